@@ -0,0 +1,29 @@
+from fastapi import Request, Response
+from core.cache import CachedResponse
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Confere If-None-Match (lista de ETags ou "*") com a ETag atual"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match usa comparação fraca: W/"x" equivale a "x"
+    for tag in header.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def cached_response(request: Request, cached: CachedResponse) -> Response:
+    """304 se o cliente já tem a versão atual; senão o corpo guardado com a ETag"""
+    if etag_matches(request, cached.etag):
+        return not_modified(cached.etag)
+    return Response(content=cached.body, media_type=cached.media_type,
+                    headers={"ETag": cached.etag, "Cache-Control": "no-cache"})
@@ -1,12 +1,25 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterator
 from pydantic import BaseModel
-from core.backup.models import BackupMetadata, BackupType, CompressionType
+from core.backup.models import (BackupMetadata, BackupType, BackupStatus, CompressionType,
+                                BackupRules, ReplicationReport, RestoreMode, RestoreReport,
+                                StandbyInfo, StandbyPromotion, StandbyVerification, VolumeInfo)
 from core.backup.manager import BackupManager
+from core.backup.volumes import backup_base_dir
+from core.backup.catalog import BackupFilter, CatalogPage
+from core.backup.replication import (DEFAULT_WORKERS, BackupReplicator, ReplicationPeer,
+                                     ReplicationSource, parse_range)
+from core.cache import RESPONSE_CACHE, stamped_etag
+from api.conditional import cached_response, etag_matches, not_modified
+import json
 import os
+import threading
 
 router = APIRouter()
-manager = BackupManager("/data/backups")
+manager = BackupManager(backup_base_dir())
+replication = ReplicationSource(manager)
 
 class CreateBackupRequest(BaseModel):
     project_id: str
@@ -16,11 +29,82 @@ class CreateBackupRequest(BaseModel):
     compression_level: int = 6
     tags: Optional[Dict[str, str]] = None
     extra: Optional[Dict[str, Any]] = None
+    rules: Optional[BackupRules] = None
+    label: Optional[str] = None
+    dry_run: bool = False
+    git_mode: bool = False                 # Repositórios git como packfiles
+    env_mode: bool = False                 # venvs/node_modules no cache de ambientes
+    max_restore_seconds: Optional[float] = None  # Limite do modo auto (padrão da política)
+
+def _page_chunks(page: CatalogPage, batch: int = 200) -> Iterator[bytes]:
+    """Serializa a página em JSON em blocos, sem montar a resposta inteira em memória"""
+    yield b'{"items":['
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    for start in range(0, len(page.items), batch):
+        chunk = ",".join(encode(item) for item in page.items[start:start + batch])
+        yield (("," if start else "") + chunk).encode()
+    yield f'],"next_cursor":{encode(page.next_cursor)}}}'.encode()
+
+class AddVolumeRequest(BaseModel):
+    path: str
+    weight: float = 1.0
+    rebalance: bool = False
+
+def _rebalance_in_background() -> None:
+    """Rebalanceia numa thread; cada projeto só fica bloqueado enquanto é movido"""
+    def run() -> None:
+        try:
+            manager.volumes.rebalance()
+        except Exception as e:
+            print(f"Erro no rebalanceamento de volumes: {e}")
+    threading.Thread(target=run, name="volume-rebalance", daemon=True).start()
+
+class ReplicationPullRequest(BaseModel):
+    peer_url: str                          # Prefixo do router no peer (ex.: http://host-b:8000/api/v1)
+    project_ids: Optional[List[str]] = None
+    workers: int = DEFAULT_WORKERS
+
+def _file_range(path: str, start: int, end: int, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Lê os bytes [start, end] de um arquivo em blocos"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def _range_response(request: Request, file_path: str) -> Response:
+    """Arquivo inteiro (200) ou a faixa pedida em Range (206)"""
+    size = os.path.getsize(file_path)
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range or (0, size - 1)
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(_file_range(file_path, start, end), status_code=206 if byte_range else 200,
+                             media_type="application/octet-stream", headers=headers)
+
+class StandbyRequest(BaseModel):
+    path: str                              # Diretório da réplica quente
+
+class PromoteStandbyRequest(BaseModel):
+    target_dir: str
+    clone: bool = False                    # Reflink/cópia em vez de rename (mantém a réplica)
+    deep: bool = False                     # Confere o md5 de todos os arquivos antes
 
 class RestoreBackupRequest(BaseModel):
     project_id: str
     backup_id: str
     restore_dir: str
+    workers: Optional[int] = None
+    mode: RestoreMode = RestoreMode.FULL
+    dry_run: bool = False
 
 @router.post("/backup/create")
 def create_backup(body: CreateBackupRequest) -> BackupMetadata:
@@ -33,7 +117,13 @@ def create_backup(body: CreateBackupRequest) -> BackupMetadata:
             compression_type=body.compression_type,
             compression_level=body.compression_level,
             tags=body.tags,
-            extra=body.extra
+            extra=body.extra,
+            rules=body.rules,
+            label=body.label,
+            dry_run=body.dry_run,
+            git_mode=body.git_mode,
+            env_mode=body.env_mode,
+            max_restore_seconds=body.max_restore_seconds
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -45,27 +135,211 @@ def restore_backup(body: RestoreBackupRequest) -> bool:
         return manager.restore_backup(
             backup_id=body.backup_id,
             project_id=body.project_id,
-            restore_dir=body.restore_dir
+            restore_dir=body.restore_dir,
+            mode=body.mode
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backup/restore/report")
+def restore_backup_report(body: RestoreBackupRequest) -> RestoreReport:
+    """Restaura um backup retornando a verificação de cada arquivo"""
+    try:
+        return manager.restore_backup_report(
+            backup_id=body.backup_id,
+            project_id=body.project_id,
+            restore_dir=body.restore_dir,
+            workers=body.workers,
+            mode=body.mode,
+            dry_run=body.dry_run
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/backup/list/{project_id}")
-def list_backups(project_id: str) -> List[BackupMetadata]:
-    """Lista todos os backups de um projeto"""
+def list_backups(request: Request,
+                 project_id: str,
+                 limit: int = Query(50, ge=1, le=1000),
+                 cursor: Optional[str] = None,
+                 type: Optional[List[BackupType]] = Query(None),
+                 status: Optional[List[BackupStatus]] = Query(None),
+                 created_after: Optional[datetime] = None,
+                 created_before: Optional[datetime] = None,
+                 tag: Optional[List[str]] = Query(None, description="Filtro chave:valor"),
+                 fields: Optional[str] = Query(None, description="Campos separados por vírgula")):
+    """Lista os backups de um projeto, paginado e sem a lista de arquivos por padrão
+
+    Os itens vêm do mais recente ao mais antigo; next_cursor continua a
+    listagem. fields projeta os campos retornados ("files" inclui a lista
+    de arquivos). A página fica em cache até o próximo backup criado ou
+    removido no projeto e responde 304 a If-None-Match com a ETag atual.
+    """
+    try:
+        filters = BackupFilter(
+            types=[t.value for t in type or []],
+            statuses=[s.value for s in status or []],
+            created_after=created_after,
+            created_before=created_before,
+            tags=dict(t.split(":", 1) for t in tag or [] if ":" in t)
+        )
+        field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+        def build() -> bytes:
+            page = manager.list_backups_page(project_id, limit, cursor, filters, field_list)
+            return b"".join(_page_chunks(page))
+
+        cached = RESPONSE_CACHE.get_or_build(
+            f"backup_list:{project_id}?{request.url.query}", [f"backup:{project_id}"], build)
+        return cached_response(request, cached)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backup/files/{project_id}/{backup_id}")
+def list_backup_files(request: Request,
+                      project_id: str,
+                      backup_id: str,
+                      limit: int = Query(1000, ge=1, le=10000),
+                      cursor: Optional[str] = None,
+                      prefix: Optional[str] = None):
+    """Lista os arquivos de um backup, paginado
+
+    A ETag vem do carimbo do metadata.json (mtime e tamanho) e da consulta,
+    então um 304 não lê a lista de arquivos.
+    """
+    meta_path = os.path.join(manager.project_dir(project_id), backup_id, "metadata.json")
+    try:
+        stat = os.stat(meta_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Backup não encontrado")
+    etag = stamped_etag(meta_path, stat.st_mtime_ns, stat.st_size, request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        page = manager.list_backup_files(backup_id, project_id, limit, cursor, prefix)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Backup não encontrado")
+    return StreamingResponse(_page_chunks(page), media_type="application/json",
+                             headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@router.get("/backup/info/{project_id}/{backup_id}", response_model=BackupMetadata)
+def get_backup_info(request: Request, project_id: str, backup_id: str) -> Response:
+    """Obtém informações de um backup específico (com ETag e cache)"""
+    meta_path = os.path.join(manager.project_dir(project_id), backup_id, "metadata.json")
+    if not os.path.exists(meta_path):
+        raise HTTPException(status_code=404, detail="Backup não encontrado")
+    try:
+        def build() -> bytes:
+            # metadata.json já é o BackupMetadata serializado
+            with open(meta_path, "rb") as f:
+                return f.read()
+
+        cached = RESPONSE_CACHE.get_or_build(
+            f"backup_info:{project_id}/{backup_id}", [f"backup:{project_id}"], build)
+        return cached_response(request, cached)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backup/history/{project_id}")
+def path_history(project_id: str,
+                 path: str,
+                 since: Optional[datetime] = None,
+                 until: Optional[datetime] = None,
+                 limit: int = Query(100, ge=1, le=10000),
+                 distinct: bool = False) -> Dict[str, Any]:
+    """Versões de um caminho nos backups do projeto, da mais recente à mais antiga"""
+    try:
+        versions = manager.path_history(project_id, path, since, until, limit, distinct)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"path": path, "versions": versions}
+
+@router.get("/backup/history/{project_id}/content")
+def path_version_content(request: Request, project_id: str, path: str, backup_id: str):
+    """Conteúdo de um arquivo como estava num backup, sem restaurar o resto
+
+    Aceita Range: em arquivos grandes (em blocos) só os blocos da faixa são
+    lidos e descomprimidos.
+    """
+    try:
+        opened = manager.open_version(backup_id, project_id, path)
+        if opened is None:
+            raise HTTPException(status_code=404, detail="Arquivo não encontrado no backup")
+        file_info, chunks = opened
+        byte_range = None
+        if request.headers.get("range"):
+            try:
+                byte_range = parse_range(request.headers["range"], file_info.size)
+            except ValueError:
+                chunks.close()
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{file_info.size}"})
+            # O tamanho só é conhecido depois de resolver a cadeia: reabre só a faixa
+            chunks.close()
+            file_info, chunks = manager.open_version(backup_id, project_id, path, byte_range)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    start, end = byte_range or (0, file_info.size - 1)
+    headers = {"ETag": f'"{file_info.checksum}"',
+               "Accept-Ranges": "bytes",
+               "Content-Length": str(end - start + 1),
+               "Content-Disposition": f'attachment; filename="{os.path.basename(file_info.path)}"'}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_info.size}"
+    return StreamingResponse(chunks, status_code=206 if byte_range else 200,
+                             media_type="application/octet-stream", headers=headers)
+
+@router.get("/backup/standby/{project_id}")
+def get_standby(project_id: str) -> Optional[StandbyInfo]:
+    """Estado da réplica quente do projeto"""
+    try:
+        return manager.standby.load(project_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/backup/standby/{project_id}")
+def enable_standby(project_id: str, body: StandbyRequest) -> Optional[StandbyInfo]:
+    """Ativa a réplica quente do projeto e a materializa com o último backup"""
+    try:
+        return manager.standby.enable(project_id, body.path)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/backup/standby/{project_id}")
+def disable_standby(project_id: str, remove: bool = False) -> bool:
+    """Desativa a réplica quente (remove=true apaga o diretório)"""
+    try:
+        return manager.standby.disable(project_id, remove)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backup/standby/{project_id}/verify")
+def verify_standby(project_id: str, deep: bool = False) -> StandbyVerification:
+    """Confere a réplica contra a árvore Merkle do backup materializado"""
     try:
-        return manager.list_backups(project_id)
+        return manager.standby.verify(project_id, deep)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/backup/info/{project_id}/{backup_id}")
-def get_backup_info(project_id: str, backup_id: str) -> Optional[BackupMetadata]:
-    """Obtém informações de um backup específico"""
+@router.post("/backup/standby/{project_id}/promote")
+def promote_standby(project_id: str, body: PromoteStandbyRequest) -> StandbyPromotion:
+    """Restaura o último backup em target_dir promovendo a réplica quente"""
     try:
-        info = manager.get_backup_info(backup_id, project_id)
-        if not info:
-            raise HTTPException(status_code=404, detail="Backup não encontrado")
-        return info
+        return manager.standby.promote(project_id, body.target_dir, body.clone, body.deep)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -77,3 +351,98 @@ def delete_backup(project_id: str, backup_id: str) -> bool:
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/backup/retention/{project_id}")
+def apply_retention(project_id: str, keep_last: int) -> List[str]:
+    """Remove snapshots antigos não fixados por checkpoints"""
+    try:
+        return manager.apply_retention(project_id, keep_last)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backup/rules/{project_id}")
+def get_backup_rules(project_id: str) -> Optional[BackupRules]:
+    """Obtém as regras de inclusão/exclusão de um projeto"""
+    try:
+        return manager.get_rules(project_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/backup/rules/{project_id}")
+def set_backup_rules(project_id: str, rules: Optional[BackupRules] = None) -> bool:
+    """Define as regras de inclusão/exclusão de um projeto (vazio remove)"""
+    try:
+        manager.set_rules(project_id, rules)
+        return True
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backup/volumes")
+def list_volumes() -> List[VolumeInfo]:
+    """Lista os volumes de armazenamento com ocupação e projetos"""
+    try:
+        return manager.volumes.status()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backup/volumes")
+def add_volume(body: AddVolumeRequest) -> List[VolumeInfo]:
+    """Adiciona um volume; com rebalance=true move projetos para ele em segundo plano"""
+    try:
+        manager.volumes.add_volume(body.path, body.weight)
+        if body.rebalance:
+            _rebalance_in_background()
+        return manager.volumes.status()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backup/volumes/rebalance")
+def rebalance_volumes() -> bool:
+    """Inicia o rebalanceamento de projetos entre os volumes"""
+    _rebalance_in_background()
+    return True
+
+@router.get("/backup/replication/catalog")
+def replication_catalog(project_id: Optional[List[str]] = Query(None)) -> Dict[str, List[Dict[str, Any]]]:
+    """Catálogo dos backups concluídos para outra instância comparar com o seu"""
+    try:
+        return replication.catalog(project_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backup/replication/index/{project_id}/{backup_id}")
+def replication_index(project_id: str, backup_id: str) -> Dict[str, Dict[str, Any]]:
+    """sha256 e tamanho de cada arquivo de um backup"""
+    try:
+        index = replication.index(project_id, backup_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if index is None:
+        raise HTTPException(status_code=404, detail="Backup não encontrado")
+    return index
+
+@router.get("/backup/replication/blob/{project_id}/{backup_id}/{path:path}")
+def replication_blob(request: Request, project_id: str, backup_id: str, path: str):
+    """Conteúdo de um arquivo do backup, como está no disco; aceita Range para retomar downloads"""
+    file_path = replication.blob_path(project_id, backup_id, path)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    return _range_response(request, file_path)
+
+@router.get("/backup/replication/envcache/{name:path}")
+def replication_env_object(request: Request, name: str):
+    """Manifesto ou pacote do cache de ambientes; aceita Range"""
+    file_path = manager.environments.resolve(name)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Objeto não encontrado")
+    return _range_response(request, file_path)
+
+@router.post("/backup/replication/pull")
+def replication_pull(body: ReplicationPullRequest) -> ReplicationReport:
+    """Traz do peer os backups que faltam nesta instância"""
+    try:
+        peer = ReplicationPeer(body.peer_url)
+        return BackupReplicator(manager, peer, body.workers).run(body.project_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1 @@
+# Benchmarks do sistema de backup
@@ -0,0 +1,276 @@
+"""Benchmark do BackupManager com corpora sintéticos
+
+Uso:
+    python -m benchmarks.backup_benchmark --output results.json
+    python -m benchmarks.backup_benchmark --baseline benchmarks/baseline.json
+    python -m benchmarks.backup_benchmark --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.backup.manager import BackupManager
+from core.backup.models import BackupType, CompressionType
+from benchmarks.corpus import CORPORA, generate_corpus, mutate_corpus
+
+PROJECT_ID = "bench"
+CODECS = [CompressionType.NONE, CompressionType.ZLIB, CompressionType.GZIP, CompressionType.LZMA]
+DEFAULT_THRESHOLDS = {
+    "mb_per_s": 0.10,        # Queda máxima de throughput (10%)
+    "peak_rss_bytes": 0.20,  # Aumento máximo de memória (20%)
+    "cpu_seconds": 0.20,     # Aumento máximo de CPU (20%)
+}
+
+
+def _tree_stats(path: str) -> Tuple[int, int]:
+    """Retorna (arquivos, bytes) de um diretório"""
+    files = 0
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            files += 1
+            size += os.path.getsize(os.path.join(dirpath, filename))
+    return files, size
+
+
+def _child(fn: Callable[[], Any], conn) -> None:
+    """Executa uma operação medindo tempo, CPU e pico de memória"""
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            usage_before = resource.getrusage(resource.RUSAGE_SELF)
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = ((usage_after.ru_utime - usage_before.ru_utime)
+               + (usage_after.ru_stime - usage_before.ru_stime))
+        conn.send({
+            "seconds": elapsed,
+            "cpu_seconds": cpu,
+            # ru_maxrss é reportado em KB no Linux
+            "peak_rss_bytes": usage_after.ru_maxrss * 1024,
+        })
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def _run_isolated(fn: Callable[[], Any]) -> Dict[str, Any]:
+    """Executa fn em um processo separado para isolar o pico de RSS"""
+    ctx = multiprocessing.get_context("fork")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child, args=(fn, child_conn))
+    process.start()
+    child_conn.close()
+    result = parent_conn.recv()
+    process.join()
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+
+class BenchmarkRunner:
+    """Executa os cenários de benchmark e coleta resultados"""
+
+    def __init__(self, workdir: str, scale: float, codecs: List[CompressionType], level: int):
+        self.workdir = workdir
+        self.scale = scale
+        self.codecs = codecs
+        self.level = level
+        self.results: List[Dict[str, Any]] = []
+
+    def _record(self, corpus: str, operation: str, codec: str,
+                files: int, size: int, fn: Callable[[], Any]) -> None:
+        print(f"[bench] {corpus:<15} {operation:<18} {codec:<5}", end=" ", flush=True)
+        measured = _run_isolated(fn)
+        seconds = max(measured["seconds"], 1e-9)
+        entry = {
+            "corpus": corpus,
+            "operation": operation,
+            "codec": codec,
+            "files": files,
+            "bytes": size,
+            "seconds": round(seconds, 6),
+            "files_per_s": round(files / seconds, 3),
+            "mb_per_s": round(size / seconds / (1024 * 1024), 3),
+            "cpu_seconds": round(measured["cpu_seconds"], 6),
+            "peak_rss_bytes": measured["peak_rss_bytes"],
+        }
+        self.results.append(entry)
+        print(f"{entry['mb_per_s']:>9.2f} MB/s {entry['files_per_s']:>10.1f} files/s")
+
+    def run_corpus(self, name: str) -> None:
+        corpus_root = os.path.join(self.workdir, name, "source")
+        generate_corpus(name, corpus_root, self.scale)
+        files, size = _tree_stats(corpus_root)
+
+        for codec in self.codecs:
+            codec_dir = os.path.join(self.workdir, name, codec.value)
+            data_dir = os.path.join(codec_dir, "source")
+            store = os.path.join(codec_dir, "store")
+            shutil.copytree(corpus_root, data_dir)
+
+            def create(backup_type: BackupType):
+                return lambda: BackupManager(store).create_backup(
+                    PROJECT_ID, backup_type, data_dir,
+                    compression_type=codec, compression_level=self.level)
+
+            self._record(name, "create_full", codec.value, files, size,
+                         create(BackupType.FULL))
+
+            mutate_corpus(data_dir)
+            inc_files, inc_size = _tree_stats(data_dir)
+            self._record(name, "create_incremental", codec.value, inc_files, inc_size,
+                         create(BackupType.INCREMENTAL))
+
+            manager = BackupManager(store)
+            latest = manager.list_backups(PROJECT_ID)[0]
+            restore_dir = os.path.join(codec_dir, "restore")
+            self._record(name, "restore", codec.value, inc_files, inc_size,
+                         lambda: _check(manager.restore_backup(latest.id, PROJECT_ID, restore_dir)))
+
+            self._record(name, "validate", codec.value, inc_files, inc_size,
+                         lambda: _check(manager.validator.validate_restore_point(
+                             latest.id, PROJECT_ID)[0]))
+
+            if codec != CompressionType.NONE:
+                compressed_dir = os.path.join(codec_dir, "compressed")
+                decompressed_dir = os.path.join(codec_dir, "decompressed")
+                self._record(name, "compress", codec.value, files, size,
+                             lambda: manager.compressor.compress_directory(
+                                 corpus_root, compressed_dir, codec, self.level))
+                self._record(name, "decompress", codec.value, files, size,
+                             lambda: _check(manager.compressor.decompress_directory(
+                                 compressed_dir, decompressed_dir)[0]))
+
+            shutil.rmtree(codec_dir, ignore_errors=True)
+
+    def run(self, corpora: List[str]) -> Dict[str, Any]:
+        for name in corpora:
+            self.run_corpus(name)
+        return {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": self.scale,
+            "level": self.level,
+            "results": self.results,
+        }
+
+
+def _check(ok: bool) -> None:
+    if not ok:
+        raise RuntimeError("Operação retornou falha")
+
+
+def _result_key(entry: Dict[str, Any]) -> str:
+    return f"{entry['corpus']}/{entry['operation']}/{entry['codec']}"
+
+
+def compare_results(current: Dict[str, Any],
+                    baseline: Dict[str, Any],
+                    thresholds: Optional[Dict[str, float]] = None) -> List[str]:
+    """Compara resultados com a baseline e retorna as regressões encontradas"""
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    if baseline.get("scale") != current.get("scale"):
+        return [f"Escala diferente da baseline: {current.get('scale')} != {baseline.get('scale')}"]
+
+    base_index = {_result_key(entry): entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in current["results"]:
+        base = base_index.get(_result_key(entry))
+        if not base:
+            continue
+        # Throughput: maior é melhor
+        limit = thresholds.get("mb_per_s")
+        if limit is not None and base["mb_per_s"] > 0:
+            change = (entry["mb_per_s"] - base["mb_per_s"]) / base["mb_per_s"]
+            if change < -limit:
+                regressions.append(
+                    f"{_result_key(entry)}: throughput {entry['mb_per_s']} MB/s "
+                    f"({change:+.1%} vs {base['mb_per_s']})")
+        # Memória e CPU: menor é melhor
+        for metric in ("peak_rss_bytes", "cpu_seconds"):
+            limit = thresholds.get(metric)
+            if limit is None or base[metric] <= 0:
+                continue
+            change = (entry[metric] - base[metric]) / base[metric]
+            if change > limit:
+                regressions.append(
+                    f"{_result_key(entry)}: {metric} {entry[metric]} "
+                    f"({change:+.1%} vs {base[metric]})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do sistema de backup")
+    parser.add_argument("--corpus", action="append", choices=sorted(CORPORA),
+                        help="Corpus a executar (padrão: todos)")
+    parser.add_argument("--codec", action="append", choices=[c.value for c in CODECS],
+                        help="Codec a executar (padrão: todos)")
+    parser.add_argument("--scale", type=float, default=0.1,
+                        help="Fator de escala dos corpora (1.0 = tamanho completo)")
+    parser.add_argument("--level", type=int, default=6, help="Nível de compressão")
+    parser.add_argument("--workdir", default=None, help="Diretório de trabalho")
+    parser.add_argument("--keep", action="store_true", help="Mantém o diretório de trabalho")
+    parser.add_argument("--output", default="bench_results.json", help="Arquivo JSON de resultados")
+    parser.add_argument("--baseline", default=None, help="Baseline para comparação")
+    parser.add_argument("--save-baseline", default=None, help="Salva os resultados como baseline")
+    parser.add_argument("--max-throughput-drop", type=float, default=DEFAULT_THRESHOLDS["mb_per_s"])
+    parser.add_argument("--max-rss-increase", type=float, default=DEFAULT_THRESHOLDS["peak_rss_bytes"])
+    parser.add_argument("--max-cpu-increase", type=float, default=DEFAULT_THRESHOLDS["cpu_seconds"])
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="nexus_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    codecs = [CompressionType(c) for c in args.codec] if args.codec else CODECS
+    runner = BenchmarkRunner(workdir, args.scale, codecs, args.level)
+    try:
+        results = runner.run(args.corpus or sorted(CORPORA))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Resultados salvos em {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline salva em {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, {
+            "mb_per_s": args.max_throughput_drop,
+            "peak_rss_bytes": args.max_rss_increase,
+            "cpu_seconds": args.max_cpu_increase,
+        })
+        if regressions:
+            print("Regressões encontradas:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("Nenhuma regressão em relação à baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import os
+import random
+from typing import Callable, Dict, List
+
+# Vocabulário usado para gerar texto parecido com código-fonte
+_KEYWORDS = [
+    "def", "class", "return", "import", "from", "if", "else", "for", "while",
+    "try", "except", "with", "as", "self", "None", "True", "False", "yield",
+    "async", "await", "lambda", "print", "len", "range", "dict", "list",
+]
+_IDENTIFIERS = [
+    "backup", "project", "manager", "metadata", "checksum", "service", "config",
+    "data_dir", "file_info", "status", "result", "items", "value", "path",
+    "compression", "level", "handler", "request", "response", "logger",
+]
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _source_text(rng: random.Random, size: int) -> bytes:
+    """Gera texto com estrutura e repetição semelhantes a código Python"""
+    lines: List[str] = []
+    total = 0
+    indent = 0
+    while total < size:
+        words = [rng.choice(_KEYWORDS if i % 3 == 0 else _IDENTIFIERS)
+                 for i in range(rng.randint(2, 8))]
+        line = "    " * indent + " ".join(words)
+        if rng.random() < 0.2:
+            line += ":"
+            indent = min(indent + 1, 4)
+        elif rng.random() < 0.2:
+            indent = max(indent - 1, 0)
+        lines.append(line)
+        total += len(line) + 1
+    return ("\n".join(lines) + "\n").encode()[:size]
+
+
+def tiny_files(root: str, rng: random.Random, scale: float) -> None:
+    """Muitos arquivos pequenos (200B a 2KB)"""
+    count = max(10, int(5000 * scale))
+    for i in range(count):
+        size = rng.randint(200, 2048)
+        _write(os.path.join(root, f"d{i % 50:02d}", f"f{i:05d}.txt"),
+               _source_text(rng, size))
+
+
+def huge_files(root: str, rng: random.Random, scale: float) -> None:
+    """Poucos arquivos grandes, metade compressível e metade aleatória"""
+    size = max(1024 * 1024, int(64 * 1024 * 1024 * scale))
+    block = _source_text(rng, 1024 * 1024)
+    with open(os.path.join(root, "huge_text.dat"), "wb") as f:
+        written = 0
+        while written < size:
+            f.write(block)
+            written += len(block)
+    _write(os.path.join(root, "huge_random.bin"), rng.randbytes(size))
+
+
+def incompressible(root: str, rng: random.Random, scale: float) -> None:
+    """Binários aleatórios que não comprimem"""
+    count = max(2, int(20 * scale))
+    for i in range(count):
+        _write(os.path.join(root, "bin", f"blob{i:03d}.bin"),
+               rng.randbytes(2 * 1024 * 1024))
+
+
+def source_code(root: str, rng: random.Random, scale: float) -> None:
+    """Árvore de arquivos de código-fonte de tamanho médio"""
+    count = max(10, int(1000 * scale))
+    for i in range(count):
+        package = f"pkg{i % 20:02d}"
+        module = f"sub{i % 7}"
+        _write(os.path.join(root, package, module, f"module_{i:04d}.py"),
+               _source_text(rng, rng.randint(2 * 1024, 16 * 1024)))
+
+
+def deep_nesting(root: str, rng: random.Random, scale: float) -> None:
+    """Diretórios profundamente aninhados com arquivos em todos os níveis"""
+    depth = 32
+    branches = max(1, int(8 * scale))
+    for branch in range(branches):
+        path = os.path.join(root, f"branch{branch}")
+        for level in range(depth):
+            path = os.path.join(path, f"level{level:02d}")
+            _write(os.path.join(path, "node.json"),
+                   (f'{{"branch": {branch}, "level": {level}, '
+                    f'"value": {rng.randint(0, 1 << 30)}}}\n').encode())
+
+
+CORPORA: Dict[str, Callable[[str, random.Random, float], None]] = {
+    "tiny_files": tiny_files,
+    "huge_files": huge_files,
+    "incompressible": incompressible,
+    "source_code": source_code,
+    "deep_nesting": deep_nesting,
+}
+
+
+def generate_corpus(name: str, root: str, scale: float = 1.0, seed: int = 42) -> str:
+    """Gera um corpus sintético reproduzível em root"""
+    os.makedirs(root, exist_ok=True)
+    CORPORA[name](root, random.Random(f"{name}:{seed}"), scale)
+    return root
+
+
+def mutate_corpus(root: str, fraction: float = 0.05, seed: int = 7) -> int:
+    """Altera, cria e remove uma fração dos arquivos (para backups incrementais)"""
+    rng = random.Random(seed)
+    paths = sorted(
+        os.path.join(dirpath, filename)
+        for dirpath, _, filenames in os.walk(root)
+        for filename in filenames
+    )
+    count = max(1, int(len(paths) * fraction))
+    changed = rng.sample(paths, min(count, len(paths)))
+    for i, path in enumerate(changed):
+        if i % 5 == 0:
+            os.remove(path)
+        else:
+            with open(path, "ab") as f:
+                f.write(_source_text(rng, 512))
+    for i in range(max(1, count // 5)):
+        _write(os.path.join(root, "added", f"new_{i:04d}.txt"), _source_text(rng, 1024))
+    return count
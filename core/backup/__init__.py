@@ -1,10 +1,18 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 import os
 import json
 import shutil
 import traceback
+from .pagecache import copy_file
+from .metrics import STAGE_METRICS, StageRecorder
+from .models import BackupRules, RestorePlan
+from .rules import compile_rules, load_rules
+from .manifest import iter_tree
+from .differential import DELETE, DesiredFile, apply_metadata, plan_restore, writes
+from .volumes import VolumeSet, get_volume_set
+from ..cache import RESPONSE_CACHE
 
 @dataclass
 class BackupInfo:
@@ -16,14 +24,17 @@ class BackupInfo:
     size_bytes: int
     status: str  # success, failed, in_progress
     error_message: Optional[str] = None
+    rules: Optional[Dict[str, Any]] = None  # Regras de inclusão/exclusão efetivas
 
 class BackupManager:
     """Gerenciador de backups"""
 
-    def __init__(self, base_dir: str):
+    def __init__(self, base_dir: str, volumes: Optional[VolumeSet] = None):
         print(f"Inicializando BackupManager com diretório base: {base_dir}")
         self.base_dir = base_dir
         self._ensure_directories()
+        # base_dir é o volume primário; outros volumes vêm de volumes/BACKUP_VOLUMES
+        self.volumes = volumes or get_volume_set(base_dir)
         print("BackupManager inicializado com sucesso")
 
     def _ensure_directories(self):
@@ -37,13 +48,13 @@ class BackupManager:
             print(traceback.format_exc())
             raise
 
-    def _get_project_dir(self, project_id: str) -> str:
-        """Retorna o diretório de um projeto"""
-        return os.path.join(self.base_dir, project_id)
+    def _get_project_dir(self, project_id: str, create: bool = False) -> str:
+        """Retorna o diretório de um projeto (create posiciona projetos novos num volume)"""
+        return self.volumes.project_dir(project_id, create)
 
-    def _get_backup_dir(self, project_id: str, backup_id: str) -> str:
+    def _get_backup_dir(self, project_id: str, backup_id: str, create: bool = False) -> str:
         """Retorna o diretório de um backup específico"""
-        return os.path.join(self._get_project_dir(project_id), backup_id)
+        return os.path.join(self._get_project_dir(project_id, create), backup_id)
 
     def _get_backup_info_path(self, project_id: str, backup_id: str) -> str:
         """Retorna o caminho do arquivo de informações do backup"""
@@ -61,11 +72,13 @@ class BackupManager:
                 "description": backup.description,
                 "size_bytes": backup.size_bytes,
                 "status": backup.status,
-                "error_message": backup.error_message
+                "error_message": backup.error_message,
+                "rules": backup.rules
             }
             os.makedirs(os.path.dirname(info_path), exist_ok=True)
             with open(info_path, "w") as f:
                 json.dump(info_dict, f, indent=2)
+            RESPONSE_CACHE.invalidate(f"backup:{backup.project_id}")
             print(f"Informações do backup {backup.id} salvas com sucesso")
         except Exception as e:
             print(f"Erro ao salvar informações do backup: {e}")
@@ -91,7 +104,8 @@ class BackupManager:
                 description=info_dict["description"],
                 size_bytes=info_dict["size_bytes"],
                 status=info_dict["status"],
-                error_message=info_dict.get("error_message")
+                error_message=info_dict.get("error_message"),
+                rules=info_dict.get("rules")
             )
             print(f"Informações do backup {backup_id} carregadas com sucesso")
             return backup
@@ -100,13 +114,22 @@ class BackupManager:
             print(traceback.format_exc())
             return None
 
-    def create_backup(self, project_id: str, source_dir: str, description: str = "") -> BackupInfo:
+    def create_backup(self,
+                      project_id: str,
+                      source_dir: str,
+                      description: str = "",
+                      rules: Optional[BackupRules] = None) -> BackupInfo:
         """Cria um novo backup"""
         try:
             print(f"Iniciando backup do projeto {project_id}")
             # Gera ID único para o backup usando timestamp
             backup_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_dir = self._get_backup_dir(project_id, backup_id)
+            backup_dir = self._get_backup_dir(project_id, backup_id, create=True)
+
+            # Regras do projeto (mesmo rules.json usado pelo BackupManager novo)
+            if rules is None:
+                rules = load_rules(self._get_project_dir(project_id))
+            compiled_rules = compile_rules(rules)
 
             # Cria o backup com status inicial
             backup = BackupInfo(
@@ -115,19 +138,34 @@ class BackupManager:
                 timestamp=datetime.now(),
                 description=description,
                 size_bytes=0,
-                status="in_progress"
+                status="in_progress",
+                rules=compiled_rules.rules.dict() if compiled_rules else None
             )
             self._save_backup_info(backup)
 
+            recorder = StageRecorder("create_backup")
             try:
                 # Copia os arquivos
                 print(f"Copiando arquivos de {source_dir} para {backup_dir}")
-                shutil.copytree(source_dir, backup_dir)
+                with self.volumes.project_lock(project_id), self.volumes.io(project_id), \
+                        recorder.stage("copy"):
+                    shutil.copytree(
+                        source_dir,
+                        backup_dir,
+                        copy_function=copy_file,
+                        ignore=compiled_rules.copytree_ignore(source_dir) if compiled_rules else None,
+                        dirs_exist_ok=True  # info.json já foi gravado no diretório
+                    )
 
                 # Atualiza o tamanho e status
-                total_size = sum(os.path.getsize(os.path.join(dirpath, filename))
-                                for dirpath, _, filenames in os.walk(backup_dir)
-                                for filename in filenames)
+                with recorder.stage("size") as span:
+                    total_size = 0
+                    total_files = 0
+                    for dirpath, _, filenames in os.walk(backup_dir):
+                        for filename in filenames:
+                            total_size += os.path.getsize(os.path.join(dirpath, filename))
+                            total_files += 1
+                    span.add(files=total_files, bytes=total_size)
 
                 backup.size_bytes = total_size
                 backup.status = "success"
@@ -139,7 +177,11 @@ class BackupManager:
                 print(f"Erro ao criar backup: {e}")
                 print(traceback.format_exc())
 
-            self._save_backup_info(backup)
+            with recorder.stage("metadata") as span:
+                self._save_backup_info(backup)
+                span.add(files=1)
+            if backup.status == "success":
+                STAGE_METRICS.record("create_backup", recorder.timings())
             return backup
 
         except Exception as e:
@@ -172,24 +214,86 @@ class BackupManager:
             print(traceback.format_exc())
             return []
 
-    def restore_backup(self, project_id: str, backup_id: str, target_dir: str) -> bool:
-        """Restaura um backup"""
+    def plan_restore(self, project_id: str, backup_id: str, target_dir: str) -> Optional[RestorePlan]:
+        """Planeja uma restauração diferencial sem alterar o destino
+
+        Os arquivos do backup são comparados com o destino pelo stat (a cópia
+        preserva o mtime) e, se ambíguos, pelo md5 dos dois lados.
+        """
         try:
-            print(f"Iniciando restauração do backup {backup_id} do projeto {project_id}")
             backup_dir = self._get_backup_dir(project_id, backup_id)
-            if not os.path.exists(backup_dir):
-                print(f"Diretório do backup não encontrado: {backup_dir}")
-                return False
+            backup = self._load_backup_info(project_id, backup_id)
+            if not backup or not os.path.exists(backup_dir):
+                print(f"Backup não encontrado: {backup_dir}")
+                return None
+            desired = {}
+            for rel_path, stat in iter_tree(backup_dir):
+                if rel_path == "info.json":
+                    continue
+                desired[rel_path] = DesiredFile(rel_path, stat.st_size, stat.st_mtime,
+                                                source=os.path.join(backup_dir, rel_path))
+            rules = compile_rules(BackupRules(**backup.rules)) if backup.rules else None
+            plan = plan_restore(target_dir, desired, rules)
+            # O info.json que restaurações completas copiam para o destino é mantido
+            plan.changes = [c for c in plan.changes
+                            if not (c.path == "info.json" and c.action == DELETE)]
+            plan.files_to_delete = sum(1 for c in plan.changes if c.action == DELETE)
+            return plan
+        except Exception as e:
+            print(f"Erro ao planejar restauração: {e}")
+            print(traceback.format_exc())
+            return None
+
+    def restore_backup(self,
+                       project_id: str,
+                       backup_id: str,
+                       target_dir: str,
+                       differential: bool = False) -> bool:
+        """Restaura um backup
+
+        Por padrão o destino é apagado e recopiado. Com differential=True só
+        os arquivos que diferem são copiados e os que sobram são removidos.
+        """
+        try:
+            print(f"Iniciando restauração do backup {backup_id} do projeto {project_id}")
+            recorder = StageRecorder("restore_backup")
+            # Plano, remoção e cópia sob o lock do projeto e um slot de I/O:
+            # nem backups nem migrações entre volumes mudam o backup no meio
+            with self.volumes.project_lock(project_id), self.volumes.io(project_id):
+                backup_dir = self._get_backup_dir(project_id, backup_id)
+                if not os.path.exists(backup_dir):
+                    print(f"Diretório do backup não encontrado: {backup_dir}")
+                    return False
 
-            # Remove o diretório de destino se existir
-            if os.path.exists(target_dir):
-                print(f"Removendo diretório de destino existente: {target_dir}")
-                shutil.rmtree(target_dir)
+                if differential:
+                    with recorder.stage("diff") as span:
+                        plan = self.plan_restore(project_id, backup_id, target_dir)
+                        if plan is None:
+                            return False
+                        span.add(files=len(plan.changes) + plan.unchanged)
+                    print(f"Plano diferencial: {plan.files_to_create} novos, {plan.files_to_update} "
+                          f"alterados, {plan.files_to_delete} removidos, {plan.unchanged} inalterados")
+                    with recorder.stage("remove") as span:
+                        span.add(files=apply_metadata(target_dir, plan))
+                    with recorder.stage("copy") as span:
+                        for path in writes(plan):
+                            dest = os.path.join(target_dir, path)
+                            os.makedirs(os.path.dirname(dest), exist_ok=True)
+                            copy_file(os.path.join(backup_dir, path), dest)
+                        span.add(files=plan.files_to_create + plan.files_to_update,
+                                 bytes=plan.bytes_to_write)
+                else:
+                    # Remove o diretório de destino se existir
+                    if os.path.exists(target_dir):
+                        print(f"Removendo diretório de destino existente: {target_dir}")
+                        shutil.rmtree(target_dir)
 
-            # Copia os arquivos do backup
-            print(f"Copiando arquivos de {backup_dir} para {target_dir}")
-            shutil.copytree(backup_dir, target_dir)
-            print(f"Backup {backup_id} restaurado com sucesso")
+                    # Copia os arquivos do backup
+                    print(f"Copiando arquivos de {backup_dir} para {target_dir}")
+                    with recorder.stage("copy"):
+                        shutil.copytree(backup_dir, target_dir, copy_function=copy_file)
+            STAGE_METRICS.record("restore_backup", recorder.timings())
+            print(f"Backup {backup_id} restaurado{' (diferencial)' if differential else ''} com sucesso")
             return True
 
         except Exception as e:
@@ -207,7 +311,9 @@ class BackupManager:
                 return False
 
             # Remove o diretório do backup
-            shutil.rmtree(backup_dir)
+            with self.volumes.project_lock(project_id):
+                shutil.rmtree(backup_dir)
+            RESPONSE_CACHE.invalidate(f"backup:{project_id}")
             print(f"Backup {backup_id} deletado com sucesso")
             return True
 
@@ -0,0 +1,262 @@
+import bisect
+import lzma
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+
+BLOCK_SIZE = 4 * 1024 * 1024            # Conteúdo original de cada bloco
+BLOCK_THRESHOLD = 64 * 1024 * 1024      # Arquivos a partir deste tamanho usam blocos
+_INDEX_ENTRY = struct.Struct(">QIIII")  # offset, tamanho gravado, tamanho original, crc32 original, crc32 gravado
+_FOOTER = struct.Struct(">QII4s")       # offset do índice, blocos, crc32 do índice, marca
+_FOOTER_MAGIC = b"BIDX"
+BLOCK_WORKERS = os.cpu_count() or 1
+MAX_IN_FLIGHT = 2 * BLOCK_WORKERS       # Blocos em voo somando todos os arquivos
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+_SLOTS = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+
+def block_pool() -> ThreadPoolExecutor:
+    """Pool compartilhado de compressão por blocos (zlib e lzma liberam o GIL)"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(BLOCK_WORKERS, thread_name_prefix="block-codec")
+        return _POOL
+
+
+class _InFlight:
+    """Blocos em voo de um arquivo, em ordem, limitados pelas vagas de _SLOTS
+
+    Sem vaga livre o arquivo coleta o seu bloco mais antigo em vez de esperar
+    no semáforo, e sem nenhum em voo submete um bloco fora das vagas. A
+    memória fica em MAX_IN_FLIGHT blocos mais um por arquivo ativo, e um
+    leitor e um gravador na mesma thread (recompressão) nunca se bloqueiam.
+    """
+
+    def __init__(self):
+        self._pending: Deque[Tuple[Future, bool]] = deque()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def try_submit(self, fn: Callable[..., Any], *args: Any) -> bool:
+        """Submete ao pool; False se é preciso coletar um bloco antes"""
+        slotted = _SLOTS.acquire(blocking=False)
+        if not slotted and self._pending:
+            return False
+        self._pending.append((block_pool().submit(fn, *args), slotted))
+        return True
+
+    def result(self) -> Any:
+        """Resultado do bloco mais antigo, liberando a vaga dele"""
+        future, slotted = self._pending.popleft()
+        try:
+            return future.result()
+        finally:
+            if slotted:
+                _SLOTS.release()
+
+    def cancel(self) -> None:
+        """Descarta os blocos em voo; espera os que já rodam e libera as vagas"""
+        pending, self._pending = self._pending, deque()
+        for future, _ in pending:
+            future.cancel()
+        for future, slotted in pending:
+            if not future.cancelled():
+                future.exception()
+            if slotted:
+                _SLOTS.release()
+
+
+class BlockCorrupted(ValueError):
+    """Bloco com CRC divergente"""
+
+
+@dataclass
+class Block:
+    """Entrada do índice: posição no arquivo e CRCs do bloco"""
+    offset: int          # Início do bloco comprimido no arquivo
+    stored_size: int     # Tamanho comprimido
+    size: int            # Tamanho original
+    crc: int             # crc32 do conteúdo original
+    stored_crc: int      # crc32 do bloco comprimido (confere sem descomprimir)
+    start: int = 0       # Posição do bloco no conteúdo original
+
+
+class BlockIndex:
+    """Índice gravado no final de um arquivo em blocos
+
+    Layout: cabeçalho, blocos comprimidos independentes, índice (uma entrada
+    por bloco) e rodapé com o offset e o crc32 do índice.
+    """
+
+    def __init__(self, blocks: List[Block]):
+        self.blocks = blocks
+        self._starts = []
+        position = 0
+        for block in blocks:
+            block.start = position
+            self._starts.append(position)
+            position += block.size
+        self.total_size = position
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def to_bytes(self, index_offset: int) -> bytes:
+        index = b"".join(_INDEX_ENTRY.pack(b.offset, b.stored_size, b.size, b.crc, b.stored_crc)
+                         for b in self.blocks)
+        return index + _FOOTER.pack(index_offset, len(self.blocks), zlib.crc32(index), _FOOTER_MAGIC)
+
+    @classmethod
+    def load(cls, path: str) -> "BlockIndex":
+        """Lê o índice pelo rodapé, sem percorrer os blocos"""
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size < _FOOTER.size:
+                raise BlockCorrupted(f"Arquivo em blocos truncado: {path}")
+            f.seek(size - _FOOTER.size)
+            index_offset, count, index_crc, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if magic != _FOOTER_MAGIC or index_offset + count * _INDEX_ENTRY.size != size - _FOOTER.size:
+                raise BlockCorrupted(f"Índice de blocos inválido em {path}")
+            f.seek(index_offset)
+            index = f.read(count * _INDEX_ENTRY.size)
+        if zlib.crc32(index) != index_crc:
+            raise BlockCorrupted(f"Índice de blocos corrompido em {path}")
+        return cls([Block(*_INDEX_ENTRY.unpack_from(index, i * _INDEX_ENTRY.size)) for i in range(count)])
+
+    def find(self, position: int) -> int:
+        """Bloco que contém a posição (no conteúdo original)"""
+        return max(0, bisect.bisect_right(self._starts, position) - 1)
+
+
+class BlockWriter:
+    """Corta o conteúdo em blocos, comprime em paralelo e grava na ordem
+
+    Os blocos em voo contam no limite global (MAX_IN_FLIGHT): a memória não
+    depende do tamanho nem do número de arquivos. finish() grava o índice e
+    o rodapé; close() descarta o que restar em voo após um erro.
+    """
+
+    def __init__(self,
+                 write: Callable[[bytes], None],
+                 offset: int,
+                 compress: Callable[[bytes], bytes],
+                 block_size: int = BLOCK_SIZE):
+        self.write = write
+        self.offset = offset  # Posição no arquivo do próximo bloco (depois do cabeçalho)
+        self.compress = compress
+        self.block_size = block_size
+        self._buffer = bytearray()
+        self._in_flight = _InFlight()
+        self._blocks: List[Block] = []
+
+    def _encode(self, data: bytes) -> Tuple[Block, bytes]:
+        stored = self.compress(data)
+        return Block(0, len(stored), len(data), zlib.crc32(data), zlib.crc32(stored)), stored
+
+    def _write_next(self) -> None:
+        block, stored = self._in_flight.result()
+        block.offset = self.offset
+        self.write(stored)
+        self.offset += len(stored)
+        self._blocks.append(block)
+
+    def _submit(self, data: bytes) -> None:
+        while not self._in_flight.try_submit(self._encode, data):
+            self._write_next()
+
+    def update(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+
+    def finish(self) -> BlockIndex:
+        if self._buffer or not self._blocks and not self._in_flight:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._in_flight:
+            self._write_next()
+        index = BlockIndex(self._blocks)
+        self.write(index.to_bytes(self.offset))
+        return index
+
+    def close(self) -> None:
+        self._in_flight.cancel()
+
+
+def _read_block(fd: int, block: Block) -> bytes:
+    stored = os.pread(fd, block.stored_size, block.offset)
+    if len(stored) != block.stored_size or zlib.crc32(stored) != block.stored_crc:
+        raise BlockCorrupted(f"Bloco em {block.offset} corrompido")
+    return stored
+
+
+def _decode(fd: int, block: Block, decompress: Callable[[bytes], bytes]) -> bytes:
+    data = decompress(_read_block(fd, block))
+    if len(data) != block.size or zlib.crc32(data) != block.crc:
+        raise BlockCorrupted(f"Bloco em {block.offset} com conteúdo divergente")
+    return data
+
+
+def iter_blocks(path: str,
+                index: BlockIndex,
+                decompress: Callable[[bytes], bytes],
+                numbers: Optional[Iterable[int]] = None) -> Iterator[bytes]:
+    """Conteúdo original dos blocos pedidos (todos, por padrão), descomprimidos em paralelo"""
+    numbers = iter(range(len(index)) if numbers is None else numbers)
+    with open(path, "rb") as f:
+        fd = f.fileno()
+        in_flight = _InFlight()
+        try:
+            for number in numbers:
+                while not in_flight.try_submit(_decode, fd, index.blocks[number], decompress):
+                    yield in_flight.result()
+            while in_flight:
+                yield in_flight.result()
+        finally:
+            # O arquivo fecha ao sair: nada pode continuar lendo o fd
+            in_flight.cancel()
+
+
+def slice_chunks(chunks: Iterable[bytes], start: int, end: int, position: int = 0) -> Iterator[bytes]:
+    """Bytes [start, end] de um fluxo de chunks que começa em position"""
+    for chunk in chunks:
+        chunk_end = position + len(chunk)
+        if chunk_end > start:
+            yield chunk[max(0, start - position):end + 1 - position]
+        position = chunk_end
+        if position > end:
+            break
+
+
+def verify_blocks(path: str,
+                  index: BlockIndex,
+                  decompress: Optional[Callable[[bytes], bytes]] = None,
+                  numbers: Optional[Iterable[int]] = None) -> List[int]:
+    """Blocos com CRC divergente
+
+    Sem decompress, só o crc32 dos bytes gravados é conferido; com ele,
+    cada bloco pedido é descomprimido isoladamente e o conteúdo também.
+    """
+    bad = []
+    with open(path, "rb") as f:
+        fd = f.fileno()
+        for number in (range(len(index)) if numbers is None else numbers):
+            try:
+                if decompress is None:
+                    _read_block(fd, index.blocks[number])
+                else:
+                    _decode(fd, index.blocks[number], decompress)
+            except (BlockCorrupted, zlib.error, lzma.LZMAError, EOFError, OSError):
+                bad.append(number)
+    return bad
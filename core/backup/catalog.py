@@ -0,0 +1,244 @@
+import base64
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .manifest import MANIFEST_FILENAME, Manifest, ManifestEntry
+from .models import BackupMetadata
+from ..cache import RESPONSE_CACHE
+
+CATALOG_FILENAME = "catalog.json"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+DEFAULT_FILES_PAGE_SIZE = 1000
+MAX_FILES_PAGE_SIZE = 10000
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Cursor opaco (base64 de JSON) com a posição do último item da página"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Cursor inválido: {cursor}")
+    return values
+
+
+def _as_iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def summarize(metadata: BackupMetadata) -> Dict[str, Any]:
+    """Entrada do catálogo: os metadados sem a lista de arquivos, já em JSON puro"""
+    return json.loads(metadata.json(exclude={"files"}))
+
+
+@dataclass
+class BackupFilter:
+    """Filtros da listagem paginada (todos opcionais, combinados com E)"""
+    types: List[str] = field(default_factory=list)
+    statuses: List[str] = field(default_factory=list)
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    tags: Dict[str, str] = field(default_factory=dict)
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        if self.types and entry.get("type") not in self.types:
+            return False
+        if self.statuses and entry.get("status") not in self.statuses:
+            return False
+        created_at = entry.get("created_at") or ""
+        if self.created_after and created_at < _as_iso(self.created_after):
+            return False
+        if self.created_before and created_at >= _as_iso(self.created_before):
+            return False
+        entry_tags = entry.get("tags") or {}
+        return all(entry_tags.get(key) == value for key, value in self.tags.items())
+
+
+@dataclass
+class CatalogPage:
+    """Uma página da listagem; next_cursor é None na última"""
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+class BackupCatalog:
+    """Índice dos backups de um projeto em {projeto}/catalog.json
+
+    Guarda um resumo de cada backup (metadados sem `files`), de modo que a
+    listagem não precisa abrir nem validar cada metadata.json. O catálogo é
+    atualizado a cada backup criado ou removido e reconciliado com os
+    diretórios existentes na leitura, cobrindo backups gravados por fora.
+    """
+
+    def __init__(self, project_dir: str):
+        self.project_dir = project_dir
+        self.path = os.path.join(project_dir, CATALOG_FILENAME)
+        self.scope = f"backup:{os.path.basename(os.path.normpath(project_dir))}"
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._mtime_ns: Optional[int] = None
+
+    def _backup_ids(self) -> List[str]:
+        if not os.path.isdir(self.project_dir):
+            return []
+        return [
+            entry.name for entry in os.scandir(self.project_dir)
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "metadata.json"))
+        ]
+
+    def _read_summary(self, backup_id: str) -> Optional[Dict[str, Any]]:
+        meta_path = os.path.join(self.project_dir, backup_id, "metadata.json")
+        try:
+            with open(meta_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao ler metadados de {backup_id}: {e}")
+            return None
+        data.pop("files", None)
+        return data
+
+    def _save(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        os.makedirs(self.project_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": 1, "backups": entries}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self._mtime_ns = os.stat(self.path).st_mtime_ns
+        # Respostas de leitura montadas com o catálogo anterior deixam de valer
+        RESPONSE_CACHE.invalidate(self.scope)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Carrega (com cache pelo mtime) e reconcilia com os diretórios de backup"""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if self._entries is None or mtime_ns != self._mtime_ns:
+            entries: Dict[str, Dict[str, Any]] = {}
+            if mtime_ns is not None:
+                try:
+                    with open(self.path, "r") as f:
+                        entries = json.load(f).get("backups", {})
+                except (OSError, ValueError) as e:
+                    print(f"Catálogo inválido em {self.path}, reconstruindo: {e}")
+            self._entries = entries
+            self._mtime_ns = mtime_ns
+
+        on_disk = set(self._backup_ids())
+        missing = on_disk - self._entries.keys()
+        stale = self._entries.keys() - on_disk
+        if missing or stale:
+            for backup_id in stale:
+                del self._entries[backup_id]
+            for backup_id in missing:
+                summary = self._read_summary(backup_id)
+                if summary is not None:
+                    self._entries[backup_id] = summary
+            self._save(self._entries)
+        return self._entries
+
+    def put(self, metadata: BackupMetadata) -> None:
+        """Registra ou atualiza o resumo de um backup"""
+        with self._lock:
+            entries = self._load()
+            entries[metadata.id] = summarize(metadata)
+            self._save(entries)
+
+    def remove(self, backup_id: str) -> None:
+        with self._lock:
+            entries = self._load()
+            if entries.pop(backup_id, None) is not None:
+                self._save(entries)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Resumos de todos os backups, do mais recente ao mais antigo"""
+        with self._lock:
+            entries = list(self._load().values())
+        entries.sort(key=lambda e: (e.get("created_at") or "", e.get("id") or ""), reverse=True)
+        return entries
+
+    def page(self,
+             limit: int = DEFAULT_PAGE_SIZE,
+             cursor: Optional[str] = None,
+             filters: Optional[BackupFilter] = None,
+             fields: Optional[Iterable[str]] = None) -> CatalogPage:
+        """Uma página de resumos em ordem decrescente de criação
+
+        O cursor guarda (created_at, id) do último item, então páginas
+        seguintes continuam corretas mesmo com backups criados no meio.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after = tuple(decode_cursor(cursor)) if cursor else None
+        selected = set(fields) if fields else None
+        items: List[Dict[str, Any]] = []
+        next_cursor = None
+        for entry in self.entries():
+            key = (entry.get("created_at") or "", entry.get("id") or "")
+            if after is not None and key >= after:
+                continue
+            if filters and not filters.matches(entry):
+                continue
+            if len(items) == limit:
+                last = items[-1]["__key"]
+                next_cursor = encode_cursor(list(last))
+                break
+            item = {k: v for k, v in entry.items() if k in selected} if selected else dict(entry)
+            item["__key"] = key
+            items.append(item)
+        for item in items:
+            del item["__key"]
+        return CatalogPage(items=items, next_cursor=next_cursor)
+
+
+def _file_dict(entry: ManifestEntry, compressed: bool) -> Dict[str, Any]:
+    """Entrada do manifesto no formato de FileInfo do metadata.json"""
+    return {"path": entry.path, "size": entry.size, "modified_at": entry.modified_at.isoformat(),
+            "checksum": entry.checksum, "is_deleted": False, "compressed": compressed, "delta": False}
+
+
+def iter_files(meta_path: str, start: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(posição, arquivo) de um backup a partir de start, sem validação pydantic
+
+    Completos e snapshots (files_manifest) têm a lista só no manifest.bin.
+    """
+    with open(meta_path, "r") as f:
+        data = json.load(f)
+    if not data.get("files_manifest"):
+        files = data.get("files", [])
+        for index in range(start, len(files)):
+            yield index, files[index]
+        return
+    manifest = Manifest.load(os.path.join(os.path.dirname(meta_path), MANIFEST_FILENAME))
+    compressed = data.get("compression") is not None
+    for index in range(start, len(manifest)):
+        yield index, _file_dict(manifest.entry(index), compressed)
+
+
+def files_page(meta_path: str,
+               limit: int = DEFAULT_FILES_PAGE_SIZE,
+               cursor: Optional[str] = None,
+               prefix: Optional[str] = None) -> CatalogPage:
+    """Uma página da lista de arquivos de um backup, lida sem validação pydantic"""
+    limit = max(1, min(limit, MAX_FILES_PAGE_SIZE))
+    start = int(decode_cursor(cursor)[0]) if cursor else 0
+    items: List[Dict[str, Any]] = []
+    next_cursor = None
+    for index, file_info in iter_files(meta_path, start):
+        if prefix and not file_info.get("path", "").startswith(prefix):
+            continue
+        if len(items) == limit:
+            next_cursor = encode_cursor([index])
+            break
+        items.append(file_info)
+    return CatalogPage(items=items, next_cursor=next_cursor)
@@ -1,46 +1,176 @@
+import hashlib
 import os
+import shutil
+import threading
 import zlib
-import gzip
 import lzma
-from typing import BinaryIO, Optional, Tuple
-from io import BytesIO
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
 from .models import CompressionType, CompressionInfo
+from .delta import Signature, SignatureBuilder
+from .blocks import BLOCK_SIZE, BLOCK_THRESHOLD, BlockIndex, BlockWriter, iter_blocks, slice_chunks, verify_blocks
+from .pagecache import CachePolicy, CacheFriendlyWriter, iter_file
+from .rules import CompiledRules
+
+# Tamanho do dicionário LZMA de cada preset (0-9), conforme o liblzma
+LZMA_PRESET_DICT_SIZES = [256 << 10, 1 << 20, 2 << 20, 4 << 20, 4 << 20,
+                          8 << 20, 8 << 20, 16 << 20, 32 << 20, 64 << 20]
+LZMA_MIN_DICT_SIZE = 4096
+
+
+def lzma_dict_size(level: int, size_hint: Optional[int]) -> int:
+    """Dicionário do preset limitado ao tamanho do arquivo
+
+    Um dicionário maior que a entrada não melhora a taxa, mas custa alocação
+    (preset 9 reserva ~670MB por compressor).
+    """
+    preset_size = LZMA_PRESET_DICT_SIZES[max(0, min(level, 9))]
+    if size_hint is None:
+        return preset_size
+    return max(LZMA_MIN_DICT_SIZE, min(preset_size, 1 << max(0, size_hint - 1).bit_length()))
+
+
+@dataclass
+class StoredFile:
+    """Resultado do armazenamento de um arquivo em uma única leitura"""
+    path: str                      # Arquivo gravado (com .compressed, se comprimido)
+    checksum: str                  # md5 do conteúdo original
+    stored_digest: str             # sha256 do arquivo gravado (checksum do backup)
+    compression: Optional[CompressionInfo] = None
+    signature: Optional[Signature] = None
+
 
 class BackupCompressor:
     """Gerenciador de compressão de backups"""
 
     CHUNK_SIZE = 64 * 1024  # 64KB chunks para processamento em memória
+    SMALL_FILE = 64 * 1024  # Até este tamanho o arquivo é lido e gravado de uma vez
+
+    def __init__(self,
+                 cache_policy: Optional[CachePolicy] = None,
+                 block_size: int = BLOCK_SIZE,
+                 block_threshold: Optional[int] = BLOCK_THRESHOLD):
+        self.cache_policy = cache_policy
+        # Arquivos a partir de block_threshold viram blocos independentes (None desativa)
+        self.block_size = block_size
+        self.block_threshold = block_threshold
+        # Compressores zlib já carregados com o dicionário, clonados por arquivo
+        self._primed: Dict[Tuple[int, str], object] = {}
+        self._primed_lock = threading.Lock()
 
     @staticmethod
-    def _get_compressor(compression_type: CompressionType, level: int):
+    def supports_dictionary(compression_type: CompressionType) -> bool:
+        """Só o formato zlib aceita dicionário pré-definido (gzip e xz não)"""
+        return CompressionType(compression_type) == CompressionType.ZLIB
+
+    def _get_compressor(self,
+                        compression_type: CompressionType,
+                        level: int,
+                        zdict: Optional[bytes] = None,
+                        dictionary_id: Optional[str] = None,
+                        size_hint: Optional[int] = None):
         """Retorna o compressor adequado para o tipo especificado"""
         if compression_type == CompressionType.ZLIB:
+            if zdict:
+                # Carregar o dicionário custa mais que comprimir um arquivo
+                # pequeno; clonar um compressor já carregado evita esse custo
+                key = (level, dictionary_id or "")
+                with self._primed_lock:
+                    primed = self._primed.get(key)
+                    if primed is None:
+                        primed = zlib.compressobj(level, zdict=zdict)
+                        self._primed[key] = primed
+                    return primed.copy()
             return zlib.compressobj(level)
         elif compression_type == CompressionType.GZIP:
-            return gzip.GzipFile(fileobj=BytesIO(), mode="wb", compresslevel=level)
+            # wbits=31 gera o formato gzip em modo streaming
+            return zlib.compressobj(level, zlib.DEFLATED, 31)
         elif compression_type == CompressionType.LZMA:
-            return lzma.LZMACompressor(preset=level)
+            if size_hint is None:
+                return lzma.LZMACompressor(preset=level)
+            # Mesmo formato xz do preset, que o LZMADecompressor lê sem ajustes
+            return lzma.LZMACompressor(filters=[{
+                "id": lzma.FILTER_LZMA2,
+                "preset": level,
+                "dict_size": lzma_dict_size(level, size_hint)
+            }])
         else:
             raise ValueError(f"Tipo de compressão não suportado: {compression_type}")
 
     @staticmethod
-    def _get_decompressor(compression_type: CompressionType):
+    def _get_decompressor(compression_type: CompressionType, zdict: Optional[bytes] = None):
         """Retorna o decompressor adequado para o tipo especificado"""
         if compression_type == CompressionType.ZLIB:
-            return zlib.decompressobj()
+            return zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
         elif compression_type == CompressionType.GZIP:
-            return gzip.GzipFile(fileobj=BytesIO(), mode="rb")
+            return zlib.decompressobj(31)
         elif compression_type == CompressionType.LZMA:
             return lzma.LZMADecompressor()
         else:
             raise ValueError(f"Tipo de compressão não suportado: {compression_type}")
 
+    @staticmethod
+    def _header(compression_type: CompressionType, level: int,
+                dictionary_id: Optional[str] = None,
+                block_size: Optional[int] = None) -> bytes:
+        """Cabeçalho "tipo:nível[:opção=valor...]" gravado no início de cada arquivo"""
+        header = f"{compression_type.value}:{level}"
+        if dictionary_id:
+            header += f":dict={dictionary_id}"
+        if block_size:
+            header += f":blocks={block_size}"
+        return (header + "\n").encode()
+
+    def _use_blocks(self, size: int) -> bool:
+        return self.block_threshold is not None and size >= self.block_threshold
+
+    def _block_writer(self, write, offset: int, compression_type: CompressionType, level: int) -> BlockWriter:
+        """Escritor de blocos: cada um é um fluxo completo e independente do codec"""
+        def compress(data: bytes) -> bytes:
+            compressor = self._get_compressor(compression_type, level, size_hint=self.block_size)
+            return compressor.compress(data) + compressor.flush()
+        return BlockWriter(write, offset, compress, self.block_size)
+
+    def _block_decompress(self, compression_type: CompressionType):
+        def decompress(data: bytes) -> bytes:
+            decompressor = self._get_decompressor(compression_type)
+            result = decompressor.decompress(data)
+            if hasattr(decompressor, "flush"):
+                result += decompressor.flush()
+            return result
+        return decompress
+
+    @staticmethod
+    def _read_header(source_path: str) -> Tuple[CompressionType, int, int, Dict[str, str]]:
+        """Lê o cabeçalho de um arquivo comprimido (tipo, nível, tamanho do cabeçalho, opções)"""
+        with open(source_path, "rb") as src:
+            raw = src.readline()
+        fields = raw.decode().strip().split(":")
+        options = dict(field.split("=", 1) for field in fields[2:] if "=" in field)
+        return CompressionType(fields[0]), int(fields[1]), len(raw), options
+
+    def compress_bytes(self,
+                       data: bytes,
+                       compression_type: CompressionType,
+                       level: int = 6,
+                       zdict: Optional[bytes] = None,
+                       dictionary_id: Optional[str] = None) -> bytes:
+        """Comprime um bloco em memória com o mesmo codec usado nos arquivos"""
+        compressor = self._get_compressor(compression_type, level, zdict, dictionary_id)
+        return compressor.compress(data) + compressor.flush()
+
     def compress_file(self, 
                       source_path: str, 
                       dest_path: str, 
                       compression_type: CompressionType = CompressionType.ZLIB,
-                      level: int = 6) -> Optional[CompressionInfo]:
-        """Comprime um arquivo usando o algoritmo especificado"""
+                      level: int = 6,
+                      zdict: Optional[bytes] = None,
+                      dictionary_id: Optional[str] = None) -> Optional[CompressionInfo]:
+        """Comprime um arquivo usando o algoritmo especificado
+
+        Com zdict (só zlib), o dicionário identificado por dictionary_id é
+        registrado no cabeçalho e exigido na descompressão.
+        """
         try:
             if not os.path.exists(source_path):
                 return None
@@ -49,38 +179,60 @@ class BackupCompressor:
             os.makedirs(os.path.dirname(dest_path), exist_ok=True)
 
             # Inicializa compressor
-            compressor = self._get_compressor(compression_type, level)
+            compression_type = CompressionType(compression_type)
             original_size = os.path.getsize(source_path)
-            compressed_size = 0
+            # O dicionário só compensa em arquivos pequenos: nos grandes o
+            # próprio conteúdo já preenche a janela
+            if not (zdict and self.supports_dictionary(compression_type)) or original_size > self.SMALL_FILE:
+                zdict = dictionary_id = None
+            compressor = self._get_compressor(compression_type, level, zdict, dictionary_id,
+                                              size_hint=original_size)
+            block_size = self.block_size if self._use_blocks(original_size) else None
+            header = self._header(compression_type, level, dictionary_id, block_size)
+
+            if original_size <= self.SMALL_FILE:
+                # Arquivo pequeno: uma leitura e uma escrita, sem o custo das
+                # dicas de page cache (irrelevantes neste tamanho)
+                with open(source_path, "rb") as src:
+                    data = src.read()
+                compressed = header + compressor.compress(data) + compressor.flush()
+                with open(dest_path, "wb") as dst:
+                    dst.write(compressed)
+                compressed_size = len(compressed)
+                return CompressionInfo(
+                    type=compression_type,
+                    original_size=len(data),
+                    compressed_size=compressed_size,
+                    ratio=len(data) / compressed_size if compressed_size > 0 else 1.0,
+                    level=level,
+                    dictionary_id=dictionary_id
+                )
 
-            with open(source_path, "rb") as src, open(dest_path, "wb") as dst:
+            with CacheFriendlyWriter(dest_path, self.cache_policy) as dst:
                 # Escreve cabeçalho com informações da compressão
-                header = f"{compression_type}:{level}\n".encode()
                 dst.write(header)
-                compressed_size += len(header)
-
-                # Processa o arquivo em chunks
-                while chunk := src.read(self.CHUNK_SIZE):
-                    if isinstance(compressor, gzip.GzipFile):
-                        compressor.write(chunk)
-                        compressed = compressor.fileobj.getvalue()
-                        compressor.fileobj.seek(0)
-                        compressor.fileobj.truncate()
-                    else:
-                        compressed = compressor.compress(chunk)
-                    if compressed:
-                        dst.write(compressed)
-                        compressed_size += len(compressed)
-
-                # Finaliza compressão
-                if isinstance(compressor, gzip.GzipFile):
-                    compressor.close()
-                    final = compressor.fileobj.getvalue()
+
+                if block_size:
+                    # Arquivo grande: blocos comprimidos em paralelo, com índice no final
+                    blocks = self._block_writer(dst.write, len(header), compression_type, level)
+                    try:
+                        for chunk in iter_file(source_path, self.cache_policy):
+                            blocks.update(chunk)
+                        blocks.finish()
+                    finally:
+                        blocks.close()
                 else:
+                    # Processa o arquivo em chunks
+                    for chunk in iter_file(source_path, self.cache_policy):
+                        compressed = compressor.compress(chunk)
+                        if compressed:
+                            dst.write(compressed)
+
+                    # Finaliza compressão
                     final = compressor.flush()
-                if final:
-                    dst.write(final)
-                    compressed_size += len(final)
+                    if final:
+                        dst.write(final)
+                compressed_size = dst.bytes_written
 
             # Calcula taxa de compressão
             ratio = original_size / compressed_size if compressed_size > 0 else 1.0
@@ -90,7 +242,8 @@ class BackupCompressor:
                 original_size=original_size,
                 compressed_size=compressed_size,
                 ratio=ratio,
-                level=level
+                level=level,
+                dictionary_id=dictionary_id
             )
 
         except Exception as e:
@@ -99,9 +252,163 @@ class BackupCompressor:
                 os.remove(dest_path)
             return None
 
+    def store_file(self,
+                   source_path: str,
+                   dest_path: str,
+                   compression_type: CompressionType = CompressionType.NONE,
+                   level: int = 6,
+                   zdict: Optional[bytes] = None,
+                   dictionary_id: Optional[str] = None,
+                   signature_block_size: Optional[int] = None) -> StoredFile:
+        """Lê o arquivo uma vez e grava o destino (comprimido ou não)
+
+        O mesmo buffer alimenta o md5 do conteúdo, a assinatura por blocos
+        (se signature_block_size), o compressor e o sha256 do que é gravado,
+        dispensando a cópia intermediária e as releituras de hash e checksum.
+        """
+        compression_type = CompressionType(compression_type)
+        compressed = compression_type != CompressionType.NONE
+        if compressed:
+            dest_path += ".compressed"
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        original_size = os.path.getsize(source_path)
+        compressor = header = block_size = None
+        if compressed:
+            # Mesma regra de compress_file: dicionário só em arquivos pequenos
+            if not (zdict and self.supports_dictionary(compression_type)) or original_size > self.SMALL_FILE:
+                zdict = dictionary_id = None
+            compressor = self._get_compressor(compression_type, level, zdict, dictionary_id,
+                                              size_hint=original_size)
+            block_size = self.block_size if self._use_blocks(original_size) else None
+            header = self._header(compression_type, level, dictionary_id, block_size)
+        md5 = hashlib.md5()
+        stored = hashlib.sha256()
+        builder = SignatureBuilder(signature_block_size) if signature_block_size else None
+
+        def emit(dst, data: bytes) -> None:
+            if data:
+                stored.update(data)
+                dst.write(data)
+
+        if original_size <= self.SMALL_FILE:
+            # Arquivo pequeno: uma leitura e uma escrita, sem as dicas de page cache
+            with open(source_path, "rb") as src:
+                data = src.read()
+            md5.update(data)
+            if builder:
+                builder.update(data)
+            out = header + compressor.compress(data) + compressor.flush() if compressed else data
+            stored.update(out)
+            with open(dest_path, "wb") as dst:
+                dst.write(out)
+            original_size = len(data)
+            stored_size = len(out)
+        else:
+            with CacheFriendlyWriter(dest_path, self.cache_policy) as dst:
+                blocks = None
+                if compressed:
+                    emit(dst, header)
+                if block_size:
+                    # O hash e a assinatura seguem na leitura; só a compressão vai para o pool
+                    blocks = self._block_writer(lambda data: emit(dst, data), len(header),
+                                                compression_type, level)
+                try:
+                    for chunk in iter_file(source_path, self.cache_policy):
+                        md5.update(chunk)
+                        if builder:
+                            builder.update(chunk)
+                        if blocks:
+                            blocks.update(chunk)
+                        else:
+                            emit(dst, compressor.compress(chunk) if compressed else chunk)
+                    if blocks:
+                        blocks.finish()
+                    elif compressed:
+                        emit(dst, compressor.flush())
+                finally:
+                    if blocks:
+                        blocks.close()
+                stored_size = dst.bytes_written
+        if not compressed:
+            shutil.copystat(source_path, dest_path)
+
+        info = None
+        if compressed:
+            info = CompressionInfo(
+                type=compression_type,
+                original_size=original_size,
+                compressed_size=stored_size,
+                ratio=original_size / stored_size if stored_size > 0 else 1.0,
+                level=level,
+                dictionary_id=dictionary_id
+            )
+        return StoredFile(
+            path=dest_path,
+            checksum=md5.hexdigest(),
+            stored_digest=stored.hexdigest(),
+            compression=info,
+            signature=builder.finish() if builder else None
+        )
+
+    def recompress_file(self,
+                        source_path: str,
+                        dest_path: str,
+                        compression_type: CompressionType,
+                        level: int,
+                        zdict: Optional[bytes] = None,
+                        size_hint: Optional[int] = None) -> Tuple[CompressionInfo, str]:
+        """Recodifica um arquivo já comprimido em streaming, sem arquivo intermediário
+
+        Retorna a compressão resultante e o md5 do conteúdo original, que
+        permite conferir o arquivo novo antes de substituir o antigo.
+        """
+        compression_type = CompressionType(compression_type)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        compressor = self._get_compressor(compression_type, level, size_hint=size_hint)
+        block_size = self.block_size if size_hint is not None and self._use_blocks(size_hint) else None
+        header = self._header(compression_type, level, block_size=block_size)
+        hasher = hashlib.md5()
+        original_size = 0
+        try:
+            with CacheFriendlyWriter(dest_path, self.cache_policy) as dst:
+                dst.write(header)
+                blocks = self._block_writer(dst.write, len(header), compression_type, level) if block_size else None
+                try:
+                    for chunk in self.iter_decompressed(source_path, zdict=zdict):
+                        hasher.update(chunk)
+                        original_size += len(chunk)
+                        if blocks:
+                            blocks.update(chunk)
+                            continue
+                        compressed = compressor.compress(chunk)
+                        if compressed:
+                            dst.write(compressed)
+                    if blocks:
+                        blocks.finish()
+                    else:
+                        final = compressor.flush()
+                        if final:
+                            dst.write(final)
+                finally:
+                    if blocks:
+                        blocks.close()
+                compressed_size = dst.bytes_written
+        except Exception:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            raise
+        return CompressionInfo(
+            type=compression_type,
+            original_size=original_size,
+            compressed_size=compressed_size,
+            ratio=original_size / compressed_size if compressed_size > 0 else 1.0,
+            level=level
+        ), hasher.hexdigest()
+
     def decompress_file(self, 
                         source_path: str, 
-                        dest_path: str) -> Tuple[bool, Optional[str]]:
+                        dest_path: str,
+                        zdict: Optional[bytes] = None) -> Tuple[bool, Optional[str]]:
         """Descomprime um arquivo"""
         try:
             if not os.path.exists(source_path):
@@ -112,33 +419,14 @@ class BackupCompressor:
 
             print(f"Descomprimindo {source_path} para {dest_path}")
 
-            with open(source_path, "rb") as src:
-                # Lê cabeçalho
-                header = src.readline().decode().strip()
-                print(f"Cabeçalho: {header}")
-                compression_type, level = header.split(":")
-                compression_type = CompressionType(compression_type)
-                print(f"Tipo de compressão: {compression_type}, nível: {level}")
-
-                # Inicializa decompressor
-                decompressor = self._get_decompressor(compression_type)
+            # Lê cabeçalho
+            header = self._read_header(source_path)
+            print(f"Tipo de compressão: {header[0]}, nível: {header[1]}")
 
-                # Lê todo o conteúdo comprimido
-                compressed_data = src.read()
-                print(f"Tamanho dos dados comprimidos: {len(compressed_data)} bytes")
-
-                with open(dest_path, "wb") as dst:
-                    if isinstance(decompressor, gzip.GzipFile):
-                        decompressor.fileobj = BytesIO(compressed_data)
-                        decompressed = decompressor.read()
-                        dst.write(decompressed)
-                    else:
-                        # Para ZLIB e LZMA, processa em chunks
-                        decompressed = decompressor.decompress(compressed_data)
-                        dst.write(decompressed)
-                        final = decompressor.flush()
-                        if final:
-                            dst.write(final)
+            # Processa o conteúdo comprimido em streaming
+            with CacheFriendlyWriter(dest_path, self.cache_policy) as dst:
+                for chunk in self.iter_decompressed(source_path, header, zdict):
+                    dst.write(chunk)
 
             print(f"Arquivo descomprimido com sucesso: {os.path.exists(dest_path)}")
             return True, None
@@ -149,12 +437,78 @@ class BackupCompressor:
                 os.remove(dest_path)
             return False, str(e)
 
+    def iter_decompressed(self,
+                          source_path: str,
+                          header: Optional[Tuple[CompressionType, int, int, Dict[str, str]]] = None,
+                          zdict: Optional[bytes] = None) -> Iterator[bytes]:
+        """Gera o conteúdo descomprimido de um arquivo em chunks"""
+        compression_type, _, header_size, options = header or self._read_header(source_path)
+        if "blocks" in options:
+            yield from iter_blocks(source_path, BlockIndex.load(source_path),
+                                   self._block_decompress(compression_type))
+            return
+        dictionary_id = options.get("dict")
+        if dictionary_id and not zdict:
+            raise ValueError(f"Dicionário {dictionary_id} necessário para {source_path}")
+        decompressor = self._get_decompressor(compression_type, zdict if dictionary_id else None)
+        for chunk in iter_file(source_path, self.cache_policy, offset=header_size):
+            decompressed = decompressor.decompress(chunk)
+            if decompressed:
+                yield decompressed
+        if hasattr(decompressor, "flush"):
+            final = decompressor.flush()
+            if final:
+                yield final
+
+    def iter_range(self,
+                   source_path: str,
+                   start: int,
+                   end: int,
+                   zdict: Optional[bytes] = None) -> Iterator[bytes]:
+        """Bytes [start, end] do conteúdo original
+
+        Num arquivo em blocos, só os blocos da faixa são lidos e
+        descomprimidos; num fluxo único, o conteúdo é descomprimido desde o
+        início e descartado até start.
+        """
+        header = self._read_header(source_path)
+        if "blocks" in header[3]:
+            index = BlockIndex.load(source_path)
+            end = min(end, index.total_size - 1)
+            if start > end:
+                return
+            first, last = index.find(start), index.find(end)
+            chunks = iter_blocks(source_path, index, self._block_decompress(header[0]), range(first, last + 1))
+            position = index.blocks[first].start
+        else:
+            chunks = self.iter_decompressed(source_path, header, zdict)
+            position = 0
+        yield from slice_chunks(chunks, start, end, position)
+
+    def verify_file(self,
+                    source_path: str,
+                    blocks: Optional[List[int]] = None,
+                    decompress: bool = False) -> List[int]:
+        """Blocos corrompidos de um arquivo em blocos (todos ou os pedidos)
+
+        Sem decompress só o crc32 dos bytes gravados é conferido, sem
+        descomprimir nada; com ele, cada bloco é descomprimido isoladamente.
+        """
+        compression_type, _, _, options = self._read_header(source_path)
+        if "blocks" not in options:
+            raise ValueError(f"{source_path} não está no formato em blocos")
+        return verify_blocks(source_path, BlockIndex.load(source_path),
+                             self._block_decompress(compression_type) if decompress else None, blocks)
+
     def compress_directory(self,
                           source_dir: str,
                           dest_dir: str,
                           compression_type: CompressionType = CompressionType.ZLIB,
-                          level: int = 6) -> Optional[CompressionInfo]:
-        """Comprime um diretório inteiro"""
+                          level: int = 6,
+                          rules: Optional[CompiledRules] = None,
+                          zdict: Optional[bytes] = None,
+                          dictionary_id: Optional[str] = None) -> Optional[CompressionInfo]:
+        """Comprime um diretório inteiro (respeitando as regras, se informadas)"""
         try:
             if not os.path.exists(source_dir):
                 return None
@@ -162,8 +516,13 @@ class BackupCompressor:
             total_original_size = 0
             total_compressed_size = 0
 
+            if rules is not None:
+                entries = ((root, files) for root, _, files in rules.walk(source_dir))
+            else:
+                entries = ((root, files) for root, _, files in os.walk(source_dir))
+
             # Processa cada arquivo no diretório
-            for root, _, files in os.walk(source_dir):
+            for root, files in entries:
                 for file in files:
                     source_path = os.path.join(root, file)
                     rel_path = os.path.relpath(source_path, source_dir)
@@ -171,7 +530,7 @@ class BackupCompressor:
 
                     # Comprime arquivo individual
                     info = self.compress_file(
-                        source_path, dest_path, compression_type, level)
+                        source_path, dest_path, compression_type, level, zdict, dictionary_id)
                     
                     if info:
                         total_original_size += info.original_size
@@ -184,7 +543,8 @@ class BackupCompressor:
                     original_size=total_original_size,
                     compressed_size=total_compressed_size,
                     ratio=ratio,
-                    level=level
+                    level=level,
+                    dictionary_id=dictionary_id if zdict and self.supports_dictionary(compression_type) else None
                 )
 
             return None
@@ -195,7 +555,8 @@ class BackupCompressor:
 
     def decompress_directory(self,
                             source_dir: str,
-                            dest_dir: str) -> Tuple[bool, Optional[str]]:
+                            dest_dir: str,
+                            zdict: Optional[bytes] = None) -> Tuple[bool, Optional[str]]:
         """Descomprime um diretório inteiro"""
         try:
             if not os.path.exists(source_dir):
@@ -217,7 +578,7 @@ class BackupCompressor:
 
                         print(f"Processando arquivo {source_path}")
                         # Descomprime arquivo individual
-                        ok, err = self.decompress_file(source_path, dest_path)
+                        ok, err = self.decompress_file(source_path, dest_path, zdict)
                         if not ok:
                             success = False
                             error_msg = err
@@ -0,0 +1,382 @@
+import os
+import struct
+import zlib
+import hashlib
+from array import array
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from .pagecache import CachePolicy, CacheFriendlyWriter, iter_file
+
+DELTA_BLOCK_SIZE = 64 * 1024           # Tamanho do bloco da assinatura
+DELTA_THRESHOLD = 64 * 1024 * 1024     # Arquivos a partir deste tamanho usam delta
+MAX_LITERAL_RATIO = 0.5                # Acima disso o delta não compensa
+LITERAL_FLUSH = 1024 * 1024            # Literais pendentes são gravados a cada 1MB
+
+_ADLER_MOD = 65521
+_SIG_MAGIC = b"NXSIG1\n"
+_DELTA_MAGIC = b"NXDELTA1\n"
+_SIG_HEADER = struct.Struct("<IQI")     # block_size, file_size, blocos
+_DELTA_HEADER = struct.Struct("<IQQ")   # block_size, tamanho da base, tamanho final
+_OP_COPY = b"C"
+_OP_LITERAL = b"L"
+_OP_END = b"E"
+_COPY = struct.Struct("<II")            # bloco inicial, quantidade de blocos
+_LITERAL = struct.Struct("<I")          # tamanho do literal
+_STRONG_SIZE = 16
+
+
+def _strong(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=_STRONG_SIZE).digest()
+
+
+class DeltaAborted(Exception):
+    """O arquivo mudou demais para que o delta compense"""
+
+
+class Signature:
+    """Assinatura por blocos (checksum fraco rolante + hash forte) de um arquivo"""
+
+    def __init__(self, block_size: int, file_size: int = 0):
+        self.block_size = block_size
+        self.file_size = file_size
+        self.weak = array("I")
+        self.strong = bytearray()
+        self._lookup: Optional[Dict[int, List[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.weak)
+
+    def add_block(self, block) -> None:
+        self.weak.append(zlib.adler32(block))
+        self.strong += _strong(block)
+        self.file_size += len(block)
+
+    def strong_at(self, index: int) -> bytes:
+        start = index * _STRONG_SIZE
+        return bytes(self.strong[start:start + _STRONG_SIZE])
+
+    @property
+    def lookup(self) -> Dict[int, List[int]]:
+        """Índice checksum fraco -> blocos, montado sob demanda"""
+        if self._lookup is None:
+            lookup: Dict[int, List[int]] = {}
+            for index, value in enumerate(self.weak):
+                lookup.setdefault(value, []).append(index)
+            self._lookup = lookup
+        return self._lookup
+
+    def find(self, weak: int, data) -> Optional[int]:
+        """Procura um bloco com os mesmos checksums fraco e forte"""
+        candidates = self.lookup.get(weak)
+        if not candidates:
+            return None
+        strong = _strong(data)
+        for index in candidates:
+            if self.strong_at(index) == strong:
+                return index
+        return None
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(_SIG_MAGIC)
+            f.write(_SIG_HEADER.pack(self.block_size, self.file_size, len(self.weak)))
+            f.write(self.weak.tobytes())
+            f.write(self.strong)
+
+    @classmethod
+    def load(cls, path: str) -> "Signature":
+        with open(path, "rb") as f:
+            if f.read(len(_SIG_MAGIC)) != _SIG_MAGIC:
+                raise ValueError(f"Assinatura inválida: {path}")
+            block_size, file_size, count = _SIG_HEADER.unpack(f.read(_SIG_HEADER.size))
+            signature = cls(block_size, file_size)
+            signature.weak.frombytes(f.read(count * 4))
+            signature.strong = bytearray(f.read(count * _STRONG_SIZE))
+        return signature
+
+
+class SignatureBuilder:
+    """Monta a assinatura de um fluxo de bytes em blocos alinhados"""
+
+    def __init__(self, block_size: int = DELTA_BLOCK_SIZE):
+        self.signature = Signature(block_size)
+        self._pending = bytearray()
+
+    def update(self, data: bytes) -> None:
+        block_size = self.signature.block_size
+        if not self._pending and len(data) % block_size == 0:
+            # Caminho rápido: chunks múltiplos do bloco dispensam cópia
+            view = memoryview(data)
+            for start in range(0, len(data), block_size):
+                self.signature.add_block(view[start:start + block_size])
+            return
+        self._pending += data
+        full = len(self._pending) - len(self._pending) % block_size
+        if full:
+            view = memoryview(self._pending)
+            for start in range(0, full, block_size):
+                self.signature.add_block(view[start:start + block_size])
+            view.release()
+            del self._pending[:full]
+
+    def finish(self) -> Signature:
+        if self._pending:
+            self.signature.add_block(bytes(self._pending))
+            self._pending.clear()
+        return self.signature
+
+
+def build_signature(path: str,
+                    block_size: int = DELTA_BLOCK_SIZE,
+                    policy: Optional[CachePolicy] = None) -> Tuple[Signature, str]:
+    """Calcula assinatura e md5 de um arquivo em uma única leitura"""
+    builder = SignatureBuilder(block_size)
+    md5 = hashlib.md5()
+    for chunk in iter_file(path, policy):
+        md5.update(chunk)
+        builder.update(chunk)
+    return builder.finish(), md5.hexdigest()
+
+
+@dataclass
+class DeltaResult:
+    """Resultado da codificação delta de um arquivo"""
+    copied_bytes: int
+    literal_bytes: int
+    delta_size: int
+
+
+class _DeltaWriter:
+    """Serializa operações de cópia/literal, agrupando blocos consecutivos"""
+
+    def __init__(self, out: CacheFriendlyWriter):
+        self.out = out
+        self.run_start: Optional[int] = None
+        self.run_count = 0
+        self.copied = 0
+        self.literal = 0
+
+    def copy(self, index: int, length: int) -> None:
+        if self.run_start is not None and index == self.run_start + self.run_count:
+            self.run_count += 1
+        else:
+            self._flush_run()
+            self.run_start = index
+            self.run_count = 1
+        self.copied += length
+
+    def literal_data(self, data) -> None:
+        if not len(data):
+            return
+        self._flush_run()
+        self.out.write(_OP_LITERAL + _LITERAL.pack(len(data)))
+        self.out.write(bytes(data))
+        self.literal += len(data)
+
+    def finish(self) -> None:
+        self._flush_run()
+
+    def _flush_run(self) -> None:
+        if self.run_start is not None:
+            self.out.write(_OP_COPY + _COPY.pack(self.run_start, self.run_count))
+            self.run_start = None
+            self.run_count = 0
+
+
+def encode_delta(new_path: str,
+                 basis: Signature,
+                 delta_path: str,
+                 target_md5: str,
+                 policy: Optional[CachePolicy] = None,
+                 max_literal_ratio: float = MAX_LITERAL_RATIO) -> DeltaResult:
+    """Codifica new_path como delta em relação à assinatura da versão anterior
+
+    Blocos alinhados são verificados primeiro (C puro); só as regiões
+    alteradas percorrem o checksum rolante byte a byte. Lança DeltaAborted
+    quando os literais passam de max_literal_ratio do arquivo.
+    """
+    block_size = basis.block_size
+    target_size = os.path.getsize(new_path)
+    min_check = 8 * block_size
+
+    with CacheFriendlyWriter(delta_path, policy) as out:
+        out.write(_DELTA_MAGIC)
+        out.write(_DELTA_HEADER.pack(block_size, basis.file_size, target_size))
+        writer = _DeltaWriter(out)
+
+        chunks = iter_file(new_path, policy)
+        data = bytearray()
+        eof = False
+        i = 0               # Início da janela atual em data
+        literal_start = 0   # Início dos bytes literais pendentes em data
+        rolling = False
+        a = b = 0
+        processed_base = 0  # Bytes já descartados de data
+
+        while True:
+            # Garante uma janela completa (ou fim do arquivo)
+            while not eof and len(data) - i <= block_size:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                else:
+                    data += chunk
+            if len(data) - i < block_size:
+                break
+
+            if not rolling:
+                weak = zlib.adler32(memoryview(data)[i:i + block_size])
+                a = weak & 0xFFFF
+                b = weak >> 16
+                rolling = True
+            else:
+                weak = (b << 16) | a
+
+            match = basis.find(weak, memoryview(data)[i:i + block_size])
+            if match is not None:
+                writer.literal_data(memoryview(data)[literal_start:i])
+                writer.copy(match, block_size)
+                i += block_size
+                literal_start = i
+                rolling = False
+            else:
+                limit = min(len(data) - block_size, literal_start + LITERAL_FLUSH)
+                if eof and i >= len(data) - block_size:
+                    break
+                # Checksum rolante do adler32 até o próximo candidato fraco:
+                # remove data[i], inclui data[i + block_size]
+                lookup = basis.lookup
+                while i < limit:
+                    out_byte = data[i]
+                    a = (a - out_byte + data[i + block_size]) % _ADLER_MOD
+                    b = (b + a - 1 - block_size * out_byte) % _ADLER_MOD
+                    i += 1
+                    if ((b << 16) | a) in lookup:
+                        break
+
+            if i - literal_start >= LITERAL_FLUSH:
+                writer.literal_data(memoryview(data)[literal_start:i])
+                literal_start = i
+
+            # Aborta cedo quando o arquivo mudou quase todo
+            position = processed_base + i
+            if position >= min_check and \
+                    writer.literal + (i - literal_start) > max_literal_ratio * position:
+                raise DeltaAborted(new_path)
+
+            # Descarta dados já emitidos para manter a memória limitada
+            if literal_start >= LITERAL_FLUSH:
+                del data[:literal_start]
+                processed_base += literal_start
+                i -= literal_start
+                literal_start = 0
+
+        # O último bloco da base pode ser curto: tenta casar a cauda exata
+        tail_len = basis.file_size % block_size
+        if tail_len and len(basis) and len(data) - tail_len >= literal_start:
+            tail = memoryview(data)[len(data) - tail_len:]
+            if basis.find(zlib.adler32(tail), tail) == len(basis) - 1:
+                writer.literal_data(memoryview(data)[literal_start:len(data) - tail_len])
+                writer.copy(len(basis) - 1, tail_len)
+                literal_start = len(data)
+        writer.literal_data(memoryview(data)[literal_start:])
+        writer.finish()
+        out.write(_OP_END + bytes.fromhex(target_md5))
+
+        if writer.literal > max_literal_ratio * max(target_size, 1) and target_size >= min_check:
+            raise DeltaAborted(new_path)
+        return DeltaResult(
+            copied_bytes=writer.copied,
+            literal_bytes=writer.literal,
+            delta_size=out.bytes_written
+        )
+
+
+class _ChunkReader:
+    """Leitura de tamanho exato sobre um iterador de chunks"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def read_exact(self, size: int) -> bytes:
+        data = self.read(size)
+        if len(data) != size:
+            raise ValueError("Delta truncado")
+        return data
+
+
+def apply_delta(delta_chunks: Iterable[bytes],
+                basis_path: str,
+                out: BinaryIO) -> str:
+    """Reconstrói um arquivo a partir da base e do delta em streaming
+
+    Retorna o md5 do arquivo reconstruído, conferido com o registrado no delta.
+    """
+    reader = _ChunkReader(delta_chunks)
+    if reader.read_exact(len(_DELTA_MAGIC)) != _DELTA_MAGIC:
+        raise ValueError("Formato de delta inválido")
+    block_size, basis_size, target_size = _DELTA_HEADER.unpack(
+        reader.read_exact(_DELTA_HEADER.size))
+    if os.path.getsize(basis_path) != basis_size:
+        raise ValueError(f"Arquivo base com tamanho inesperado: {basis_path}")
+
+    md5 = hashlib.md5()
+    written = 0
+    with open(basis_path, "rb") as basis:
+        while True:
+            op = reader.read_exact(1)
+            if op == _OP_COPY:
+                start, count = _COPY.unpack(reader.read_exact(_COPY.size))
+                basis.seek(start * block_size)
+                remaining = min(count * block_size, basis_size - start * block_size)
+                while remaining > 0:
+                    data = basis.read(min(remaining, LITERAL_FLUSH))
+                    if not data:
+                        raise ValueError("Arquivo base truncado")
+                    out.write(data)
+                    md5.update(data)
+                    remaining -= len(data)
+                    written += len(data)
+            elif op == _OP_LITERAL:
+                (length,) = _LITERAL.unpack(reader.read_exact(_LITERAL.size))
+                data = reader.read_exact(length)
+                out.write(data)
+                md5.update(data)
+                written += length
+            elif op == _OP_END:
+                expected = reader.read_exact(16).hex()
+                break
+            else:
+                raise ValueError(f"Operação de delta desconhecida: {op!r}")
+
+    if written != target_size or md5.hexdigest() != expected:
+        raise ValueError("Delta aplicado não confere com o arquivo original")
+    return expected
+
+
+def apply_delta_file(delta_chunks: Iterable[bytes],
+                     basis_path: str,
+                     dest_path: str,
+                     policy: Optional[CachePolicy] = None) -> str:
+    """Aplica um delta gravando em arquivo temporário e trocando atomicamente"""
+    tmp_path = dest_path + ".delta-tmp"
+    try:
+        with CacheFriendlyWriter(tmp_path, policy) as out:
+            digest = apply_delta(delta_chunks, basis_path, out)
+        os.replace(tmp_path, dest_path)
+        return digest
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+DICTIONARY_SIZE = 32 * 1024        # Janela do deflate: bytes além disso nunca são referenciados
+TRAIN_SAMPLE_FILES = 2000          # Arquivos lidos para treinar
+TRAIN_MAX_FILE = 64 * 1024         # Só arquivos pequenos entram no treino
+MIN_TRAIN_FILES = 8
+_INDEX = "index.json"
+_SEGMENT_RE = re.compile(rb"[^\n,;{}]*[\n,;{}]?")
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = DICTIONARY_SIZE) -> bytes:
+    """Treina um dicionário a partir de amostras de arquivos pequenos
+
+    Segmentos (linhas e trechos entre separadores de JSON/código) que se
+    repetem em vários arquivos são pontuados por frequência x tamanho. Os
+    mais valiosos ficam no fim do dicionário, mais perto dos dados e
+    portanto com distâncias mais baratas no deflate.
+    """
+    document_frequency: Counter = Counter()
+    for sample in samples:
+        segments = {s for s in _SEGMENT_RE.findall(sample) if 4 <= len(s) <= 256}
+        document_frequency.update(segments)
+
+    ranked = sorted(
+        (segment for segment, count in document_frequency.items() if count > 1),
+        key=lambda s: document_frequency[s] * len(s),
+        reverse=True
+    )
+    chosen: List[bytes] = []
+    used = 0
+    for segment in ranked:
+        if used + len(segment) > size:
+            continue
+        chosen.append(segment)
+        used += len(segment)
+        if used >= size - 4:
+            break
+    chosen.reverse()
+    return b"".join(chosen)
+
+
+class DictionaryStore:
+    """Dicionários versionados de um projeto, em {projeto}/dictionaries/
+
+    Versões antigas são mantidas: cada backup referencia em CompressionInfo
+    o dicionário usado e precisa dele para ser restaurado.
+    """
+
+    def __init__(self, project_dir: str):
+        self.path = os.path.join(project_dir, "dictionaries")
+        self._cache: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _load_index(self) -> Dict[str, object]:
+        index_path = os.path.join(self.path, _INDEX)
+        if not os.path.exists(index_path):
+            return {"current": None, "versions": []}
+        with open(index_path, "r") as f:
+            return json.load(f)
+
+    def _save_index(self, index: Dict[str, object]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, _INDEX + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, _INDEX))
+
+    def versions(self) -> List[Dict[str, object]]:
+        return list(self._load_index()["versions"])
+
+    def current_id(self) -> Optional[str]:
+        return self._load_index()["current"]
+
+    def get(self, dictionary_id: str) -> bytes:
+        """Carrega um dicionário pelo ID (com cache em memória)"""
+        with self._lock:
+            data = self._cache.get(dictionary_id)
+        if data is None:
+            path = os.path.join(self.path, f"{dictionary_id}.zdict")
+            if not os.path.exists(path):
+                raise ValueError(f"Dicionário não encontrado: {dictionary_id}")
+            with open(path, "rb") as f:
+                data = f.read()
+            with self._lock:
+                self._cache[dictionary_id] = data
+        return data
+
+    def save(self, data: bytes, trained_files: int = 0) -> str:
+        """Grava uma nova versão e a torna a atual"""
+        index = self._load_index()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        for version in index["versions"]:
+            if version["id"].endswith(digest):
+                index["current"] = version["id"]
+                self._save_index(index)
+                return version["id"]
+        dictionary_id = f"v{len(index['versions']) + 1}-{digest}"
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, f"{dictionary_id}.zdict"), "wb") as f:
+            f.write(data)
+        index["versions"].append({
+            "id": dictionary_id,
+            "size": len(data),
+            "trained_files": trained_files,
+            "created_at": datetime.now().isoformat()
+        })
+        index["current"] = dictionary_id
+        self._save_index(index)
+        return dictionary_id
+
+    def train(self,
+              data_dir: str,
+              paths: Iterable[str],
+              size: int = DICTIONARY_SIZE,
+              sample_files: int = TRAIN_SAMPLE_FILES,
+              seed: Optional[int] = None) -> Optional[str]:
+        """Treina e grava um dicionário a partir de uma amostra dos arquivos do projeto
+
+        paths são caminhos relativos a data_dir. Retorna None se não houver
+        arquivos pequenos suficientes para o treino.
+        """
+        candidates = list(paths)
+        random.Random(seed).shuffle(candidates)
+        samples = []
+        for rel_path in candidates:
+            path = os.path.join(data_dir, rel_path)
+            try:
+                if os.path.getsize(path) > TRAIN_MAX_FILE:
+                    continue
+                with open(path, "rb") as f:
+                    samples.append(f.read())
+            except OSError:
+                continue
+            if len(samples) >= sample_files:
+                break
+        if len(samples) < MIN_TRAIN_FILES:
+            return None
+        data = train_dictionary(samples, size)
+        if not data:
+            return None
+        dictionary_id = self.save(data, len(samples))
+        print(f"Dicionário {dictionary_id} treinado com {len(samples)} arquivos ({len(data)} bytes)")
+        return dictionary_id
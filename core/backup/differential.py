@@ -0,0 +1,161 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from .models import RestoreChange, RestorePlan
+from .manifest import iter_tree
+from .pagecache import CachePolicy, iter_file
+from .rules import CompiledRules
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+TOUCH = "touch"   # Conteúdo igual, só o mtime é corrigido
+
+# A restauração grava o mtime do backup com utime; floats perdem precisão
+# abaixo do microssegundo
+MTIME_TOLERANCE = 1e-5
+
+
+@dataclass
+class DesiredFile:
+    """Estado final de um arquivo segundo o backup
+
+    checksum vazio com source definido: o hash é calculado do arquivo
+    armazenado, só se o stat do destino for ambíguo.
+    """
+    path: str
+    size: int
+    mtime: float
+    checksum: str = ""
+    source: Optional[str] = None
+
+
+def file_md5(path: str, policy: Optional[CachePolicy] = None) -> str:
+    hasher = hashlib.md5()
+    for chunk in iter_file(path, policy):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def plan_restore(target_dir: str,
+                 desired: Dict[str, DesiredFile],
+                 rules: Optional[CompiledRules] = None,
+                 workers: int = 4,
+                 policy: Optional[CachePolicy] = None) -> RestorePlan:
+    """Compara o destino com o estado do backup e lista só o que precisa mudar
+
+    Tamanho diferente ou arquivo ausente decide sem ler nada; tamanho e
+    mtime iguais contam como inalterado (caminho rápido do stat). Só os
+    casos ambíguos (mesmo tamanho, mtime diferente) são conferidos por md5,
+    em paralelo. Arquivos do destino fora do backup são removidos, exceto
+    os que as regras do backup excluem (nunca foram copiados).
+    """
+    started = time.perf_counter()
+    plan = RestorePlan(target_dir=target_dir)
+    changes: List[RestoreChange] = []
+    ambiguous: List[Tuple[str, DesiredFile]] = []
+    seen = set()
+
+    if os.path.isdir(target_dir):
+        for rel_path, stat in iter_tree(target_dir, rules):
+            wanted = desired.get(rel_path)
+            if wanted is None:
+                changes.append(RestoreChange(path=rel_path, action=DELETE,
+                                             size=stat.st_size, reason="extraneous"))
+                continue
+            seen.add(rel_path)
+            if stat.st_size != wanted.size:
+                changes.append(RestoreChange(path=rel_path, action=UPDATE,
+                                             size=wanted.size, reason="size"))
+            elif abs(stat.st_mtime - wanted.mtime) <= MTIME_TOLERANCE:
+                plan.unchanged += 1
+            else:
+                ambiguous.append((rel_path, wanted))
+
+    for rel_path, wanted in desired.items():
+        if rel_path not in seen:
+            changes.append(RestoreChange(path=rel_path, action=CREATE,
+                                         size=wanted.size, reason="missing"))
+
+    def differs(item: Tuple[str, DesiredFile]) -> bool:
+        rel_path, wanted = item
+        expected = wanted.checksum
+        if not expected and wanted.source:
+            expected = file_md5(wanted.source, policy)
+        try:
+            return file_md5(os.path.join(target_dir, rel_path), policy) != expected
+        except OSError:
+            return True
+
+    if ambiguous:
+        with ThreadPoolExecutor(max_workers=max(1, workers),
+                                thread_name_prefix="restore-plan") as pool:
+            for (rel_path, wanted), changed in zip(ambiguous, pool.map(differs, ambiguous)):
+                if changed:
+                    changes.append(RestoreChange(path=rel_path, action=UPDATE,
+                                                 size=wanted.size, reason="checksum"))
+                else:
+                    # Corrigir o mtime faz a próxima comparação cair no stat
+                    changes.append(RestoreChange(path=rel_path, action=TOUCH,
+                                                 reason="mtime", mtime=wanted.mtime))
+                    plan.unchanged += 1
+        plan.hashed = len(ambiguous)
+
+    changes.sort(key=lambda c: c.path)
+    plan.changes = changes
+    for change in changes:
+        if change.action == CREATE:
+            plan.files_to_create += 1
+        elif change.action == UPDATE:
+            plan.files_to_update += 1
+        elif change.action == DELETE:
+            plan.files_to_delete += 1
+        if change.action in (CREATE, UPDATE):
+            plan.bytes_to_write += change.size
+    plan.seconds = time.perf_counter() - started
+    return plan
+
+
+def writes(plan: RestorePlan) -> List[str]:
+    """Caminhos cujo conteúdo precisa ser escrito"""
+    return [c.path for c in plan.changes if c.action in (CREATE, UPDATE)]
+
+
+def apply_metadata(target_dir: str, plan: RestorePlan) -> int:
+    """Remove os arquivos sobrando e corrige mtimes; retorna os removidos"""
+    removed = remove_extraneous(target_dir, [c.path for c in plan.changes if c.action == DELETE])
+    for change in plan.changes:
+        if change.action == TOUCH:
+            try:
+                os.utime(os.path.join(target_dir, change.path), (change.mtime, change.mtime))
+            except OSError as e:
+                print(f"Erro ao ajustar mtime de {change.path}: {e}")
+    return removed
+
+
+def remove_extraneous(target_dir: str, paths: Iterable[str]) -> int:
+    """Remove os arquivos listados e os diretórios que ficarem vazios"""
+    removed = 0
+    parents = set()
+    for rel_path in paths:
+        path = os.path.join(target_dir, rel_path)
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            continue
+        parents.add(os.path.dirname(path))
+    root = os.path.abspath(target_dir)
+    # Mais profundos primeiro, para esvaziar a árvore de baixo para cima
+    for directory in sorted(parents, key=len, reverse=True):
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+    return removed
@@ -0,0 +1,495 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tarfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .models import EnvironmentInfo
+from .rules import CompiledRules
+
+ENV_CACHE_DIRNAME = ".envcache"   # {volume primário}/.envcache: pacotes compartilhados entre projetos
+OBJECTS_DIRNAME = "objects"       # objects/{aa}/{digest}.tar.gz: um pacote instalado
+MANIFESTS_DIRNAME = "manifests"   # manifests/{aa}/{sha256}.json: pacotes de um ambiente
+OBJECT_SUFFIX = ".tar.gz"
+MANIFEST_SUFFIX = ".json"
+PYTHON = "python"
+NODE = "node"
+# Arquivos que descrevem o ambiente, procurados no diretório que o contém
+LOCKFILES = {
+    PYTHON: ("requirements.txt", "requirements.lock", "poetry.lock", "Pipfile.lock", "uv.lock",
+             "pyproject.toml"),
+    NODE: ("package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "package.json"),
+}
+REST = "."                        # Unidade com o que não pertence a nenhum pacote
+GC_GRACE = 3600.0                 # Objetos mais novos não são coletados (backups em andamento)
+COMPRESS_LEVEL = 6
+CHUNK_SIZE = 1024 * 1024
+
+Entry = Tuple[str, os.stat_result]
+
+
+class EnvCacheError(Exception):
+    """Objeto ausente ou corrompido no cache de ambientes"""
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+def find_environments(root: str, rules: Optional[CompiledRules] = None) -> List[Tuple[str, str]]:
+    """(caminho relativo com "/", tipo) dos ambientes sob root
+
+    Um venv é um diretório com pyvenv.cfg; um node_modules conta quando o
+    diretório que o contém tem package.json. Diretórios excluídos pelas
+    regras não são considerados e a raiz do projeto nunca é um ambiente.
+    """
+    envs = []
+    for dirpath, dirs, files in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        if rel_dir and "pyvenv.cfg" in files:
+            envs.append((rel_dir, PYTHON))
+            dirs[:] = []
+            continue
+        if ".git" in dirs:
+            dirs.remove(".git")
+        if rules is not None:
+            dirs[:] = [d for d in dirs if not rules.excludes_dir(_join(rel_dir, d))]
+        if "node_modules" in dirs and "package.json" in files:
+            envs.append((_join(rel_dir, "node_modules"), NODE))
+            dirs.remove("node_modules")
+    return sorted(envs)
+
+
+def environment_excludes(envs: Iterable[Tuple[str, str]]) -> List[str]:
+    """Exclusões ancoradas que tiram os ambientes do walk"""
+    return [f"/{path}/" for path, _ in envs]
+
+
+def _sha256_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def describe(project_root: str, env_path: str, kind: str) -> EnvironmentInfo:
+    """Locks e fingerprint de um ambiente (sem ler o ambiente)"""
+    env_dir = os.path.join(project_root, env_path)
+    owner_dir = os.path.dirname(env_dir)
+    owner_rel = os.path.dirname(env_path)
+    lockfiles = {}
+    for name in LOCKFILES[kind]:
+        path = os.path.join(owner_dir, name)
+        if os.path.isfile(path):
+            lockfiles[_join(owner_rel, name)] = _sha256_file(path)
+    hasher = hashlib.sha256(kind.encode())
+    if kind == PYTHON:
+        # pyvenv.cfg traz a versão e o caminho do interpretador base
+        with open(os.path.join(env_dir, "pyvenv.cfg"), "rb") as f:
+            hasher.update(f.read())
+    for name, digest in sorted(lockfiles.items()):
+        hasher.update(f"\0{os.path.basename(name)}\0{digest}".encode())
+    return EnvironmentInfo(path=env_path, kind=kind, lockfiles=lockfiles,
+                           fingerprint=hasher.hexdigest())
+
+
+def _site_packages(env_dir: str) -> List[str]:
+    result = []
+    for lib in ("lib", "Lib"):
+        base = os.path.join(env_dir, lib)
+        if not os.path.isdir(base) or os.path.islink(base):
+            continue
+        if os.path.isdir(os.path.join(base, "site-packages")):
+            result.append(f"{lib}/site-packages")
+        for name in sorted(os.listdir(base)):
+            if name.startswith("python") and os.path.isdir(os.path.join(base, name, "site-packages")):
+                result.append(f"{lib}/{name}/site-packages")
+    return result
+
+
+def _dist_name(dist_dir: str) -> Tuple[str, str]:
+    name, _, version = os.path.basename(dist_dir)[:-len(".dist-info")].partition("-")
+    try:
+        with open(os.path.join(dist_dir, "METADATA"), "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    break
+                key, _, value = line.partition(":")
+                if key == "Name":
+                    name = value.strip()
+                elif key == "Version":
+                    version = value.strip()
+    except OSError:
+        pass
+    return name, version
+
+
+def _python_packages(env_dir: str) -> List[Tuple[str, str, List[str]]]:
+    """Pacotes de um venv: cada dist-info com os diretórios/módulos do seu RECORD
+
+    Nomes de primeiro nível reivindicados por mais de um pacote (pacotes de
+    namespace) ficam no resto do ambiente.
+    """
+    packages = []
+    for site in _site_packages(env_dir):
+        site_dir = os.path.join(env_dir, site)
+        found = []
+        owners: Dict[str, int] = {}
+        for entry in sorted(os.listdir(site_dir)):
+            if not entry.endswith(".dist-info"):
+                continue
+            name, version = _dist_name(os.path.join(site_dir, entry))
+            tops = {entry}
+            try:
+                with open(os.path.join(site_dir, entry, "RECORD"), "r", newline="",
+                          encoding="utf-8", errors="replace") as f:
+                    for row in csv.reader(f):
+                        path = row[0].replace("\\", "/") if row else ""
+                        if not path or path.startswith(("/", "..")):
+                            continue  # Scripts em bin/ ficam no resto
+                        top = path.split("/", 1)[0]
+                        if top != "__pycache__":
+                            tops.add(top)
+            except OSError:
+                pass
+            found.append((name, version, tops))
+            for top in tops:
+                owners[top] = owners.get(top, 0) + 1
+        for name, version, tops in found:
+            members = [f"{site}/{top}" for top in sorted(tops)
+                       if owners[top] == 1 and os.path.lexists(os.path.join(site_dir, top))]
+            packages.append((name, version, members))
+    return packages
+
+
+def _node_packages(env_dir: str) -> List[Tuple[str, str, List[str]]]:
+    """Pacotes de um node_modules: cada diretório de primeiro nível (ou @escopo/nome)"""
+    names = []
+    for entry in sorted(os.listdir(env_dir)):
+        if entry.startswith("."):
+            continue  # .bin, .package-lock.json, caches
+        path = os.path.join(env_dir, entry)
+        if entry.startswith("@") and os.path.isdir(path) and not os.path.islink(path):
+            names.extend(f"{entry}/{sub}" for sub in sorted(os.listdir(path)))
+        else:
+            names.append(entry)
+    packages = []
+    for name in names:
+        version = ""
+        try:
+            with open(os.path.join(env_dir, name, "package.json"), "r", encoding="utf-8") as f:
+                version = str(json.load(f).get("version", ""))
+        except (OSError, ValueError, AttributeError):
+            pass
+        packages.append((name, version, [name]))
+    return packages
+
+
+def _entries(env_dir: str, rel: str, skip: Set[str] = frozenset()) -> Iterator[Entry]:
+    """rel e tudo abaixo dele (sem seguir links), em ordem; skip poda caminhos"""
+    st = os.lstat(os.path.join(env_dir, rel)) if rel else os.lstat(env_dir)
+    if rel:
+        yield rel, st
+    if stat.S_ISDIR(st.st_mode):
+        for name in sorted(os.listdir(os.path.join(env_dir, rel))):
+            child = _join(rel, name)
+            if child not in skip:
+                yield from _entries(env_dir, child, skip)
+
+
+def _stat_key(entries: List[Entry]) -> str:
+    """Resumo só de stat: igual ao do backup anterior, o pacote não é relido"""
+    hasher = hashlib.sha1()
+    for rel, st in entries:
+        hasher.update(f"{rel}\0{st.st_mode}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return hasher.hexdigest()
+
+
+def _content_digest(env_dir: str, entries: List[Entry]) -> str:
+    """Identidade do pacote: caminhos, modos, alvos dos links e sha256 dos arquivos"""
+    hasher = hashlib.sha256()
+    for rel, st in entries:
+        path = os.path.join(env_dir, rel)
+        mode = stat.S_IMODE(st.st_mode)
+        if stat.S_ISLNK(st.st_mode):
+            line = f"l\0{rel}\0{os.readlink(path)}"
+        elif stat.S_ISDIR(st.st_mode):
+            line = f"d\0{rel}\0{mode:o}"
+        elif stat.S_ISREG(st.st_mode):
+            line = f"f\0{rel}\0{mode:o}\0{_sha256_file(path)}"
+        else:
+            continue  # Sockets, fifos: não entram no pacote
+        hasher.update(line.encode() + b"\n")
+    return hasher.hexdigest()
+
+
+def _units(env_dir: str, kind: str) -> List[Tuple[str, str, List[Entry]]]:
+    """(nome, versão, entradas) de cada pacote do ambiente, mais o resto"""
+    packages = _python_packages(env_dir) if kind == PYTHON else _node_packages(env_dir)
+    members = {member for _, _, paths in packages for member in paths}
+    units: List[Tuple[str, str, List[Entry]]] = [(REST, "", list(_entries(env_dir, "", members)))]
+    for name, version, paths in packages:
+        entries = [entry for member in paths for entry in _entries(env_dir, member)]
+        if entries:
+            units.append((name, version, entries))
+    return units
+
+
+def _extract(tar: tarfile.TarFile, dest_dir: str) -> None:
+    # Filtro "tar": nada fora do destino, mas links absolutos (bin/python) são aceitos
+    if hasattr(tarfile, "tar_filter"):
+        tar.extractall(dest_dir, filter="tar")
+    else:
+        tar.extractall(dest_dir)
+
+
+class EnvironmentCache:
+    """Cache de pacotes instalados compartilhado entre projetos ({volume}/.envcache)
+
+    Cada pacote (um dist-info de venv com seus módulos, um diretório de
+    node_modules) vira um tar.gz endereçado pelo conteúdo: o mesmo pacote
+    instalado em vários projetos ou backups é guardado uma vez. O que não
+    pertence a nenhum pacote (bin/, pyvenv.cfg, .bin) forma uma unidade à
+    parte. Um manifesto, endereçado pelo sha256 do próprio JSON, lista as
+    unidades de um ambiente; o backup guarda só a referência a ele.
+    """
+
+    def __init__(self, root: str, workers: Optional[int] = None):
+        self.root = root
+        self.workers = workers or min(8, os.cpu_count() or 1)
+
+    def _path(self, dirname: str, digest: str, suffix: str) -> str:
+        return os.path.join(self.root, dirname, digest[:2], digest + suffix)
+
+    def object_path(self, digest: str) -> str:
+        return self._path(OBJECTS_DIRNAME, digest, OBJECT_SUFFIX)
+
+    def manifest_path(self, digest: str) -> str:
+        return self._path(MANIFESTS_DIRNAME, digest, MANIFEST_SUFFIX)
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Caminho local de um nome relativo do cache (None se inválido ou ausente)"""
+        path = os.path.normpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        # Reaproveitar conta como uso recente: a coleta respeita a carência
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _publish(self, tmp: str, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp, path)
+
+    def load_manifest(self, digest: str) -> Dict[str, Any]:
+        path = self.manifest_path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise EnvCacheError(f"Manifesto de ambiente ausente no cache: {digest}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise EnvCacheError(f"Manifesto de ambiente corrompido: {digest}")
+        return json.loads(data)
+
+    def _save_manifest(self, manifest: Dict[str, Any]) -> Tuple[str, int]:
+        data = json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.manifest_path(digest)
+        if os.path.exists(path):
+            self._touch(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            self._publish(tmp, path)
+        return digest, len(data)
+
+    def _write_object(self, env_dir: str, entries: List[Entry], path: str) -> int:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with tarfile.open(tmp, "w:gz", compresslevel=COMPRESS_LEVEL) as tar:
+                for rel, st in entries:
+                    if stat.S_ISDIR(st.st_mode) or stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode):
+                        tar.add(os.path.join(env_dir, rel), arcname=rel, recursive=False)
+            size = os.path.getsize(tmp)
+            self._publish(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return size
+
+    def _unit(self,
+              env_dir: str,
+              name: str,
+              version: str,
+              entries: List[Entry],
+              known: Dict[Tuple[str, str], Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+        """Entrada do manifesto para um pacote e os bytes gravados no cache"""
+        key = _stat_key(entries)
+        previous = known.get((name, key))
+        if previous is not None and os.path.exists(self.object_path(previous["digest"])):
+            self._touch(self.object_path(previous["digest"]))
+            return previous, 0
+        digest = _content_digest(env_dir, entries)
+        path = self.object_path(digest)
+        written = 0
+        if os.path.exists(path):
+            # Mesmo pacote já guardado por outro projeto ou backup
+            self._touch(path)
+        else:
+            written = self._write_object(env_dir, entries, path)
+        return {
+            "name": name,
+            "version": version,
+            "digest": digest,
+            "sha256": _sha256_file(path),
+            "stat": key,
+            "files": sum(1 for _, st in entries if not stat.S_ISDIR(st.st_mode)),
+            "size": sum(st.st_size for _, st in entries if stat.S_ISREG(st.st_mode)),
+            "archive_size": os.path.getsize(path)
+        }, written
+
+    def capture(self,
+                project_root: str,
+                env_path: str,
+                kind: str,
+                previous: Optional[EnvironmentInfo] = None) -> EnvironmentInfo:
+        """Guarda o ambiente no cache e retorna a referência para os metadados
+
+        Pacotes com o mesmo stat que no manifesto de previous não são relidos.
+        """
+        info = describe(project_root, env_path, kind)
+        env_dir = os.path.join(project_root, env_path)
+        known: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        if previous is not None and previous.manifest:
+            try:
+                for unit in self.load_manifest(previous.manifest)["units"]:
+                    known[(unit["name"], unit["stat"])] = unit
+            except EnvCacheError as e:
+                print(f"Manifesto anterior de {env_path} indisponível: {e}")
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = list(pool.map(lambda unit: self._unit(env_dir, *unit, known), _units(env_dir, kind)))
+        manifest = {"kind": kind, "units": [unit for unit, _ in results]}
+        info.manifest, info.manifest_size = self._save_manifest(manifest)
+        info.packages = len(results)
+        info.files = sum(unit["files"] for unit, _ in results)
+        info.size_bytes = sum(unit["size"] for unit, _ in results)
+        info.new_objects = sum(1 for _, written in results if written)
+        info.new_bytes = sum(written for _, written in results)
+        return info
+
+    def references(self, info: EnvironmentInfo) -> List[Tuple[str, int, Optional[str]]]:
+        """(nome relativo, tamanho, sha256) dos objetos do ambiente; o manifesto precisa estar local"""
+        return [
+            (os.path.relpath(self.object_path(unit["digest"]), self.root).replace(os.sep, "/"),
+             unit["archive_size"], unit["sha256"])
+            for unit in self.load_manifest(info.manifest)["units"]
+        ]
+
+    def manifest_name(self, info: EnvironmentInfo) -> str:
+        return os.path.relpath(self.manifest_path(info.manifest), self.root).replace(os.sep, "/")
+
+    def missing(self, info: EnvironmentInfo) -> List[Tuple[str, int, Optional[str]]]:
+        """Manifesto e objetos do ambiente ausentes no cache local
+
+        Sem o manifesto, só ele é listado (com o sha256 do próprio nome).
+        """
+        if not os.path.exists(self.manifest_path(info.manifest)):
+            return [(self.manifest_name(info), info.manifest_size, info.manifest)]
+        return [ref for ref in self.references(info) if self.resolve(ref[0]) is None]
+
+    def matches(self, info: EnvironmentInfo, dest_dir: str) -> bool:
+        """Se dest_dir já tem exatamente os pacotes do manifesto (pelo conteúdo)
+
+        Lê os arquivos do ambiente, mas não escreve nada: a restauração
+        diferencial usa para não recriar um ambiente que não mudou.
+        """
+        if os.path.islink(dest_dir) or not os.path.isdir(dest_dir):
+            return False
+        try:
+            expected = sorted((unit["name"], unit["digest"])
+                              for unit in self.load_manifest(info.manifest)["units"])
+            with ThreadPoolExecutor(self.workers) as pool:
+                found = sorted(pool.map(lambda unit: (unit[0], _content_digest(dest_dir, unit[2])),
+                                        _units(dest_dir, info.kind)))
+        except (EnvCacheError, OSError):
+            return False
+        return found == expected
+
+    def rebuild(self, info: EnvironmentInfo, dest_dir: str) -> int:
+        """Recria o ambiente em dest_dir a partir do cache; retorna os arquivos escritos
+
+        O que houver em dest_dir é substituído. Cada objeto é conferido pelo
+        sha256 antes de ser extraído.
+        """
+        units = self.load_manifest(info.manifest)["units"]
+        if os.path.islink(dest_dir) or os.path.isfile(dest_dir):
+            os.remove(dest_dir)
+        elif os.path.isdir(dest_dir):
+            shutil.rmtree(dest_dir)
+        os.makedirs(dest_dir)
+        # O resto primeiro: cria os diretórios (lib/, site-packages) com os modos originais
+        for unit in sorted(units, key=lambda u: u["name"] != REST):
+            path = self.object_path(unit["digest"])
+            if not os.path.exists(path):
+                raise EnvCacheError(f"Pacote {unit['name']} ausente no cache de ambientes")
+            if _sha256_file(path) != unit["sha256"]:
+                raise EnvCacheError(f"Pacote {unit['name']} corrompido no cache de ambientes")
+            with tarfile.open(path, "r:gz") as tar:
+                _extract(tar, dest_dir)
+            self._touch(path)
+        return sum(unit["files"] for unit in units)
+
+    def collect(self, live: Iterable[str], grace: float = GC_GRACE) -> Tuple[int, int]:
+        """Remove manifestos e objetos que nenhum backup referencia
+
+        live são os manifestos em uso. Arquivos usados há menos de grace
+        segundos ficam (um backup em andamento ainda não está no catálogo).
+        Retorna (arquivos removidos, bytes liberados).
+        """
+        live = set(live)
+        live_objects = set()
+        for digest in live:
+            try:
+                live_objects.update(unit["digest"] for unit in self.load_manifest(digest)["units"])
+            except EnvCacheError:
+                pass
+        cutoff = time.time() - grace
+        removed = freed = 0
+        for dirname, suffix, wanted in ((MANIFESTS_DIRNAME, MANIFEST_SUFFIX, live),
+                                        (OBJECTS_DIRNAME, OBJECT_SUFFIX, live_objects)):
+            base = os.path.join(self.root, dirname)
+            if not os.path.isdir(base):
+                continue
+            for shard in os.scandir(base):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    digest = entry.name[:-len(suffix)] if entry.name.endswith(suffix) else None
+                    if digest in wanted:
+                        continue
+                    st = entry.stat()
+                    if st.st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                        freed += st.st_size
+        if removed:
+            print(f"Cache de ambientes: {removed} arquivos removidos, {freed} bytes liberados")
+        return removed, freed
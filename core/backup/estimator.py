@@ -0,0 +1,193 @@
+import hashlib
+import math
+import os
+import random
+import time
+from array import array
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+from .models import BackupEstimate, BackupType, CompressionType, EstimateRange
+from .compressor import BackupCompressor
+from .manifest import Manifest, scan_manifest
+from .rules import CompiledRules
+
+SAMPLE_CHUNK = 64 * 1024   # Tamanho de cada amostra lida do disco
+MIN_SAMPLES = 30           # Amostra piloto antes de calcular o tamanho necessário
+MAX_SAMPLES = 1000
+TARGET_ERROR = 0.02        # Meia largura relativa desejada para a taxa de compressão
+TIME_BUDGET = 5.0          # Segundos gastos amostrando, no máximo
+Z_95 = 1.96
+
+
+def _mean_interval(values: List[float]) -> Tuple[float, float]:
+    """Média e meia largura do intervalo de 95%"""
+    n = len(values)
+    if n == 0:
+        return 0.0, 0.0
+    mean = sum(values) / n
+    if n == 1:
+        return mean, abs(mean)  # Sem variância conhecida: intervalo largo
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean, Z_95 * math.sqrt(variance / n)
+
+
+class BackupEstimator:
+    """Estima tamanho, compressão e duração de um backup sem executá-lo
+
+    Só o stat da árvore é percorrido. Blocos de SAMPLE_CHUNK são sorteados com
+    probabilidade proporcional ao tamanho (cada byte tem a mesma chance) e
+    passam por leitura, md5 e pelo codec real, dando amostras de taxa de
+    compressão e de custo por byte.
+    """
+
+    def __init__(self,
+                 compressor: BackupCompressor,
+                 sample_chunk: int = SAMPLE_CHUNK,
+                 max_samples: int = MAX_SAMPLES,
+                 target_error: float = TARGET_ERROR,
+                 time_budget: float = TIME_BUDGET,
+                 seed: Optional[int] = None,
+                 zdict: Optional[bytes] = None,
+                 dictionary_id: Optional[str] = None):
+        self.compressor = compressor
+        self.zdict = zdict  # Dicionário atual do projeto, como no backup real
+        self.dictionary_id = dictionary_id
+        self.sample_chunk = sample_chunk
+        self.max_samples = max_samples
+        self.target_error = target_error
+        self.time_budget = time_budget
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def changed_entries(current: Manifest, parent: Optional[Manifest]) -> Tuple[List[int], int]:
+        """Arquivos com tamanho/mtime diferentes do pai e quantidade de removidos
+
+        É um limite superior: mtime alterado não garante conteúdo alterado.
+        """
+        if parent is None:
+            return list(range(len(current))), 0
+        previous = {}
+        for index in range(len(parent)):
+            previous[parent.path(index)] = (parent.sizes[index], parent.mtimes[index])
+        changed = []
+        for index in range(len(current)):
+            stat = previous.pop(current.path(index), None)
+            if stat != (current.sizes[index], current.mtimes[index]):
+                changed.append(index)
+        return changed, len(previous)
+
+    def _sample(self, data_dir: str, current: Manifest, indices: List[int], total: int,
+                compression_type: CompressionType, level: int) -> Tuple[List[float], List[float], int]:
+        """Sorteia e processa amostras; retorna taxas, segundos por byte e bytes lidos"""
+        cumulative = array("q")
+        running = 0
+        for index in indices:
+            running += current.sizes[index]
+            cumulative.append(running)
+
+        ratios: List[float] = []
+        costs: List[float] = []
+        sampled = 0
+        needed = MIN_SAMPLES
+        deadline = time.perf_counter() + self.time_budget
+        while len(ratios) < min(needed, self.max_samples) and time.perf_counter() < deadline:
+            offset = self._random.randrange(total)
+            position = bisect_right(cumulative, offset)
+            index = indices[position]
+            start = offset - (cumulative[position] - current.sizes[index])
+            start -= start % self.sample_chunk
+            path = os.path.join(data_dir, current.path(index))
+
+            began = time.perf_counter()
+            try:
+                with open(path, "rb") as f:
+                    chunk = os.pread(f.fileno(), self.sample_chunk, start)
+            except OSError:
+                continue
+            if not chunk:
+                continue
+            read_seconds = time.perf_counter() - began
+            hashlib.md5(chunk).digest()
+            if compression_type != CompressionType.NONE:
+                compressed = len(self.compressor.compress_bytes(
+                    chunk, compression_type, level, self.zdict, self.dictionary_id))
+            else:
+                compressed = len(chunk)
+            # Leitura conta duas vezes: hash/compressão e a passada de cópia
+            costs.append((time.perf_counter() - began + read_seconds) / len(chunk))
+            ratios.append(compressed / len(chunk))
+            sampled += len(chunk)
+
+            if len(ratios) == MIN_SAMPLES:
+                # Tamanho de amostra para o erro relativo desejado na taxa
+                mean, half = _mean_interval(ratios)
+                if mean > 0 and half > 0:
+                    std = half / Z_95 * math.sqrt(len(ratios))
+                    needed = max(MIN_SAMPLES, math.ceil((Z_95 * std / (self.target_error * mean)) ** 2))
+        return ratios, costs, sampled
+
+    def estimate(self,
+                 data_dir: str,
+                 backup_type: BackupType,
+                 compression_type: CompressionType = CompressionType.ZLIB,
+                 level: int = 6,
+                 rules: Optional[CompiledRules] = None,
+                 parent: Optional[Manifest] = None) -> BackupEstimate:
+        """Estima o backup de data_dir; parent é o estado do backup base (incremental/snapshot)"""
+        began = time.perf_counter()
+        current = scan_manifest(data_dir, rules)
+        walk_seconds = time.perf_counter() - began
+
+        if backup_type == BackupType.CHECKPOINT:
+            indices, deleted = [], 0
+        else:
+            indices, deleted = self.changed_entries(
+                current, parent if backup_type != BackupType.FULL else None)
+        changed_bytes = sum(current.sizes[index] for index in indices)
+        # Snapshots não são comprimidos
+        if backup_type == BackupType.SNAPSHOT:
+            compression_type = CompressionType.NONE
+
+        ratios: List[float] = []
+        costs: List[float] = []
+        sampled = 0
+        if changed_bytes:
+            ratios, costs, sampled = self._sample(
+                data_dir, current, indices, changed_bytes, compression_type, level)
+
+        ratio_mean, ratio_half = _mean_interval(ratios) if ratios else (1.0, 0.0)
+        cost_mean, cost_half = _mean_interval(costs)
+        # O walk entra como custo fixo
+        per_byte = cost_mean
+        seconds = walk_seconds + changed_bytes * per_byte
+        seconds_half = changed_bytes * cost_half
+
+        compressed = changed_bytes * ratio_mean
+        compressed_low = changed_bytes * max(ratio_mean - ratio_half, 0.0)
+        compressed_high = changed_bytes * (ratio_mean + ratio_half)
+
+        def ratio_of(fraction: float) -> float:
+            return 1.0 / fraction if fraction > 0 else 1.0
+
+        return BackupEstimate(
+            files_count=len(current),
+            size_bytes=current.total_size,
+            changed_files=len(indices),
+            changed_bytes=changed_bytes,
+            deleted_files=deleted,
+            ratio=EstimateRange(
+                value=ratio_of(ratio_mean),
+                low=ratio_of(ratio_mean + ratio_half),
+                high=ratio_of(max(ratio_mean - ratio_half, 1e-6))
+            ),
+            compressed_bytes=EstimateRange(value=compressed, low=compressed_low, high=compressed_high),
+            seconds=EstimateRange(
+                value=seconds,
+                low=max(walk_seconds, seconds - seconds_half),
+                high=seconds + seconds_half
+            ),
+            throughput_mb_s=(1.0 / per_byte / (1024 * 1024)) if per_byte else 0.0,
+            sample_count=len(ratios),
+            sample_bytes=sampled,
+            elapsed_seconds=time.perf_counter() - began
+        )
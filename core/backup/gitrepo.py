@@ -0,0 +1,173 @@
+import hashlib
+import os
+import shutil
+import struct
+import subprocess
+from typing import Dict, Iterable, List, Optional, Set
+from .models import BackupRules, GitRepoInfo
+from .rules import CompiledRules, compile_rules, with_excludes
+
+GIT_DIRNAME = "git"   # {backup}/git/{n}.pack: packfiles dos repositórios
+PACK_HEADER = struct.Struct(">4sII")
+
+
+class GitError(Exception):
+    """Falha de um comando git"""
+
+
+def git_available() -> bool:
+    return shutil.which("git") is not None
+
+
+def _git(repo_dir: str, *args: str, stdin=None, stdout=None, input: Optional[bytes] = None) -> bytes:
+    # safe.directory: os projetos costumam pertencer a outro usuário
+    command = ["git", "-c", "safe.directory=*", "-C", repo_dir, *args]
+    result = subprocess.run(command, input=input, stdin=stdin,
+                            stdout=stdout if stdout is not None else subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise GitError(f"git {' '.join(args)}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout or b""
+
+
+def _anchor(rel_dir: str, name: str) -> str:
+    return f"/{rel_dir}/{name}" if rel_dir else f"/{name}"
+
+
+def find_repositories(root: str, rules: Optional[CompiledRules] = None) -> List[str]:
+    """Caminhos relativos (com "/") dos repositórios sob root; "" é a própria raiz
+
+    Só diretórios .git contam: worktrees e submódulos (.git como arquivo)
+    seguem como arquivos comuns.
+    """
+    repos = []
+    for dirpath, dirs, _ in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        if ".git" in dirs:
+            if os.path.isdir(os.path.join(dirpath, ".git", "objects")):
+                repos.append(rel_dir)
+            dirs.remove(".git")
+        if rules is not None:
+            dirs[:] = [d for d in dirs
+                       if not rules.excludes_dir(f"{rel_dir}/{d}" if rel_dir else d)]
+    return sorted(repos)
+
+
+def rules_without_objects(rules: Optional[BackupRules], repos: Iterable[str]) -> Optional[CompiledRules]:
+    """Regras do backup acrescidas da exclusão de .git/objects de cada repositório"""
+    return compile_rules(with_excludes(rules, [_anchor(repo, ".git/objects/") for repo in repos]))
+
+
+def _tips(refs: Dict[str, str], head: Optional[str]) -> Set[str]:
+    tips = set(refs.values())
+    if head:
+        tips.add(head)
+    return tips
+
+
+def read_state(repo_dir: str) -> GitRepoInfo:
+    """Refs e HEAD atuais de um repositório"""
+    refs = {}
+    output = _git(repo_dir, "for-each-ref", "--format=%(objectname) %(refname)")
+    for line in output.decode().splitlines():
+        objectname, _, refname = line.partition(" ")
+        refs[refname] = objectname
+    with open(os.path.join(repo_dir, ".git", "HEAD"), "r") as f:
+        head = f.read().strip()
+    try:
+        head_commit = _git(repo_dir, "rev-parse", "--verify", "-q", "HEAD").decode().strip()
+    except GitError:
+        head_commit = None  # Branch sem commits
+    return GitRepoInfo(path="", head=head, head_commit=head_commit, refs=refs)
+
+
+def _existing(repo_dir: str, objects: Iterable[str]) -> List[str]:
+    """Objetos que ainda existem no repositório (tips antigos podem ter sido coletados)"""
+    objects = sorted(objects)
+    if not objects:
+        return []
+    output = _git(repo_dir, "cat-file", "--batch-check=%(objectname) %(objecttype)",
+                  input="".join(f"{o}\n" for o in objects).encode())
+    return [line.split()[0] for line in output.decode().splitlines() if not line.endswith(" missing")]
+
+
+def pack_repository(repo_dir: str,
+                    dest: str,
+                    previous: Optional[GitRepoInfo] = None) -> GitRepoInfo:
+    """Grava em dest um packfile com os objetos novos desde previous
+
+    O pack inclui tudo o que é alcançável pelas refs, reflogs e pelo index
+    (alterações em stage), menos o que já era alcançável pelos tips do
+    backup anterior, que estão nos packs da cadeia. O pack é autocontido
+    (sem deltas para objetos de fora). Sem objetos novos, nada é gravado.
+    """
+    info = read_state(repo_dir)
+    excluded: List[str] = []
+    trees: List[str] = []
+    if previous:
+        tips = _tips(previous.refs, previous.head_commit)
+        excluded = _existing(repo_dir, tips)
+        # As árvores dos tips também: o index lista seus blobs diretamente,
+        # e sem elas um repositório inalterado repetiria o index inteiro
+        trees = _existing(repo_dir, (f"{tip}^{{tree}}" for tip in excluded))
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(dest, "wb") as f:
+        _git(repo_dir, "pack-objects", "--revs", "--all", "--reflog", "--indexed-objects",
+             "--stdout", "-q", input="".join(f"^{o}\n" for o in excluded + trees).encode(), stdout=f)
+    with open(dest, "rb") as f:
+        signature, _, count = PACK_HEADER.unpack(f.read(PACK_HEADER.size))
+    if signature != b"PACK":
+        raise GitError(f"Packfile inválido gerado para {repo_dir}")
+    info.excluded = len(excluded)
+    if count == 0:
+        os.remove(dest)
+        return info
+    hasher = hashlib.sha256()
+    with open(dest, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    info.pack = os.path.basename(dest)
+    info.pack_sha256 = hasher.hexdigest()
+    info.pack_size = os.path.getsize(dest)
+    info.objects = count
+    return info
+
+
+def count_object_files(repo_dir: str) -> int:
+    """Arquivos em .git/objects (o que o modo git deixa de copiar um a um)"""
+    return sum(len(files) for _, _, files in os.walk(os.path.join(repo_dir, ".git", "objects")))
+
+
+def prepare_repository(repo_dir: str) -> None:
+    """Recria os diretórios que o git exige e que a árvore não guarda (vazios)"""
+    git_dir = os.path.join(repo_dir, ".git")
+    for name in ("objects/pack", "objects/info", "refs/heads", "refs/tags"):
+        os.makedirs(os.path.join(git_dir, name), exist_ok=True)
+
+
+def unpack_into(repo_dir: str, pack_path: str, expected_sha256: Optional[str] = None) -> None:
+    """Indexa um packfile no repositório restaurado (objects/pack)"""
+    if expected_sha256:
+        hasher = hashlib.sha256()
+        with open(pack_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        if hasher.hexdigest() != expected_sha256:
+            raise GitError(f"Packfile corrompido: {pack_path}")
+    prepare_repository(repo_dir)
+    with open(pack_path, "rb") as f:
+        _git(repo_dir, "index-pack", "--stdin", stdin=f)
+
+
+def verify_refs(repo_dir: str) -> None:
+    """Confere que HEAD e as refs restauradas apontam para objetos presentes
+
+    As refs vêm da árvore de arquivos e o pack é gravado depois dela, então
+    todo objeto referenciado precisa estar nos packs da cadeia.
+    """
+    state = read_state(repo_dir)
+    tips = _tips(state.refs, state.head_commit)
+    missing = tips - set(_existing(repo_dir, tips))
+    if missing:
+        raise GitError(f"{len(missing)} objetos referenciados ausentes em {repo_dir}")
@@ -0,0 +1,185 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from .manifest import backup_files
+from .models import BackupMetadata, BackupStatus, BackupType, PathVersion
+
+HISTORY_FILENAME = "history.db"
+_BATCH_SIZE = 10_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS backups (
+    backup_id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    path_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    backup_id TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    deleted INTEGER NOT NULL,
+    PRIMARY KEY (path_id, created_at, backup_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS versions_backup ON versions (backup_id);
+"""
+
+
+class PathHistory:
+    """Índice invertido caminho -> versões dos backups do projeto em {projeto}/history.db
+
+    Cada arquivo listado num backup concluído vira uma linha (backup,
+    checksum, tamanho, mtime), agrupada pelo caminho e ordenada pela data
+    do backup: o histórico de um caminho é uma leitura de faixa na chave
+    primária. Completos e snapshots listam todos os arquivos; incrementais,
+    só os alterados e removidos. O índice é atualizado a cada backup gravado
+    ou removido e reconciliado com o catálogo na consulta, cobrindo backups
+    anteriores ao índice ou gravados por fora.
+    """
+
+    def __init__(self, project_dir: str):
+        self.project_dir = project_dir
+        self.path = os.path.join(project_dir, HISTORY_FILENAME)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.project_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def indexed(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._connection().execute("SELECT backup_id FROM backups")]
+
+    def _add(self, conn: sqlite3.Connection, metadata: BackupMetadata) -> None:
+        created_at = metadata.created_at.isoformat()
+        # Completos e snapshots vêm do manifest.bin, em lotes
+        files = backup_files(metadata, os.path.join(self.project_dir, metadata.id))
+        while True:
+            batch = list(islice(files, _BATCH_SIZE))
+            if not batch:
+                break
+            conn.executemany("INSERT OR IGNORE INTO paths (path) VALUES (?)", ((f.path,) for f in batch))
+            conn.executemany(
+                "INSERT OR REPLACE INTO versions "
+                "SELECT id, ?, ?, ?, ?, ?, ? FROM paths WHERE path = ?",
+                ((created_at, metadata.id, f.checksum, f.size, f.modified_at.timestamp(),
+                  int(f.is_deleted), f.path) for f in batch)
+            )
+        conn.execute("INSERT OR REPLACE INTO backups VALUES (?, ?, ?)",
+                     (metadata.id, BackupType(metadata.type).value, created_at))
+
+    def add(self, metadata: BackupMetadata) -> bool:
+        """Indexa os arquivos de um backup concluído; False se já estava indexado"""
+        if metadata.status != BackupStatus.COMPLETED or metadata.type == BackupType.CHECKPOINT:
+            return False
+        with self._lock:
+            conn = self._connection()
+            if conn.execute("SELECT 1 FROM backups WHERE backup_id = ?", (metadata.id,)).fetchone():
+                # Regravações dos metadados (ex.: camada fria) não mudam os arquivos
+                return False
+            with conn:
+                self._add(conn, metadata)
+        return True
+
+    def remove(self, backup_id: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM versions WHERE backup_id = ?", (backup_id,))
+                conn.execute("DELETE FROM backups WHERE backup_id = ?", (backup_id,))
+
+    def sync(self,
+             entries: Iterable[Dict[str, Any]],
+             load: Callable[[str], Optional[BackupMetadata]]) -> int:
+        """Indexa os backups do catálogo que faltam e remove os que não existem mais
+
+        Retorna quantos backups foram indexados.
+        """
+        wanted = {e["id"] for e in entries
+                  if e.get("status") == BackupStatus.COMPLETED.value
+                  and e.get("type") != BackupType.CHECKPOINT.value}
+        indexed = set(self.indexed())
+        for backup_id in indexed - wanted:
+            self.remove(backup_id)
+        added = 0
+        for backup_id in sorted(wanted - indexed):
+            metadata = load(backup_id)
+            if metadata is not None and self.add(metadata):
+                added += 1
+        if added:
+            print(f"Histórico de {os.path.basename(self.project_dir)}: {added} backups indexados")
+        return added
+
+    def versions(self,
+                 path: str,
+                 since: Optional[datetime] = None,
+                 until: Optional[datetime] = None,
+                 limit: int = 100,
+                 distinct: bool = False) -> List[PathVersion]:
+        """Versões de um caminho, da mais recente à mais antiga
+
+        distinct mantém só a primeira aparição de cada conteúdo (e de cada
+        remoção) em ordem cronológica, omitindo os backups em que o arquivo
+        não mudou.
+        """
+        query = ("SELECT v.backup_id, b.type, v.created_at, v.checksum, v.size, v.mtime, v.deleted "
+                 "FROM paths p JOIN versions v ON v.path_id = p.id "
+                 "JOIN backups b ON b.backup_id = v.backup_id WHERE p.path = ?")
+        params: List[Any] = [path]
+        if since is not None:
+            query += " AND v.created_at >= ?"
+            params.append(since.isoformat())
+        if until is not None:
+            query += " AND v.created_at < ?"
+            params.append(until.isoformat())
+        if distinct:
+            # Filtra em ordem cronológica antes de aplicar o limite
+            query += " ORDER BY v.created_at"
+        else:
+            query += " ORDER BY v.created_at DESC LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._connection().execute(query, params).fetchall()
+
+        result = []
+        previous = None
+        for backup_id, backup_type, created_at, checksum, size, mtime, deleted in rows:
+            if distinct:
+                key = (checksum, deleted)
+                if key == previous:
+                    continue
+                previous = key
+            result.append(PathVersion(
+                backup_id=backup_id,
+                backup_type=backup_type,
+                created_at=datetime.fromisoformat(created_at),
+                checksum=checksum,
+                size=size,
+                modified_at=datetime.fromtimestamp(mtime),
+                deleted=bool(deleted)
+            ))
+        if distinct:
+            result = result[::-1][:limit]
+        return result
@@ -0,0 +1,189 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+from typing import Dict, Optional
+from .journal import ChangeJournal
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+              | IN_ONLYDIR | IN_DONT_FOLLOW)
+_EVENT_HEADER = struct.Struct("iIII")
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library("c")
+        if not name:
+            raise OSError("libc não encontrada")
+        libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify não suportado nesta plataforma")
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def inotify_available() -> bool:
+    """Verifica se o inotify pode ser usado neste sistema"""
+    try:
+        _get_libc()
+        return True
+    except OSError:
+        return False
+
+
+class InotifyWatcher:
+    """Observa recursivamente um diretório e alimenta um ChangeJournal"""
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, journal: ChangeJournal):
+        self.journal = journal
+        self.root = journal.data_dir
+        self._libc = _get_libc()
+        self._fd = -1
+        self._wd_to_path: Dict[int, str] = {}
+        self._path_to_wd: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_r, self._stop_w = -1, -1
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._wd_to_path)
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _add_watch(self, path: str) -> bool:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return True  # Diretório sumiu entre o evento e a watch
+            # ENOSPC: limite fs.inotify.max_user_watches atingido
+            print(f"Erro ao observar {path}: {os.strerror(err)}")
+            self.journal.mark_degraded()
+            return False
+        self._wd_to_path[wd] = path
+        self._path_to_wd[path] = wd
+        return True
+
+    def _add_tree(self, path: str) -> None:
+        """Adiciona watches recursivamente em um diretório"""
+        if not self._add_watch(path):
+            return
+        for root, dirnames, _ in os.walk(path):
+            for dirname in dirnames:
+                if not self._add_watch(os.path.join(root, dirname)):
+                    return
+
+    def _forget_tree(self, path: str) -> None:
+        """Remove as watches de um diretório movido/removido"""
+        prefix = path + os.sep
+        for watched in [p for p in self._path_to_wd if p == path or p.startswith(prefix)]:
+            wd = self._path_to_wd.pop(watched)
+            self._wd_to_path.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def start(self) -> None:
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Falha ao inicializar inotify")
+        self._stop_r, self._stop_w = os.pipe()
+        self._add_tree(self.root)
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"inotify-{self.journal.project_id}")
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread:
+            os.write(self._stop_w, b"x")
+            self._thread.join()
+            self._thread = None
+        for fd in (self._fd, self._stop_r, self._stop_w):
+            if fd >= 0:
+                os.close(fd)
+        self._fd = self._stop_r = self._stop_w = -1
+        self._wd_to_path.clear()
+        self._path_to_wd.clear()
+
+    def _run(self) -> None:
+        while True:
+            readable, _, _ = select.select([self._fd, self._stop_r], [], [])
+            if self._stop_r in readable:
+                return
+            try:
+                data = os.read(self._fd, self.READ_SIZE)
+            except BlockingIOError:
+                continue
+            self._handle(data)
+
+    def _handle(self, data: bytes) -> None:
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.journal.mark_overflow()
+                continue
+
+            parent = self._wd_to_path.get(wd)
+            if parent is None:
+                continue
+
+            if mask & IN_IGNORED:
+                self._wd_to_path.pop(wd, None)
+                if self._path_to_wd.get(parent) == wd:
+                    del self._path_to_wd[parent]
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if parent == self.root:
+                    # A raiz do projeto sumiu: o journal não é mais confiável
+                    self.journal.mark_degraded()
+                continue
+
+            if not name:
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+            rel_path = self._rel(path)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # O diretório inteiro é reescaneado, inclusive o que foi
+                    # criado antes da watch existir
+                    self.journal.mark_dir(rel_path)
+                    self._add_tree(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.journal.mark_dir(rel_path)
+                    self._forget_tree(path)
+            else:
+                self.journal.mark_file(rel_path)
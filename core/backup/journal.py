@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set
+
+
+@dataclass
+class JournalChanges:
+    """Caminhos alterados desde um instante de referência"""
+    files: Set[str] = field(default_factory=set)   # Arquivos criados/alterados/removidos
+    dirs: Set[str] = field(default_factory=set)    # Diretórios a reescanear por inteiro
+
+
+class ChangeJournal:
+    """Journal de alterações de um projeto alimentado por um watcher"""
+
+    def __init__(self, project_id: str, data_dir: str):
+        self.project_id = project_id
+        self.data_dir = os.path.realpath(data_dir)
+        self.started_at = time.time()
+        self.last_overflow_at: Optional[float] = None
+        self.degraded = False            # Watcher não consegue mais garantir o journal
+        self._files: Dict[str, float] = {}
+        self._dirs: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark_file(self, rel_path: str) -> None:
+        with self._lock:
+            self._files[rel_path] = time.time()
+
+    def mark_dir(self, rel_path: str) -> None:
+        with self._lock:
+            self._dirs[rel_path] = time.time()
+
+    def mark_overflow(self) -> None:
+        """Registra perda de eventos (fila do inotify estourou)"""
+        with self._lock:
+            self.last_overflow_at = time.time()
+
+    def mark_degraded(self) -> None:
+        with self._lock:
+            self.degraded = True
+
+    def covers(self, data_dir: str) -> bool:
+        return os.path.realpath(data_dir) == self.data_dir
+
+    def changes_since(self, timestamp: float) -> Optional[JournalChanges]:
+        """Retorna as alterações desde timestamp ou None se o journal não puder garantir"""
+        with self._lock:
+            if self.degraded or self.started_at > timestamp:
+                return None
+            if self.last_overflow_at is not None and self.last_overflow_at >= timestamp:
+                return None
+            return JournalChanges(
+                files={path for path, ts in self._files.items() if ts >= timestamp},
+                dirs={path for path, ts in self._dirs.items() if ts >= timestamp}
+            )
+
+    def prune(self, before: float) -> None:
+        """Descarta entradas anteriores a before (já cobertas por um backup completo)"""
+        with self._lock:
+            self._files = {p: ts for p, ts in self._files.items() if ts >= before}
+            self._dirs = {p: ts for p, ts in self._dirs.items() if ts >= before}
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "data_dir": self.data_dir,
+                "started_at": self.started_at,
+                "dirty_files": len(self._files),
+                "dirty_dirs": len(self._dirs),
+                "last_overflow_at": self.last_overflow_at,
+                "degraded": self.degraded
+            }
+
+
+class JournalRegistry:
+    """Journals ativos por projeto"""
+
+    def __init__(self):
+        self._journals: Dict[str, ChangeJournal] = {}
+        self._lock = threading.Lock()
+
+    def register(self, journal: ChangeJournal) -> None:
+        with self._lock:
+            self._journals[journal.project_id] = journal
+
+    def unregister(self, project_id: str) -> None:
+        with self._lock:
+            self._journals.pop(project_id, None)
+
+    def get(self, project_id: str) -> Optional[ChangeJournal]:
+        with self._lock:
+            return self._journals.get(project_id)
+
+    def all(self) -> Dict[str, ChangeJournal]:
+        with self._lock:
+            return dict(self._journals)
+
+
+# Registro compartilhado entre o WatcherService e os gerenciadores de backup
+CHANGE_JOURNALS = JournalRegistry()
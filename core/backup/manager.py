@@ -1,54 +1,664 @@
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 import json
 import os
 import shutil
-from .models import BackupMetadata, BackupType, BackupStatus, FileInfo, CompressionType, CompressionInfo
+import threading
+import time
+from .models import (BackupMetadata, BackupType, BackupStatus, FileInfo, CompressionType,
+                     CompressionInfo, BackupRules, SnapshotInfo, RestoreMode, RestoreReport,
+                     PathVersion, EnvironmentInfo, BackupDecision)
 from .validator import BackupValidator
-from .compressor import BackupCompressor
+from .compressor import BackupCompressor, StoredFile
+from .pagecache import CachePolicy, copy_file, system_page_cache_bytes
+from .metrics import STAGE_METRICS, StageRecorder
+from .journal import CHANGE_JOURNALS, JournalRegistry
+from .rules import CompiledRules, compile_rules, load_rules, save_rules, with_excludes
+from .delta import (DELTA_BLOCK_SIZE, DELTA_THRESHOLD, DeltaAborted, Signature,
+                    build_signature, encode_delta)
+from .manifest import (DELETED, MANIFEST_FILENAME, MODIFIED, Manifest, diff_manifests,
+                       iter_tree, scan_manifest)
+from .dictionary import TRAIN_MAX_FILE, DictionaryStore
+from .estimator import BackupEstimator
+from .catalog import BackupCatalog, BackupFilter, CatalogPage, files_page, iter_files
+from .differential import remove_extraneous
+from .restorer import ACTIVE_RESTORES, ParallelRestorer, backup_rules
+from .snapshot import LINKED, REFLINKED, clone_file, link_file
+from .gitrepo import (GIT_DIRNAME, count_object_files, find_repositories, git_available,
+                      pack_repository, prepare_repository, read_state, rules_without_objects,
+                      unpack_into, verify_refs)
+from .storage import RemoteBackupStore, remote_from_env
+from .volumes import VolumeSet, get_volume_set
+from .history import PathHistory
+from .environments import (ENV_CACHE_DIRNAME, GC_GRACE, EnvironmentCache, environment_excludes,
+                           find_environments)
+from .standby import WarmStandby
+from .planner import CHAIN_TYPES, BackupPlanner, ChainPolicy
 
 class BackupManager:
     """Gerenciador principal de backups"""
 
-    def __init__(self, base_dir: str):
-        self.base_dir = base_dir
-        self.validator = BackupValidator(base_dir)
-        self.compressor = BackupCompressor()
+    def __init__(self,
+                 base_dir: str,
+                 cache_policy: Optional[CachePolicy] = None,
+                 journals: Optional[JournalRegistry] = None,
+                 delta_threshold: Optional[int] = DELTA_THRESHOLD,
+                 delta_block_size: int = DELTA_BLOCK_SIZE,
+                 restore_workers: Optional[int] = None,
+                 use_dictionaries: bool = True,
+                 volumes: Optional[VolumeSet] = None,
+                 remote: Optional[RemoteBackupStore] = None,
+                 chain_policy: Optional[ChainPolicy] = None):
+        # base_dir é o volume primário; outros volumes vêm de volumes/BACKUP_VOLUMES
+        self.volumes = volumes or get_volume_set(base_dir)
+        self.base_dir = self.volumes.primary
+        self.delta_threshold = delta_threshold  # None desativa a codificação delta
+        self.delta_block_size = delta_block_size
+        self.restore_workers = restore_workers  # None: um por CPU
+        self.use_dictionaries = use_dictionaries  # Dicionários treinados por projeto (zlib)
+        self.cache_policy = cache_policy or CachePolicy()
+        self.journals = journals or CHANGE_JOURNALS
+        self.validator = BackupValidator(self.base_dir, self.cache_policy, self.project_dir)
+        self.compressor = BackupCompressor(self.cache_policy)
+        # Object store com o disco como cache write-through; BACKUP_S3_BUCKET ativa
+        self.remote = remote if remote is not None else remote_from_env()
+        # Pacotes de venvs/node_modules compartilhados entre projetos (modo ambientes)
+        self.environments = EnvironmentCache(os.path.join(self.base_dir, ENV_CACHE_DIRNAME))
+        # Réplicas quentes por projeto, atualizadas a cada backup concluído
+        self.standby = WarmStandby(self)
+        # Modo automático: escolhe o tipo pelo custo e pelo limite de restauração
+        self.planner = BackupPlanner(self, chain_policy)
+        self._catalogs: Dict[str, BackupCatalog] = {}
+        self._histories: Dict[str, PathHistory] = {}
+        self._catalogs_lock = threading.Lock()
+
+    def catalog(self, project_id: str) -> BackupCatalog:
+        """Catálogo (resumos sem a lista de arquivos) dos backups do projeto"""
+        with self._catalogs_lock:
+            project_dir = self.project_dir(project_id)
+            catalog = self._catalogs.get(project_id)
+            # Um projeto movido de volume ganha um catálogo novo
+            if catalog is None or catalog.project_dir != project_dir:
+                catalog = BackupCatalog(project_dir)
+                self._catalogs[project_id] = catalog
+            return catalog
+
+    def history(self, project_id: str) -> PathHistory:
+        """Índice de versões por caminho dos backups do projeto"""
+        with self._catalogs_lock:
+            project_dir = self.project_dir(project_id)
+            history = self._histories.get(project_id)
+            if history is None or history.project_dir != project_dir:
+                if history is not None:
+                    history.close()
+                history = PathHistory(project_dir)
+                self._histories[project_id] = history
+            return history
+
+    def _register(self, metadata: BackupMetadata) -> None:
+        """Atualiza o catálogo e o histórico de caminhos com um backup gravado"""
+        self.catalog(metadata.project_id).put(metadata)
+        self.history(metadata.project_id).add(metadata)
+
+    def _write_metadata(self, metadata: BackupMetadata, backup_dir: str) -> None:
+        """Grava metadata.json e atualiza o catálogo do projeto"""
+        with open(os.path.join(backup_dir, "metadata.json"), "w") as f:
+            f.write(metadata.json())
+        self._register(metadata)
+
+    def project_dir(self, project_id: str) -> str:
+        """Diretório do projeto no volume em que está posicionado"""
+        return self.volumes.project_dir(project_id)
 
     def _ensure_project_dir(self, project_id: str) -> str:
-        """Garante que o diretório do projeto existe"""
-        project_dir = os.path.join(self.base_dir, project_id)
+        """Garante que o diretório do projeto existe (posicionando-o num volume)"""
+        project_dir = self.volumes.project_dir(project_id, create=True)
         os.makedirs(project_dir, exist_ok=True)
         return project_dir
 
     def _generate_backup_id(self, project_id: str) -> str:
         """Gera ID único para o backup"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return f"backup_{project_id}_{timestamp}"
+        backup_id = f"backup_{project_id}_{timestamp}"
+        # Evita colisão entre backups criados no mesmo segundo
+        project_dir = self.project_dir(project_id)
+        suffix = 1
+        candidate = backup_id
+        while os.path.exists(os.path.join(project_dir, candidate)):
+            candidate = f"{backup_id}_{suffix}"
+            suffix += 1
+        return candidate
+
+    def _get_latest(self, project_id: str, *backup_types: BackupType) -> Optional[BackupMetadata]:
+        """Último backup concluído entre os tipos, montado do resumo do catálogo
+
+        Vem sem a lista de arquivos: o estado completo fica em _load_manifest.
+        """
+        filters = BackupFilter(types=[t.value for t in backup_types], statuses=[BackupStatus.COMPLETED.value])
+        page = self.catalog(project_id).page(limit=1, filters=filters)
+        if not page.items:
+            return None
+        return BackupMetadata.parse_obj(page.items[0])
 
     def _get_last_backup(self, project_id: str) -> Optional[BackupMetadata]:
         """Obtém o último backup completo do projeto"""
-        backups = self.list_backups(project_id)
-        for backup in backups:
-            if backup.type == BackupType.FULL and backup.status == BackupStatus.COMPLETED:
-                return backup
-        return None
+        return self._get_latest(project_id, BackupType.FULL)
+
+    def _parent_for(self, project_id: str, backup_type: BackupType) -> BackupMetadata:
+        """Pai de um incremental (último da cadeia) ou diferencial (último completo)"""
+        if backup_type == BackupType.INCREMENTAL:
+            parent = self._get_latest(project_id, *CHAIN_TYPES)
+        else:
+            parent = self._get_last_backup(project_id)
+        if not parent:
+            kind = "incremental" if backup_type == BackupType.INCREMENTAL else "diferencial"
+            raise ValueError(f"Nenhum backup completo encontrado para backup {kind}")
+        return parent
+
+    def _get_last_snapshot(self, project_id: str) -> Optional[BackupMetadata]:
+        """Obtém o último snapshot concluído do projeto (com os arquivos, base dos links)"""
+        snapshot = self._get_latest(project_id, BackupType.SNAPSHOT)
+        return self.get_backup_info(snapshot.id, project_id) if snapshot else None
+
+    def get_rules(self, project_id: str) -> Optional[BackupRules]:
+        """Retorna as regras de inclusão/exclusão do projeto"""
+        return load_rules(self.project_dir(project_id))
+
+    def set_rules(self, project_id: str, rules: Optional[BackupRules]) -> None:
+        """Define (ou remove) as regras de inclusão/exclusão do projeto"""
+        save_rules(self._ensure_project_dir(project_id), rules)
 
     def _copy_file(self, src: str, dest: str) -> None:
         """Copia um arquivo garantindo que o diretório de destino exista"""
         print(f"Copiando arquivo de {src} para {dest}")
         os.makedirs(os.path.dirname(dest), exist_ok=True)
-        shutil.copy2(src, dest)
+        copy_file(src, dest, self.cache_policy)
 
-    def create_backup(self, 
-                     project_id: str,
-                     backup_type: BackupType,
-                     data_dir: str,
-                     compression_type: CompressionType = CompressionType.ZLIB,
-                     compression_level: int = 6,
-                     tags: Optional[Dict[str, str]] = None,
-                     extra: Optional[Dict[str, Any]] = None) -> BackupMetadata:
-        """Cria um novo backup"""
+    def _signature_path(self, project_id: str, backup_id: str, path: str) -> str:
+        return os.path.join(self.project_dir(project_id), backup_id, "signatures", path + ".sig")
+
+    def _find_signature(self,
+                        project_id: str,
+                        parent_id: str,
+                        path: str,
+                        parents: Dict[str, Optional[str]],
+                        manifests: Dict[str, Manifest]) -> Optional[Signature]:
+        """Procura na cadeia do pai a assinatura da versão anterior de um arquivo
+
+        A versão foi gravada pelo primeiro backup, subindo a cadeia, cujo pai
+        tem outro md5 para o caminho (ou nenhum pai). parents vem do catálogo
+        e manifests guarda os manifestos já carregados entre chamadas.
+        """
+        def manifest(backup_id: str) -> Manifest:
+            if backup_id not in manifests:
+                manifests[backup_id] = self._manifest_at(project_id, backup_id)
+            return manifests[backup_id]
+
+        current = manifest(parent_id)
+        index = current.find(path)
+        if index is None:
+            return None
+        digest = current.digest(index)
+        writer = parent_id
+        seen = set()
+        while parents.get(writer) and writer not in seen:
+            seen.add(writer)
+            previous = manifest(parents[writer])
+            previous_index = previous.find(path)
+            if previous_index is None or previous.digest(previous_index) != digest:
+                break
+            writer = parents[writer]
+        sig_path = self._signature_path(project_id, writer, path)
+        if not os.path.exists(sig_path):
+            return None
+        signature = Signature.load(sig_path)
+        return signature if signature.file_size == current.sizes[index] else None
+
+    def _use_delta(self, size: int) -> bool:
+        return self.delta_threshold is not None and size >= self.delta_threshold
+
+    def dictionaries(self, project_id: str) -> DictionaryStore:
+        """Dicionários de compressão versionados do projeto"""
+        return DictionaryStore(self.project_dir(project_id))
+
+    def _project_dictionary(self,
+                            project_id: str,
+                            data_dir: str,
+                            current: Manifest,
+                            train: bool) -> Tuple[Optional[str], Optional[bytes]]:
+        """Dicionário a usar no backup; backups completos treinam uma nova versão"""
+        store = self.dictionaries(project_id)
+        dictionary_id = store.current_id()
+        if train or dictionary_id is None:
+            small = (current.path(i) for i in range(len(current))
+                     if current.sizes[i] <= TRAIN_MAX_FILE)
+            dictionary_id = store.train(data_dir, small) or dictionary_id
+        if dictionary_id is None:
+            return None, None
+        return dictionary_id, store.get(dictionary_id)
+
+    def _load_manifest(self, backup: BackupMetadata) -> Manifest:
+        """Carrega o estado completo de um backup (manifest.bin ou metadados)"""
+        return self._manifest_at(backup.project_id, backup.id)
+
+    def _manifest_at(self, project_id: str, backup_id: str) -> Manifest:
+        path = os.path.join(self.project_dir(project_id), backup_id, MANIFEST_FILENAME)
+        if os.path.exists(path):
+            return Manifest.load(path)
+        # Backups antigos, sem manifest.bin: a lista files dos metadados
+        metadata = self.get_backup_info(backup_id, project_id)
+        return Manifest.from_file_infos(metadata.files if metadata else [])
+
+    def _scan_from_journal(self,
+                           project_id: str,
+                           data_dir: str,
+                           parent: BackupMetadata,
+                           parent_manifest: Manifest,
+                           rules: Optional[CompiledRules] = None,
+                           stored_rules: Optional[BackupRules] = None) -> Optional[Manifest]:
+        """Monta o estado atual a partir do manifesto do pai e do journal de alterações
+
+        rules são as regras do scan (com ambientes e .git/objects) e
+        stored_rules as gravadas em metadata.rules. Retorna None quando não
+        há journal confiável desde a criação do pai; nesse caso o chamador
+        faz o scan completo. Arquivos alterados ficam sem checksum para
+        serem recalculados.
+        """
+        journal = self.journals.get(project_id)
+        if not journal or not journal.covers(data_dir):
+            return None
+        # Regras diferentes das do pai exigem reavaliar a árvore inteira
+        if parent.rules != stored_rules:
+            return None
+        # Ambientes ou repositórios que entraram ou saíram do walk também
+        parent_scan = backup_rules(parent)
+        if (parent_scan.rules if parent_scan else None) != (rules.rules if rules else None):
+            return None
+        changes = journal.changes_since(parent.created_at.timestamp())
+        if changes is None:
+            print(f"Journal de {project_id} incompleto, usando scan completo")
+            return None
+
+        overrides: Dict[str, Optional[Tuple[int, float]]] = {}
+
+        # Diretórios alterados: descarta o estado antigo e reescaneia
+        for rel_dir in changes.dirs:
+            abs_dir = os.path.join(data_dir, rel_dir)
+            if rules and rules.dir_pruned(rel_dir):
+                continue
+            if os.path.isdir(abs_dir):
+                for rel_path, stat in iter_tree(abs_dir, rules, prefix=rel_dir):
+                    overrides[rel_path] = (stat.st_size, stat.st_mtime)
+
+        # Arquivos alterados: atualiza stat e força novo hash
+        for rel_path in changes.files:
+            abs_path = os.path.join(data_dir, rel_path)
+            stat = os.stat(abs_path) if os.path.isfile(abs_path) else None
+            if stat and (rules is None or rules.includes_file(rel_path, stat.st_size)):
+                overrides[rel_path] = (stat.st_size, stat.st_mtime)
+            else:
+                overrides[rel_path] = None
+
+        print(f"Journal de {project_id}: {len(changes.files)} arquivos e "
+              f"{len(changes.dirs)} diretórios alterados")
+        return Manifest.merged(parent_manifest, overrides, changes.dirs)
+
+    def _create_snapshot(self,
+                         metadata: BackupMetadata,
+                         data_dir: str,
+                         backup_dir: str,
+                         rules: Optional[CompiledRules],
+                         recorder: StageRecorder) -> None:
+        """Materializa um snapshot completo reaproveitando o snapshot anterior
+
+        Arquivos com mesmo tamanho e mtime do snapshot anterior viram hardlinks
+        (estilo rsync --link-dest) e herdam o checksum; só os alterados são
+        lidos. Os dados ficam sem compressão para que os links sejam possíveis.
+        """
+        data_backup_dir = os.path.join(backup_dir, "data")
+        os.makedirs(data_backup_dir)
+        base = self._get_last_snapshot(metadata.project_id)
+        base_data_dir = os.path.join(self.project_dir(metadata.project_id), base.id, "data") if base else None
+        info = SnapshotInfo(base_snapshot_id=base.id if base else None)
+
+        with recorder.stage("scan") as span:
+            current = scan_manifest(data_dir, rules)
+            if base:
+                current.inherit_checksums(self._load_manifest(base))
+            span.add(files=len(current), bytes=current.total_size)
+
+        with recorder.stage("link") as span:
+            for index in range(len(current)):
+                path = current.path(index)
+                dest = os.path.join(data_backup_dir, path)
+                if current.checksum(index) and os.path.exists(os.path.join(base_data_dir, path)):
+                    method = link_file(os.path.join(base_data_dir, path), dest, self.cache_policy)
+                else:
+                    src = os.path.join(data_dir, path)
+                    current.set_checksum(index, self.validator.file_digest(src))
+                    method = clone_file(src, dest, self.cache_policy)
+                    span.add(bytes=current.sizes[index])
+                if method == LINKED:
+                    info.linked += 1
+                elif method == REFLINKED:
+                    info.reflinked += 1
+                else:
+                    info.copied += 1
+            span.add(files=len(current))
+
+        print(f"Snapshot {metadata.id}: {info.linked} hardlinks, "
+              f"{info.reflinked} reflinks, {info.copied} cópias")
+        # A lista de arquivos fica só no manifest.bin
+        current.save(os.path.join(backup_dir, MANIFEST_FILENAME))
+        metadata.files_manifest = True
+        metadata.files_count = len(current)
+        metadata.size_bytes = current.total_size
+        metadata.snapshot = info
+        with recorder.stage("checksum") as span:
+            metadata.checksum = self.validator.manifest_checksum(current)
+            span.add(files=metadata.files_count)
+
+    def _git_repositories(self, data_dir: str, rules: Optional[CompiledRules]) -> List[str]:
+        """Repositórios git do projeto que podem ir como packfile"""
+        if not git_available():
+            print("git não encontrado, .git/objects será copiado arquivo a arquivo")
+            return []
+        repos = []
+        for repo in find_repositories(data_dir, rules):
+            try:
+                read_state(os.path.join(data_dir, repo))
+                repos.append(repo)
+            except Exception as e:
+                # Repositório ilegível pelo git: segue pelo caminho normal
+                print(f"Repositório {repo or '.'} ignorado no modo git: {e}")
+        return repos
+
+    def _pack_repositories(self,
+                           metadata: BackupMetadata,
+                           data_dir: str,
+                           backup_dir: str,
+                           repos: List[str],
+                           last_backup: Optional[BackupMetadata]) -> None:
+        """Grava um packfile por repositório com os objetos novos desde o backup anterior"""
+        previous = {info.path: info for info in last_backup.git} if last_backup else {}
+        for n, repo in enumerate(repos):
+            repo_dir = os.path.join(data_dir, repo)
+            dest = os.path.join(backup_dir, GIT_DIRNAME, f"{n}.pack")
+            info = pack_repository(repo_dir, dest, previous.get(repo))
+            info.path = repo
+            info.object_files = count_object_files(repo_dir)
+            metadata.git.append(info)
+            print(f"Repositório {repo or '.'}: {info.objects} objetos em {info.pack_size} bytes "
+                  f"(em vez de {info.object_files} arquivos em .git/objects)")
+
+    def _restore_git(self, chain: List[BackupMetadata], restore_dir: str) -> int:
+        """Reconstrói .git/objects dos repositórios com os packs da cadeia
+
+        Retorna o número de packs indexados.
+        """
+        project_dir = self.project_dir(chain[-1].project_id)
+        unpacked = 0
+        for info in chain[-1].git:
+            repo_dir = os.path.join(restore_dir, info.path)
+            prepare_repository(repo_dir)
+            for backup in chain:
+                for packed in backup.git:
+                    if packed.path == info.path and packed.pack:
+                        unpack_into(repo_dir, os.path.join(project_dir, backup.id, GIT_DIRNAME, packed.pack),
+                                    packed.pack_sha256)
+                        unpacked += 1
+            verify_refs(repo_dir)
+        return unpacked
+
+    def _previous_environments(self, project_id: str) -> Dict[str, EnvironmentInfo]:
+        """Ambientes do backup mais recente que os tem, por caminho (base do reaproveitamento)"""
+        for entry in self.catalog(project_id).entries():
+            if entry.get("status") == BackupStatus.COMPLETED.value and entry.get("environments"):
+                return {env["path"]: EnvironmentInfo.parse_obj(env) for env in entry["environments"]}
+        return {}
+
+    def _capture_environments(self,
+                              metadata: BackupMetadata,
+                              data_dir: str,
+                              envs: List[Tuple[str, str]]) -> None:
+        """Guarda cada ambiente no cache compartilhado e registra a referência"""
+        previous = self._previous_environments(metadata.project_id)
+        for path, kind in envs:
+            info = self.environments.capture(data_dir, path, kind, previous.get(path))
+            metadata.environments.append(info)
+            print(f"Ambiente {path} ({kind}): {info.packages} pacotes, {info.files} arquivos, "
+                  f"{info.new_objects} novos no cache ({info.new_bytes} bytes)")
+
+    def _restore_environments(self,
+                              environments: List[EnvironmentInfo],
+                              restore_dir: str,
+                              differential: bool = False) -> int:
+        """Recria os ambientes a partir do cache; retorna os arquivos escritos
+
+        No modo diferencial, um ambiente idêntico no destino fica como está.
+        """
+        restored = 0
+        for info in environments:
+            if self.remote is not None and self.environments.missing(info):
+                self.remote.fetch_environment(self.environments, info)
+            dest_dir = os.path.join(restore_dir, info.path)
+            if differential and self.environments.matches(info, dest_dir):
+                print(f"Ambiente {info.path} inalterado no destino")
+                continue
+            restored += self.environments.rebuild(info, dest_dir)
+        return restored
+
+    def collect_environment_cache(self, grace: float = GC_GRACE) -> Tuple[int, int]:
+        """Remove do cache de ambientes o que nenhum backup de nenhum projeto referencia
+
+        Retorna (arquivos removidos, bytes liberados).
+        """
+        live = set()
+        for project_id in self.volumes.projects():
+            for entry in self.catalog(project_id).entries():
+                live.update(env["manifest"] for env in entry.get("environments") or [])
+        return self.environments.collect(live, grace)
+
+    def _create_checkpoint(self, metadata: BackupMetadata, backup_dir: str) -> None:
+        """Marca o último snapshot; o checkpoint o impede de ser removido pela retenção"""
+        snapshot = self._get_last_snapshot(metadata.project_id)
+        if not snapshot:
+            raise ValueError("Nenhum snapshot encontrado para o checkpoint")
+        os.makedirs(os.path.join(backup_dir, "data"))
+        metadata.parent_backup_id = snapshot.id
+        metadata.files = []
+        metadata.files_count = 0
+        metadata.size_bytes = 0
+        metadata.checksum = snapshot.checksum
+        print(f"Checkpoint {metadata.label or metadata.id} fixando snapshot {snapshot.id}")
+
+    def estimate_backup(self,
+                        project_id: str,
+                        backup_type: BackupType,
+                        data_dir: str,
+                        compression_type: CompressionType = CompressionType.ZLIB,
+                        compression_level: int = 6,
+                        tags: Optional[Dict[str, str]] = None,
+                        extra: Optional[Dict[str, Any]] = None,
+                        rules: Optional[BackupRules] = None,
+                        label: Optional[str] = None) -> BackupMetadata:
+        """Estima um backup sem gravá-lo (só stat e amostragem pelos codecs)"""
+        effective_rules = rules if rules is not None else self.get_rules(project_id)
+        compiled_rules = compile_rules(effective_rules)
+        metadata = BackupMetadata(
+            id=self._generate_backup_id(project_id),
+            project_id=project_id,
+            type=backup_type,
+            status=BackupStatus.PENDING,
+            created_at=datetime.now(),
+            tags=tags or {},
+            extra=extra or {},
+            label=label,
+            rules=compiled_rules.rules if compiled_rules else None
+        )
+
+        parent = None
+        if backup_type in (BackupType.INCREMENTAL, BackupType.DIFFERENTIAL):
+            parent = self._parent_for(project_id, backup_type)
+        elif backup_type in (BackupType.SNAPSHOT, BackupType.CHECKPOINT):
+            parent = self._get_last_snapshot(project_id)
+            if not parent and backup_type == BackupType.CHECKPOINT:
+                raise ValueError("Nenhum snapshot encontrado para o checkpoint")
+        if parent:
+            metadata.parent_backup_id = parent.id if backup_type != BackupType.SNAPSHOT else None
+
+        dictionary_id = None
+        if self.use_dictionaries and self.compressor.supports_dictionary(compression_type):
+            dictionary_id = self.dictionaries(project_id).current_id()
+        estimator = BackupEstimator(
+            self.compressor,
+            zdict=self.dictionaries(project_id).get(dictionary_id) if dictionary_id else None,
+            dictionary_id=dictionary_id
+        )
+        estimate = estimator.estimate(
+            data_dir,
+            backup_type,
+            compression_type,
+            compression_level,
+            compiled_rules,
+            self._load_manifest(parent) if parent else None
+        )
+        metadata.estimate = estimate
+        metadata.files_count = estimate.files_count
+        metadata.size_bytes = estimate.size_bytes
+        print(f"Estimativa para {project_id}: {estimate.changed_bytes} bytes em "
+              f"{estimate.changed_files} arquivos, ~{estimate.seconds.value:.1f}s "
+              f"({estimate.seconds.low:.1f}-{estimate.seconds.high:.1f}s)")
+        return metadata
+
+    def create_backup(self,
+                      project_id: str,
+                      backup_type: BackupType,
+                      data_dir: str,
+                      compression_type: CompressionType = CompressionType.ZLIB,
+                      compression_level: int = 6,
+                      tags: Optional[Dict[str, str]] = None,
+                      extra: Optional[Dict[str, Any]] = None,
+                      rules: Optional[BackupRules] = None,
+                      label: Optional[str] = None,
+                      dry_run: bool = False,
+                      git_mode: bool = False,
+                      env_mode: bool = False,
+                      max_restore_seconds: Optional[float] = None) -> BackupMetadata:
+        """Cria um novo backup
+
+        rules sobrescreve as regras persistidas do projeto para este backup.
+        SNAPSHOT ignora a compressão; CHECKPOINT só registra um marcador
+        (label) sobre o último snapshot. dry_run não grava nada e retorna os
+        metadados com a estimativa de custo em metadata.estimate. git_mode
+        grava os repositórios git (FULL/DIFFERENTIAL/INCREMENTAL) como
+        packfiles relativos ao backup anterior, em vez de copiar .git/objects
+        arquivo a arquivo. env_mode guarda venvs e node_modules como pacotes
+        no cache de ambientes compartilhado, em vez de copiá-los para data/.
+
+        AUTO escolhe FULL, DIFFERENTIAL ou INCREMENTAL pelo modelo de custo
+        do planner, mantendo a restauração prevista abaixo de
+        max_restore_seconds (ou do limite da política); a escolha fica em
+        metadata.decision.
+
+        Backups de um mesmo projeto são serializados (migrações entre volumes
+        esperam) e limitados pelos slots de I/O do dispositivo do projeto.
+        """
+        if dry_run:
+            decision = None
+            if backup_type == BackupType.AUTO:
+                decision = self._decide(project_id, data_dir, rules, max_restore_seconds)
+                backup_type = decision.chosen
+            metadata = self.estimate_backup(project_id, backup_type, data_dir, compression_type,
+                                            compression_level, tags, extra, rules, label)
+            metadata.decision = decision
+            return metadata
+        with self.volumes.project_lock(project_id):
+            # Posiciona antes de reservar o slot, para usar o dispositivo certo
+            self.volumes.place(project_id)
+            with self.volumes.io(project_id):
+                decision = None
+                if backup_type == BackupType.AUTO:
+                    # Sob o lock: a cadeia avaliada é a que recebe o backup
+                    decision = self._decide(project_id, data_dir, rules, max_restore_seconds)
+                    backup_type = decision.chosen
+                metadata = self._create_backup(project_id, backup_type, data_dir, compression_type,
+                                               compression_level, tags, extra, rules, label,
+                                               git_mode, env_mode, decision)
+            # Antes do envio: os dados ainda estão no disco
+            self.standby.update(project_id)
+            if self.remote is not None:
+                self._push(metadata)
+            return metadata
+
+    def _decide(self,
+                project_id: str,
+                data_dir: str,
+                rules: Optional[BackupRules],
+                max_restore_seconds: Optional[float]) -> BackupDecision:
+        """Resolve o modo automático para um tipo concreto"""
+        effective_rules = rules if rules is not None else self.get_rules(project_id)
+        decision = self.planner.choose(project_id, data_dir, compile_rules(effective_rules),
+                                       max_restore_seconds)
+        print(f"Modo automático em {project_id}: {decision.chosen.value} ({decision.reason})")
+        return decision
+
+    def _push(self, metadata: BackupMetadata) -> None:
+        """Envia o backup ao object store e libera o cache local (sob o lock do projeto)
+
+        Uma falha no envio não invalida o backup: ele continua só no disco e
+        não sai do cache até ser enviado.
+        """
+        project_dir = self.project_dir(metadata.project_id)
+        try:
+            # Pacotes dos ambientes antes do backup: enviado, ele é restaurável só do bucket
+            for info in metadata.environments:
+                self.remote.push_environment(self.environments, info)
+            self.remote.push(os.path.join(project_dir, metadata.id), metadata.project_id, metadata.id)
+        except Exception as e:
+            print(f"Erro ao enviar backup {metadata.id} ao object store: {e}")
+            return
+        try:
+            self.remote.evict(project_dir, metadata.project_id, self.catalog(metadata.project_id).entries())
+        except Exception as e:
+            print(f"Erro ao liberar o cache local de {metadata.project_id}: {e}")
+
+    def _hydrate_chain(self, backup_id: str, project_id: str) -> Tuple[int, int]:
+        """Baixa do object store os dados da cadeia que saíram do cache local
+
+        Retorna (backups baixados, bytes baixados).
+        """
+        hydrated = received = 0
+        current_id = backup_id
+        seen = set()
+        while current_id and current_id not in seen:
+            seen.add(current_id)
+            metadata = self.get_backup_info(current_id, project_id)
+            if metadata is None:
+                break
+            nbytes = self.remote.hydrate(os.path.join(self.project_dir(project_id), current_id),
+                                         project_id, current_id)
+            if nbytes:
+                hydrated += 1
+                received += nbytes
+            current_id = metadata.parent_backup_id
+        return hydrated, received
+
+    def _create_backup(self,
+                       project_id: str,
+                       backup_type: BackupType,
+                       data_dir: str,
+                       compression_type: CompressionType,
+                       compression_level: int,
+                       tags: Optional[Dict[str, str]],
+                       extra: Optional[Dict[str, Any]],
+                       rules: Optional[BackupRules],
+                       label: Optional[str],
+                       git_mode: bool = False,
+                       env_mode: bool = False,
+                       decision: Optional[BackupDecision] = None) -> BackupMetadata:
+        """Cria o backup sob o lock do projeto"""
+        recorder = StageRecorder("create_backup")
         try:
             # Prepara diretórios
             project_dir = self._ensure_project_dir(project_id)
@@ -65,94 +675,290 @@ class BackupManager:
                 status=BackupStatus.RUNNING,
                 created_at=datetime.now(),
                 tags=tags or {},
-                extra=extra or {}
+                extra=extra or {},
+                label=label,
+                decision=decision
             )
+            page_cache_before = system_page_cache_bytes()
+
+            # Regras efetivas, compiladas uma vez para todo o walk
+            effective_rules = rules if rules is not None else self.get_rules(project_id)
+            compiled_rules = compile_rules(effective_rules)
+            metadata.rules = compiled_rules.rules if compiled_rules else None
 
-            # Obtém informações dos arquivos atuais
-            current_files = self.validator.scan_directory(data_dir)
+            if backup_type in (BackupType.SNAPSHOT, BackupType.CHECKPOINT):
+                if backup_type == BackupType.SNAPSHOT:
+                    self._create_snapshot(metadata, data_dir, backup_dir, compiled_rules, recorder)
+                else:
+                    self._create_checkpoint(metadata, backup_dir)
+                metadata.status = BackupStatus.COMPLETED
+                metadata.completed_at = datetime.now()
+                with recorder.stage("metadata") as span:
+                    metadata.stages = recorder.timings()
+                    self._write_metadata(metadata, backup_dir)
+                    span.add(files=1)
+                metadata.stages = recorder.timings()
+                STAGE_METRICS.record("create_backup", metadata.stages)
+                return metadata
 
-            # Se for incremental, precisa do backup anterior
-            if backup_type == BackupType.INCREMENTAL:
-                last_backup = self._get_last_backup(project_id)
-                if not last_backup:
-                    raise ValueError("Nenhum backup completo encontrado para backup incremental")
-                
+            # Incremental e diferencial gravam só o que mudou desde o pai
+            last_backup = None
+            if backup_type in (BackupType.INCREMENTAL, BackupType.DIFFERENTIAL):
+                last_backup = self._parent_for(project_id, backup_type)
                 metadata.parent_backup_id = last_backup.id
-                last_files = {f.path: f for f in last_backup.files}
-
-                # Identifica arquivos modificados/novos/deletados
-                modified_files = []
-                for path, file_info in current_files.items():
-                    last_file = last_files.get(path)
-                    if not last_file or last_file.checksum != file_info.checksum:
-                        modified_files.append(file_info)
-
-                # Identifica arquivos deletados
-                for path, last_file in last_files.items():
-                    if path not in current_files:
-                        modified_files.append(FileInfo(
-                            path=path,
-                            size=last_file.size,
-                            modified_at=datetime.now(),
-                            checksum=last_file.checksum,
-                            is_deleted=True
-                        ))
-
-                # Copia apenas arquivos modificados
-                for file_info in modified_files:
-                    if not file_info.is_deleted:
+
+            # Modo ambientes: venvs e node_modules saem do walk e vão para o cache
+            scan_base = effective_rules
+            scan_rules = compiled_rules
+            envs: List[Tuple[str, str]] = []
+            if env_mode:
+                with recorder.stage("env_detect") as span:
+                    envs = find_environments(data_dir, compiled_rules)
+                    if envs:
+                        scan_base = with_excludes(effective_rules, environment_excludes(envs))
+                        scan_rules = compile_rules(scan_base)
+                    span.add(files=len(envs))
+
+            # Modo git: .git/objects dos repositórios sai do walk e vira packfile
+            repos: List[str] = []
+            if git_mode:
+                with recorder.stage("git_detect") as span:
+                    repos = self._git_repositories(data_dir, scan_rules)
+                    scan_rules = rules_without_objects(scan_base, repos)
+                    span.add(files=len(repos))
+
+            # Obtém informações dos arquivos atuais (só stat, em manifesto compacto)
+            with recorder.stage("scan") as span:
+                current = None
+                if last_backup:
+                    parent_manifest = self._load_manifest(last_backup)
+                    # Com journal ativo, escaneia apenas os caminhos alterados
+                    current = self._scan_from_journal(
+                        project_id, data_dir, last_backup, parent_manifest, scan_rules, metadata.rules)
+                if current is None:
+                    current = scan_manifest(data_dir, scan_rules)
+                    if last_backup:
+                        # Stat igual ao do pai: herda o checksum e não é relido
+                        current.inherit_checksums(parent_manifest)
+                span.add(files=len(current), bytes=current.total_size)
+
+            # O dicionário é escolhido antes da leitura, para que cada arquivo
+            # seja comprimido na mesma passada que calcula o hash
+            compress = compression_type != CompressionType.NONE
+            dictionary_id = zdict = None
+            if compress and self.use_dictionaries and self.compressor.supports_dictionary(compression_type):
+                with recorder.stage("dictionary") as span:
+                    dictionary_id, zdict = self._project_dictionary(
+                        project_id, data_dir, current, train=backup_type == BackupType.FULL)
+                    span.add(files=1 if zdict else 0, bytes=len(zdict or b""))
+            if compress:
+                metadata.status = BackupStatus.COMPRESSING
+            os.makedirs(data_backup_dir, exist_ok=True)
+
+            stored: Dict[str, StoredFile] = {}  # Caminho no projeto -> arquivo gravado
+            stored_deltas: List[StoredFile] = []
+            signatures: Dict[str, Signature] = {}
+
+            def store(path: str, with_signature: bool) -> StoredFile:
+                result = self.compressor.store_file(
+                    os.path.join(data_dir, path), os.path.join(data_backup_dir, path),
+                    compression_type, compression_level, zdict, dictionary_id,
+                    self.delta_block_size if with_signature else None)
+                stored[path] = result
+                if result.signature is not None:
+                    signatures[path] = result.signature
+                return result
+
+            # Leitura única por arquivo: md5, assinatura, compressão e gravação
+            # saem do mesmo buffer. Num incremental, arquivos com stat alterado
+            # são gravados de forma especulativa e descartados se o hash mostrar
+            # que não mudaram; só os grandes já presentes no pai (candidatos a
+            # delta) são apenas hasheados aqui.
+            with recorder.stage("store") as span:
+                read_files = 0
+                read_bytes = 0
+                parent_paths = None
+                for index in current.unhashed():
+                    path = current.path(index)
+                    size = current.sizes[index]
+                    large = self._use_delta(size)
+                    read_files += 1
+                    read_bytes += size
+                    if large and last_backup:
+                        if parent_paths is None:
+                            parent_paths = {parent_manifest.path(i) for i in range(len(parent_manifest))}
+                        if path in parent_paths:
+                            signatures[path], checksum = build_signature(
+                                os.path.join(data_dir, path), self.delta_block_size, self.cache_policy)
+                            current.set_checksum(index, checksum)
+                            continue
+                    current.set_checksum(index, store(path, large).checksum)
+                span.add(files=read_files, bytes=read_bytes)
+
+            if last_backup:
+                with recorder.stage("diff") as span:
+                    # Merge-join dos manifestos ordenados: só as alterações viram FileInfo
+                    modified_files = []
+                    delta_candidates = set()
+                    for kind, old_index, new_index in diff_manifests(parent_manifest, current):
+                        if kind == DELETED:
+                            modified_files.append(FileInfo(
+                                path=parent_manifest.path(old_index),
+                                size=parent_manifest.sizes[old_index],
+                                modified_at=datetime.now(),
+                                checksum=parent_manifest.checksum(old_index),
+                                is_deleted=True
+                            ))
+                        else:
+                            file_info = current.entry(new_index).to_file_info()
+                            if kind == MODIFIED:
+                                delta_candidates.add(file_info.path)
+                            modified_files.append(file_info)
+                    span.add(files=len(current) + len(parent_manifest))
+
+                # Arquivos grandes com versão anterior viram delta por blocos
+                with recorder.stage("delta") as span:
+                    delta_files = 0
+                    delta_bytes = 0
+                    parents: Dict[str, Optional[str]] = {}
+                    manifests = {last_backup.id: parent_manifest}
+                    for file_info in modified_files:
+                        if file_info.path not in delta_candidates or not self._use_delta(file_info.size):
+                            continue
+                        if not parents:
+                            parents = {entry["id"]: entry.get("parent_backup_id")
+                                       for entry in self.catalog(project_id).entries()}
+                        signature = self._find_signature(project_id, last_backup.id, file_info.path,
+                                                         parents, manifests)
+                        if signature is None:
+                            continue
                         src = os.path.join(data_dir, file_info.path)
-                        dest = os.path.join(data_backup_dir, file_info.path)
-                        self._copy_file(src, dest)
+                        dest = os.path.join(data_backup_dir, file_info.path) + ".delta"
+                        os.makedirs(os.path.dirname(dest), exist_ok=True)
+                        try:
+                            result = encode_delta(src, signature, dest,
+                                                  file_info.checksum, self.cache_policy)
+                        except DeltaAborted:
+                            print(f"Delta de {file_info.path} não compensa, copiando inteiro")
+                            continue
+                        print(f"Delta de {file_info.path}: {result.literal_bytes} bytes "
+                              f"novos, {result.copied_bytes} reaproveitados")
+                        if compress:
+                            # O delta é pequeno: comprimi-lo relê só a saída, não a origem
+                            stored_deltas.append(self.compressor.store_file(
+                                dest, dest, compression_type, compression_level))
+                            os.remove(dest)
+                        file_info.delta = True
+                        delta_files += 1
+                        delta_bytes += file_info.size
+                    span.add(files=delta_files, bytes=delta_bytes)
+
+                # Grava os modificados que não viraram delta e descarta as
+                # gravações especulativas de arquivos que não mudaram
+                with recorder.stage("store") as span:
+                    keep = set()
+                    stored_files = 0
+                    stored_bytes = 0
+                    for file_info in modified_files:
+                        if file_info.is_deleted or file_info.delta:
+                            continue
+                        keep.add(file_info.path)
+                        if file_info.path not in stored:
+                            store(file_info.path, False)
+                            stored_files += 1
+                            stored_bytes += file_info.size
+                    discarded = [path for path in stored if path not in keep]
+                    remove_extraneous(data_backup_dir, [
+                        os.path.relpath(stored.pop(path).path, data_backup_dir) for path in discarded
+                    ])
+                    span.add(files=stored_files, bytes=stored_bytes)
 
                 metadata.files = modified_files
 
-            else:  # Backup completo
-                # Copia todos os arquivos
-                os.makedirs(data_backup_dir)
-                for path, file_info in current_files.items():
-                    src = os.path.join(data_dir, path)
-                    dest = os.path.join(data_backup_dir, path)
-                    self._copy_file(src, dest)
-                metadata.files = list(current_files.values())
+            else:  # Backup completo: todos os arquivos já foram gravados
+                # A lista fica só no manifest.bin, sem um FileInfo por arquivo
+                metadata.files_manifest = True
+
+            # Packs depois da árvore: as refs gravadas acima só apontam para
+            # objetos que já existiam, e o pack inclui tudo o que existe agora
+            if repos:
+                with recorder.stage("git_pack") as span:
+                    self._pack_repositories(metadata, data_dir, backup_dir, repos, last_backup)
+                    span.add(files=sum(r.objects for r in metadata.git),
+                             bytes=sum(r.pack_size for r in metadata.git))
+
+            if envs:
+                with recorder.stage("env_capture") as span:
+                    self._capture_environments(metadata, data_dir, envs)
+                    span.add(files=sum(e.files for e in metadata.environments),
+                             bytes=sum(e.new_bytes for e in metadata.environments))
+
+            # Estado completo do backup, base compacta para o próximo diff
+            current.save(os.path.join(backup_dir, MANIFEST_FILENAME))
+
+            # Assinaturas dos arquivos grandes armazenados, base do próximo delta
+            if metadata.files_manifest:
+                kept = list(signatures)
+            else:
+                kept = [f.path for f in metadata.files if not f.is_deleted]
+            for path in kept:
+                signature = signatures.get(path)
+                if signature is not None:
+                    signature.save(self._signature_path(project_id, backup_id, path))
 
             # Atualiza metadados iniciais
-            size = sum(f.size for f in metadata.files if not f.is_deleted)
-            metadata.size_bytes = size
-            metadata.files_count = len([f for f in metadata.files if not f.is_deleted])
+            if metadata.files_manifest:
+                metadata.size_bytes = current.total_size
+                metadata.files_count = len(current)
+            else:
+                metadata.size_bytes = sum(f.size for f in metadata.files if not f.is_deleted)
+                metadata.files_count = len([f for f in metadata.files if not f.is_deleted])
 
-            # Comprime os arquivos se necessário
-            if compression_type != CompressionType.NONE:
-                metadata.status = BackupStatus.COMPRESSING
-                compressed_dir = os.path.join(backup_dir, "compressed_data")
-                compression_info = self.compressor.compress_directory(
-                    data_backup_dir,
-                    compressed_dir,
-                    compression_type,
-                    compression_level
+            # Compressão total derivada dos resultados por arquivo
+            results = list(stored.values()) + stored_deltas
+            if compress and results:
+                original_size = sum(r.compression.original_size for r in results)
+                compressed_size = sum(r.compression.compressed_size for r in results)
+                metadata.compression = CompressionInfo(
+                    type=compression_type,
+                    original_size=original_size,
+                    compressed_size=compressed_size,
+                    ratio=original_size / compressed_size if compressed_size > 0 else 1.0,
+                    level=compression_level,
+                    dictionary_id=dictionary_id if zdict else None
                 )
+                for file in metadata.files:
+                    if not file.is_deleted:
+                        file.compressed = True
 
-                if compression_info:
-                    # Remove diretório não comprimido
-                    shutil.rmtree(data_backup_dir)
-                    # Renomeia diretório comprimido
-                    os.rename(compressed_dir, data_backup_dir)
-                    # Atualiza metadados
-                    metadata.compression = compression_info
-                    # Marca arquivos como comprimidos
-                    for file in metadata.files:
-                        if not file.is_deleted:
-                            file.compressed = True
-
-            # Finaliza metadados
-            metadata.checksum = self.validator.calculate_checksum(data_backup_dir)
+            # Finaliza metadados: o sha256 de cada arquivo veio da gravação
+            with recorder.stage("checksum") as span:
+                known = {os.path.relpath(r.path, data_backup_dir): r.stored_digest for r in results}
+                metadata.checksum = self.validator.calculate_checksum(data_backup_dir, known)
+                span.add(files=len(known))
             metadata.status = BackupStatus.COMPLETED
             metadata.completed_at = datetime.now()
+            page_cache_after = system_page_cache_bytes()
+            if page_cache_before is not None and page_cache_after is not None:
+                metadata.page_cache = {
+                    "before": page_cache_before,
+                    "after": page_cache_after
+                }
 
             # Salva metadados
-            with open(os.path.join(backup_dir, "metadata.json"), "w") as f:
-                f.write(metadata.json())
+            with recorder.stage("metadata") as span:
+                metadata.stages = recorder.timings()
+                self._write_metadata(metadata, backup_dir)
+                span.add(files=1)
+
+            # Inclui a etapa de metadados no registro final
+            metadata.stages = recorder.timings()
+            STAGE_METRICS.record("create_backup", metadata.stages)
 
+            # Alterações anteriores a um backup completo não serão mais consultadas
+            journal = self.journals.get(project_id)
+            if backup_type == BackupType.FULL and journal and journal.covers(data_dir):
+                journal.prune(metadata.created_at.timestamp())
             return metadata
 
         except Exception as e:
@@ -163,74 +969,90 @@ class BackupManager:
             metadata.error_message = str(e)
             raise
 
-    def restore_backup(self, backup_id: str, project_id: str, restore_dir: str) -> bool:
-        """Restaura um backup"""
-        temp_dir = None
-        try:
-            print(f"Iniciando restauração do backup {backup_id} do projeto {project_id}")
-            # Valida backup
-            is_valid, error = self.validator.validate_restore_point(backup_id, project_id)
+    def _resolve_chain(self, backup_id: str, project_id: str) -> List[BackupMetadata]:
+        """Valida e retorna a cadeia de um backup, do backup base até ele"""
+        chain = []
+        current_id = backup_id
+        while current_id:
+            is_valid, error = self.validator.validate_restore_point(current_id, project_id)
             if not is_valid:
-                print(f"Backup inválido: {error}")
-                raise ValueError(f"Backup inválido: {error}")
-
-            # Carrega metadados
-            backup_dir = os.path.join(self.base_dir, project_id, backup_id)
-            print(f"Diretório do backup: {backup_dir}")
-            with open(os.path.join(backup_dir, "metadata.json"), "r") as f:
-                metadata = BackupMetadata.parse_raw(f.read())
-
-            # Se for incremental, precisa restaurar a cadeia completa
-            if metadata.parent_backup_id:
-                print(f"Restaurando backup pai: {metadata.parent_backup_id}")
-                # Primeiro restaura o pai
-                self.restore_backup(metadata.parent_backup_id, project_id, restore_dir)
-
-            # Aplica as alterações deste backup
-            data_dir = os.path.join(backup_dir, "data")
-            temp_dir = os.path.join(backup_dir, "temp_restore")
-            os.makedirs(temp_dir, exist_ok=True)
-
-            # Se os arquivos estão comprimidos, descomprime primeiro
-            if metadata.compression:
-                print(f"Descomprimindo arquivos usando {metadata.compression.type}")
-                success, error = self.compressor.decompress_directory(
-                    data_dir, temp_dir)
-                if not success:
-                    print(f"Erro ao descomprimir: {error}")
-                    raise ValueError(f"Erro ao descomprimir: {error}")
-                data_dir = temp_dir
-
-            # Aplica as alterações
-            for file_info in metadata.files:
-                dest_path = os.path.join(restore_dir, file_info.path)
-                if file_info.is_deleted:
-                    print(f"Removendo arquivo {dest_path}")
-                    # Remove arquivo se foi deletado
-                    if os.path.exists(dest_path):
-                        os.remove(dest_path)
-                else:
-                    # Copia arquivo novo/modificado
-                    src_path = os.path.join(data_dir, file_info.path)
-                    print(f"Restaurando arquivo {src_path} para {dest_path}")
-                    self._copy_file(src_path, dest_path)
+                raise ValueError(f"Backup inválido ({current_id}): {error}")
+            metadata = self.get_backup_info(current_id, project_id)
+            if any(b.id == metadata.id for b in chain):
+                raise ValueError(f"Cadeia de backups circular em {current_id}")
+            chain.append(metadata)
+            current_id = metadata.parent_backup_id
+        chain.reverse()
+        return chain
 
-            # Limpa diretório temporário
-            if temp_dir and os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+    def restore_backup(self,
+                       backup_id: str,
+                       project_id: str,
+                       restore_dir: str,
+                       mode: RestoreMode = RestoreMode.FULL) -> bool:
+        """Restaura um backup"""
+        return self.restore_backup_report(backup_id, project_id, restore_dir, mode=mode).success
 
-            print("Restauração concluída com sucesso")
-            return True
+    def restore_backup_report(self,
+                              backup_id: str,
+                              project_id: str,
+                              restore_dir: str,
+                              workers: Optional[int] = None,
+                              mode: RestoreMode = RestoreMode.FULL,
+                              dry_run: bool = False) -> RestoreReport:
+        """Restaura um backup e sua cadeia em paralelo, verificando cada arquivo
 
+        O estado final de cada caminho é resolvido antes da escrita, então
+        cada arquivo é escrito uma única vez (mais os deltas sobre ele). No
+        modo diferencial só o que difere do destino é escrito ou removido;
+        dry_run retorna o plano sem alterar o destino.
+        """
+        recorder = StageRecorder("restore_backup")
+        report = RestoreReport(backup_id=backup_id, project_id=project_id,
+                               restore_dir=restore_dir, mode=mode, dry_run=dry_run)
+        started = time.perf_counter()
+        try:
+            print(f"Iniciando restauração do backup {backup_id} do projeto {project_id}")
+            # O lock impede que o projeto mude de volume durante a leitura
+            with self.volumes.project_lock(project_id), self.volumes.io(project_id):
+                if self.remote is not None:
+                    with recorder.stage("hydrate") as span:
+                        hydrated, received = self._hydrate_chain(backup_id, project_id)
+                        span.add(files=hydrated, bytes=received)
+                with recorder.stage("validate") as span:
+                    chain = self._resolve_chain(backup_id, project_id)
+                    span.add(files=len(chain))
+                restorer = ParallelRestorer(self.compressor, self.cache_policy,
+                                            workers or self.restore_workers)
+                with ACTIVE_RESTORES.hold(project_id, [b.id for b in chain]):
+                    restorer.restore(chain, self.volumes.root_for(project_id), restore_dir,
+                                     report, recorder)
+                    if chain[-1].git and report.success and not report.dry_run:
+                        with recorder.stage("git_unpack") as span:
+                            span.add(files=self._restore_git(chain, restore_dir))
+                    if chain[-1].environments and report.success and not report.dry_run:
+                        with recorder.stage("env_rebuild") as span:
+                            span.add(files=self._restore_environments(
+                                chain[-1].environments, restore_dir, mode == RestoreMode.DIFFERENTIAL))
+            if report.dry_run:
+                print(f"Dry-run da restauração: {len(report.plan.changes)} alterações planejadas")
+            elif report.success:
+                STAGE_METRICS.record("restore_backup", recorder.timings())
+                print(f"Restauração concluída com sucesso: {report.files_restored} arquivos "
+                      f"verificados com {report.workers} workers")
+            else:
+                report.error = f"{report.files_failed} arquivos com falha na verificação"
+                print(f"Erro ao restaurar backup: {report.error}")
         except Exception as e:
             print(f"Erro ao restaurar backup: {e}")
-            if temp_dir and os.path.exists(temp_dir):
-                print(f"Mantendo diretório temporário para debug: {temp_dir}")
-            return False
+            report.success = False
+            report.error = str(e)
+        report.seconds = time.perf_counter() - started
+        return report
 
     def list_backups(self, project_id: str) -> List[BackupMetadata]:
         """Lista todos os backups de um projeto"""
-        project_dir = os.path.join(self.base_dir, project_id)
+        project_dir = self.project_dir(project_id)
         if not os.path.exists(project_dir):
             return []
 
@@ -244,29 +1066,147 @@ class BackupManager:
 
         return sorted(backups, key=lambda x: x.created_at, reverse=True)
 
+    def list_backups_page(self,
+                          project_id: str,
+                          limit: int = 50,
+                          cursor: Optional[str] = None,
+                          filters: Optional[BackupFilter] = None,
+                          fields: Optional[List[str]] = None) -> CatalogPage:
+        """Lista uma página de backups pelo catálogo, sem a lista de arquivos
+
+        "files" em fields inclui a lista completa, lida do metadata.json (ou
+        do manifest.bin) de cada item da página.
+        """
+        with_files = bool(fields) and "files" in fields
+        page = self.catalog(project_id).page(
+            limit, cursor, filters, list(fields) + ["id"] if with_files else fields)
+        if with_files:
+            for item in page.items:
+                meta_path = os.path.join(self.project_dir(project_id), item["id"], "metadata.json")
+                item["files"] = [file_info for _, file_info in iter_files(meta_path)]
+                if "id" not in fields:
+                    del item["id"]
+        return page
+
+    def list_backup_files(self,
+                          backup_id: str,
+                          project_id: str,
+                          limit: int = 1000,
+                          cursor: Optional[str] = None,
+                          prefix: Optional[str] = None) -> Optional[CatalogPage]:
+        """Lista uma página dos arquivos de um backup (None se não existir)"""
+        meta_path = os.path.join(self.project_dir(project_id), backup_id, "metadata.json")
+        if not os.path.exists(meta_path):
+            return None
+        return files_page(meta_path, limit, cursor, prefix)
+
     def get_backup_info(self, backup_id: str, project_id: str) -> Optional[BackupMetadata]:
         """Obtém informações de um backup específico"""
-        meta_path = os.path.join(self.base_dir, project_id, backup_id, "metadata.json")
+        meta_path = os.path.join(self.project_dir(project_id), backup_id, "metadata.json")
         if not os.path.exists(meta_path):
             return None
 
         with open(meta_path, "r") as f:
             return BackupMetadata.parse_raw(f.read())
 
+    def path_history(self,
+                     project_id: str,
+                     path: str,
+                     since: Optional[datetime] = None,
+                     until: Optional[datetime] = None,
+                     limit: int = 100,
+                     distinct: bool = False) -> List[PathVersion]:
+        """Versões de um caminho nos backups do projeto, da mais recente à mais antiga"""
+        history = self.history(project_id)
+        history.sync(self.catalog(project_id).entries(),
+                     lambda backup_id: self.get_backup_info(backup_id, project_id))
+        return history.versions(path.replace(os.sep, "/").strip("/"), since, until, limit, distinct)
+
+    def open_version(self,
+                     backup_id: str,
+                     project_id: str,
+                     path: str,
+                     byte_range: Optional[Tuple[int, int]] = None) -> Optional[Tuple[FileInfo, Iterator[bytes]]]:
+        """Conteúdo de um arquivo como estava num backup (None se o backup não o tem)
+
+        Só o caminho pedido é resolvido na cadeia; byte_range limita a leitura
+        à faixa [início, fim]. A leitura fica registrada em ACTIVE_RESTORES
+        até o iterador terminar, como uma restauração.
+        """
+        path = path.replace(os.sep, "/").strip("/")
+        with self.volumes.project_lock(project_id):
+            if self.remote is not None:
+                self._hydrate_chain(backup_id, project_id)
+            chain: List[BackupMetadata] = []
+            current_id = backup_id
+            while current_id:
+                metadata = self.get_backup_info(current_id, project_id)
+                if metadata is None:
+                    raise ValueError(f"Backup não encontrado: {current_id}")
+                if any(b.id == metadata.id for b in chain):
+                    raise ValueError(f"Cadeia de backups circular em {current_id}")
+                chain.append(metadata)
+                current_id = metadata.parent_backup_id
+            chain.reverse()
+            restorer = ParallelRestorer(self.compressor, self.cache_policy, 1)
+            files, _ = restorer.plan(chain, self.volumes.root_for(project_id), {path})
+            steps = files.get(path)
+            if not steps:
+                return None
+
+            def stream() -> Iterator[bytes]:
+                with ACTIVE_RESTORES.hold(project_id, [b.id for b in chain]):
+                    yield b""
+                    yield from restorer.iter_version(path, steps, byte_range)
+
+            chunks = stream()
+            next(chunks)  # Registra a leitura antes de soltar o lock
+        return steps[-1].file_info, chunks
+
+    def apply_retention(self, project_id: str, keep_last: int) -> List[str]:
+        """Remove snapshots além dos keep_last mais recentes
+
+        Snapshots fixados por um checkpoint (ou base de outro backup) são mantidos.
+        Retorna os IDs removidos.
+        """
+        backups = self.catalog(project_id).entries()
+        pinned = {b["parent_backup_id"] for b in backups if b.get("parent_backup_id")}
+        snapshots = [b["id"] for b in backups if b.get("type") == BackupType.SNAPSHOT.value]
+        removed = []
+        for snapshot_id in snapshots[keep_last:]:
+            if snapshot_id in pinned:
+                print(f"Snapshot {snapshot_id} fixado, mantido pela retenção")
+                continue
+            if self.delete_backup(snapshot_id, project_id):
+                removed.append(snapshot_id)
+        print(f"Retenção de {project_id}: {len(removed)} snapshots removidos")
+        if os.path.isdir(self.environments.root):
+            try:
+                self.collect_environment_cache()
+            except Exception as e:
+                print(f"Erro ao limpar o cache de ambientes: {e}")
+        return removed
+
     def delete_backup(self, backup_id: str, project_id: str) -> bool:
         """Remove um backup"""
         try:
-            # Verifica se tem backups incrementais dependentes
-            backups = self.list_backups(project_id)
-            for backup in backups:
-                if backup.parent_backup_id == backup_id:
-                    raise ValueError("Não é possível remover backup com dependentes")
+            with self.volumes.project_lock(project_id):
+                # Verifica se tem backups incrementais dependentes
+                catalog = self.catalog(project_id)
+                for backup in catalog.entries():
+                    if backup.get("parent_backup_id") == backup_id:
+                        raise ValueError("Não é possível remover backup com dependentes")
 
-            backup_dir = os.path.join(self.base_dir, project_id, backup_id)
-            if os.path.exists(backup_dir):
-                shutil.rmtree(backup_dir)
-                return True
-            return False
+                backup_dir = os.path.join(self.project_dir(project_id), backup_id)
+                if os.path.exists(backup_dir):
+                    pushed = self.remote is not None and self.remote.pushed(backup_dir)
+                    shutil.rmtree(backup_dir)
+                    catalog.remove(backup_id)
+                    self.history(project_id).remove(backup_id)
+                    if pushed:
+                        self.remote.delete(project_id, backup_id)
+                    return True
+                return False
         except Exception as e:
             print(f"Erro ao deletar backup: {e}")
             return False
@@ -0,0 +1,378 @@
+import os
+import struct
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from .models import BackupMetadata, FileInfo
+from .rules import CompiledRules
+
+MANIFEST_FILENAME = "manifest.bin"
+DIGEST_SIZE = 16             # md5 em binário
+_EMPTY_DIGEST = bytes(DIGEST_SIZE)
+_MAGIC = b"NXMANIFEST1\n"
+_HEADER = struct.Struct("<QQ")  # diretórios, arquivos
+
+# Tipos de alteração produzidos por diff_manifests
+ADDED = "added"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+DirKey = Tuple[Tuple[int, str], ...]
+
+
+def _dir_key(rel_dir: str) -> DirKey:
+    return tuple((1, part) for part in rel_dir.split("/")) if rel_dir else ()
+
+
+def path_key(path: str) -> DirKey:
+    """Chave de ordenação do manifesto: arquivos de um diretório antes dos subdiretórios
+
+    É a mesma ordem produzida por iter_tree, o que permite o diff por merge-join.
+    """
+    rel_dir, _, name = path.rpartition("/")
+    return _dir_key(rel_dir) + ((0, name),)
+
+
+class ManifestEntry:
+    """Visão leve de uma entrada do manifesto
+
+    Tem os campos de FileInfo lidos pela restauração e pelo histórico, então
+    serve no lugar dele sem criar um objeto pydantic por arquivo.
+    """
+    __slots__ = ("index", "path", "size", "mtime", "checksum", "compressed")
+    is_deleted = False
+    delta = False
+
+    def __init__(self, index: int, path: str, size: int, mtime: float, checksum: str,
+                 compressed: bool = False):
+        self.index = index
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.checksum = checksum
+        self.compressed = compressed
+
+    @property
+    def modified_at(self) -> datetime:
+        # Como o FileInfo, que recebe o mtime como timestamp
+        return datetime.fromtimestamp(self.mtime, timezone.utc)
+
+    def to_file_info(self) -> FileInfo:
+        return FileInfo(path=self.path, size=self.size,
+                        modified_at=self.mtime, checksum=self.checksum)
+
+
+class Manifest:
+    """Estado de uma árvore em colunas compactas
+
+    Diretórios são internados (cada um guardado uma vez), tamanhos e mtimes
+    ficam em arrays tipados e os md5 em um bytearray de largura fixa. Um
+    arquivo custa ~100 bytes em vez de um FileInfo e a entrada de dict.
+    As entradas ficam na ordem de path_key.
+    """
+    __slots__ = ("_dirs", "_dir_ids", "_dir_keys", "dir_index", "names",
+                 "sizes", "mtimes", "digests")
+
+    def __init__(self):
+        self._dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        self._dir_keys: List[DirKey] = []
+        self.dir_index = array("I")
+        self.names: List[str] = []
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.digests = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _intern_dir(self, rel_dir: str) -> int:
+        dir_id = self._dir_ids.get(rel_dir)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dirs.append(rel_dir)
+            self._dir_ids[rel_dir] = dir_id
+            self._dir_keys.append(_dir_key(rel_dir))
+        return dir_id
+
+    def append(self, path: str, size: int, mtime: float, digest: bytes = _EMPTY_DIGEST) -> int:
+        rel_dir, _, name = path.rpartition("/")
+        self.dir_index.append(self._intern_dir(rel_dir))
+        self.names.append(name)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.digests += digest
+        return len(self.names) - 1
+
+    def path(self, index: int) -> str:
+        rel_dir = self._dirs[self.dir_index[index]]
+        name = self.names[index]
+        return f"{rel_dir}/{name}" if rel_dir else name
+
+    def sort_key(self, index: int) -> DirKey:
+        return self._dir_keys[self.dir_index[index]] + ((0, self.names[index]),)
+
+    def find(self, path: str) -> Optional[int]:
+        """Índice de um caminho por busca binária na ordem de path_key"""
+        key = path_key(path)
+        low, high = 0, len(self.names)
+        while low < high:
+            middle = (low + high) // 2
+            if self.sort_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.names) and self.sort_key(low) == key:
+            return low
+        return None
+
+    def digest(self, index: int) -> bytes:
+        start = index * DIGEST_SIZE
+        return bytes(self.digests[start:start + DIGEST_SIZE])
+
+    def checksum(self, index: int) -> str:
+        digest = self.digest(index)
+        return "" if digest == _EMPTY_DIGEST else digest.hex()
+
+    def set_checksum(self, index: int, checksum: str) -> None:
+        start = index * DIGEST_SIZE
+        self.digests[start:start + DIGEST_SIZE] = bytes.fromhex(checksum)
+
+    def entry(self, index: int) -> ManifestEntry:
+        return ManifestEntry(index, self.path(index), self.sizes[index],
+                             self.mtimes[index], self.checksum(index))
+
+    def __iter__(self) -> Iterator[ManifestEntry]:
+        for index in range(len(self.names)):
+            yield self.entry(index)
+
+    def unhashed(self) -> Iterator[int]:
+        """Índices das entradas ainda sem checksum"""
+        view = memoryview(self.digests)
+        for index in range(len(self.names)):
+            start = index * DIGEST_SIZE
+            if view[start:start + DIGEST_SIZE] == _EMPTY_DIGEST:
+                yield index
+
+    def inherit_checksums(self, parent: "Manifest") -> int:
+        """Copia o checksum do pai para entradas com mesmo tamanho e mtime (merge-join)
+
+        Retorna quantas entradas herdaram; as demais seguem sem checksum.
+        """
+        inherited = 0
+        i = j = 0
+        while i < len(parent) and j < len(self):
+            parent_key = parent.sort_key(i)
+            key = self.sort_key(j)
+            if parent_key == key:
+                if (parent.sizes[i] == self.sizes[j] and parent.mtimes[i] == self.mtimes[j]
+                        and parent.checksum(i)):
+                    start = j * DIGEST_SIZE
+                    self.digests[start:start + DIGEST_SIZE] = parent.digest(i)
+                    inherited += 1
+                i += 1
+                j += 1
+            elif parent_key < key:
+                i += 1
+            else:
+                j += 1
+        return inherited
+
+    @property
+    def total_size(self) -> int:
+        return sum(self.sizes)
+
+    def file_infos(self) -> Iterator[FileInfo]:
+        for entry in self:
+            yield entry.to_file_info()
+
+    @classmethod
+    def from_file_infos(cls, files: Iterable[FileInfo]) -> "Manifest":
+        """Monta um manifesto a partir de metadados antigos (ordena se preciso)"""
+        live = [f for f in files if not f.is_deleted]
+        if any(path_key(a.path) > path_key(b.path) for a, b in zip(live, live[1:])):
+            live.sort(key=lambda f: path_key(f.path))
+        manifest = cls()
+        for file_info in live:
+            manifest.append(
+                file_info.path,
+                file_info.size,
+                file_info.modified_at.timestamp(),
+                bytes.fromhex(file_info.checksum) if file_info.checksum else _EMPTY_DIGEST
+            )
+        return manifest
+
+    @classmethod
+    def merged(cls,
+               base: "Manifest",
+               overrides: Dict[str, Optional[Tuple[int, float]]],
+               dropped_dirs: Iterable[str] = ()) -> "Manifest":
+        """Aplica alterações pontuais sobre um manifesto mantendo a ordem
+
+        overrides mapeia caminho -> (tamanho, mtime) ou None para remoção;
+        entradas sob dropped_dirs são descartadas. Entradas alteradas ficam
+        sem checksum.
+        """
+        prefixes = tuple(d.rstrip("/") + "/" for d in dropped_dirs)
+        extra = sorted((path_key(path), path, value)
+                       for path, value in overrides.items() if value is not None)
+        result = cls()
+        j = 0
+        for index in range(len(base)):
+            path = base.path(index)
+            if path in overrides or (prefixes and path.startswith(prefixes)):
+                continue
+            key = base.sort_key(index)
+            while j < len(extra) and extra[j][0] < key:
+                _, extra_path, (size, mtime) = extra[j]
+                result.append(extra_path, size, mtime)
+                j += 1
+            result.append(path, base.sizes[index], base.mtimes[index], base.digest(index))
+        for _, extra_path, (size, mtime) in extra[j:]:
+            result.append(extra_path, size, mtime)
+        return result
+
+    def save(self, path: str) -> None:
+        """Grava o manifesto em formato binário (manifest.bin)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(len(self._dirs), len(self.names)))
+            for blob in ("\0".join(self._dirs).encode("utf-8", "surrogateescape"),
+                         "\0".join(self.names).encode("utf-8", "surrogateescape")):
+                f.write(struct.pack("<Q", len(blob)))
+                f.write(blob)
+            f.write(self.dir_index.tobytes())
+            f.write(self.sizes.tobytes())
+            f.write(self.mtimes.tobytes())
+            f.write(self.digests)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        manifest = cls()
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"Manifesto inválido: {path}")
+            dir_count, file_count = _HEADER.unpack(f.read(_HEADER.size))
+            blobs = []
+            for _ in range(2):
+                (length,) = struct.unpack("<Q", f.read(8))
+                blobs.append(f.read(length).decode("utf-8", "surrogateescape"))
+            dirs = blobs[0].split("\0") if dir_count else []
+            for rel_dir in dirs:
+                manifest._intern_dir(rel_dir)
+            manifest.names = blobs[1].split("\0") if file_count else []
+            manifest.dir_index.frombytes(f.read(file_count * manifest.dir_index.itemsize))
+            manifest.sizes.frombytes(f.read(file_count * manifest.sizes.itemsize))
+            manifest.mtimes.frombytes(f.read(file_count * manifest.mtimes.itemsize))
+            manifest.digests = bytearray(f.read(file_count * DIGEST_SIZE))
+        return manifest
+
+
+def iter_tree(root: str,
+              rules: Optional[CompiledRules] = None,
+              prefix: str = "") -> Iterator[Tuple[str, os.stat_result]]:
+    """Percorre a árvore em ordem de path_key retornando (caminho relativo, stat)
+
+    Diretórios excluídos pelas regras são podados; links simbólicos para
+    diretórios não são seguidos (como os.walk).
+    """
+    base_rel = prefix.replace(os.sep, "/").strip("/")
+    stack = [(root, base_rel)]
+    while stack:
+        dirpath, rel_dir = stack.pop()
+        base = f"{rel_dir}/" if rel_dir else ""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry)
+        except FileNotFoundError:
+            continue
+        files.sort(key=lambda e: e.name)
+        for entry in files:
+            rel_path = base + entry.name
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if rules is None or rules.matches_file(rel_path, stat.st_size):
+                yield rel_path, stat
+        for name in sorted(subdirs, reverse=True):
+            if rules is None or not rules.excludes_dir(base + name):
+                stack.append((os.path.join(dirpath, name), base + name))
+
+
+def backup_files(metadata: BackupMetadata,
+                 backup_dir: str,
+                 only: Optional[Iterable[str]] = None) -> Iterator[Union[FileInfo, ManifestEntry]]:
+    """Arquivos registrados num backup, sem montar a lista inteira
+
+    Completos e snapshots (files_manifest) guardam a lista só no
+    manifest.bin, e as entradas vêm dele; os demais têm as alterações em
+    metadata.files. only restringe a alguns caminhos (busca binária no
+    manifesto).
+    """
+    if not metadata.files_manifest:
+        wanted = set(only) if only is not None else None
+        for file_info in metadata.files:
+            if wanted is None or file_info.path in wanted:
+                yield file_info
+        return
+    manifest = Manifest.load(os.path.join(backup_dir, MANIFEST_FILENAME))
+    # Num completo comprimido todos os arquivos estão comprimidos
+    compressed = metadata.compression is not None
+    if only is None:
+        indexes: Iterable[int] = range(len(manifest))
+    else:
+        indexes = sorted(i for i in map(manifest.find, set(only)) if i is not None)
+    for index in indexes:
+        entry = manifest.entry(index)
+        entry.compressed = compressed
+        yield entry
+
+
+def scan_manifest(root: str,
+                  rules: Optional[CompiledRules] = None,
+                  prefix: str = "") -> Manifest:
+    """Escaneia uma árvore (só stat) para um manifesto"""
+    manifest = Manifest()
+    for rel_path, stat in iter_tree(root, rules, prefix):
+        manifest.append(rel_path, stat.st_size, stat.st_mtime)
+    return manifest
+
+
+def diff_manifests(old: Manifest, new: Manifest) -> Iterator[Tuple[str, int, int]]:
+    """Compara dois manifestos ordenados em uma única passada (merge-join)
+
+    Retorna (tipo, índice em old, índice em new), com -1 no lado ausente.
+    """
+    i = j = 0
+    old_len, new_len = len(old), len(new)
+    while i < old_len or j < new_len:
+        if j >= new_len:
+            yield DELETED, i, -1
+            i += 1
+            continue
+        if i >= old_len:
+            yield ADDED, -1, j
+            j += 1
+            continue
+        old_key = old.sort_key(i)
+        new_key = new.sort_key(j)
+        if old_key == new_key:
+            if old.digest(i) != new.digest(j):
+                yield MODIFIED, i, j
+            i += 1
+            j += 1
+        elif old_key < new_key:
+            yield DELETED, i, -1
+            i += 1
+        else:
+            yield ADDED, -1, j
+            j += 1
@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Any
+from .models import StageTiming
+from ..cache import RESPONSE_CACHE
+
+# Limites (em segundos) dos buckets do histograma de duração
+HISTOGRAM_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600]
+DEFAULT_WINDOW = 500  # Amostras mantidas por etapa
+
+
+class StageSpan:
+    """Intervalo de tempo de uma etapa com contadores de arquivos e bytes"""
+    __slots__ = ("name", "seconds", "cpu_seconds", "files", "bytes")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, files: int = 0, bytes: int = 0) -> None:
+        """Soma contadores (chamar fora do loop por arquivo quando possível)"""
+        self.files += files
+        self.bytes += bytes
+
+
+class StageRecorder:
+    """Registra as etapas de uma operação de backup ou restauração"""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.spans: List[StageSpan] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageSpan]:
+        span = StageSpan(name)
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - start
+            span.cpu_seconds = time.process_time() - cpu_start
+            self.spans.append(span)
+
+    def timings(self) -> List[StageTiming]:
+        """Agrupa os spans por nome, mantendo a ordem de primeira execução"""
+        merged: Dict[str, StageTiming] = {}
+        for span in self.spans:
+            timing = merged.get(span.name)
+            if timing is None:
+                merged[span.name] = StageTiming(
+                    name=span.name,
+                    seconds=span.seconds,
+                    cpu_seconds=span.cpu_seconds,
+                    files=span.files,
+                    bytes=span.bytes
+                )
+            else:
+                timing.seconds += span.seconds
+                timing.cpu_seconds += span.cpu_seconds
+                timing.files += span.files
+                timing.bytes += span.bytes
+        return list(merged.values())
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class StageHistogram:
+    """Janela móvel de amostras de uma etapa"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.samples: Deque[Tuple[float, float, int, int]] = deque(maxlen=window)
+        self.total_count = 0
+
+    def add(self, timing: StageTiming) -> None:
+        self.samples.append((timing.seconds, timing.cpu_seconds, timing.files, timing.bytes))
+        self.total_count += 1
+
+    def summary(self) -> Dict[str, Any]:
+        durations = sorted(sample[0] for sample in self.samples)
+        total_seconds = sum(durations)
+        total_bytes = sum(sample[3] for sample in self.samples)
+        total_files = sum(sample[2] for sample in self.samples)
+
+        buckets: Dict[str, int] = {}
+        for limit in HISTOGRAM_BUCKETS:
+            buckets[f"le_{limit}"] = sum(1 for d in durations if d <= limit)
+        buckets["le_inf"] = len(durations)
+
+        return {
+            "count": self.total_count,
+            "window": len(durations),
+            "seconds": {
+                "mean": total_seconds / len(durations) if durations else 0.0,
+                "p50": _percentile(durations, 0.50),
+                "p95": _percentile(durations, 0.95),
+                "p99": _percentile(durations, 0.99),
+                "max": durations[-1] if durations else 0.0,
+            },
+            "cpu_seconds": sum(sample[1] for sample in self.samples),
+            "files": total_files,
+            "bytes": total_bytes,
+            "mb_per_s": (total_bytes / total_seconds / (1024 * 1024)) if total_seconds > 0 else 0.0,
+            "histogram": buckets,
+        }
+
+
+class MetricsRegistry:
+    """Agrega as etapas de todas as operações em histogramas móveis"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, StageHistogram]] = {}
+        self._totals: Dict[str, StageHistogram] = {}
+
+    def record(self, operation: str, timings: List[StageTiming]) -> None:
+        """Registra as etapas de uma operação concluída"""
+        total = StageTiming(name=operation, seconds=0.0, cpu_seconds=0.0, files=0, bytes=0)
+        with self._lock:
+            stages = self._stages.setdefault(operation, {})
+            for timing in timings:
+                stages.setdefault(timing.name, StageHistogram(self.window)).add(timing)
+                total.seconds += timing.seconds
+                total.cpu_seconds += timing.cpu_seconds
+                total.files = max(total.files, timing.files)
+                total.bytes = max(total.bytes, timing.bytes)
+            self._totals.setdefault(operation, StageHistogram(self.window)).add(total)
+        RESPONSE_CACHE.invalidate("stage_metrics")
+
+    def snapshot(self, operation: Optional[str] = None) -> Dict[str, Any]:
+        """Retorna os agregados por operação e etapa"""
+        with self._lock:
+            operations = [operation] if operation else list(self._stages)
+            result = {}
+            for name in operations:
+                if name not in self._stages:
+                    continue
+                result[name] = {
+                    "total": self._totals[name].summary(),
+                    "stages": {
+                        stage: histogram.summary()
+                        for stage, histogram in self._stages[name].items()
+                    }
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._totals.clear()
+        RESPONSE_CACHE.invalidate("stage_metrics")
+
+
+# Registro compartilhado entre os gerenciadores de backup e o BackupService
+STAGE_METRICS = MetricsRegistry()
@@ -5,9 +5,11 @@ from pydantic import BaseModel
 
 class BackupType(str, Enum):
     FULL = "full"          # Backup completo
-    INCREMENTAL = "inc"    # Apenas mudanças
+    INCREMENTAL = "inc"    # Mudanças desde o último backup da cadeia
+    DIFFERENTIAL = "diff"  # Mudanças desde o último completo
     SNAPSHOT = "snap"      # Estado atual
     CHECKPOINT = "check"   # Ponto específico
+    AUTO = "auto"          # Completo, diferencial ou incremental pelo modelo de custo (nunca gravado)
 
 class CompressionType(str, Enum):
     NONE = "none"      # Sem compressão
@@ -31,6 +33,109 @@ class CompressionInfo(BaseModel):
     compressed_size: int        # Tamanho após compressão
     ratio: float               # Taxa de compressão (original/compressed)
     level: int                 # Nível de compressão usado (1-9)
+    dictionary_id: Optional[str] = None  # Dicionário do projeto usado (só zlib)
+
+class BackupRules(BaseModel):
+    """Regras de inclusão/exclusão de arquivos (padrões estilo gitignore)"""
+    exclude: List[str] = []             # Padrões excluídos ("!" reinclui)
+    include: List[str] = []             # Se definido, só arquivos que casam
+    max_file_size: Optional[int] = None # Ignora arquivos maiores (bytes)
+    exclude_extensions: List[str] = []  # Extensões ignoradas (.log, .pyc)
+    include_extensions: List[str] = []  # Se definido, só estas extensões
+
+class StageTiming(BaseModel):
+    """Tempo e volume processado em uma etapa do backup/restauração"""
+    name: str                  # Nome da etapa (scan, hash, copy...)
+    seconds: float             # Tempo de relógio
+    cpu_seconds: float         # Tempo de CPU do processo
+    files: int = 0             # Arquivos processados
+    bytes: int = 0             # Bytes processados
+
+class SnapshotInfo(BaseModel):
+    """Como os arquivos de um snapshot foram materializados"""
+    base_snapshot_id: Optional[str] = None  # Snapshot anterior usado como base dos links
+    linked: int = 0            # Arquivos inalterados em hardlink
+    reflinked: int = 0         # Arquivos clonados via reflink
+    copied: int = 0            # Arquivos copiados
+
+class EstimateRange(BaseModel):
+    """Valor estimado com intervalo de confiança"""
+    value: float
+    low: float
+    high: float
+
+class BackupEstimate(BaseModel):
+    """Estimativa de custo de um backup (dry-run)"""
+    files_count: int = 0            # Arquivos no projeto (após as regras)
+    size_bytes: int = 0             # Tamanho total do projeto
+    changed_files: int = 0          # Arquivos a copiar (todos, num completo)
+    changed_bytes: int = 0          # Bytes a copiar, previstos por stat
+    deleted_files: int = 0          # Arquivos removidos desde o pai
+    ratio: EstimateRange            # Taxa de compressão (original/comprimido)
+    compressed_bytes: EstimateRange # Tamanho final previsto
+    seconds: EstimateRange          # Duração prevista
+    throughput_mb_s: float = 0.0    # Vazão medida nas amostras (leitura+hash+compressão)
+    sample_count: int = 0           # Amostras processadas pelos codecs
+    sample_bytes: int = 0           # Bytes amostrados
+    confidence: float = 0.95        # Nível de confiança dos intervalos
+    elapsed_seconds: float = 0.0    # Tempo gasto na estimativa
+
+class BackupCandidate(BaseModel):
+    """Um tipo de backup avaliado pelo modo automático"""
+    type: BackupType
+    parent_backup_id: Optional[str] = None
+    chain_depth: int = 1            # Backups a ler na restauração (completo = 1)
+    changed_files: int = 0          # Arquivos a gravar (stat diferente do pai)
+    changed_bytes: int = 0
+    deleted_files: int = 0
+    backup_seconds: float = 0.0     # Custo previsto de criação
+    restore_seconds: float = 0.0    # Restauração prevista do novo ponto (pior caso da cadeia)
+    feasible: bool = True
+    reason: Optional[str] = None    # Por que foi descartado
+
+class BackupDecision(BaseModel):
+    """Escolha do modo automático e os candidatos avaliados"""
+    chosen: BackupType
+    reason: str = ""
+    max_restore_seconds: float
+    max_chain_depth: int
+    restore_mb_s: float             # Vazão de restauração usada no modelo
+    backup_mb_s: float              # Vazão de criação usada no modelo
+    candidates: List[BackupCandidate] = []
+
+class TierInfo(BaseModel):
+    """Migração de um backup para a camada fria"""
+    tier: str = "cold"                 # Camada atual
+    migrated_at: datetime              # Quando foi recomprimido
+    previous: Optional[CompressionInfo] = None  # Compressão antes da migração
+    seconds: float = 0.0               # Duração da recompressão
+
+class GitRepoInfo(BaseModel):
+    """Repositório git capturado como packfile em vez de .git/objects"""
+    path: str                          # Diretório do repositório no projeto ("" = raiz)
+    head: str = ""                     # Conteúdo de .git/HEAD
+    head_commit: Optional[str] = None  # Commit de HEAD (None em branch sem commits)
+    refs: Dict[str, str] = {}          # Ref -> objeto
+    pack: Optional[str] = None         # Packfile em git/ (None = sem objetos novos)
+    pack_sha256: Optional[str] = None
+    pack_size: int = 0
+    objects: int = 0                   # Objetos no packfile
+    excluded: int = 0                  # Tips do backup anterior excluídos do pack
+    object_files: int = 0              # Arquivos de .git/objects que não foram copiados
+
+class EnvironmentInfo(BaseModel):
+    """Ambiente de dependências (venv, node_modules) guardado no cache compartilhado"""
+    path: str                          # Diretório do ambiente no projeto
+    kind: str                          # "python" ou "node"
+    lockfiles: Dict[str, str] = {}     # Lock/requirements junto do ambiente -> sha256
+    fingerprint: str = ""              # sha256 do tipo, interpretador e locks
+    manifest: str = ""                 # Manifesto do ambiente no cache (sha256 do JSON)
+    manifest_size: int = 0
+    packages: int = 0                  # Pacotes (objetos do cache) do ambiente
+    files: int = 0                     # Arquivos do ambiente que não entraram em data/
+    size_bytes: int = 0                # Tamanho do ambiente no projeto
+    new_objects: int = 0               # Pacotes gravados no cache por este backup
+    new_bytes: int = 0
 
 class FileInfo(BaseModel):
     """Informações de um arquivo"""
@@ -40,6 +145,7 @@ class FileInfo(BaseModel):
     checksum: str             # Hash do arquivo
     is_deleted: bool = False   # Se foi deletado
     compressed: bool = False   # Se está comprimido
+    delta: bool = False        # Armazenado como delta sobre a versão do backup pai
 
 class BackupMetadata(BaseModel):
     """Metadados do backup"""
@@ -57,7 +163,149 @@ class BackupMetadata(BaseModel):
     tags: Dict[str, str] = {}             # Tags para categorização
     extra: Dict[str, Any] = {}            # Dados extras
     files: List[FileInfo] = []            # Lista de arquivos
+    files_manifest: bool = False          # Lista completa só no manifest.bin (files vazio)
     compression: Optional[CompressionInfo] = None  # Info de compressão
+    page_cache: Optional[Dict[str, int]] = None    # Page cache do sistema antes/depois
+    stages: List[StageTiming] = []                 # Tempos por etapa
+    rules: Optional[BackupRules] = None            # Regras efetivas do backup
+    label: Optional[str] = None                    # Nome do checkpoint
+    snapshot: Optional[SnapshotInfo] = None        # Detalhes do snapshot
+    estimate: Optional[BackupEstimate] = None      # Estimativa (dry-run)
+    tier: Optional[TierInfo] = None                # Camada fria (None = quente)
+    git: List[GitRepoInfo] = []                    # Repositórios em packfile (modo git)
+    environments: List[EnvironmentInfo] = []       # venvs/node_modules no cache (modo ambientes)
+    decision: Optional[BackupDecision] = None      # Escolha do tipo (modo automático)
 
     class Config:
         use_enum_values = True
+
+class FileVerification(BaseModel):
+    """Resultado da verificação de um arquivo restaurado"""
+    path: str                  # Caminho relativo
+    backup_id: str             # Backup de onde veio a versão restaurada
+    expected: str              # Checksum registrado no backup
+    actual: Optional[str] = None  # Checksum calculado durante a escrita
+    ok: bool = False           # Se confere
+    error: Optional[str] = None   # Erro durante a restauração
+
+class RestoreMode(str, Enum):
+    """Modo de restauração sobre o diretório de destino"""
+    FULL = "full"                  # Escreve todos os arquivos do backup
+    DIFFERENTIAL = "differential"  # Escreve/remove só o que difere do destino
+
+class RestoreChange(BaseModel):
+    """Alteração planejada no destino por uma restauração diferencial"""
+    path: str                  # Caminho relativo
+    action: str                # create, update, delete ou touch (só o mtime)
+    size: int = 0              # Bytes a escrever (ou removidos)
+    reason: str = ""           # missing, size, checksum, mtime ou extraneous
+    mtime: Optional[float] = None  # mtime a aplicar (touch)
+
+class RestorePlan(BaseModel):
+    """Diferença entre o destino atual e o estado do backup"""
+    target_dir: str
+    changes: List[RestoreChange] = []
+    files_to_create: int = 0
+    files_to_update: int = 0
+    files_to_delete: int = 0
+    unchanged: int = 0         # Iguais pelo stat ou pelo hash
+    hashed: int = 0            # Arquivos com stat ambíguo conferidos por hash
+    bytes_to_write: int = 0
+    seconds: float = 0.0
+
+class RestoreReport(BaseModel):
+    """Relatório de uma restauração"""
+    backup_id: str
+    project_id: str
+    restore_dir: str
+    mode: RestoreMode = RestoreMode.FULL
+    dry_run: bool = False      # Só planejou, sem alterar o destino
+    plan: Optional[RestorePlan] = None  # Plano do modo diferencial
+    success: bool = False
+    workers: int = 1
+    files_restored: int = 0
+    files_failed: int = 0
+    files_removed: int = 0
+    bytes_written: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+    files: List[FileVerification] = []
+
+class VolumeInfo(BaseModel):
+    """Estado de um volume do armazenamento de backups"""
+    path: str
+    device: int                # st_dev: volumes no mesmo dispositivo dividem os slots de I/O
+    total_bytes: int
+    free_bytes: int
+    projects: int = 0          # Projetos posicionados no volume
+    active_ops: int = 0        # Backups/restaurações em andamento no dispositivo
+    weight: float = 1.0        # Peso no posicionamento de novos projetos
+
+class ReplicationReport(BaseModel):
+    """Resultado de uma replicação a partir de outra instância"""
+    peer: str
+    success: bool = False
+    projects: int = 0
+    backups_replicated: List[str] = []
+    backups_skipped: int = 0       # Já presentes com o mesmo checksum
+    blobs_fetched: int = 0         # Arquivos baixados do peer
+    blobs_reused: int = 0          # Arquivos já presentes localmente (hardlink/cópia)
+    bytes_fetched: int = 0
+    bytes_reused: int = 0
+    resumed: int = 0               # Downloads retomados de onde pararam
+    seconds: float = 0.0
+    errors: List[str] = []
+
+class PathVersion(BaseModel):
+    """Uma versão de um caminho no histórico do projeto"""
+    backup_id: str
+    backup_type: BackupType
+    created_at: datetime       # Data do backup
+    checksum: str              # md5 do conteúdo
+    size: int
+    modified_at: datetime      # mtime do arquivo
+    deleted: bool = False      # Removido neste backup
+
+class StandbyInfo(BaseModel):
+    """Réplica quente de um projeto: o último backup já materializado em disco"""
+    project_id: str
+    path: str                          # Diretório da réplica
+    backup_id: Optional[str] = None    # Backup materializado (None: reconstrói no próximo)
+    merkle_root: Optional[str] = None  # Raiz Merkle do manifesto do backup
+    files: int = 0
+    applied: int = 0                   # Arquivos escritos ou removidos na última atualização
+    rebuilt: bool = False              # Última atualização foi uma restauração completa
+    verified: bool = False             # Conferida pelo stat contra o manifesto após aplicar
+    updated_at: Optional[datetime] = None
+    seconds: float = 0.0
+    environments: Dict[str, str] = {}  # Caminho do ambiente -> manifesto no cache
+    repositories: List[str] = []       # Repositórios com .git/objects vindo de packs
+    error: Optional[str] = None
+
+class StandbyVerification(BaseModel):
+    """Comparação da réplica com a árvore Merkle do backup"""
+    project_id: str
+    backup_id: Optional[str] = None
+    ok: bool = False
+    deep: bool = False                 # Todos os arquivos conferidos por md5 (senão só os de stat divergente)
+    merkle_root: Optional[str] = None  # Esperada (manifesto do backup)
+    actual_root: Optional[str] = None  # Calculada a partir da réplica
+    files: int = 0
+    hashed: int = 0
+    changed: List[str] = []
+    missing: List[str] = []
+    extraneous: List[str] = []
+    seconds: float = 0.0
+
+class StandbyPromotion(BaseModel):
+    """Resultado da promoção da réplica a diretório restaurado"""
+    project_id: str
+    backup_id: str
+    target_dir: str
+    method: str                        # rename (consome a réplica) ou clone (reflink/cópia)
+    files: int = 0
+    reflinked: int = 0
+    copied: int = 0
+    repaired: int = 0                  # Arquivos corrigidos antes da promoção
+    seconds: float = 0.0
+    verification: Optional[StandbyVerification] = None
@@ -0,0 +1,265 @@
+import os
+import mmap
+import ctypes
+import ctypes.util
+import shutil
+from dataclasses import dataclass
+from typing import Iterator, Optional, Dict
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024      # 1MB por leitura
+DROP_INTERVAL = 8 * 1024 * 1024       # Descarta páginas a cada 8MB processados
+DIRECT_IO_ALIGNMENT = 4096            # Alinhamento exigido pelo O_DIRECT
+
+_HAS_FADVISE = hasattr(os, "posix_fadvise")
+_libc = None
+
+
+@dataclass
+class CachePolicy:
+    """Política de uso do page cache durante backups"""
+    drop_behind: bool = True                    # Descarta páginas já processadas
+    direct_io_threshold: Optional[int] = None   # Usa O_DIRECT para arquivos >= este tamanho
+    chunk_size: int = DEFAULT_CHUNK_SIZE        # Tamanho de cada leitura
+
+
+DEFAULT_POLICY = CachePolicy()
+
+
+def _fadvise(fd: int, offset: int, length: int, advice: int) -> None:
+    """Aplica posix_fadvise ignorando plataformas/sistemas sem suporte"""
+    if not _HAS_FADVISE:
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+
+def _advise_sequential(fd: int) -> None:
+    if _HAS_FADVISE:
+        _fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+
+def _drop_range(fd: int, offset: int, length: int) -> None:
+    if _HAS_FADVISE:
+        _fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+
+
+def _open_direct(path: str) -> Optional[int]:
+    """Abre um arquivo com O_DIRECT, retornando None se o sistema não suportar"""
+    flag = getattr(os, "O_DIRECT", 0)
+    if not flag:
+        return None
+    try:
+        return os.open(path, os.O_RDONLY | flag)
+    except OSError:
+        return None
+
+
+def _iter_direct(fd: int, chunk_size: int) -> Iterator[bytes]:
+    """Lê um arquivo aberto com O_DIRECT usando buffer alinhado"""
+    size = max(DIRECT_IO_ALIGNMENT, chunk_size - chunk_size % DIRECT_IO_ALIGNMENT)
+    buf = mmap.mmap(-1, size)  # mmap anônimo é alinhado à página
+    try:
+        while True:
+            n = os.readv(fd, [buf])
+            if n <= 0:
+                break
+            yield buf[:n]
+            if n < size:
+                break
+    finally:
+        buf.close()
+
+
+def iter_file(path: str,
+              policy: Optional[CachePolicy] = None,
+              offset: int = 0) -> Iterator[bytes]:
+    """Lê um arquivo em chunks sequenciais sem poluir o page cache"""
+    policy = policy or DEFAULT_POLICY
+
+    if (policy.direct_io_threshold is not None and offset == 0
+            and os.path.getsize(path) >= policy.direct_io_threshold):
+        fd = _open_direct(path)
+        if fd is not None:
+            try:
+                yielded = False
+                try:
+                    for chunk in _iter_direct(fd, policy.chunk_size):
+                        yielded = True
+                        yield chunk
+                    return
+                except OSError:
+                    # Alguns sistemas aceitam o open mas rejeitam a leitura
+                    if yielded:
+                        raise
+            finally:
+                os.close(fd)
+
+    with open(path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        _advise_sequential(fd)
+        if offset:
+            f.seek(offset)
+        dropped = offset
+        position = offset
+        while True:
+            chunk = f.read(policy.chunk_size)
+            if not chunk:
+                break
+            position += len(chunk)
+            if policy.drop_behind and position - dropped >= DROP_INTERVAL:
+                _drop_range(fd, dropped, position - dropped)
+                dropped = position
+            yield chunk
+        if policy.drop_behind:
+            _drop_range(fd, 0, 0)
+
+
+class CacheFriendlyWriter:
+    """Escritor que descarta do page cache as páginas já gravadas"""
+
+    def __init__(self, path: str, policy: Optional[CachePolicy] = None):
+        self.policy = policy or DEFAULT_POLICY
+        self.path = path
+        self._file = open(path, "wb")
+        self._fd = self._file.fileno()
+        self._written = 0
+        self._dropped = 0
+        self._synced = False
+
+    def write(self, data: bytes) -> int:
+        self._file.write(data)
+        self._written += len(data)
+        if self.policy.drop_behind and self._written - self._dropped >= DROP_INTERVAL:
+            # Páginas sujas não são descartadas: grava antes de liberar
+            self._file.flush()
+            os.fdatasync(self._fd)
+            self._synced = True
+            _drop_range(self._fd, self._dropped, self._written - self._dropped)
+            self._dropped = self._written
+        return len(data)
+
+    @property
+    def bytes_written(self) -> int:
+        return self._written
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.flush()
+        if self.policy.drop_behind:
+            # Só sincroniza arquivos grandes; arquivos pequenos não justificam o fsync
+            if self._synced:
+                os.fdatasync(self._fd)
+            _drop_range(self._fd, 0, 0)
+        self._file.close()
+
+    def abort(self) -> None:
+        """Fecha e remove o arquivo parcialmente escrito"""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def copy_file(src: str, dest: str, policy: Optional[CachePolicy] = None) -> str:
+    """Copia um arquivo preservando metadados sem poluir o page cache"""
+    with CacheFriendlyWriter(dest, policy) as writer:
+        for chunk in iter_file(src, policy):
+            writer.write(chunk)
+    shutil.copystat(src, dest)
+    return dest
+
+
+def drop_file_cache(path: str) -> None:
+    """Remove do page cache as páginas limpas de um arquivo"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        _drop_range(fd, 0, 0)
+    finally:
+        os.close(fd)
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library("c")
+        if not name:
+            return None
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
+                              ctypes.c_int, ctypes.c_int, ctypes.c_long]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+        _libc = libc
+    return _libc
+
+
+def file_cache_residency(path: str) -> Optional[Dict[str, int]]:
+    """Retorna quantas páginas de um arquivo estão no page cache (via mincore)"""
+    libc = _get_libc()
+    if libc is None:
+        return None
+    size = os.path.getsize(path)
+    page_size = mmap.PAGESIZE
+    pages = (size + page_size - 1) // page_size
+    if pages == 0:
+        return {"pages": 0, "cached_pages": 0}
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        addr = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            return None
+        try:
+            vec = (ctypes.c_ubyte * pages)()
+            if libc.mincore(addr, size, vec) != 0:
+                return None
+            cached = sum(1 for page in vec if page & 1)
+        finally:
+            libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+    return {"pages": pages, "cached_pages": cached}
+
+
+def tree_cache_residency(path: str) -> Dict[str, int]:
+    """Soma a residência no page cache de todos os arquivos de um diretório"""
+    totals = {"files": 0, "bytes": 0, "cached_bytes": 0}
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            file_path = os.path.join(root, filename)
+            if not os.path.isfile(file_path):
+                continue
+            residency = file_cache_residency(file_path)
+            totals["files"] += 1
+            totals["bytes"] += os.path.getsize(file_path)
+            if residency:
+                totals["cached_bytes"] += residency["cached_pages"] * mmap.PAGESIZE
+    return totals
+
+
+def system_page_cache_bytes() -> Optional[int]:
+    """Tamanho atual do page cache do sistema (linha Cached de /proc/meminfo)"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("Cached:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
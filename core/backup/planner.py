@@ -0,0 +1,206 @@
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+from .models import BackupCandidate, BackupDecision, BackupMetadata, BackupType
+from .manifest import Manifest, scan_manifest
+from .metrics import STAGE_METRICS
+from .rules import CompiledRules
+
+if TYPE_CHECKING:
+    from .manager import BackupManager
+
+# Tipos que formam cadeias de restauração (base de incrementais e diferenciais)
+CHAIN_TYPES = (BackupType.FULL, BackupType.DIFFERENTIAL, BackupType.INCREMENTAL)
+MB = 1024 * 1024
+
+
+@dataclass
+class ChainPolicy:
+    """Limites do modo automático e parâmetros do modelo de custo"""
+    max_restore_seconds: float = 600.0   # Pior caso aceito para restaurar o backup novo
+    max_chain_depth: int = 16            # Backups lidos numa restauração, no máximo
+    differential_ratio: float = 0.5      # Diferencial com essa fração do total vira completo
+    restore_mb_s: float = 100.0          # Vazão de restauração sem métricas medidas
+    backup_mb_s: float = 50.0            # Vazão de gravação sem métricas medidas
+    per_backup_seconds: float = 0.05     # Metadados, validação e hidratação de cada elo
+    per_entry_seconds: float = 0.0002    # Cada FileInfo listado (validação e plano)
+
+
+def chain_policy_from_env() -> ChainPolicy:
+    """Política configurada por BACKUP_MAX_RESTORE_SECONDS e BACKUP_MAX_CHAIN_DEPTH"""
+    policy = ChainPolicy()
+    if os.environ.get("BACKUP_MAX_RESTORE_SECONDS"):
+        policy.max_restore_seconds = float(os.environ["BACKUP_MAX_RESTORE_SECONDS"])
+    if os.environ.get("BACKUP_MAX_CHAIN_DEPTH"):
+        policy.max_chain_depth = int(os.environ["BACKUP_MAX_CHAIN_DEPTH"])
+    return policy
+
+
+def _measured_mb_s(operation: str, stage: str) -> Optional[float]:
+    """Vazão observada de uma etapa nas métricas do processo"""
+    summary = STAGE_METRICS.snapshot(operation).get(operation, {}).get("stages", {}).get(stage)
+    if not summary or summary["bytes"] < MB:
+        return None  # Amostras pequenas medem só overhead
+    return summary["mb_per_s"] or None
+
+
+class BackupPlanner:
+    """Escolhe FULL, DIFFERENTIAL ou INCREMENTAL para cada execução
+
+    Cada candidato tem um custo de criação (bytes alterados desde o pai) e
+    uma restauração prevista: o estado completo escrito uma vez, mais o
+    overhead de cada elo da cadeia (metadados, entradas listadas e deltas
+    reaplicados). Entre os que cabem no limite de restauração e de
+    profundidade, vence o mais barato de criar; se nenhum cabe, FULL.
+    """
+
+    def __init__(self, manager: "BackupManager", policy: Optional[ChainPolicy] = None):
+        self.manager = manager
+        self.policy = policy or chain_policy_from_env()
+
+    def _chain(self, tip: BackupMetadata, summaries: Dict[str, Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """(entradas, bytes em delta) de cada elo da cadeia do backup, até o completo
+
+        Vem dos resumos do catálogo (files_count e a etapa "delta"): nenhum
+        metadata.json é aberto.
+        """
+        chain = []
+        seen = set()
+        backup_id: Optional[str] = tip.id
+        while backup_id and backup_id not in seen:
+            seen.add(backup_id)
+            entry = summaries.get(backup_id)
+            if entry is None:
+                break
+            delta_bytes = sum(stage.get("bytes", 0) for stage in entry.get("stages") or []
+                              if stage.get("name") == "delta")
+            chain.append((entry.get("files_count") or 0, delta_bytes))
+            backup_id = entry.get("parent_backup_id")
+        return chain
+
+    def _changes(self, current: Manifest, parent: Manifest) -> Tuple[int, int, int, int]:
+        """(alterados, bytes alterados, removidos, bytes que tendem a virar delta) desde o pai
+
+        Merge-join por stat dos manifestos ordenados, sem conjuntos de caminhos.
+        Alterados grandes que o pai já tem tendem a virar delta (reaplicado na
+        restauração).
+        """
+        threshold = self.manager.delta_threshold
+        changed = changed_bytes = deleted = delta_bytes = 0
+        i = 0
+        for j in range(len(current)):
+            key = current.sort_key(j)
+            while i < len(parent) and parent.sort_key(i) < key:
+                deleted += 1
+                i += 1
+            size = current.sizes[j]
+            in_parent = i < len(parent) and parent.sort_key(i) == key
+            if not in_parent or (parent.sizes[i], parent.mtimes[i]) != (size, current.mtimes[j]):
+                changed += 1
+                changed_bytes += size
+                if in_parent and threshold is not None and size >= threshold:
+                    delta_bytes += size
+            if in_parent:
+                i += 1
+        deleted += len(parent) - i
+        return changed, changed_bytes, deleted, delta_bytes
+
+    def _link_seconds(self, entries: int, delta_bytes: int, restore_bps: float) -> float:
+        return (self.policy.per_backup_seconds + entries * self.policy.per_entry_seconds
+                + delta_bytes / restore_bps)
+
+    def _chain_seconds(self, chain: List[Tuple[int, int]], restore_bps: float) -> float:
+        """Overhead de restauração dos elos existentes"""
+        return sum(self._link_seconds(entries, delta_bytes, restore_bps) for entries, delta_bytes in chain)
+
+    def _candidate(self,
+                   backup_type: BackupType,
+                   parent: Optional[BackupMetadata],
+                   chain: List[Tuple[int, int]],
+                   current: Manifest,
+                   changes: Tuple[int, int, int, int],
+                   restore_bps: float,
+                   backup_bps: float) -> BackupCandidate:
+        changed, changed_bytes, deleted, delta_bytes = changes
+        restore_seconds = (current.total_size / restore_bps
+                           + self._chain_seconds(chain, restore_bps)
+                           + self._link_seconds(changed + deleted, delta_bytes, restore_bps))
+        return BackupCandidate(
+            type=backup_type,
+            parent_backup_id=parent.id if parent else None,
+            chain_depth=len(chain) + 1,
+            changed_files=changed,
+            changed_bytes=changed_bytes,
+            deleted_files=deleted,
+            backup_seconds=changed_bytes / backup_bps,
+            restore_seconds=restore_seconds
+        )
+
+    def _throughputs(self) -> Tuple[float, float]:
+        restore = _measured_mb_s("restore_backup", "write") or self.policy.restore_mb_s
+        backup = _measured_mb_s("create_backup", "store") or self.policy.backup_mb_s
+        return restore, backup
+
+    def choose(self,
+               project_id: str,
+               data_dir: str,
+               rules: Optional[CompiledRules] = None,
+               max_restore_seconds: Optional[float] = None) -> BackupDecision:
+        """Avalia os três tipos sobre o estado atual (só stat) e escolhe um"""
+        bound = max_restore_seconds if max_restore_seconds is not None else self.policy.max_restore_seconds
+        restore_mb_s, backup_mb_s = self._throughputs()
+        decision = BackupDecision(
+            chosen=BackupType.FULL,
+            max_restore_seconds=bound,
+            max_chain_depth=self.policy.max_chain_depth,
+            restore_mb_s=restore_mb_s,
+            backup_mb_s=backup_mb_s
+        )
+        full = self.manager._get_latest(project_id, BackupType.FULL)
+        if full is None:
+            decision.reason = "Nenhum backup completo: a cadeia começa aqui"
+            return decision
+
+        current = scan_manifest(data_dir, rules)
+        restore_bps = restore_mb_s * MB
+        backup_bps = backup_mb_s * MB
+        tip = self.manager._get_latest(project_id, *CHAIN_TYPES)
+        summaries = {entry["id"]: entry for entry in self.manager.catalog(project_id).entries()}
+        changes = {full.id: self._changes(current, self.manager._load_manifest(full))}
+        if tip.id not in changes:
+            changes[tip.id] = self._changes(current, self.manager._load_manifest(tip))
+        candidates = [
+            self._candidate(BackupType.FULL, None, [], current,
+                            (len(current), current.total_size, 0, 0), restore_bps, backup_bps),
+            self._candidate(BackupType.DIFFERENTIAL, full, self._chain(full, summaries), current,
+                            changes[full.id], restore_bps, backup_bps),
+            self._candidate(BackupType.INCREMENTAL, tip, self._chain(tip, summaries), current,
+                            changes[tip.id], restore_bps, backup_bps)
+        ]
+
+        for candidate in candidates:
+            if candidate.type == BackupType.FULL:
+                continue
+            if candidate.chain_depth > self.policy.max_chain_depth:
+                candidate.feasible = False
+                candidate.reason = f"Cadeia com {candidate.chain_depth} backups (máximo {self.policy.max_chain_depth})"
+            elif candidate.restore_seconds > bound:
+                candidate.feasible = False
+                candidate.reason = f"Restauração prevista de {candidate.restore_seconds:.1f}s (limite {bound:.1f}s)"
+            elif (candidate.type == BackupType.DIFFERENTIAL
+                  and candidate.changed_bytes >= self.policy.differential_ratio * current.total_size):
+                candidate.feasible = False
+                candidate.reason = (f"Diferencial com {candidate.changed_bytes} de {current.total_size} bytes: "
+                                    f"um novo completo custa pouco mais")
+        decision.candidates = candidates
+
+        # Mais barato de criar entre os viáveis; no empate, a cadeia mais curta
+        feasible = [c for c in candidates if c.feasible and c.type != BackupType.FULL]
+        if not feasible:
+            decision.reason = "Nenhum incremental ou diferencial cabe nos limites"
+            return decision
+        best = min(feasible, key=lambda c: (c.backup_seconds, c.chain_depth))
+        decision.chosen = best.type
+        decision.reason = (f"{best.changed_bytes} bytes alterados, cadeia de {best.chain_depth} backups, "
+                           f"restauração prevista de {best.restore_seconds:.1f}s")
+        return decision
@@ -0,0 +1,469 @@
+import json
+import os
+import random
+import shutil
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+from .manifest import backup_files
+from .models import BackupMetadata, BackupStatus, BackupType, ReplicationReport
+from .metrics import STAGE_METRICS, StageRecorder
+from .storage import HYDRATING_DIRNAME, REMOTE_MARKER, RetryPolicy
+from .tiering import OLD_DIRNAME, STAGING_DIRNAME as TIERING_DIRNAME
+
+if TYPE_CHECKING:
+    from .manager import BackupManager
+
+INDEX_FILENAME = "blobs.json"      # sha256 e tamanho de cada arquivo do backup
+STAGING_DIRNAME = ".replication"   # {projeto}/.replication/{backup}: recebimento em andamento
+PART_SUFFIX = ".part"              # Download incompleto (retomado com Range)
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_WORKERS = 4
+# Estado local de cada instância, nunca replicado
+LOCAL_NAMES = {INDEX_FILENAME, REMOTE_MARKER}
+LOCAL_DIRS = {TIERING_DIRNAME, OLD_DIRNAME, HYDRATING_DIRNAME}
+# Erros de rede que valem nova tentativa (retomando do ponto em que parou)
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, socket.timeout, HTTPException, urllib.error.URLError)
+_RUNNING = threading.Lock()
+
+
+class ReplicationError(Exception):
+    """Falha na replicação de um backup"""
+
+
+def blob_index(backup_dir: str, file_digest) -> Dict[str, Dict[str, Any]]:
+    """sha256 e tamanho de cada arquivo do backup, por caminho relativo
+
+    O índice fica em blobs.json e vale enquanto o metadata.json não muda
+    (uma migração para a camada fria regrava os dois).
+    """
+    meta_mtime_ns = os.stat(os.path.join(backup_dir, "metadata.json")).st_mtime_ns
+    index_path = os.path.join(backup_dir, INDEX_FILENAME)
+    try:
+        with open(index_path, "r") as f:
+            cached = json.load(f)
+        if cached.get("meta_mtime_ns") == meta_mtime_ns:
+            return cached["files"]
+    except (OSError, ValueError):
+        pass
+
+    files: Dict[str, Dict[str, Any]] = {}
+    for root, dirs, names in os.walk(backup_dir):
+        if root == backup_dir:
+            dirs[:] = [d for d in dirs if d not in LOCAL_DIRS]
+        for name in names:
+            if root == backup_dir and name in LOCAL_NAMES:
+                continue
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, backup_dir).replace(os.sep, "/")
+            files[rel_path] = {"size": os.path.getsize(path), "sha256": file_digest(path, "sha256")}
+    if os.path.isdir(os.path.join(backup_dir, "data")):
+        # Sem data/ (fora do cache local) o índice fica incompleto: não é guardado
+        write_index(backup_dir, files)
+    return files
+
+
+def write_index(backup_dir: str, files: Dict[str, Dict[str, Any]]) -> None:
+    meta_mtime_ns = os.stat(os.path.join(backup_dir, "metadata.json")).st_mtime_ns
+    index_path = os.path.join(backup_dir, INDEX_FILENAME)
+    with open(index_path + ".tmp", "w") as f:
+        json.dump({"meta_mtime_ns": meta_mtime_ns, "files": files}, f, separators=(",", ":"))
+    os.replace(index_path + ".tmp", index_path)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Faixa (início, fim inclusivo) de um cabeçalho "bytes=a-b"; None = arquivo inteiro
+
+    Só uma faixa por requisição; ValueError se não puder ser atendida (416).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError(f"Range não suportado: {header}")
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N: os últimos N bytes
+        start, end = max(0, size - int(last)), size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Faixa fora do arquivo ({size} bytes): {header}")
+    return start, end
+
+
+class ReplicationSource:
+    """Lado que serve os backups: catálogo, índice de blobs e os arquivos"""
+
+    def __init__(self, manager: "BackupManager"):
+        self.manager = manager
+
+    def catalog(self, project_ids: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Resumos dos backups concluídos de cada projeto, do mais antigo ao mais novo"""
+        result = {}
+        for project_id in project_ids or sorted(self.manager.volumes.projects()):
+            entries = [e for e in self.manager.catalog(project_id).entries()
+                       if e.get("status") == BackupStatus.COMPLETED.value]
+            entries.reverse()
+            result[project_id] = entries
+        return result
+
+    def index(self, project_id: str, backup_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Índice de blobs do backup (None se não existir)"""
+        backup_dir = os.path.join(self.manager.project_dir(project_id), backup_id)
+        if not os.path.exists(os.path.join(backup_dir, "metadata.json")):
+            return None
+        remote = self.manager.remote
+        with self.manager.volumes.project_lock(project_id):
+            # Um backup fora do cache local volta do object store antes de ser servido
+            if remote is not None and not remote.cached(backup_dir):
+                remote.hydrate(backup_dir, project_id, backup_id)
+            return blob_index(backup_dir, self.manager.validator.file_digest)
+
+    def blob_path(self, project_id: str, backup_id: str, rel_path: str) -> Optional[str]:
+        """Caminho local de um arquivo do backup (None se não existir ou for inválido)"""
+        backup_dir = os.path.join(self.manager.project_dir(project_id), backup_id)
+        path = os.path.normpath(os.path.join(backup_dir, rel_path))
+        if not path.startswith(backup_dir + os.sep) or os.path.basename(path) in LOCAL_NAMES:
+            return None
+        return path if os.path.isfile(path) else None
+
+
+class ReplicationPeer:
+    """Cliente HTTP dos endpoints de replicação de outra instância
+
+    base_url é o prefixo onde o router de backup está montado
+    (ex.: http://host-b:8000/api/v1).
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30.0, retry: Optional[RetryPolicy] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+
+    def _url(self, *parts: str, **query: Any) -> str:
+        path = "/".join(urllib.parse.quote(p, safe="/") for p in parts)
+        url = f"{self.base_url}/backup/replication/{path}"
+        query = {k: v for k, v in query.items() if v is not None}
+        return url + ("?" + urllib.parse.urlencode(query, doseq=True) if query else "")
+
+    def _sleep(self, attempt: int) -> None:
+        delay = min(self.retry.max_delay, self.retry.base_delay * 2 ** (attempt - 1))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _get_json(self, url: str) -> Any:
+        for attempt in range(1, self.retry.attempts + 1):
+            try:
+                with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                if e.code < 500 or attempt == self.retry.attempts:
+                    raise ReplicationError(f"{url}: HTTP {e.code}") from e
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.retry.attempts:
+                    raise ReplicationError(f"{url}: {e}") from e
+            self._sleep(attempt)
+
+    def catalog(self, project_ids: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        return self._get_json(self._url("catalog", project_id=project_ids))
+
+    def index(self, project_id: str, backup_id: str) -> Dict[str, Dict[str, Any]]:
+        return self._get_json(self._url("index", project_id, backup_id))
+
+    def fetch(self, project_id: str, backup_id: str, rel_path: str, dest: str, size: int) -> Tuple[int, bool]:
+        """Baixa um arquivo em dest, continuando de onde um download anterior parou
+
+        Retorna (bytes recebidos, se retomou um download existente).
+        """
+        return self._download(self._url("blob", project_id, backup_id, rel_path), rel_path, dest, size)
+
+    def fetch_env_object(self, name: str, dest: str, size: int) -> Tuple[int, bool]:
+        """Baixa um manifesto ou pacote do cache de ambientes do peer (como fetch)"""
+        return self._download(self._url("envcache", name), name, dest, size)
+
+    def _download(self, url: str, rel_path: str, dest: str, size: int) -> Tuple[int, bool]:
+        received = 0
+        resumed = False
+        for attempt in range(1, self.retry.attempts + 1):
+            offset = os.path.getsize(dest) if os.path.exists(dest) else 0
+            if offset >= size:
+                break
+            if offset:
+                resumed = True
+            request = urllib.request.Request(url, headers={"Range": f"bytes={offset}-"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    # 200 em vez de 206: o servidor ignorou a faixa, recomeça do zero
+                    mode = "ab" if response.status == 206 else "wb"
+                    with open(dest, mode) as f:
+                        while True:
+                            chunk = response.read(CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            received += len(chunk)
+                if os.path.getsize(dest) >= size:
+                    break
+            except urllib.error.HTTPError as e:
+                if e.code < 500 or attempt == self.retry.attempts:
+                    raise ReplicationError(f"{url}: HTTP {e.code}") from e
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.retry.attempts:
+                    raise ReplicationError(f"{url}: {e}") from e
+                print(f"Download de {rel_path} interrompido (tentativa {attempt}): {e}")
+            self._sleep(attempt)
+        return received, resumed
+
+
+class BackupReplicator:
+    """Traz para esta instância os backups que só existem no peer
+
+    Catálogos e índices de blobs (sha256 por arquivo) são comparados antes
+    de qualquer transferência. Arquivos que já existem localmente em outro
+    backup do projeto (snapshots, dados repetidos) viram hardlinks; só o
+    resto é baixado, já comprimido como está no disco do peer. Cada backup
+    é montado em {projeto}/.replication/{backup}, conferido (sha256 de cada
+    arquivo e checksum do backup) e só então renomeado para o lugar final,
+    sob o lock do projeto. Uma replicação interrompida continua de onde
+    parou na próxima execução.
+    """
+
+    def __init__(self,
+                 manager: "BackupManager",
+                 peer: ReplicationPeer,
+                 workers: int = DEFAULT_WORKERS):
+        self.manager = manager
+        self.peer = peer
+        self.workers = max(1, workers)
+
+    def _local_blobs(self, project_id: str) -> Dict[str, str]:
+        """sha256 -> caminho dos arquivos de dados/assinaturas dos backups locais"""
+        project_dir = self.manager.project_dir(project_id)
+        blobs: Dict[str, str] = {}
+        for entry in self.manager.catalog(project_id).entries():
+            backup_dir = os.path.join(project_dir, entry["id"])
+            try:
+                files = blob_index(backup_dir, self.manager.validator.file_digest)
+            except OSError as e:
+                print(f"Índice de blobs indisponível para {entry['id']}: {e}")
+                continue
+            self._add_blobs(blobs, backup_dir, files)
+        return blobs
+
+    @staticmethod
+    def _add_blobs(blobs: Dict[str, str], backup_dir: str, files: Dict[str, Dict[str, Any]]) -> None:
+        for rel_path, info in files.items():
+            # Arquivos da raiz (metadata.json, manifesto) são regravados no lugar:
+            # compartilhar o inode com outro backup alteraria os dois
+            if "/" in rel_path:
+                path = os.path.join(backup_dir, rel_path)
+                if os.path.exists(path):
+                    blobs.setdefault(info["sha256"], path)
+
+    def run(self, project_ids: Optional[List[str]] = None) -> ReplicationReport:
+        report = ReplicationReport(peer=self.peer.base_url)
+        # Uma replicação por vez: duas montariam o mesmo backup em .replication
+        if not _RUNNING.acquire(blocking=False):
+            report.errors.append("Replicação já em andamento")
+            return report
+        started = time.perf_counter()
+        try:
+            catalog = self.peer.catalog(project_ids)
+            report.projects = len(catalog)
+            for project_id, entries in catalog.items():
+                self._replicate_project(project_id, entries, report)
+            report.success = not report.errors
+        except Exception as e:
+            print(f"Erro na replicação a partir de {self.peer.base_url}: {e}")
+            report.errors.append(str(e))
+        finally:
+            _RUNNING.release()
+        report.seconds = time.perf_counter() - started
+        print(f"Replicação a partir de {self.peer.base_url}: {len(report.backups_replicated)} backups, "
+              f"{report.bytes_fetched} bytes baixados, {report.bytes_reused} reaproveitados "
+              f"em {report.seconds:.1f}s")
+        return report
+
+    def _replicate_project(self, project_id: str, entries: List[Dict[str, Any]],
+                           report: ReplicationReport) -> None:
+        local = {e["id"]: e for e in self.manager.catalog(project_id).entries()}
+        pending = []
+        for entry in entries:
+            existing = local.get(entry["id"])
+            if existing is None:
+                pending.append(entry)
+            elif existing.get("checksum") == entry.get("checksum"):
+                report.backups_skipped += 1
+            else:
+                report.errors.append(f"{project_id}/{entry['id']}: já existe localmente com outro conteúdo")
+
+        staging_root = os.path.join(self.manager.project_dir(project_id), STAGING_DIRNAME)
+        if os.path.isdir(staging_root):
+            # Recebimentos de backups que o peer não tem mais
+            wanted = {e["id"] for e in pending}
+            for name in os.listdir(staging_root):
+                if name not in wanted:
+                    shutil.rmtree(os.path.join(staging_root, name), ignore_errors=True)
+        if not pending:
+            return
+
+        self.manager._ensure_project_dir(project_id)
+        blobs = self._local_blobs(project_id)
+        replicated = False
+        for entry in pending:
+            parent_id = entry.get("parent_backup_id")
+            if parent_id and parent_id not in local:
+                report.errors.append(f"{project_id}/{entry['id']}: backup base {parent_id} ausente")
+                continue
+            try:
+                files = self._replicate_backup(project_id, entry["id"], blobs, report)
+            except Exception as e:
+                print(f"Erro ao replicar backup {entry['id']}: {e}")
+                report.errors.append(f"{project_id}/{entry['id']}: {e}")
+                continue
+            local[entry["id"]] = entry
+            backup_dir = os.path.join(self.manager.project_dir(project_id), entry["id"])
+            self._add_blobs(blobs, backup_dir, files)
+            report.backups_replicated.append(entry["id"])
+            replicated = True
+        if os.path.isdir(staging_root) and not os.listdir(staging_root):
+            os.rmdir(staging_root)
+        if replicated:
+            # Réplica quente da instância de destino segue o último backup recebido
+            self.manager.standby.update(project_id)
+
+    def _verify(self, staging: str, files: Dict[str, Dict[str, Any]]) -> BackupMetadata:
+        """Confere o checksum do backup montado com os sha256 já verificados"""
+        with open(os.path.join(staging, "metadata.json"), "r") as f:
+            metadata = BackupMetadata.parse_raw(f.read())
+        if metadata.type in (BackupType.FULL.value, BackupType.DIFFERENTIAL.value,
+                             BackupType.INCREMENTAL.value) and metadata.checksum:
+            known = {rel_path[len("data/"):].replace("/", os.sep): info["sha256"]
+                     for rel_path, info in files.items() if rel_path.startswith("data/")}
+            checksum = self.manager.validator.calculate_checksum(os.path.join(staging, "data"), known)
+        elif metadata.type == BackupType.SNAPSHOT.value:
+            checksum = self.manager.validator.manifest_checksum(backup_files(metadata, staging))
+        else:
+            checksum = metadata.checksum
+        if checksum != metadata.checksum:
+            raise ReplicationError(f"Checksum divergente: {checksum} != {metadata.checksum}")
+        return metadata
+
+    def _fetch_environments(self, metadata: BackupMetadata, report: ReplicationReport) -> Tuple[int, int]:
+        """Traz do peer o que falta no cache de ambientes local para o backup
+
+        Manifestos e pacotes são endereçados pelo conteúdo: o que já existe
+        localmente (de outro projeto ou backup) não é baixado.
+        """
+        cache = self.manager.environments
+        file_digest = self.manager.validator.file_digest
+        fetched = received = 0
+        for info in metadata.environments:
+            for _ in range(2):  # Sem o manifesto local, primeiro ele e depois os pacotes
+                for name, size, sha256 in cache.missing(info):
+                    dest = os.path.join(cache.root, name)
+                    part = dest + PART_SUFFIX
+                    os.makedirs(os.path.dirname(dest), exist_ok=True)
+                    if not os.path.exists(part):
+                        open(part, "wb").close()
+                    nbytes, resumed = self.peer.fetch_env_object(name, part, size)
+                    if os.path.getsize(part) != size or file_digest(part, "sha256") != sha256:
+                        os.remove(part)
+                        raise ReplicationError(f"Conteúdo divergente em {name} do cache de ambientes")
+                    os.replace(part, dest)
+                    fetched += 1
+                    received += nbytes
+                    report.blobs_fetched += 1
+                    report.bytes_fetched += nbytes
+                    report.resumed += int(resumed)
+        return fetched, received
+
+    def _replicate_backup(self, project_id: str, backup_id: str, blobs: Dict[str, str],
+                          report: ReplicationReport) -> Dict[str, Dict[str, Any]]:
+        recorder = StageRecorder("replicate_backup")
+        file_digest = self.manager.validator.file_digest
+        with recorder.stage("index") as span:
+            files = self.peer.index(project_id, backup_id)
+            if "metadata.json" not in files:
+                raise ReplicationError("Índice sem metadata.json")
+            span.add(files=len(files))
+
+        project_dir = self.manager.project_dir(project_id)
+        staging = os.path.join(project_dir, STAGING_DIRNAME, backup_id)
+        os.makedirs(staging, exist_ok=True)
+
+        missing: List[Tuple[str, Dict[str, Any]]] = []
+        with recorder.stage("reuse") as span:
+            for rel_path, info in files.items():
+                dest = os.path.join(staging, rel_path)
+                if os.path.exists(dest):
+                    continue  # Conferido numa execução anterior
+                source = blobs.get(info["sha256"]) if "/" in rel_path else None
+                if source is None:
+                    missing.append((rel_path, info))
+                    continue
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                try:
+                    os.link(source, dest)
+                except OSError:
+                    shutil.copy2(source, dest)
+                report.blobs_reused += 1
+                report.bytes_reused += info["size"]
+                span.add(files=1, bytes=info["size"])
+
+        def fetch(rel_path: str, info: Dict[str, Any]) -> Tuple[int, bool]:
+            dest = os.path.join(staging, rel_path)
+            part = dest + PART_SUFFIX
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if not os.path.exists(part):
+                open(part, "wb").close()
+            received, resumed = self.peer.fetch(project_id, backup_id, rel_path, part, info["size"])
+            if os.path.getsize(part) != info["size"] or file_digest(part, "sha256") != info["sha256"]:
+                os.remove(part)
+                raise ReplicationError(f"Conteúdo divergente em {rel_path}")
+            os.replace(part, dest)
+            return received, resumed
+
+        with recorder.stage("fetch") as span:
+            with ThreadPoolExecutor(self.workers) as pool:
+                futures = [pool.submit(fetch, rel_path, info) for rel_path, info in missing]
+                for future in futures:
+                    received, resumed = future.result()
+                    report.blobs_fetched += 1
+                    report.bytes_fetched += received
+                    report.resumed += int(resumed)
+                    span.add(files=1, bytes=received)
+
+        with recorder.stage("verify"):
+            metadata = self._verify(staging, files)
+            if metadata.id != backup_id or metadata.project_id != project_id:
+                raise ReplicationError(f"Metadados de outro backup: {metadata.project_id}/{metadata.id}")
+            write_index(staging, files)
+
+        if metadata.environments:
+            with recorder.stage("environments") as span:
+                fetched, received = self._fetch_environments(metadata, report)
+                span.add(files=fetched, bytes=received)
+
+        with recorder.stage("commit"):
+            with self.manager.volumes.project_lock(project_id):
+                if self.manager.project_dir(project_id) != project_dir:
+                    raise ReplicationError("Projeto mudou de volume durante a replicação")
+                final = os.path.join(project_dir, backup_id)
+                if os.path.exists(final):
+                    raise ReplicationError("Backup criado localmente durante a replicação")
+                os.rename(staging, final)
+                self.manager._register(metadata)
+                if self.manager.remote is not None:
+                    self.manager._push(metadata)
+        STAGE_METRICS.record("replicate_backup", recorder.timings())
+        print(f"Backup {backup_id} replicado: {len(missing)} arquivos baixados, "
+              f"{len(files) - len(missing)} reaproveitados")
+        return files
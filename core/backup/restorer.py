@@ -0,0 +1,286 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .models import BackupMetadata, FileInfo, FileVerification, RestoreMode, RestoreReport
+from .blocks import slice_chunks
+from .compressor import BackupCompressor
+from .delta import apply_delta_file
+from .differential import DesiredFile, apply_metadata, plan_restore, writes
+from .dictionary import DictionaryStore
+from .environments import environment_excludes
+from .manifest import backup_files
+from .gitrepo import rules_without_objects
+from .metrics import StageRecorder
+from .pagecache import CachePolicy, CacheFriendlyWriter, iter_file
+from .rules import CompiledRules, with_excludes
+
+
+def default_restore_workers() -> int:
+    """Um worker por CPU (mínimo 2): zlib, lzma, hashlib e I/O liberam o GIL"""
+    return max(2, os.cpu_count() or 1)
+
+
+def backup_rules(metadata: BackupMetadata) -> Optional[CompiledRules]:
+    """Regras com que o backup escaneou a árvore
+
+    As de metadata.rules mais os ambientes e o .git/objects dos
+    repositórios, que vêm do cache de ambientes e dos packs, não do
+    manifesto: o que elas excluem nunca é extra no destino.
+    """
+    rules = with_excludes(metadata.rules,
+                          environment_excludes((env.path, env.kind) for env in metadata.environments))
+    return rules_without_objects(rules, [repo.path for repo in metadata.git])
+
+
+class RestoreRegistry:
+    """Backups sendo lidos por restaurações em andamento
+
+    Processos de manutenção (como a migração para a camada fria) consultam
+    o registro para não mexer em backups de uma cadeia em restauração.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Counter = Counter()
+
+    @contextmanager
+    def hold(self, project_id: str, backup_ids: Iterable[str]) -> Iterator[None]:
+        keys = [(project_id, backup_id) for backup_id in backup_ids]
+        with self._lock:
+            self._active.update(keys)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active.subtract(keys)
+                self._active += Counter()  # Descarta contadores zerados
+
+    def busy(self, project_id: str, backup_id: Optional[str] = None) -> bool:
+        """Se o backup (ou qualquer backup do projeto) está em restauração"""
+        with self._lock:
+            if backup_id is not None:
+                return self._active[(project_id, backup_id)] > 0
+            return any(project == project_id for project, _ in self._active)
+
+
+# Registro compartilhado por todos os gerenciadores do processo
+ACTIVE_RESTORES = RestoreRegistry()
+
+
+@dataclass
+class RestoreStep:
+    """Uma versão armazenada de um arquivo a ser aplicada na restauração"""
+    backup_id: str
+    data_dir: str
+    file_info: FileInfo
+    zdict: Optional[bytes] = None  # Dicionário de compressão do backup
+
+
+class ParallelRestorer:
+    """Restaura o estado final de uma cadeia de backups com um pool limitado de workers
+
+    Cada arquivo é descomprimido em streaming direto para o destino e o md5
+    é calculado sobre os mesmos bytes escritos, sem releitura.
+    """
+
+    def __init__(self,
+                 compressor: BackupCompressor,
+                 cache_policy: Optional[CachePolicy] = None,
+                 workers: Optional[int] = None):
+        self.compressor = compressor
+        self.cache_policy = cache_policy
+        self.workers = workers or default_restore_workers()
+
+    def plan(self,
+             chain: List[BackupMetadata],
+             base_dir: str,
+             only: Optional[Set[str]] = None) -> Tuple[Dict[str, List[RestoreStep]], Set[str]]:
+        """Resolve o estado final de cada caminho ao longo da cadeia (do completo ao alvo)
+
+        Retorna os passos por arquivo (uma versão completa seguida dos deltas
+        aplicados sobre ela) e os caminhos removidos. only restringe a
+        resolução a alguns caminhos.
+        """
+        files: Dict[str, List[RestoreStep]] = {}
+        removed: Set[str] = set()
+        for backup in chain:
+            data_dir = os.path.join(base_dir, backup.project_id, backup.id, "data")
+            zdict = None
+            if backup.compression and backup.compression.dictionary_id:
+                store = DictionaryStore(os.path.join(base_dir, backup.project_id))
+                zdict = store.get(backup.compression.dictionary_id)
+            backup_dir = os.path.join(base_dir, backup.project_id, backup.id)
+            for file_info in backup_files(backup, backup_dir, only):
+                if file_info.is_deleted:
+                    files.pop(file_info.path, None)
+                    removed.add(file_info.path)
+                    continue
+                step = RestoreStep(backup.id, data_dir, file_info, zdict)
+                if file_info.delta and file_info.path in files:
+                    files[file_info.path].append(step)
+                else:
+                    files[file_info.path] = [step]
+                removed.discard(file_info.path)
+        return files, removed
+
+    def _stored_chunks(self, step: RestoreStep) -> Iterator[bytes]:
+        file_info = step.file_info
+        src = os.path.join(step.data_dir, file_info.path)
+        if file_info.delta:
+            src += ".delta"
+        if file_info.compressed:
+            return self.compressor.iter_decompressed(src + ".compressed", zdict=step.zdict)
+        return iter_file(src, self.cache_policy)
+
+    def _restore_file(self, path: str, steps: List[RestoreStep], restore_dir: str) -> Tuple[FileVerification, int]:
+        final = steps[-1]
+        result = FileVerification(path=path, backup_id=final.backup_id,
+                                  expected=final.file_info.checksum)
+        dest = os.path.join(restore_dir, path)
+        written = 0
+        try:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            for step in steps:
+                if step.file_info.delta:
+                    # A versão anterior já está em dest; o delta confere o próprio md5
+                    result.actual = apply_delta_file(self._stored_chunks(step), dest, dest,
+                                                     self.cache_policy)
+                    written += step.file_info.size
+                    continue
+                hasher = hashlib.md5()
+                with CacheFriendlyWriter(dest, self.cache_policy) as out:
+                    for chunk in self._stored_chunks(step):
+                        hasher.update(chunk)
+                        out.write(chunk)
+                    written += out.bytes_written
+                result.actual = hasher.hexdigest()
+            mtime = final.file_info.modified_at.timestamp()
+            os.utime(dest, (mtime, mtime))
+            result.ok = result.actual == result.expected
+            if not result.ok:
+                result.error = "Checksum divergente"
+        except Exception as e:
+            result.error = str(e)
+        return result, written
+
+    def iter_version(self,
+                     path: str,
+                     steps: List[RestoreStep],
+                     byte_range: Optional[Tuple[int, int]] = None) -> Iterator[bytes]:
+        """Conteúdo de uma versão de um arquivo, conferido pelo md5
+
+        Uma versão armazenada inteira é lida direto do backup; com deltas, é
+        reconstruída num diretório temporário. Com byte_range só a faixa
+        [início, fim] é devolvida: num arquivo em blocos, apenas os blocos da
+        faixa são lidos (conferidos pelo crc32 de cada bloco, não pelo md5).
+        """
+        if len(steps) == 1 and not steps[0].file_info.delta:
+            step = steps[0]
+            if byte_range:
+                start, end = byte_range
+                src = os.path.join(step.data_dir, path)
+                if step.file_info.compressed:
+                    yield from self.compressor.iter_range(src + ".compressed", start, end, step.zdict)
+                else:
+                    yield from slice_chunks(iter_file(src, self.cache_policy), start, end)
+                return
+            hasher = hashlib.md5()
+            for chunk in self._stored_chunks(step):
+                hasher.update(chunk)
+                yield chunk
+            if hasher.hexdigest() != step.file_info.checksum:
+                raise ValueError(f"Checksum divergente em {path}")
+            return
+        with tempfile.TemporaryDirectory(prefix="version-") as tmp_dir:
+            result, _ = self._restore_file(path, steps, tmp_dir)
+            if not result.ok:
+                raise ValueError(f"Falha ao reconstruir {path}: {result.error}")
+            chunks = iter_file(os.path.join(tmp_dir, path), self.cache_policy)
+            yield from slice_chunks(chunks, *byte_range) if byte_range else chunks
+
+    def restore(self,
+                chain: List[BackupMetadata],
+                base_dir: str,
+                restore_dir: str,
+                report: RestoreReport,
+                recorder: StageRecorder,
+                only: Optional[Set[str]] = None) -> RestoreReport:
+        """Restaura a cadeia em restore_dir preenchendo o relatório
+
+        No modo diferencial só os arquivos que diferem do destino são
+        escritos e os que sobram são removidos; com report.dry_run (em
+        qualquer modo) só o plano diferencial é preenchido, sem alterar nada.
+        only restringe a restauração a alguns caminhos.
+        """
+        report.workers = self.workers
+        with recorder.stage("plan") as span:
+            files, removed = self.plan(chain, base_dir, only)
+            span.add(files=len(files) + len(removed))
+
+        if report.mode == RestoreMode.DIFFERENTIAL or report.dry_run:
+            with recorder.stage("diff") as span:
+                desired = {
+                    path: DesiredFile(path, steps[-1].file_info.size,
+                                      steps[-1].file_info.modified_at.timestamp(),
+                                      steps[-1].file_info.checksum)
+                    for path, steps in files.items()
+                }
+                report.plan = plan_restore(restore_dir, desired, backup_rules(chain[-1]),
+                                           self.workers, self.cache_policy)
+                span.add(files=len(desired) + report.plan.files_to_delete)
+            print(f"Plano diferencial: {report.plan.files_to_create} novos, "
+                  f"{report.plan.files_to_update} alterados, {report.plan.files_to_delete} removidos, "
+                  f"{report.plan.unchanged} inalterados ({report.plan.hashed} conferidos por hash)")
+            if report.dry_run:
+                report.success = True
+                return report
+            changed = set(writes(report.plan))
+            files = {path: steps for path, steps in files.items() if path in changed}
+            with recorder.stage("remove") as span:
+                report.files_removed = apply_metadata(restore_dir, report.plan)
+                span.add(files=report.files_removed)
+        else:
+            with recorder.stage("remove") as span:
+                for path in removed:
+                    dest = os.path.join(restore_dir, path)
+                    if os.path.exists(dest):
+                        print(f"Removendo arquivo {dest}")
+                        os.remove(dest)
+                        report.files_removed += 1
+                span.add(files=report.files_removed)
+
+        def collect(futures):
+            for future in futures:
+                result, written = future.result()
+                report.files.append(result)
+                report.bytes_written += written
+                if result.ok:
+                    report.files_restored += 1
+                else:
+                    report.files_failed += 1
+                    print(f"Falha ao restaurar {result.path}: {result.error}")
+
+        with recorder.stage("write") as span:
+            os.makedirs(restore_dir, exist_ok=True)
+            # Submissão limitada: no máximo 4 arquivos pendentes por worker
+            max_pending = self.workers * 4
+            with ThreadPoolExecutor(max_workers=self.workers,
+                                    thread_name_prefix="restore") as pool:
+                pending = set()
+                for path, steps in files.items():
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(pool.submit(self._restore_file, path, steps, restore_dir))
+                collect(wait(pending)[0])
+            span.add(files=len(files), bytes=report.bytes_written)
+
+        report.files.sort(key=lambda f: f.path)
+        report.success = report.files_failed == 0
+        return report
@@ -0,0 +1,249 @@
+import os
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Pattern, Set, Tuple
+from .models import BackupRules
+
+RULES_FILENAME = "rules.json"
+
+# Padrões comuns para projetos Python/Node (não aplicados por padrão)
+COMMON_EXCLUDES = [
+    "node_modules/",
+    "venv/",
+    ".venv/",
+    "__pycache__/",
+    "*.py[cod]",
+    "build/",
+    "dist/",
+    "*.log",
+    ".pytest_cache/",
+    ".mypy_cache/",
+]
+
+
+def _translate(pattern: str) -> str:
+    """Converte um glob estilo gitignore (sem "!" e "/" final) em regex"""
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape("["))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    body = "".join(out)
+    if anchored:
+        return f"^{body}$"
+    return f"^(?:.*/)?{body}$"
+
+
+def _normalize_extension(ext: str) -> str:
+    ext = ext.lower()
+    return ext if ext.startswith(".") else f".{ext}"
+
+
+class CompiledRules:
+    """Regras de backup compiladas uma única vez para consulta rápida"""
+
+    def __init__(self, rules: BackupRules):
+        self.rules = rules
+        self._ordered: List[Tuple[Pattern, bool, bool]] = []  # (regex, negado, só diretório)
+        self._has_negation = False
+        any_patterns = []
+        dir_patterns = []
+
+        for raw in rules.exclude:
+            pattern = raw.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            if negated:
+                pattern = pattern[1:]
+                self._has_negation = True
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            if not pattern:
+                continue
+            regex = _translate(pattern)
+            self._ordered.append((re.compile(regex), negated, dir_only))
+            (dir_patterns if dir_only else any_patterns).append(regex)
+
+        # Sem negações, todas as regras viram uma única alternância
+        self._any_re = re.compile("|".join(any_patterns)) if any_patterns else None
+        self._dir_re = re.compile("|".join(dir_patterns)) if dir_patterns else None
+
+        include = [p.strip().rstrip("/") for p in rules.include if p.strip()]
+        self._include_re = re.compile("|".join(_translate(p) for p in include)) if include else None
+        self._exclude_ext = tuple(_normalize_extension(e) for e in rules.exclude_extensions)
+        self._include_ext = tuple(_normalize_extension(e) for e in rules.include_extensions)
+        self._dir_cache: Dict[str, bool] = {}
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self._ordered or self._include_re or self._exclude_ext
+                    or self._include_ext or self.rules.max_file_size is not None)
+
+    def _excluded(self, rel_path: str, is_dir: bool) -> bool:
+        if not self._has_negation:
+            if self._any_re and self._any_re.match(rel_path):
+                return True
+            return bool(is_dir and self._dir_re and self._dir_re.match(rel_path))
+        # Com negações, vale a última regra que casar
+        excluded = False
+        for regex, negated, dir_only in self._ordered:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                excluded = not negated
+        return excluded
+
+    def excludes_dir(self, rel_dir: str) -> bool:
+        """Indica se um diretório (relativo à raiz) deve ser podado"""
+        rel_dir = rel_dir.replace(os.sep, "/")
+        cached = self._dir_cache.get(rel_dir)
+        if cached is None:
+            cached = self._excluded(rel_dir, True)
+            self._dir_cache[rel_dir] = cached
+        return cached
+
+    def _matches_file(self, rel_path: str, size: Optional[int]) -> bool:
+        if self._excluded(rel_path, False):
+            return False
+        if self._exclude_ext or self._include_ext:
+            ext = os.path.splitext(rel_path)[1].lower()
+            if ext in self._exclude_ext:
+                return False
+            if self._include_ext and ext not in self._include_ext:
+                return False
+        if self._include_re and not self._include_re.match(rel_path):
+            return False
+        if size is not None and self.rules.max_file_size is not None:
+            return size <= self.rules.max_file_size
+        return True
+
+    def matches_file(self, rel_path: str, size: Optional[int] = None) -> bool:
+        """Avalia só o próprio arquivo (o walk já podou os diretórios ancestrais)"""
+        return self._matches_file(rel_path.replace(os.sep, "/"), size)
+
+    def dir_pruned(self, rel_dir: str) -> bool:
+        """Indica se um diretório ou algum ancestral dele é podado"""
+        parts = rel_dir.replace(os.sep, "/").strip("/").split("/")
+        return any(self.excludes_dir("/".join(parts[:depth]))
+                   for depth in range(1, len(parts) + 1) if parts[0])
+
+    def includes_file(self, rel_path: str, size: Optional[int] = None) -> bool:
+        """Indica se um arquivo entra no backup, considerando os diretórios ancestrais"""
+        rel_path = rel_path.replace(os.sep, "/")
+        parent = rel_path.rpartition("/")[0]
+        if parent and self.dir_pruned(parent):
+            return False
+        return self._matches_file(rel_path, size)
+
+    def walk(self, root: str, prefix: str = "") -> Iterator[Tuple[str, str, List[str]]]:
+        """os.walk com poda de diretórios excluídos
+
+        Retorna (dirpath, caminho relativo do diretório, arquivos incluídos).
+        prefix é o caminho relativo de root em relação à raiz do projeto.
+        """
+        root_rel_base = prefix.replace(os.sep, "/").strip("/")
+        for dirpath, dirnames, filenames in os.walk(root):
+            rel_dir = os.path.relpath(dirpath, root)
+            rel_dir = "" if rel_dir == "." else rel_dir.replace(os.sep, "/")
+            if root_rel_base:
+                rel_dir = f"{root_rel_base}/{rel_dir}" if rel_dir else root_rel_base
+            base = f"{rel_dir}/" if rel_dir else ""
+            # Poda in-place: os.walk não desce nos diretórios removidos
+            dirnames[:] = [d for d in dirnames if not self.excludes_dir(base + d)]
+            kept = []
+            for filename in filenames:
+                rel_path = base + filename
+                size = None
+                if self.rules.max_file_size is not None:
+                    try:
+                        size = os.path.getsize(os.path.join(dirpath, filename))
+                    except OSError:
+                        continue
+                if self._matches_file(rel_path, size):
+                    kept.append(filename)
+            yield dirpath, rel_dir, kept
+
+    def copytree_ignore(self, root: str) -> Callable[[str, List[str]], Set[str]]:
+        """Função ignore para shutil.copytree baseada nas regras"""
+        def ignore(dirpath: str, names: List[str]) -> Set[str]:
+            rel_dir = os.path.relpath(dirpath, root)
+            base = "" if rel_dir == "." else rel_dir.replace(os.sep, "/") + "/"
+            ignored = set()
+            for name in names:
+                full_path = os.path.join(dirpath, name)
+                if os.path.isdir(full_path) and not os.path.islink(full_path):
+                    if self.excludes_dir(base + name):
+                        ignored.add(name)
+                else:
+                    size = os.path.getsize(full_path) if self.rules.max_file_size is not None else None
+                    if not self._matches_file(base + name, size):
+                        ignored.add(name)
+            return ignored
+        return ignore
+
+
+def compile_rules(rules: Optional[BackupRules]) -> Optional[CompiledRules]:
+    """Compila as regras, retornando None quando não há nada a filtrar"""
+    if rules is None:
+        return None
+    compiled = CompiledRules(rules)
+    return None if compiled.is_empty else compiled
+
+
+def with_excludes(rules: Optional[BackupRules], excludes: List[str]) -> Optional[BackupRules]:
+    """Regras acrescidas de exclusões no início (um "!" do usuário ainda pode reincluí-las)"""
+    if not excludes:
+        return rules
+    base = rules or BackupRules()
+    return base.copy(update={"exclude": list(excludes) + list(base.exclude)})
+
+
+def load_rules(project_dir: str) -> Optional[BackupRules]:
+    """Carrega as regras persistidas de um projeto"""
+    path = os.path.join(project_dir, RULES_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return BackupRules.parse_raw(f.read())
+
+
+def save_rules(project_dir: str, rules: Optional[BackupRules]) -> None:
+    """Persiste (ou remove, se None) as regras de um projeto"""
+    path = os.path.join(project_dir, RULES_FILENAME)
+    if rules is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(project_dir, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(rules.json(indent=2))
@@ -0,0 +1,53 @@
+import errno
+import fcntl
+import os
+import shutil
+from typing import Optional
+from .pagecache import CachePolicy, copy_file
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) de <linux/fs.h>
+
+# Métodos usados para materializar um arquivo no snapshot
+LINKED = "linked"         # Hardlink do snapshot anterior
+REFLINKED = "reflinked"   # Cópia copy-on-write (btrfs, xfs, ...)
+COPIED = "copied"         # Cópia convencional
+
+_NO_REFLINK_ERRORS = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL,
+                      errno.ENOSYS, errno.EBADF, errno.EPERM)
+
+
+def reflink(src: str, dest: str) -> bool:
+    """Tenta clonar src em dest via FICLONE; retorna False se o fs não suportar"""
+    try:
+        with open(src, "rb") as s, open(dest, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except OSError as e:
+        if os.path.exists(dest):
+            os.remove(dest)
+        if e.errno in _NO_REFLINK_ERRORS:
+            return False
+        raise
+    shutil.copystat(src, dest)
+    return True
+
+
+def clone_file(src: str, dest: str, policy: Optional[CachePolicy] = None) -> str:
+    """Copia src para dest usando reflink quando possível"""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if reflink(src, dest):
+        return REFLINKED
+    copy_file(src, dest, policy)
+    return COPIED
+
+
+def link_file(src: str, dest: str, policy: Optional[CachePolicy] = None) -> str:
+    """Reaproveita um arquivo imutável de outro snapshot (hardlink, reflink ou cópia)"""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.link(src, dest)
+        return LINKED
+    except OSError as e:
+        # EXDEV: outro filesystem; EMLINK: limite de links do inode
+        if e.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM, errno.ENOTSUP):
+            raise
+    return clone_file(src, dest, policy)
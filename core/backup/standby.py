@@ -0,0 +1,502 @@
+import errno
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+from .models import (BackupMetadata, BackupStatus, BackupType, RestoreMode, RestoreReport,
+                     StandbyInfo, StandbyPromotion, StandbyVerification)
+from .catalog import BackupFilter
+from .differential import MTIME_TOLERANCE, file_md5, remove_extraneous
+from .manifest import DELETED, Manifest, diff_manifests, iter_tree
+from .metrics import STAGE_METRICS, StageRecorder
+from .restorer import ACTIVE_RESTORES, ParallelRestorer, backup_rules
+from .snapshot import REFLINKED, clone_file
+
+if TYPE_CHECKING:
+    from .manager import BackupManager
+
+STANDBY_FILENAME = "standby.json"   # {projeto}/standby.json: configuração e estado da réplica
+STAGING_SUFFIX = ".standby-new"     # Réplica sendo reconstruída ao lado da atual
+OLD_SUFFIX = ".standby-old"         # Réplica anterior durante a troca
+# Tipos que representam um estado completo do projeto (checkpoints só marcam snapshots)
+RESTORABLE_TYPES = [BackupType.FULL.value, BackupType.DIFFERENTIAL.value, BackupType.INCREMENTAL.value,
+                    BackupType.SNAPSHOT.value]
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+class MerkleTree:
+    """Árvore Merkle de um estado de arquivos
+
+    As folhas são os md5 dos arquivos e cada diretório é o sha256 dos
+    (nome, hash) dos filhos em ordem. Duas árvores com a mesma raiz têm o
+    mesmo conteúdo, e a comparação só desce nos diretórios com hash diferente.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, bytes]]):
+        # Diretório -> filho -> md5 (arquivo) ou None (subdiretório)
+        self.children: Dict[str, Dict[str, Optional[bytes]]] = {"": {}}
+        for path, digest in entries:
+            rel_dir, _, name = path.rpartition("/")
+            self.children.setdefault(rel_dir, {})[name] = digest
+            while rel_dir:
+                parent, _, name = rel_dir.rpartition("/")
+                siblings = self.children.setdefault(parent, {})
+                if name in siblings:
+                    break
+                siblings[name] = None
+                rel_dir = parent
+        self.hashes: Dict[str, bytes] = {}
+        # Mais profundos primeiro: o hash de um diretório usa o dos filhos
+        for rel_dir in sorted(self.children, key=lambda d: d.count("/") + bool(d), reverse=True):
+            hasher = hashlib.sha256()
+            for name, digest in sorted(self.children[rel_dir].items()):
+                node = b"d" + self.hashes[_join(rel_dir, name)] if digest is None else b"f" + digest
+                hasher.update(name.encode("utf-8", "surrogateescape") + b"\0" + node)
+            self.hashes[rel_dir] = hasher.digest()
+
+    @classmethod
+    def from_manifest(cls, manifest: Manifest) -> "MerkleTree":
+        return cls((manifest.path(i), manifest.digest(i)) for i in range(len(manifest)))
+
+    @property
+    def root(self) -> str:
+        return self.hashes[""].hex()
+
+    def files(self, rel_dir: str = "") -> Iterator[str]:
+        """Arquivos sob um diretório"""
+        for name, digest in self.children.get(rel_dir, {}).items():
+            path = _join(rel_dir, name)
+            if digest is None:
+                yield from self.files(path)
+            else:
+                yield path
+
+    def diff(self, other: "MerkleTree") -> Tuple[List[str], List[str], List[str]]:
+        """(alterados, ausentes em other, sobrando em other)"""
+        changed: List[str] = []
+        missing: List[str] = []
+        extraneous: List[str] = []
+        absent = object()
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            if self.hashes.get(rel_dir) == other.hashes.get(rel_dir):
+                continue
+            mine = self.children.get(rel_dir, {})
+            theirs = other.children.get(rel_dir, {})
+            for name in sorted(mine.keys() | theirs.keys()):
+                path = _join(rel_dir, name)
+                expected, actual = mine.get(name, absent), theirs.get(name, absent)
+                if expected is None and actual is None:
+                    stack.append(path)
+                elif expected is not absent and actual is not absent \
+                        and expected is not None and actual is not None:
+                    if expected != actual:
+                        changed.append(path)
+                else:
+                    # Um dos lados não tem o caminho, ou é arquivo de um lado e diretório do outro
+                    if expected is not absent:
+                        missing.extend(self.files(path) if expected is None else [path])
+                    if actual is not absent:
+                        extraneous.extend(other.files(path) if actual is None else [path])
+        return sorted(changed), sorted(missing), sorted(extraneous)
+
+
+class WarmStandby:
+    """Réplica quente por projeto: o último backup sempre materializado num diretório
+
+    Cada backup concluído é aplicado sobre a réplica logo em seguida, pela
+    diferença entre o manifesto dele e o do backup já materializado: só os
+    arquivos alterados são escritos, os removidos são apagados e os mtimes
+    corrigidos. Depois de aplicar, a réplica é conferida pelo stat contra a
+    árvore Merkle do manifesto. Restaurar o último ponto vira a promoção da
+    réplica: um rename (ou clone com reflink, que mantém a réplica).
+    """
+
+    def __init__(self, manager: "BackupManager"):
+        self.manager = manager
+
+    def _state_path(self, project_id: str) -> str:
+        return os.path.join(self.manager.project_dir(project_id), STANDBY_FILENAME)
+
+    def load(self, project_id: str) -> Optional[StandbyInfo]:
+        path = self._state_path(project_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return StandbyInfo.parse_raw(f.read())
+
+    def _save(self, info: StandbyInfo) -> None:
+        path = self._state_path(info.project_id)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(info.json())
+        os.replace(tmp, path)
+
+    def latest(self, project_id: str) -> Optional[BackupMetadata]:
+        """Último backup concluído que representa um estado completo do projeto"""
+        filters = BackupFilter(types=RESTORABLE_TYPES, statuses=[BackupStatus.COMPLETED.value])
+        page = self.manager.catalog(project_id).page(limit=1, filters=filters, fields=["id"])
+        if not page.items:
+            return None
+        return self.manager.get_backup_info(page.items[0]["id"], project_id)
+
+    def enable(self, project_id: str, path: str) -> StandbyInfo:
+        """Ativa a réplica do projeto em path e a materializa com o último backup
+
+        O diretório precisa não existir ou estar vazio: a réplica é
+        reconstruída por troca e o que houver nele seria descartado.
+        """
+        path = os.path.abspath(path)
+        with self.manager.volumes.project_lock(project_id):
+            info = self.load(project_id)
+            if info is None or info.path != path:
+                if os.path.exists(path) and (not os.path.isdir(path) or os.listdir(path)):
+                    raise ValueError(f"Diretório da réplica já existe e não está vazio: {path}")
+                info = StandbyInfo(project_id=project_id, path=path)
+                self.manager._ensure_project_dir(project_id)
+                self._save(info)
+                print(f"Réplica quente de {project_id} ativada em {path}")
+            return self.update(project_id)
+
+    def disable(self, project_id: str, remove: bool = False) -> bool:
+        """Desativa a réplica; remove também apaga o diretório dela"""
+        with self.manager.volumes.project_lock(project_id):
+            info = self.load(project_id)
+            if info is None:
+                return False
+            os.remove(self._state_path(project_id))
+            if remove and os.path.isdir(info.path):
+                shutil.rmtree(info.path)
+            print(f"Réplica quente de {project_id} desativada")
+            return True
+
+    def _verify(self,
+                info: StandbyInfo,
+                metadata: BackupMetadata,
+                manifest: Manifest,
+                tree: MerkleTree,
+                deep: bool) -> StandbyVerification:
+        """Monta a árvore Merkle da réplica e compara com a do manifesto
+
+        Sem deep, arquivos com tamanho e mtime do manifesto herdam o md5
+        registrado (como a restauração diferencial) e só os demais são lidos.
+        """
+        started = time.perf_counter()
+        expected = {manifest.path(i): i for i in range(len(manifest))}
+        entries: List[Tuple[str, bytes]] = []
+        pending: List[str] = []
+        for rel_path, stat in iter_tree(info.path, backup_rules(metadata)):
+            index = expected.get(rel_path)
+            if not deep and index is not None and stat.st_size == manifest.sizes[index] \
+                    and abs(stat.st_mtime - manifest.mtimes[index]) <= MTIME_TOLERANCE:
+                entries.append((rel_path, manifest.digest(index)))
+            else:
+                pending.append(rel_path)
+        if pending:
+            workers = self.manager.restore_workers or max(2, os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="standby-verify") as pool:
+                digests = pool.map(lambda p: file_md5(os.path.join(info.path, p), self.manager.cache_policy),
+                                   pending)
+                entries.extend((p, bytes.fromhex(d)) for p, d in zip(pending, digests))
+        actual = MerkleTree(entries)
+        changed, missing, extraneous = tree.diff(actual)
+        return StandbyVerification(
+            project_id=info.project_id,
+            backup_id=metadata.id,
+            ok=actual.root == tree.root,
+            deep=deep,
+            merkle_root=tree.root,
+            actual_root=actual.root,
+            files=len(entries),
+            hashed=len(pending),
+            changed=changed,
+            missing=missing,
+            extraneous=extraneous,
+            seconds=time.perf_counter() - started
+        )
+
+    def _write(self,
+               info: StandbyInfo,
+               metadata: BackupMetadata,
+               paths: Set[str],
+               recorder: StageRecorder) -> int:
+        """Restaura alguns caminhos do backup na réplica; retorna os arquivos escritos"""
+        if not paths:
+            return 0
+        chain = self.manager._resolve_chain(metadata.id, metadata.project_id)
+        restorer = ParallelRestorer(self.manager.compressor, self.manager.cache_policy,
+                                    self.manager.restore_workers)
+        report = RestoreReport(backup_id=metadata.id, project_id=metadata.project_id,
+                               restore_dir=info.path, mode=RestoreMode.FULL)
+        with ACTIVE_RESTORES.hold(metadata.project_id, [b.id for b in chain]):
+            restorer.restore(chain, self.manager.volumes.root_for(metadata.project_id), info.path,
+                             report, recorder, only=paths)
+        if not report.success:
+            raise ValueError(f"{report.files_failed} arquivos com falha na verificação")
+        return report.files_restored
+
+    def _links_after(self, previous: BackupMetadata, metadata: BackupMetadata) -> List[BackupMetadata]:
+        """Elos da cadeia de metadata posteriores a previous (a cadeia toda se ele não faz parte)"""
+        links = [metadata]
+        while links[-1].parent_backup_id and links[-1].parent_backup_id != previous.id:
+            parent = self.manager.get_backup_info(links[-1].parent_backup_id, metadata.project_id)
+            if parent is None or any(b.id == parent.id for b in links):
+                break
+            links.append(parent)
+        links.reverse()
+        return links
+
+    def _apply(self,
+               info: StandbyInfo,
+               previous: BackupMetadata,
+               metadata: BackupMetadata,
+               manifest: Manifest,
+               recorder: StageRecorder) -> int:
+        """Leva a réplica do backup previous para metadata; retorna os arquivos alterados"""
+        replica = info.path
+        with recorder.stage("diff") as span:
+            old = self.manager._load_manifest(previous)
+            changed: Set[str] = set()
+            deleted: List[str] = []
+            for kind, i, j in diff_manifests(old, manifest):
+                if kind == DELETED:
+                    deleted.append(old.path(i))
+                else:
+                    changed.add(manifest.path(j))
+            # Mesmo conteúdo com outro mtime: só o utime (snapshots guardam o mtime arredondado)
+            old_mtimes = {old.path(i): old.mtimes[i] for i in range(len(old))}
+            touched = []
+            for j in range(len(manifest)):
+                path = manifest.path(j)
+                if path not in changed and abs(old_mtimes.get(path, 0.0) - manifest.mtimes[j]) > MTIME_TOLERANCE:
+                    touched.append((path, manifest.mtimes[j]))
+            span.add(files=len(changed) + len(deleted) + len(touched))
+
+        with self.manager.volumes.io(metadata.project_id):
+            with recorder.stage("remove") as span:
+                # Ambientes e repositórios que deixaram de vir do cache/packs voltam pelo manifesto
+                envs = {env.path for env in metadata.environments}
+                for path in info.environments:
+                    if path not in envs:
+                        shutil.rmtree(os.path.join(replica, path), ignore_errors=True)
+                repos = {repo.path for repo in metadata.git}
+                for path in info.repositories:
+                    if path not in repos:
+                        shutil.rmtree(os.path.join(replica, path, ".git", "objects"), ignore_errors=True)
+                removed = remove_extraneous(replica, deleted)
+                span.add(files=removed)
+
+            with recorder.stage("write") as span:
+                written = self._write(info, metadata, changed, recorder)
+                for path, mtime in touched:
+                    os.utime(os.path.join(replica, path), (mtime, mtime))
+                span.add(files=written + len(touched))
+
+            if metadata.git:
+                with recorder.stage("git_unpack") as span:
+                    # Os packs dos elos depois de previous completam os objetos já presentes
+                    span.add(files=self.manager._restore_git(self._links_after(previous, metadata), replica))
+            changed_envs = [env for env in metadata.environments
+                            if info.environments.get(env.path) != env.manifest]
+            if changed_envs:
+                with recorder.stage("env_rebuild") as span:
+                    span.add(files=self.manager._restore_environments(changed_envs, replica))
+        return written + removed + len(touched)
+
+    def _rebuild(self, info: StandbyInfo, metadata: BackupMetadata) -> int:
+        """Restaura o backup inteiro ao lado da réplica e troca os diretórios"""
+        staging = info.path + STAGING_SUFFIX
+        old = info.path + OLD_SUFFIX
+        shutil.rmtree(staging, ignore_errors=True)
+        report = self.manager.restore_backup_report(metadata.id, metadata.project_id, staging)
+        if not report.success:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise ValueError(f"Falha ao reconstruir a réplica: {report.error}")
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.lexists(info.path):
+            os.rename(info.path, old)
+        os.rename(staging, info.path)
+        shutil.rmtree(old, ignore_errors=True)
+        return report.files_restored
+
+    def _repair(self,
+                info: StandbyInfo,
+                metadata: BackupMetadata,
+                verification: StandbyVerification,
+                recorder: StageRecorder) -> int:
+        """Corrige os caminhos apontados pela verificação; retorna quantos"""
+        removed = remove_extraneous(info.path, verification.extraneous)
+        written = self._write(info, metadata, set(verification.changed) | set(verification.missing), recorder)
+        print(f"Réplica de {info.project_id}: {written} arquivos reescritos e {removed} removidos")
+        return written + removed
+
+    def update(self, project_id: str) -> Optional[StandbyInfo]:
+        """Aplica o último backup do projeto na réplica, se houver uma ativa
+
+        Chamado após cada backup concluído (ou replicado). Sem o backup
+        anterior da réplica, ou se a aplicação incremental falhar, a réplica
+        é reconstruída por inteiro. Falhas ficam em info.error e não afetam
+        o backup.
+        """
+        with self.manager.volumes.project_lock(project_id):
+            info = self.load(project_id)
+            if info is None:
+                return None
+            metadata = self.latest(project_id)
+            if metadata is None or (info.backup_id == metadata.id and os.path.isdir(info.path)):
+                return info
+            recorder = StageRecorder("standby_update")
+            started = time.perf_counter()
+            try:
+                if self.manager.remote is not None:
+                    with recorder.stage("hydrate") as span:
+                        hydrated, received = self.manager._hydrate_chain(metadata.id, project_id)
+                        span.add(files=hydrated, bytes=received)
+                manifest = self.manager._load_manifest(metadata)
+                tree = MerkleTree.from_manifest(manifest)
+                previous = None
+                if info.backup_id and os.path.isdir(info.path):
+                    previous = self.manager.get_backup_info(info.backup_id, project_id)
+                applied = None
+                if previous is not None:
+                    try:
+                        applied = self._apply(info, previous, metadata, manifest, recorder)
+                    except Exception as e:
+                        print(f"Réplica de {project_id}: aplicação incremental falhou ({e}), reconstruindo")
+                info.rebuilt = applied is None
+                if info.rebuilt:
+                    with recorder.stage("rebuild") as span:
+                        applied = self._rebuild(info, metadata)
+                        span.add(files=applied)
+
+                with recorder.stage("verify") as span:
+                    verification = self._verify(info, metadata, manifest, tree, deep=False)
+                    if not verification.ok:
+                        applied += self._repair(info, metadata, verification, recorder)
+                        verification = self._verify(info, metadata, manifest, tree, deep=False)
+                    span.add(files=verification.files)
+                if not verification.ok:
+                    raise ValueError(f"Réplica diverge do backup {metadata.id}: "
+                                     f"{len(verification.changed)} alterados, {len(verification.missing)} "
+                                     f"ausentes, {len(verification.extraneous)} sobrando")
+
+                info.backup_id = metadata.id
+                info.merkle_root = tree.root
+                info.files = len(manifest)
+                info.applied = applied
+                info.verified = True
+                info.environments = {env.path: env.manifest for env in metadata.environments}
+                info.repositories = [repo.path for repo in metadata.git]
+                info.error = None
+                STAGE_METRICS.record("standby_update", recorder.timings())
+                print(f"Réplica de {project_id} no backup {metadata.id}: {applied} arquivos aplicados"
+                      f"{' (reconstruída)' if info.rebuilt else ''}")
+            except Exception as e:
+                print(f"Erro ao atualizar a réplica de {project_id}: {e}")
+                # Estado desconhecido: a próxima atualização reconstrói
+                info.backup_id = info.merkle_root = None
+                info.verified = False
+                info.error = str(e)
+            info.updated_at = datetime.now()
+            info.seconds = time.perf_counter() - started
+            self._save(info)
+            return info
+
+    def verify(self, project_id: str, deep: bool = False) -> StandbyVerification:
+        """Confere a réplica contra a árvore Merkle do backup materializado"""
+        with self.manager.volumes.project_lock(project_id):
+            info = self.load(project_id)
+            if info is None:
+                raise ValueError(f"Projeto {project_id} sem réplica quente")
+            if info.backup_id is None:
+                return StandbyVerification(project_id=project_id)
+            metadata = self.manager.get_backup_info(info.backup_id, project_id)
+            if metadata is None:
+                raise ValueError(f"Backup da réplica não encontrado: {info.backup_id}")
+            manifest = self.manager._load_manifest(metadata)
+            tree = MerkleTree.from_manifest(manifest)
+            if tree.root != info.merkle_root:
+                raise ValueError(f"Manifesto do backup {metadata.id} diverge da raiz Merkle registrada")
+            return self._verify(info, metadata, manifest, tree, deep)
+
+    def promote(self,
+                project_id: str,
+                target_dir: str,
+                clone: bool = False,
+                deep: bool = False) -> StandbyPromotion:
+        """Entrega o último backup em target_dir a partir da réplica
+
+        A réplica é atualizada se estiver atrás do último backup e conferida
+        (deep lê todos os arquivos); divergências são corrigidas antes. Sem
+        clone o diretório é renomeado (mesmo filesystem) e a réplica é
+        reconstruída no próximo backup; com clone os arquivos são copiados
+        com reflink quando o filesystem permite e a réplica continua ativa.
+        """
+        started = time.perf_counter()
+        target_dir = os.path.abspath(target_dir)
+        with self.manager.volumes.project_lock(project_id):
+            info = self.load(project_id)
+            if info is None:
+                raise ValueError(f"Projeto {project_id} sem réplica quente")
+            metadata = self.latest(project_id)
+            if metadata is None:
+                raise ValueError(f"Nenhum backup concluído do projeto {project_id}")
+            if os.path.lexists(target_dir) and (not os.path.isdir(target_dir) or os.listdir(target_dir)):
+                raise ValueError(f"Destino já existe e não está vazio: {target_dir}")
+            if info.backup_id != metadata.id or not os.path.isdir(info.path):
+                info = self.update(project_id)
+                if info.backup_id != metadata.id:
+                    raise ValueError(f"Réplica desatualizada: {info.error}")
+
+            recorder = StageRecorder("standby_promote")
+            with recorder.stage("verify") as span:
+                verification = self.verify(project_id, deep)
+                repaired = 0
+                if not verification.ok:
+                    repaired = self._repair(info, metadata, verification, recorder)
+                    verification = self.verify(project_id, deep)
+                    if not verification.ok:
+                        raise ValueError(f"Réplica diverge do backup {metadata.id} mesmo após correção")
+                span.add(files=verification.files)
+
+            promotion = StandbyPromotion(project_id=project_id, backup_id=metadata.id,
+                                         target_dir=target_dir, method="clone" if clone else "rename",
+                                         repaired=repaired, verification=verification)
+            with recorder.stage("promote") as span:
+                if clone:
+                    def copy(src: str, dest: str) -> None:
+                        if clone_file(src, dest, self.manager.cache_policy) == REFLINKED:
+                            promotion.reflinked += 1
+                        else:
+                            promotion.copied += 1
+
+                    shutil.copytree(info.path, target_dir, symlinks=True, copy_function=copy,
+                                    dirs_exist_ok=True)
+                    promotion.files = promotion.reflinked + promotion.copied
+                else:
+                    if os.path.isdir(target_dir):
+                        os.rmdir(target_dir)
+                    os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+                    try:
+                        os.rename(info.path, target_dir)
+                    except OSError as e:
+                        if e.errno == errno.EXDEV:
+                            raise ValueError("Réplica e destino em filesystems diferentes: use clone") from e
+                        raise
+                    promotion.files = verification.files
+                    info.backup_id = info.merkle_root = None
+                    info.verified = False
+                    self._save(info)
+                span.add(files=promotion.files)
+        STAGE_METRICS.record("standby_promote", recorder.timings())
+        promotion.seconds = time.perf_counter() - started
+        print(f"Réplica de {project_id} promovida para {target_dir} ({promotion.method}) "
+              f"em {promotion.seconds:.2f}s")
+        return promotion
@@ -0,0 +1,606 @@
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .models import BackupType, EnvironmentInfo
+from .restorer import ACTIVE_RESTORES
+from .environments import EnvCacheError, EnvironmentCache
+
+PART_SIZE = 8 * 1024 * 1024             # Tamanho de cada parte (multipart e download por faixas)
+MULTIPART_THRESHOLD = 16 * 1024 * 1024  # Objetos menores vão em uma única requisição
+MAX_CONCURRENCY = 8                     # Transferências simultâneas de partes/arquivos
+DEFAULT_KEEP_RECENT = 3                 # Backups por projeto mantidos no cache local
+REMOTE_MARKER = "remote.json"           # Backup enviado por completo ao object store
+HYDRATING_DIRNAME = ".data.remote"      # Download em andamento de um backup removido do cache
+ENV_PREFIX = "envcache"                 # {prefixo}/envcache/...: cache de ambientes compartilhado
+# Só completos e incrementais saem do cache: snapshots servem de base para hardlinks
+EVICTABLE_TYPES = (BackupType.FULL.value, BackupType.DIFFERENTIAL.value, BackupType.INCREMENTAL.value)
+TRANSIENT_CODES = {"RequestTimeout", "RequestTimeTooSkewed", "SlowDown", "Throttling",
+                   "ThrottlingException", "InternalError", "ServiceUnavailable"}
+TRANSIENT_EXCEPTIONS = {"EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError",
+                        "ConnectionClosedError", "IncompleteReadError", "ResponseStreamingError"}
+
+
+class StorageError(Exception):
+    """Falha definitiva de uma operação no object store"""
+
+
+@dataclass
+class RetryPolicy:
+    """Retentativas com backoff exponencial e jitter para erros transitórios"""
+    attempts: int = 5
+    base_delay: float = 0.2
+    max_delay: float = 5.0
+
+
+def _error_info(exc: Exception) -> Tuple[str, int]:
+    response = getattr(exc, "response", None) or {}
+    code = response.get("Error", {}).get("Code", "")
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+    return code, status
+
+
+def is_transient(exc: Exception) -> bool:
+    """Erros de rede, throttling e 5xx valem nova tentativa; 4xx não"""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if type(exc).__name__ in TRANSIENT_EXCEPTIONS:
+        return True
+    code, status = _error_info(exc)
+    return code in TRANSIENT_CODES or status >= 500
+
+
+def is_not_found(exc: Exception) -> bool:
+    code, status = _error_info(exc)
+    return status == 404 or code in ("404", "NoSuchKey", "NotFound")
+
+
+def _run_all(pool: ThreadPoolExecutor, fn: Callable[..., Any], calls: Iterable[Tuple[Any, ...]]) -> List[Any]:
+    """Executa fn(*args) no pool para cada chamada; resultados na ordem
+
+    Num erro (inclusive ao submeter), cancela o que não começou e espera o
+    que já roda antes de relançar: quem chamou pode fechar o que as tarefas usam.
+    """
+    futures: List[Future] = []
+    try:
+        for args in calls:
+            futures.append(pool.submit(fn, *args))
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        raise
+
+
+class ObjectStore:
+    """Transferências para um bucket compatível com S3
+
+    Arquivos a partir de multipart_threshold sobem em partes paralelas
+    (multipart upload) e descem em faixas paralelas (GET com Range) gravadas
+    com pwrite no arquivo final. Cada requisição é repetida com backoff em
+    erros transitórios. O client é um boto3 S3 client (que mantém o pool de
+    conexões) ou qualquer objeto com a mesma interface, como
+    MemoryObjectClient nos testes.
+    """
+
+    def __init__(self,
+                 client: Any,
+                 bucket: str,
+                 prefix: str = "",
+                 part_size: int = PART_SIZE,
+                 multipart_threshold: int = MULTIPART_THRESHOLD,
+                 max_concurrency: int = MAX_CONCURRENCY,
+                 retry: Optional[RetryPolicy] = None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.part_size = part_size
+        self.multipart_threshold = max(multipart_threshold, part_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.retry = retry or RetryPolicy()
+        # Pools separados: tarefas de arquivo esperam por partes sem bloquear o pool delas
+        self._files = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="objstore-file")
+        self._parts = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="objstore-part")
+
+    def key(self, *parts: str) -> str:
+        return "/".join(p.strip("/") for p in (self.prefix,) + parts if p)
+
+    def _call(self, what: str, fn: Callable[[], Any]) -> Any:
+        """Executa uma requisição com retentativas em erros transitórios"""
+        for attempt in range(1, self.retry.attempts + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.retry.attempts or not is_transient(e):
+                    raise
+                delay = min(self.retry.max_delay, self.retry.base_delay * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)
+                print(f"Erro transitório em {what} (tentativa {attempt}): {e}; "
+                      f"nova tentativa em {delay:.2f}s")
+                time.sleep(delay)
+
+    def upload_file(self, path: str, key: str) -> int:
+        """Envia um arquivo; retorna os bytes enviados"""
+        size = os.path.getsize(path)
+        if size < self.multipart_threshold:
+            with open(path, "rb") as f:
+                body = f.read()
+            self._call(f"put {key}", lambda: self.client.put_object(
+                Bucket=self.bucket, Key=key, Body=body))
+            return size
+
+        upload_id = self._call(f"create {key}", lambda: self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key))["UploadId"]
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            def send(number: int, offset: int) -> Dict[str, Any]:
+                body = os.pread(fd, min(self.part_size, size - offset), offset)
+                etag = self._call(f"part {number} de {key}", lambda: self.client.upload_part(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id,
+                    PartNumber=number, Body=body))["ETag"]
+                return {"ETag": etag, "PartNumber": number}
+
+            # Nenhuma parte fica lendo o fd depois do close abaixo, mesmo num erro
+            parts = _run_all(self._parts, send, enumerate(range(0, size, self.part_size), start=1))
+            self._call(f"complete {key}", lambda: self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts}))
+        except Exception:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            except Exception as e:
+                print(f"Erro ao abortar upload de {key}: {e}")
+            raise
+        finally:
+            os.close(fd)
+        return size
+
+    def _read_range(self, key: str, start: int, end: int) -> bytes:
+        def fetch() -> bytes:
+            response = self.client.get_object(Bucket=self.bucket, Key=key,
+                                              Range=f"bytes={start}-{end}")
+            # Lido dentro da tentativa: falhas no meio do corpo também são repetidas
+            return response["Body"].read()
+        return self._call(f"get {key} [{start}-{end}]", fetch)
+
+    def download_file(self, key: str, path: str) -> int:
+        """Baixa um objeto para path (troca atômica); retorna os bytes recebidos"""
+        size = self._call(f"head {key}", lambda: self.client.head_object(
+            Bucket=self.bucket, Key=key))["ContentLength"]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.part-{uuid.uuid4().hex[:8]}"
+        try:
+            if size < self.multipart_threshold:
+                data = self._call(f"get {key}", lambda: self.client.get_object(
+                    Bucket=self.bucket, Key=key)["Body"].read())
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+            else:
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    os.ftruncate(fd, size)
+
+                    def fetch(offset: int) -> None:
+                        end = min(offset + self.part_size, size) - 1
+                        data = self._read_range(key, offset, end)
+                        if len(data) != end - offset + 1:
+                            raise StorageError(f"Faixa incompleta de {key} em {offset}")
+                        os.pwrite(fd, data, offset)
+
+                    _run_all(self._parts, fetch, ((offset,) for offset in range(0, size, self.part_size)))
+                finally:
+                    os.close(fd)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._call(f"head {key}", lambda: self.client.head_object(Bucket=self.bucket, Key=key))
+            return True
+        except Exception as e:
+            if is_not_found(e):
+                return False
+            raise
+
+    def list(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """(chave, tamanho) de todos os objetos sob o prefixo"""
+        token = None
+        while True:
+            kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+            if token:
+                kwargs["ContinuationToken"] = token
+            page = self._call(f"list {prefix}", lambda: self.client.list_objects_v2(**kwargs))
+            for item in page.get("Contents", []):
+                yield item["Key"], item["Size"]
+            if not page.get("IsTruncated"):
+                return
+            token = page["NextContinuationToken"]
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key, _ in self.list(prefix)]
+        for start in range(0, len(keys), 1000):
+            batch = [{"Key": key} for key in keys[start:start + 1000]]
+            self._call(f"delete {prefix}", lambda: self.client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": batch}))
+        return len(keys)
+
+    def map_files(self, fn: Callable[..., Any], calls: Iterable[Tuple[Any, ...]]) -> List[Any]:
+        """Executa fn(*args) por arquivo no pool de arquivos, que pode esperar por partes
+
+        Um erro cancela as chamadas que não começaram e sobe depois das em andamento.
+        """
+        return _run_all(self._files, fn, calls)
+
+    def upload_tree(self, local_dir: str, prefix: str, skip: Tuple[str, ...] = ()) -> int:
+        """Envia todos os arquivos de um diretório em paralelo"""
+        def calls() -> Iterator[Tuple[str, str]]:
+            for root, _, files in os.walk(local_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    rel_path = os.path.relpath(path, local_dir).replace(os.sep, "/")
+                    if rel_path not in skip:
+                        yield path, f"{prefix}/{rel_path}"
+        return sum(self.map_files(self.upload_file, calls()))
+
+    def download_tree(self, prefix: str, local_dir: str) -> int:
+        """Baixa em paralelo todos os objetos sob o prefixo"""
+        return sum(self.map_files(self.download_file, (
+            (key, os.path.join(local_dir, *key[len(prefix) + 1:].split("/")))
+            for key, _ in self.list(prefix + "/")
+        )))
+
+
+class MemoryClientError(Exception):
+    """Erro no formato do botocore ClientError (response com código e status)"""
+
+    def __init__(self, code: str, status: int):
+        super().__init__(f"{code} ({status})")
+        self.response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+
+
+class MemoryObjectClient:
+    """Substituto em memória do client S3 do boto3 (subconjunto usado por ObjectStore)
+
+    latency simula o tempo de ida e volta de cada requisição (liberando o
+    GIL, como uma requisição real) e fail_next injeta erros transitórios.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests: Counter = Counter()
+        self._objects: Dict[Tuple[str, str], bytes] = {}
+        self._uploads: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+        self._failures = 0
+
+    def fail_next(self, count: int = 1) -> None:
+        with self._lock:
+            self._failures += count
+
+    def _request(self, operation: str) -> None:
+        with self._lock:
+            self.requests[operation] += 1
+            fail = self._failures > 0
+            if fail:
+                self._failures -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise MemoryClientError("ServiceUnavailable", 503)
+
+    def _get(self, bucket: str, key: str) -> bytes:
+        with self._lock:
+            data = self._objects.get((bucket, key))
+        if data is None:
+            raise MemoryClientError("NoSuchKey", 404)
+        return data
+
+    @staticmethod
+    def _etag(data: bytes) -> str:
+        return '"' + hashlib.md5(data).hexdigest() + '"'
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> Dict[str, Any]:
+        self._request("put_object")
+        with self._lock:
+            self._objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": self._etag(Body)}
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        self._request("head_object")
+        try:
+            return {"ContentLength": len(self._get(Bucket, Key))}
+        except MemoryClientError:
+            raise MemoryClientError("404", 404)
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None) -> Dict[str, Any]:
+        self._request("get_object")
+        data = self._get(Bucket, Key)
+        if Range:
+            start, end = Range[len("bytes="):].split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def create_multipart_upload(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        self._request("create_multipart_upload")
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str,
+                    PartNumber: int, Body: bytes) -> Dict[str, Any]:
+        self._request("upload_part")
+        with self._lock:
+            if UploadId not in self._uploads:
+                raise MemoryClientError("NoSuchUpload", 404)
+            self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": self._etag(Body)}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str,
+                                  MultipartUpload: Dict[str, Any]) -> Dict[str, Any]:
+        self._request("complete_multipart_upload")
+        with self._lock:
+            parts = self._uploads.pop(UploadId, None)
+            if parts is None:
+                raise MemoryClientError("NoSuchUpload", 404)
+            numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+            if numbers != sorted(numbers) or any(n not in parts for n in numbers):
+                raise MemoryClientError("InvalidPartOrder", 400)
+            self._objects[(Bucket, Key)] = b"".join(parts[n] for n in numbers)
+        return {}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> Dict[str, Any]:
+        self._request("abort_multipart_upload")
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "",
+                        ContinuationToken: Optional[str] = None,
+                        MaxKeys: int = 1000) -> Dict[str, Any]:
+        self._request("list_objects_v2")
+        with self._lock:
+            keys = sorted(key for bucket, key in self._objects if bucket == Bucket and key.startswith(Prefix))
+            start = int(ContinuationToken or 0)
+            page = keys[start:start + MaxKeys]
+            contents = [{"Key": key, "Size": len(self._objects[(Bucket, key)])} for key in page]
+        truncated = start + MaxKeys < len(keys)
+        result = {"Contents": contents, "IsTruncated": truncated}
+        if truncated:
+            result["NextContinuationToken"] = str(start + MaxKeys)
+        return result
+
+    def delete_objects(self, Bucket: str, Delete: Dict[str, Any]) -> Dict[str, Any]:
+        self._request("delete_objects")
+        with self._lock:
+            for item in Delete["Objects"]:
+                self._objects.pop((Bucket, item["Key"]), None)
+        return {}
+
+
+def connect_s3(bucket: str,
+               endpoint_url: Optional[str] = None,
+               region: Optional[str] = None,
+               prefix: str = "",
+               max_concurrency: int = MAX_CONCURRENCY) -> ObjectStore:
+    """ObjectStore sobre o boto3 (dependência opcional)
+
+    O pool de conexões do botocore acompanha a concorrência das transferências;
+    as retentativas ficam a cargo do ObjectStore.
+    """
+    try:
+        import boto3
+        from botocore.config import Config
+    except ImportError as e:
+        raise StorageError("boto3 não instalado: pip install boto3") from e
+    config = Config(max_pool_connections=max_concurrency * 2,
+                    retries={"total_max_attempts": 1})
+    client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region, config=config)
+    return ObjectStore(client, bucket, prefix, max_concurrency=max_concurrency)
+
+
+class RemoteBackupStore:
+    """Backups guardados num object store, com o disco local como cache write-through
+
+    Cada backup concluído é enviado por inteiro (metadata.json por último,
+    marcando o envio como completo) e ganha o marcador remote.json. Depois
+    disso, os dados (data/) dos completos e incrementais fora dos keep_recent
+    usados mais recentemente podem sair do disco; metadados, manifesto e
+    assinaturas ficam, porque listagens e novos incrementais dependem deles.
+    Restaurar um backup removido do cache baixa os dados de volta.
+    """
+
+    def __init__(self, objects: ObjectStore, keep_recent: int = DEFAULT_KEEP_RECENT):
+        self.objects = objects
+        self.keep_recent = keep_recent
+        self._env_keys: Optional[set] = None  # Chaves do cache de ambientes já no bucket
+        self._env_lock = threading.Lock()
+
+    def _prefix(self, project_id: str, backup_id: str) -> str:
+        return self.objects.key(project_id, backup_id)
+
+    @staticmethod
+    def _marker(backup_dir: str) -> str:
+        return os.path.join(backup_dir, REMOTE_MARKER)
+
+    def _touch(self, backup_dir: str, **fields: Any) -> None:
+        """Atualiza o marcador com o último uso (base da remoção do cache)"""
+        marker = self._marker(backup_dir)
+        data: Dict[str, Any] = {}
+        if os.path.exists(marker):
+            with open(marker, "r") as f:
+                data = json.load(f)
+        data.update(fields, last_used=datetime.now().isoformat())
+        with open(marker + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(marker + ".tmp", marker)
+
+    def pushed(self, backup_dir: str) -> bool:
+        return os.path.exists(self._marker(backup_dir))
+
+    def push(self, backup_dir: str, project_id: str, backup_id: str) -> int:
+        """Envia o backup (ou reenvia, após uma recompressão); retorna os bytes enviados"""
+        started = time.perf_counter()
+        prefix = self._prefix(project_id, backup_id)
+        sent = self.objects.upload_tree(backup_dir, prefix,
+                                        skip=("metadata.json", REMOTE_MARKER))
+        sent += self.objects.upload_file(os.path.join(backup_dir, "metadata.json"),
+                                         f"{prefix}/metadata.json")
+        self._touch(backup_dir, pushed_at=datetime.now().isoformat(), bytes=sent)
+        elapsed = time.perf_counter() - started
+        print(f"Backup {backup_id} enviado ao object store: {sent} bytes em {elapsed:.1f}s")
+        return sent
+
+    def replace(self, backup_dir: str, project_id: str, backup_id: str) -> int:
+        """Substitui a cópia remota após os dados locais mudarem (ex.: recompressão)
+
+        O marcador sai antes: se o reenvio falhar, o backup fica só no disco
+        e não é removido do cache.
+        """
+        marker = self._marker(backup_dir)
+        if os.path.exists(marker):
+            os.remove(marker)
+        self.delete(project_id, backup_id)
+        return self.push(backup_dir, project_id, backup_id)
+
+    def push_metadata(self, backup_dir: str, project_id: str, backup_id: str) -> int:
+        """Reenvia só o metadata.json (dados inalterados)"""
+        return self.objects.upload_file(os.path.join(backup_dir, "metadata.json"),
+                                        f"{self._prefix(project_id, backup_id)}/metadata.json")
+
+    def cached(self, backup_dir: str) -> bool:
+        return os.path.isdir(os.path.join(backup_dir, "data"))
+
+    def hydrate(self, backup_dir: str, project_id: str, backup_id: str) -> int:
+        """Traz de volta os dados de um backup removido do cache; retorna os bytes baixados"""
+        if self.cached(backup_dir):
+            if self.pushed(backup_dir):
+                self._touch(backup_dir)
+            return 0
+        if not self.pushed(backup_dir):
+            raise StorageError(f"Dados do backup {backup_id} ausentes no disco e no object store")
+        started = time.perf_counter()
+        staging = os.path.join(backup_dir, HYDRATING_DIRNAME)
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            received = self.objects.download_tree(self._prefix(project_id, backup_id) + "/data", staging)
+            os.rename(staging, os.path.join(backup_dir, "data"))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._touch(backup_dir)
+        print(f"Backup {backup_id} restaurado do object store para o cache: {received} bytes "
+              f"em {time.perf_counter() - started:.1f}s")
+        return received
+
+    def evict(self, project_dir: str, project_id: str, entries: List[Dict[str, Any]]) -> List[str]:
+        """Remove do disco os dados dos backups enviados menos usados além de keep_recent"""
+        candidates = []
+        for entry in entries:
+            backup_dir = os.path.join(project_dir, entry["id"])
+            if entry.get("type") not in EVICTABLE_TYPES or not self.cached(backup_dir):
+                continue
+            last_used = entry.get("created_at") or ""
+            if self.pushed(backup_dir):
+                with open(self._marker(backup_dir), "r") as f:
+                    last_used = max(last_used, json.load(f).get("last_used", ""))
+            candidates.append((last_used, entry["id"], backup_dir))
+        candidates.sort(reverse=True)
+        evicted = []
+        for _, backup_id, backup_dir in candidates[self.keep_recent:]:
+            if not self.pushed(backup_dir) or ACTIVE_RESTORES.busy(project_id, backup_id):
+                continue
+            shutil.rmtree(os.path.join(backup_dir, "data"))
+            evicted.append(backup_id)
+        if evicted:
+            print(f"Cache local de {project_id}: dados de {len(evicted)} backups removidos")
+        return evicted
+
+    def delete(self, project_id: str, backup_id: str) -> int:
+        return self.objects.delete_prefix(self._prefix(project_id, backup_id) + "/")
+
+    def push_environment(self, cache: EnvironmentCache, info: EnvironmentInfo) -> int:
+        """Envia os pacotes e o manifesto de um ambiente que ainda não estão no bucket
+
+        O manifesto vai por último: presente no bucket, seus pacotes também estão.
+        """
+        with self._env_lock:
+            if self._env_keys is None:
+                self._env_keys = {key for key, _ in self.objects.list(self.objects.key(ENV_PREFIX) + "/")}
+            known = set(self._env_keys)
+        manifest = cache.manifest_name(info)
+        if self.objects.key(ENV_PREFIX, manifest) in known:
+            return 0
+        pending = [name for name, _, _ in cache.references(info)
+                   if self.objects.key(ENV_PREFIX, name) not in known]
+        sent = sum(self.objects.map_files(self.objects.upload_file, [
+            (os.path.join(cache.root, name), self.objects.key(ENV_PREFIX, name)) for name in pending]))
+        sent += self.objects.upload_file(os.path.join(cache.root, manifest),
+                                         self.objects.key(ENV_PREFIX, manifest))
+        with self._env_lock:
+            self._env_keys.update(self.objects.key(ENV_PREFIX, name) for name in pending + [manifest])
+        return sent
+
+    def _fetch_environment_file(self, cache: EnvironmentCache, name: str, sha256: str) -> int:
+        path = os.path.join(cache.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.remote"
+        try:
+            received = self.objects.download_file(self.objects.key(ENV_PREFIX, name), tmp)
+            with open(tmp, "rb") as f:
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != sha256:
+                raise EnvCacheError(f"Conteúdo divergente em {name} no object store")
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return received
+
+    def fetch_environment(self, cache: EnvironmentCache, info: EnvironmentInfo) -> int:
+        """Baixa para o cache local o manifesto e os pacotes do ambiente que faltam"""
+        received = 0
+        for _ in range(2):  # Sem o manifesto local, primeiro ele e depois os pacotes
+            missing = cache.missing(info)
+            received += sum(self.objects.map_files(self._fetch_environment_file, [
+                (cache, name, sha256) for name, _, sha256 in missing]))
+        return received
+
+
+def remote_from_env() -> Optional[RemoteBackupStore]:
+    """Object store configurado por BACKUP_S3_BUCKET (e opcionais); None se ausente
+
+    BACKUP_S3_ENDPOINT aponta para serviços compatíveis (MinIO),
+    BACKUP_S3_PREFIX separa instalações no mesmo bucket,
+    BACKUP_S3_CONCURRENCY limita transferências simultâneas e
+    BACKUP_CACHE_KEEP define quantos backups por projeto ficam no disco.
+    """
+    bucket = os.environ.get("BACKUP_S3_BUCKET")
+    if not bucket:
+        return None
+    objects = connect_s3(
+        bucket,
+        endpoint_url=os.environ.get("BACKUP_S3_ENDPOINT") or None,
+        region=os.environ.get("BACKUP_S3_REGION") or None,
+        prefix=os.environ.get("BACKUP_S3_PREFIX", ""),
+        max_concurrency=int(os.environ.get("BACKUP_S3_CONCURRENCY", MAX_CONCURRENCY))
+    )
+    return RemoteBackupStore(objects, int(os.environ.get("BACKUP_CACHE_KEEP", DEFAULT_KEEP_RECENT)))
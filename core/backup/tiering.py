@@ -0,0 +1,288 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, TYPE_CHECKING
+from .manifest import backup_files
+from .models import BackupMetadata, BackupStatus, BackupType, CompressionInfo, CompressionType, TierInfo
+from .metrics import STAGE_METRICS, StageRecorder
+from .pagecache import iter_file
+from .restorer import ACTIVE_RESTORES
+
+if TYPE_CHECKING:
+    from .manager import BackupManager
+
+COLD_TIER = "cold"
+STAGING_DIRNAME = "data.tiering"   # Dados recomprimidos antes da troca
+OLD_DIRNAME = "data.old"           # Dados originais durante a troca
+# Snapshots ficam sem compressão (hardlinks); checkpoints não têm dados
+TIERABLE_TYPES = (BackupType.FULL.value, BackupType.DIFFERENTIAL.value, BackupType.INCREMENTAL.value)
+
+
+@dataclass
+class TieringPolicy:
+    """Quando e como backups antigos migram para a camada fria"""
+    min_age_days: float = 7.0                            # Idade mínima para migrar
+    compression_type: CompressionType = CompressionType.LZMA
+    level: int = 9
+    io_bytes_per_second: Optional[int] = 32 * 1024 * 1024  # Leitura+escrita; None = sem limite
+    cpu_fraction: Optional[float] = 0.5                  # Fração de um núcleo; None = sem limite
+    nice: int = 19                                       # Prioridade da thread de migração
+    swap_timeout: float = 60.0                           # Espera pelo lock do projeto na troca
+    max_backups_per_run: Optional[int] = None
+
+
+class TieringBudget:
+    """Limita a vazão de I/O e o uso de CPU da thread com pausas entre arquivos
+
+    As pausas compensam o consumo acumulado desde o início da execução, então
+    um arquivo grande é seguido de uma pausa proporcional.
+    """
+
+    def __init__(self,
+                 io_bytes_per_second: Optional[int] = None,
+                 cpu_fraction: Optional[float] = None,
+                 stop_event: Optional[threading.Event] = None):
+        self.io_bytes_per_second = io_bytes_per_second
+        self.cpu_fraction = cpu_fraction
+        self.stop_event = stop_event or threading.Event()
+        self.bytes = 0
+        self.waited = 0.0
+        self._started = time.monotonic()
+        self._cpu_started = time.thread_time()
+
+    def charge(self, nbytes: int) -> None:
+        self.bytes += nbytes
+        elapsed = time.monotonic() - self._started
+        wait = 0.0
+        if self.io_bytes_per_second:
+            wait = max(wait, self.bytes / self.io_bytes_per_second - elapsed)
+        if self.cpu_fraction:
+            cpu = time.thread_time() - self._cpu_started
+            wait = max(wait, cpu / self.cpu_fraction - elapsed)
+        if wait > 0:
+            self.waited += wait
+            self.stop_event.wait(wait)
+
+
+def lower_thread_priority(nice: int) -> None:
+    """Reduz a prioridade de CPU só da thread atual (no Linux o nice é por thread)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except (AttributeError, OSError) as e:
+        print(f"Não foi possível reduzir a prioridade da thread: {e}")
+
+
+def _md5(chunks) -> str:
+    hasher = hashlib.md5()
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class BackupTiering:
+    """Migra backups antigos para a camada fria recomprimindo-os
+
+    A recompressão é feita em data.tiering, fora de qualquer lock, e cada
+    arquivo é conferido pelo md5 do conteúdo antes da troca. A troca (renomear
+    data -> data.old e data.tiering -> data, gravar os metadados) acontece sob
+    o lock do projeto; restaurações seguram esse lock e são registradas em
+    ACTIVE_RESTORES, então backups em restauração nunca são alterados.
+    """
+
+    def __init__(self,
+                 manager: "BackupManager",
+                 policy: Optional[TieringPolicy] = None,
+                 stop_event: Optional[threading.Event] = None):
+        self.manager = manager
+        self.policy = policy or TieringPolicy()
+        self.stop_event = stop_event or threading.Event()
+
+    def candidates(self, project_id: str, now: Optional[datetime] = None) -> List[str]:
+        """Backups do projeto prontos para a camada fria, do mais antigo ao mais novo"""
+        cutoff = ((now or datetime.now()) - timedelta(days=self.policy.min_age_days)).isoformat()
+        result = []
+        for entry in reversed(self.manager.catalog(project_id).entries()):
+            if (entry.get("type") in TIERABLE_TYPES
+                    and entry.get("status") == BackupStatus.COMPLETED.value
+                    and not entry.get("tier")
+                    and (entry.get("created_at") or "") < cutoff):
+                result.append(entry["id"])
+        return result
+
+    def _recover(self, backup_dir: str, metadata: BackupMetadata) -> None:
+        """Desfaz ou conclui uma troca interrompida"""
+        data_dir = os.path.join(backup_dir, "data")
+        old_dir = os.path.join(backup_dir, OLD_DIRNAME)
+        if os.path.isdir(old_dir):
+            if metadata.tier is None:
+                # Metadados ainda descrevem os dados originais
+                shutil.rmtree(data_dir, ignore_errors=True)
+                os.rename(old_dir, data_dir)
+                print(f"Troca interrompida desfeita em {backup_dir}")
+            else:
+                shutil.rmtree(old_dir)
+        shutil.rmtree(os.path.join(backup_dir, STAGING_DIRNAME), ignore_errors=True)
+
+    def _recompress(self,
+                    metadata: BackupMetadata,
+                    data_dir: str,
+                    staging: str,
+                    budget: TieringBudget) -> CompressionInfo:
+        """Grava em staging a versão recomprimida de cada arquivo, conferindo o conteúdo"""
+        policy = self.policy
+        compressor = self.manager.compressor
+        zdict = None
+        if metadata.compression and metadata.compression.dictionary_id:
+            zdict = self.manager.dictionaries(metadata.project_id).get(
+                metadata.compression.dictionary_id)
+        sizes: Dict[str, int] = {}
+        for file_info in backup_files(metadata, os.path.dirname(data_dir)):
+            if not file_info.is_deleted:
+                sizes[file_info.path + (".delta" if file_info.delta else "")] = file_info.size
+
+        original_size = compressed_size = 0
+        for root, _, files in os.walk(data_dir):
+            for name in files:
+                if self.stop_event.is_set():
+                    raise InterruptedError("Migração interrompida")
+                src = os.path.join(root, name)
+                rel_path = os.path.relpath(src, data_dir)
+                if metadata.compression:
+                    if not name.endswith(".compressed"):
+                        raise ValueError(f"Arquivo sem compressão em backup comprimido: {rel_path}")
+                    dest = os.path.join(staging, rel_path)
+                    info, digest = compressor.recompress_file(
+                        src, dest, policy.compression_type, policy.level, zdict,
+                        size_hint=sizes.get(rel_path[:-len(".compressed")]))
+                else:
+                    dest = os.path.join(staging, rel_path + ".compressed")
+                    digest = _md5(iter_file(src, self.manager.cache_policy))
+                    info = compressor.compress_file(src, dest, policy.compression_type, policy.level)
+                    if info is None:
+                        raise ValueError(f"Falha ao comprimir {rel_path}")
+                if _md5(compressor.iter_decompressed(dest)) != digest:
+                    raise ValueError(f"Conteúdo divergente após recompressão: {rel_path}")
+                original_size += info.original_size
+                compressed_size += info.compressed_size
+                budget.charge(os.path.getsize(src) + 2 * info.compressed_size)
+        return CompressionInfo(
+            type=policy.compression_type,
+            original_size=original_size,
+            compressed_size=compressed_size,
+            ratio=original_size / compressed_size if compressed_size > 0 else 1.0,
+            level=policy.level
+        )
+
+    def migrate(self, project_id: str, backup_id: str) -> Optional[TierInfo]:
+        """Move um backup para a camada fria; None se não for elegível agora"""
+        if ACTIVE_RESTORES.busy(project_id, backup_id):
+            print(f"Backup {backup_id} em restauração, migração adiada")
+            return None
+        project_dir = self.manager.project_dir(project_id)
+        backup_dir = os.path.join(project_dir, backup_id)
+        meta_path = os.path.join(backup_dir, "metadata.json")
+        metadata = self.manager.get_backup_info(backup_id, project_id)
+        if metadata is None or metadata.type not in TIERABLE_TYPES or metadata.tier is not None:
+            return None
+
+        data_dir = os.path.join(backup_dir, "data")
+        if not os.path.isdir(data_dir) and not os.path.isdir(os.path.join(backup_dir, OLD_DIRNAME)):
+            # Dados só no object store: baixar para recomprimir não compensa
+            return None
+
+        recorder = StageRecorder("tier_backup")
+        started = time.perf_counter()
+        staging = os.path.join(backup_dir, STAGING_DIRNAME)
+        budget = TieringBudget(self.policy.io_bytes_per_second, self.policy.cpu_fraction,
+                               self.stop_event)
+        try:
+            self._recover(backup_dir, metadata)
+            meta_mtime = os.stat(meta_path).st_mtime_ns
+            previous = metadata.compression
+            already_dense = (previous is not None
+                             and CompressionType(previous.type) == self.policy.compression_type
+                             and previous.level >= self.policy.level)
+            compression = previous
+            if not already_dense:
+                with recorder.stage("recompress") as span:
+                    compression = self._recompress(metadata, data_dir, staging, budget)
+                    span.add(files=metadata.files_count or 0, bytes=compression.original_size)
+                if previous is not None and compression.compressed_size >= previous.compressed_size:
+                    # Backups pequenos (deltas) podem crescer com o cabeçalho do xz:
+                    # mantém os dados e só marca a camada, para não tentar de novo
+                    already_dense = True
+                    compression = previous
+
+            lock = self.manager.volumes.project_lock(project_id)
+            if not lock.acquire(timeout=self.policy.swap_timeout):
+                print(f"Projeto {project_id} ocupado, migração de {backup_id} adiada")
+                return None
+            try:
+                with recorder.stage("swap") as span:
+                    # Restaurações, remoções e migrações de volume podem ter
+                    # ocorrido durante a recompressão
+                    if (ACTIVE_RESTORES.busy(project_id, backup_id)
+                            or self.manager.project_dir(project_id) != project_dir
+                            or not os.path.exists(meta_path)
+                            or os.stat(meta_path).st_mtime_ns != meta_mtime):
+                        print(f"Backup {backup_id} alterado durante a migração, adiada")
+                        return None
+                    if not already_dense:
+                        old_dir = os.path.join(backup_dir, OLD_DIRNAME)
+                        os.rename(data_dir, old_dir)
+                        os.rename(staging, data_dir)
+                    metadata.compression = compression
+                    for file_info in metadata.files:
+                        if not file_info.is_deleted:
+                            file_info.compressed = True
+                    metadata.checksum = self.manager.validator.calculate_checksum(data_dir)
+                    metadata.tier = TierInfo(tier=COLD_TIER, migrated_at=datetime.now(),
+                                             previous=previous,
+                                             seconds=time.perf_counter() - started)
+                    self.manager._write_metadata(metadata, backup_dir)
+                    if not already_dense:
+                        shutil.rmtree(old_dir)
+                    span.add(files=1, bytes=compression.compressed_size if compression else 0)
+                remote = self.manager.remote
+                if remote is not None and remote.pushed(backup_dir):
+                    try:
+                        with recorder.stage("push"):
+                            if already_dense:
+                                remote.push_metadata(backup_dir, project_id, backup_id)
+                            else:
+                                remote.replace(backup_dir, project_id, backup_id)
+                    except Exception as e:
+                        print(f"Erro ao reenviar backup {backup_id} ao object store: {e}")
+            finally:
+                lock.release()
+
+            STAGE_METRICS.record("tier_backup", recorder.timings())
+            saved = (previous.compressed_size if previous else metadata.size_bytes or 0) - (
+                compression.compressed_size if compression else 0)
+            print(f"Backup {backup_id} migrado para a camada fria: {saved} bytes economizados "
+                  f"em {time.perf_counter() - started:.1f}s ({budget.waited:.1f}s em pausa)")
+            return metadata.tier
+        except InterruptedError:
+            print(f"Migração de {backup_id} interrompida")
+            return None
+        except Exception as e:
+            print(f"Erro ao migrar backup {backup_id}: {e}")
+            return None
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def run_once(self, project_ids: Optional[List[str]] = None) -> List[str]:
+        """Migra os backups elegíveis; retorna os IDs migrados"""
+        migrated: List[str] = []
+        limit = self.policy.max_backups_per_run
+        for project_id in project_ids or sorted(self.manager.volumes.projects()):
+            for backup_id in self.candidates(project_id):
+                if self.stop_event.is_set() or (limit is not None and len(migrated) >= limit):
+                    return migrated
+                if self.migrate(project_id, backup_id):
+                    migrated.append(backup_id)
+        return migrated
@@ -1,26 +1,42 @@
 import os
 import hashlib
-from typing import Dict, Tuple, Optional
-from .models import FileInfo
+from typing import Callable, Dict, Iterable, Tuple, Optional
+from .manifest import backup_files
+from .models import BackupMetadata, FileInfo
+from .pagecache import CachePolicy, iter_file
+from .rules import CompiledRules
 
 class BackupValidator:
     """Validador de backups"""
 
-    def __init__(self, base_dir: str):
+    def __init__(self,
+                 base_dir: str,
+                 cache_policy: Optional[CachePolicy] = None,
+                 project_dir: Optional[Callable[[str], str]] = None):
         self.base_dir = base_dir
+        self.cache_policy = cache_policy
+        # Resolve o diretório do projeto (volumes); padrão: base_dir/projeto
+        self.project_dir = project_dir or (lambda project_id: os.path.join(base_dir, project_id))
 
-    def calculate_checksum(self, path: str) -> str:
-        """Calcula o checksum de um arquivo ou diretório"""
+    def file_digest(self, path: str, algorithm: str = "md5") -> str:
+        """Calcula o hash de um arquivo em leitura sequencial"""
+        hasher = hashlib.new(algorithm)
+        for chunk in iter_file(path, self.cache_policy):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def calculate_checksum(self, path: str, known: Optional[Dict[str, str]] = None) -> str:
+        """Calcula o checksum de um arquivo ou diretório
+
+        known mapeia caminhos relativos ao sha256 já calculado na gravação;
+        esses arquivos não são relidos.
+        """
         if not os.path.exists(path):
             return ""
 
         if os.path.isfile(path):
             # Para arquivo, calcula o hash do conteúdo
-            hasher = hashlib.sha256()
-            with open(path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
+            return self.file_digest(path, "sha256")
         else:
             # Para diretório, combina os hashes dos arquivos
             hasher = hashlib.sha256()
@@ -29,35 +45,63 @@ class BackupValidator:
                     file_path = os.path.join(root, file)
                     rel_path = os.path.relpath(file_path, path)
                     hasher.update(rel_path.encode())
-                    file_hash = self.calculate_checksum(file_path)
+                    file_hash = known.get(rel_path) if known else None
+                    if file_hash is None:
+                        file_hash = self.calculate_checksum(file_path)
                     hasher.update(file_hash.encode())
             return hasher.hexdigest()
 
-    def scan_directory(self, path: str) -> Dict[str, FileInfo]:
-        """Escaneia um diretório e retorna informações dos arquivos"""
+    def manifest_checksum(self, files: Iterable[FileInfo]) -> str:
+        """Checksum derivado dos hashes já conhecidos dos arquivos (sem reler dados)"""
+        hasher = hashlib.sha256()
+        for file_info in sorted(files, key=lambda f: f.path):
+            hasher.update(file_info.path.encode())
+            hasher.update(file_info.checksum.encode())
+        return hasher.hexdigest()
+
+    def scan_directory(self,
+                       path: str,
+                       with_checksums: bool = True,
+                       rules: Optional[CompiledRules] = None,
+                       prefix: str = "") -> Dict[str, FileInfo]:
+        """Escaneia um diretório e retorna informações dos arquivos
+
+        Com rules, diretórios excluídos são podados durante o walk. prefix é
+        o caminho relativo de path dentro do projeto (para scans parciais).
+        """
         files = {}
         if not os.path.exists(path):
             return files
 
-        for root, _, filenames in os.walk(path):
+        if rules is not None:
+            entries = (
+                (dirpath, rel_dir, filenames)
+                for dirpath, rel_dir, filenames in rules.walk(path, prefix)
+            )
+        else:
+            entries = (
+                (root, os.path.join(prefix, os.path.relpath(root, path)), filenames)
+                for root, _, filenames in os.walk(path)
+            )
+
+        for root, rel_dir, filenames in entries:
+            rel_dir = os.path.normpath(rel_dir) if rel_dir else "."
             for filename in filenames:
                 file_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(file_path, path)
+                rel_path = filename if rel_dir == "." else os.path.join(rel_dir, filename)
                 stat = os.stat(file_path)
                 files[rel_path] = FileInfo(
                     path=rel_path,
                     size=stat.st_size,
                     modified_at=stat.st_mtime,
-                    checksum=hashlib.md5(
-                        open(file_path, "rb").read()
-                    ).hexdigest()
+                    checksum=self.file_digest(file_path) if with_checksums else ""
                 )
 
         return files
 
     def validate_restore_point(self, backup_id: str, project_id: str) -> Tuple[bool, Optional[str]]:
         """Valida um ponto de restauração"""
-        backup_dir = os.path.join(self.base_dir, project_id, backup_id)
+        backup_dir = os.path.join(self.project_dir(project_id), backup_id)
         data_dir = os.path.join(backup_dir, "data")
 
         # Verifica se o diretório do backup existe
@@ -73,20 +117,21 @@ class BackupValidator:
         if not os.path.exists(metadata_path):
             return False, "Metadados do backup não encontrados"
 
-        # Verifica se os arquivos listados nos metadados existem
+        # Verifica se os arquivos listados nos metadados (ou no manifest.bin) existem
         with open(metadata_path, "r") as f:
-            import json
-            metadata = json.load(f)
-            for file_info in metadata["files"]:
-                if not file_info["is_deleted"]:
-                    file_path = os.path.join(data_dir, file_info["path"])
-                    if metadata["compression"]:
-                        compressed_path = file_path + ".compressed"
-                        if not os.path.exists(compressed_path):
-                            return False, "Arquivo comprimido ausente: " + file_info["path"] + ".compressed"
-                    else:
-                        if not os.path.exists(file_path):
-                            return False, "Arquivo ausente: " + file_info["path"]
+            metadata = BackupMetadata.parse_raw(f.read())
+        for file_info in backup_files(metadata, backup_dir):
+            if not file_info.is_deleted:
+                file_path = os.path.join(data_dir, file_info.path)
+                if file_info.delta:
+                    file_path += ".delta"
+                if metadata.compression:
+                    compressed_path = file_path + ".compressed"
+                    if not os.path.exists(compressed_path):
+                        return False, "Arquivo comprimido ausente: " + file_info.path + ".compressed"
+                else:
+                    if not os.path.exists(file_path):
+                        return False, "Arquivo ausente: " + file_info.path
 
         return True, None
 
@@ -0,0 +1,379 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from .models import VolumeInfo
+
+PLACEMENT_FILENAME = "placement.json"
+MOVING_PREFIX = ".moving-"
+MAX_OPS_PER_DEVICE = 2       # Backups/restaurações simultâneos por dispositivo
+MIN_FREE_RATIO = 0.05        # Volumes com menos espaço livre não recebem projetos
+REBALANCE_TOLERANCE = 0.10   # Diferença de ocupação aceita entre volumes
+VOLUMES_ENV = "BACKUP_VOLUMES"
+BASE_DIR_ENV = "BACKUP_DIR"
+DEFAULT_BASE_DIR = "/data/backups"
+
+
+def tree_size(path: str) -> int:
+    """Bytes ocupados por uma árvore, contando hardlinks uma vez"""
+    seen = set()
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.lstat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            key = (stat.st_dev, stat.st_ino)
+            if stat.st_nlink > 1:
+                if key in seen:
+                    continue
+                seen.add(key)
+            total += stat.st_size
+    return total
+
+
+def copy_tree_linked(src: str, dest: str) -> None:
+    """Copia uma árvore preservando hardlinks internos (snapshots) e metadados"""
+    linked: Dict[Tuple[int, int], str] = {}
+    for root, dirs, files in os.walk(src):
+        rel = os.path.relpath(root, src)
+        target_root = dest if rel == "." else os.path.join(dest, rel)
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            source = os.path.join(root, name)
+            target = os.path.join(target_root, name)
+            stat = os.lstat(source)
+            key = (stat.st_dev, stat.st_ino)
+            if stat.st_nlink > 1 and key in linked:
+                os.link(linked[key], target)
+                continue
+            shutil.copy2(source, target, follow_symlinks=False)
+            if stat.st_nlink > 1:
+                linked[key] = target
+        shutil.copystat(root, target_root)
+
+
+class Volume:
+    """Um diretório raiz de backups em um dispositivo"""
+
+    def __init__(self, path: str, weight: float = 1.0):
+        self.path = os.path.abspath(path)
+        self.weight = weight
+        os.makedirs(self.path, exist_ok=True)
+        self.device = os.stat(self.path).st_dev
+
+    def usage(self) -> Tuple[int, int]:
+        """(total, livre) em bytes"""
+        usage = shutil.disk_usage(self.path)
+        return usage.total, usage.free
+
+
+class VolumeSet:
+    """Conjunto de volumes com posicionamento de projetos
+
+    Cada projeto fica inteiro em um volume: snapshots usam hardlinks e
+    deltas referenciam o backup pai, o que exige o mesmo sistema de
+    arquivos. O mapa projeto -> volume fica em placement.json, gravado em
+    todos os volumes (vale o de maior geração), então localizar um projeto
+    não sonda os volumes. Novos projetos vão para o volume com mais espaço
+    livre ponderado pela carga atual do dispositivo, e cada dispositivo
+    aceita no máximo max_ops operações pesadas simultâneas, espalhando o
+    I/O entre discos.
+    """
+
+    def __init__(self,
+                 paths: List[str],
+                 max_ops: int = MAX_OPS_PER_DEVICE,
+                 min_free_ratio: float = MIN_FREE_RATIO):
+        if not paths:
+            raise ValueError("Pelo menos um volume é necessário")
+        self.max_ops = max_ops
+        self.min_free_ratio = min_free_ratio
+        self._lock = threading.RLock()
+        self._volumes: List[Volume] = []
+        self._placement: Dict[str, str] = {}
+        self._generation = 0
+        self._project_locks: Dict[str, threading.RLock] = {}
+        self._device_slots: Dict[int, threading.BoundedSemaphore] = {}
+        self._device_active: Dict[int, int] = {}
+        for path in paths:
+            self._add(path)
+        self._load_placement()
+
+    @property
+    def primary(self) -> str:
+        return self._volumes[0].path
+
+    @property
+    def volumes(self) -> List[Volume]:
+        return list(self._volumes)
+
+    def _add(self, path: str) -> Volume:
+        path = os.path.abspath(path)
+        for volume in self._volumes:
+            if volume.path == path:
+                return volume
+        volume = Volume(path)
+        self._volumes.append(volume)
+        self._device_slots.setdefault(volume.device, threading.BoundedSemaphore(self.max_ops))
+        self._device_active.setdefault(volume.device, 0)
+        return volume
+
+    def _volume(self, path: str) -> Optional[Volume]:
+        for volume in self._volumes:
+            if volume.path == path:
+                return volume
+        return None
+
+    def _load_placement(self) -> None:
+        """Lê o placement.json de maior geração e incorpora os volumes que ele conhece"""
+        best = None
+        for volume in list(self._volumes):
+            try:
+                with open(os.path.join(volume.path, PLACEMENT_FILENAME), "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if best is None or data.get("generation", 0) > best.get("generation", 0):
+                best = data
+        if best is None:
+            return
+        for path in best.get("volumes", []):
+            if os.path.isdir(path):
+                self._add(path)
+        self._placement = {
+            project: path for project, path in best.get("projects", {}).items()
+            if self._volume(path) is not None
+        }
+        self._generation = best.get("generation", 0)
+
+    def _save_placement(self) -> None:
+        self._generation += 1
+        data = {
+            "generation": self._generation,
+            "volumes": [volume.path for volume in self._volumes],
+            "projects": self._placement
+        }
+        for volume in self._volumes:
+            path = os.path.join(volume.path, PLACEMENT_FILENAME)
+            try:
+                with open(path + ".tmp", "w") as f:
+                    json.dump(data, f, indent=2)
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print(f"Erro ao gravar posicionamento em {volume.path}: {e}")
+
+    def _choose(self, exclude: Optional[str] = None) -> Volume:
+        """Volume com mais espaço livre ponderado pela carga do dispositivo"""
+        best = None
+        best_score = -1.0
+        for volume in self._volumes:
+            if volume.path == exclude:
+                continue
+            total, free = volume.usage()
+            if total and free / total < self.min_free_ratio and len(self._volumes) > 1:
+                continue
+            score = free * volume.weight / (1 + self._device_active[volume.device])
+            if score > best_score:
+                best, best_score = volume, score
+        if best is None:
+            raise ValueError("Nenhum volume com espaço livre disponível")
+        return best
+
+    def locate(self, project_id: str) -> Optional[str]:
+        """Volume do projeto; projetos anteriores ao catálogo são procurados uma vez"""
+        with self._lock:
+            path = self._placement.get(project_id)
+            if path is not None:
+                return path
+            for volume in self._volumes:
+                if os.path.isdir(os.path.join(volume.path, project_id)):
+                    self._placement[project_id] = volume.path
+                    self._save_placement()
+                    return volume.path
+            return None
+
+    def place(self, project_id: str) -> str:
+        """Volume do projeto, posicionando-o se ainda não existir"""
+        with self._lock:
+            path = self.locate(project_id)
+            if path is None:
+                path = self._choose().path
+                self._placement[project_id] = path
+                self._save_placement()
+                print(f"Projeto {project_id} posicionado no volume {path}")
+            return path
+
+    def root_for(self, project_id: str, create: bool = False) -> str:
+        """Raiz do volume do projeto (o primário se ainda não existir e create=False)"""
+        if create:
+            return self.place(project_id)
+        return self.locate(project_id) or self.primary
+
+    def project_dir(self, project_id: str, create: bool = False) -> str:
+        return os.path.join(self.root_for(project_id, create), project_id)
+
+    def projects(self) -> Dict[str, str]:
+        """Todos os projetos e seus volumes (inclui diretórios ainda não catalogados)"""
+        with self._lock:
+            for volume in self._volumes:
+                for entry in os.scandir(volume.path):
+                    # Diretórios ocultos são do sistema (.moving-*, cache de ambientes)
+                    if (entry.is_dir() and not entry.name.startswith(".")
+                            and entry.name not in self._placement):
+                        self.locate(entry.name)
+            return dict(self._placement)
+
+    def project_lock(self, project_id: str) -> threading.RLock:
+        """Lock do projeto: operações de escrita e migrações não se sobrepõem"""
+        with self._lock:
+            lock = self._project_locks.get(project_id)
+            if lock is None:
+                lock = threading.RLock()
+                self._project_locks[project_id] = lock
+            return lock
+
+    @contextmanager
+    def io(self, project_id: str) -> Iterator[None]:
+        """Reserva um slot de I/O no dispositivo do projeto"""
+        volume = self._volume(self.root_for(project_id)) or self._volumes[0]
+        slots = self._device_slots[volume.device]
+        slots.acquire()
+        with self._lock:
+            self._device_active[volume.device] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._device_active[volume.device] -= 1
+            slots.release()
+
+    def add_volume(self, path: str, weight: float = 1.0) -> Volume:
+        """Adiciona um volume em operação; rebalance() move projetos para ele"""
+        with self._lock:
+            volume = self._add(path)
+            volume.weight = weight
+            self._save_placement()
+        print(f"Volume {volume.path} adicionado")
+        return volume
+
+    def status(self) -> List[VolumeInfo]:
+        placement = self.projects()
+        result = []
+        for volume in self._volumes:
+            total, free = volume.usage()
+            result.append(VolumeInfo(
+                path=volume.path,
+                device=volume.device,
+                total_bytes=total,
+                free_bytes=free,
+                projects=sum(1 for path in placement.values() if path == volume.path),
+                active_ops=self._device_active[volume.device],
+                weight=volume.weight
+            ))
+        return result
+
+    def move_project(self, project_id: str, dest: str) -> int:
+        """Move um projeto para outro volume sob o lock do projeto
+
+        A cópia vai para um diretório temporário no destino, o catálogo é
+        atualizado e só então a origem é removida. Retorna os bytes movidos.
+        """
+        dest = os.path.abspath(dest)
+        if self._volume(dest) is None:
+            raise ValueError(f"Volume desconhecido: {dest}")
+        with self.project_lock(project_id):
+            source_root = self.locate(project_id)
+            if source_root is None or source_root == dest:
+                return 0
+            source = os.path.join(source_root, project_id)
+            staging = os.path.join(dest, MOVING_PREFIX + project_id)
+            target = os.path.join(dest, project_id)
+            if os.path.exists(target):
+                raise ValueError(f"Projeto {project_id} já existe em {dest}")
+            started = time.perf_counter()
+            shutil.rmtree(staging, ignore_errors=True)
+            try:
+                copy_tree_linked(source, staging)
+                os.rename(staging, target)
+            except Exception:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            with self._lock:
+                self._placement[project_id] = dest
+                self._save_placement()
+            moved = tree_size(target)
+            shutil.rmtree(source)
+            print(f"Projeto {project_id} movido de {source_root} para {dest} "
+                  f"({moved} bytes em {time.perf_counter() - started:.1f}s)")
+            return moved
+
+    def rebalance(self,
+                  tolerance: float = REBALANCE_TOLERANCE,
+                  max_moves: Optional[int] = None) -> List[Dict[str, object]]:
+        """Move projetos do volume mais ocupado para o mais livre até equilibrar
+
+        Cada projeto é movido sob seu lock, então os demais continuam
+        recebendo backups e restaurações durante o rebalanceamento.
+        """
+        moves: List[Dict[str, object]] = []
+        tried = set()
+        while max_moves is None or len(moves) < max_moves:
+            usage = {}
+            for volume in self._volumes:
+                total, free = volume.usage()
+                usage[volume.path] = (total, free)
+            fullness = {path: 1 - free / total for path, (total, free) in usage.items() if total}
+            if len(fullness) < 2:
+                break
+            fullest = max(fullness, key=fullness.get)
+            emptiest = min(fullness, key=fullness.get)
+            gap = fullness[fullest] - fullness[emptiest]
+            if gap <= tolerance:
+                break
+            # Maior projeto que não inverte o desequilíbrio
+            budget = gap / 2 * usage[emptiest][0]
+            candidates = [
+                (tree_size(os.path.join(fullest, project)), project)
+                for project, path in self.projects().items()
+                if path == fullest and project not in tried
+            ]
+            candidates = [(size, project) for size, project in candidates if 0 < size <= budget]
+            if not candidates:
+                break
+            size, project = max(candidates)
+            tried.add(project)
+            moved = self.move_project(project, emptiest)
+            moves.append({"project_id": project, "from": fullest, "to": emptiest, "bytes": moved})
+        print(f"Rebalanceamento concluído: {len(moves)} projetos movidos")
+        return moves
+
+
+_VOLUME_SETS: Dict[str, VolumeSet] = {}
+_VOLUME_SETS_LOCK = threading.Lock()
+
+
+def backup_base_dir() -> str:
+    """Volume primário da instância: BACKUP_DIR, ou /data/backups"""
+    return os.environ.get(BASE_DIR_ENV) or DEFAULT_BASE_DIR
+
+
+def get_volume_set(base_dir: str) -> VolumeSet:
+    """Conjunto de volumes compartilhado para um diretório base
+
+    Volumes extras vêm de BACKUP_VOLUMES (caminhos separados por vírgula);
+    base_dir é sempre o primário. Gerenciadores sobre o mesmo base_dir
+    compartilham locks, slots de I/O e o catálogo de posicionamento.
+    """
+    key = os.path.abspath(base_dir)
+    with _VOLUME_SETS_LOCK:
+        volume_set = _VOLUME_SETS.get(key)
+        if volume_set is None:
+            extra = [p.strip() for p in os.environ.get(VOLUMES_ENV, "").split(",") if p.strip()]
+            volume_set = VolumeSet([key] + extra)
+            _VOLUME_SETS[key] = volume_set
+        return volume_set
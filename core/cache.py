@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BODY = 1024 * 1024   # Respostas maiores não ficam guardadas, só a ETag é calculada
+DEFAULT_MAX_AGE = 60.0           # Segundos; cobre alterações feitas por fora dos eventos
+
+
+def strong_etag(data: bytes) -> str:
+    """ETag forte: hash do corpo exato da resposta"""
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def stamped_etag(*parts: object) -> str:
+    """ETag forte a partir de carimbos de versão (sem montar o corpo)"""
+    raw = "\0".join(str(part) for part in parts).encode()
+    return strong_etag(raw)
+
+
+@dataclass
+class CachedResponse:
+    """Corpo serializado de uma resposta e as versões dos escopos usadas para montá-lo"""
+    body: bytes
+    etag: str
+    versions: Tuple[int, ...]
+    media_type: str = "application/json"
+    created: float = 0.0
+
+
+class ResponseCache:
+    """Cache de respostas de leitura invalidado por eventos
+
+    Cada resposta depende de escopos ("services", "backup:<projeto>"...) com
+    um contador de versão. Criar, remover ou mudar o status de algo chama
+    invalidate(escopo), e as respostas montadas com a versão anterior deixam
+    de valer. invalidate("backup:p1") também invalida o escopo pai "backup".
+    """
+
+    def __init__(self,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_body: int = DEFAULT_MAX_BODY,
+                 max_age: Optional[float] = DEFAULT_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_body = max_body
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self, scopes: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(scope, 0) for scope in scopes)
+
+    def invalidate(self, scope: str) -> None:
+        """Avança a versão do escopo e de seus pais"""
+        parts = scope.split(":")
+        with self._lock:
+            for end in range(1, len(parts) + 1):
+                name = ":".join(parts[:end])
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def lookup(self, key: str, scopes: Iterable[str]) -> Optional[CachedResponse]:
+        """Resposta guardada, se ainda válida para as versões atuais dos escopos"""
+        versions = self.versions(scopes)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.versions != versions or (
+                    self.max_age is not None and time.monotonic() - entry.created > self.max_age):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def store(self,
+              key: str,
+              versions: Tuple[int, ...],
+              body: bytes,
+              media_type: str = "application/json") -> CachedResponse:
+        """Guarda o corpo montado com as versões lidas antes da montagem
+
+        Uma invalidação durante a montagem deixa a entrada já desatualizada.
+        """
+        entry = CachedResponse(body=body, etag=strong_etag(body), versions=versions,
+                               media_type=media_type, created=time.monotonic())
+        if len(body) <= self.max_body:
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def get_or_build(self,
+                     key: str,
+                     scopes: Iterable[str],
+                     build: Callable[[], bytes],
+                     media_type: str = "application/json") -> CachedResponse:
+        scopes = tuple(scopes)
+        entry = self.lookup(key, scopes)
+        if entry is not None:
+            return entry
+        versions = self.versions(scopes)
+        return self.store(key, versions, build(), media_type)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Cache compartilhado pelas rotas de leitura da API
+RESPONSE_CACHE = ResponseCache()
@@ -1,12 +1,18 @@
 from .manager import ServiceManager, ServiceStatus, ServiceInfo
 from .base import BaseService
 from .backup import BackupService
+from .watcher import WatcherService
+from .tiering import TieringService
+from .replication import ReplicationService
 
 __all__ = [
     "ServiceManager",
     "ServiceStatus",
     "ServiceInfo",
     "BaseService",
-    "BackupService"
+    "BackupService",
+    "WatcherService",
+    "TieringService",
+    "ReplicationService"
 ]
 
@@ -4,6 +4,7 @@ import traceback
 from .base import BaseService
 from .manager import ServiceInfo as ManagerServiceInfo
 from core.backup import BackupManager
+from core.backup.metrics import STAGE_METRICS
 
 class BackupService(BaseService):
     """Serviço de gerenciamento de backups"""
@@ -64,8 +65,11 @@ class BackupService(BaseService):
             if not self._manager:
                 print("Health check falhou: manager não inicializado")
                 return False
-            # Verifica se o diretório base existe e tem permissões
-            is_healthy = os.path.exists(self.base_dir) and os.access(self.base_dir, os.W_OK)
+            # Verifica se todos os volumes existem e têm permissões
+            is_healthy = all(
+                os.path.exists(volume.path) and os.access(volume.path, os.W_OK)
+                for volume in self._manager.volumes.volumes
+            )
             print(f"Health check concluído. Resultado: {is_healthy}")
             return is_healthy
         except Exception as e:
@@ -80,7 +84,8 @@ class BackupService(BaseService):
         metrics = {
             "total_backups": 0,
             "total_size": 0,
-            "projects": 0
+            "projects": 0,
+            "stages": STAGE_METRICS.snapshot()
         }
 
         if not self._manager:
@@ -93,14 +98,9 @@ class BackupService(BaseService):
             total_size = 0
             total_backups = 0
 
-            # Itera sobre os projetos no diretório base
-            base_dir = self._manager.base_dir
-            print(f"Escaneando diretório base: {base_dir}")
-            for project_id in os.listdir(base_dir):
-                project_dir = os.path.join(base_dir, project_id)
-                if not os.path.isdir(project_dir):
-                    continue
-
+            # Itera sobre os projetos de todos os volumes
+            print(f"Escaneando volumes: {[v.path for v in self._manager.volumes.volumes]}")
+            for project_id in self._manager.volumes.projects():
                 projects.add(project_id)
                 backups = self._manager.list_backups(project_id)
                 total_backups += len(backups)
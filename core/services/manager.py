@@ -4,6 +4,7 @@ from datetime import datetime
 import threading
 import time
 import traceback
+from core.cache import RESPONSE_CACHE
 
 class ServiceStatus(str, Enum):
     """Status possíveis para um serviço"""
@@ -38,12 +39,13 @@ class ServiceInfo:
             self.status = status
             self.error_message = error
             self.last_status_change = datetime.now()
-            
-            # Registra a mudança de status
-            log_msg = f"[{self.name}] Status alterado: {old_status} -> {status}"
-            if error:
-                log_msg += f" (Erro: {error})"
-            self.add_log(log_msg)
+        RESPONSE_CACHE.invalidate("services")
+
+        # Registra a mudança de status fora do lock: add_log também o adquire
+        log_msg = f"[{self.name}] Status alterado: {old_status} -> {status}"
+        if error:
+            log_msg += f" (Erro: {error})"
+        self.add_log(log_msg)
 
     def add_log(self, message: str):
         """Adiciona uma mensagem ao log do serviço"""
@@ -106,6 +108,7 @@ class ServiceManager:
             # Registra o serviço
             with self._lock:
                 self._services[service.name] = service
+            RESPONSE_CACHE.invalidate("services")
 
             self._add_global_log(f"Serviço {service.name} registrado com sucesso")
             return True
@@ -0,0 +1,125 @@
+from typing import Dict, Any, Optional
+from datetime import datetime
+import threading
+import traceback
+from .base import BaseService
+from .manager import ServiceInfo as ManagerServiceInfo
+from core.backup.manager import BackupManager
+from core.backup.models import ReplicationReport
+from core.backup.replication import BackupReplicator, ReplicationPeer
+
+DEFAULT_INTERVAL = 300.0  # Segundos entre replicações
+
+class ReplicationService(BaseService):
+    """Serviço que replica periodicamente os backups de outra instância"""
+
+    def __init__(self, base_dir: str, peer_url: str, interval: float = DEFAULT_INTERVAL):
+        print(f"Inicializando ReplicationService com peer: {peer_url}")
+        super().__init__(
+            name="replication",
+            description="Replicação de backups a partir de outra instância",
+            dependencies=["backup"],
+            required_ports=[]
+        )
+        self.base_dir = base_dir
+        self.peer_url = peer_url
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._replicator: Optional[BackupReplicator] = None
+        self._runs = 0
+        self._replicated = 0
+        self._bytes_fetched = 0
+        self._last_report: Optional[ReplicationReport] = None
+        self._last_run: Optional[datetime] = None
+        self._service_info = ManagerServiceInfo(
+            name="replication",
+            description="Replicação de backups a partir de outra instância",
+            dependencies=["backup"],
+            required_ports=[]
+        )
+        print("ReplicationService inicializado")
+
+    @property
+    def info(self) -> ManagerServiceInfo:
+        """Retorna as informações do serviço"""
+        return self._service_info
+
+    def run_once(self) -> Optional[ReplicationReport]:
+        """Replica imediatamente; retorna o relatório"""
+        if not self._replicator:
+            return None
+        try:
+            report = self._replicator.run()
+            self._replicated += len(report.backups_replicated)
+            self._bytes_fetched += report.bytes_fetched
+            self._last_report = report
+            return report
+        except Exception as e:
+            print(f"Erro na replicação: {e}")
+            print(traceback.format_exc())
+            return None
+        finally:
+            self._runs += 1
+            self._last_run = datetime.now()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start_worker(self) -> None:
+        """Cria o replicador e a thread periódica (idempotente)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._replicator = BackupReplicator(BackupManager(self.base_dir), ReplicationPeer(self.peer_url))
+        self._thread = threading.Thread(target=self._loop, name="backup-replication", daemon=True)
+        self._thread.start()
+
+    async def start(self) -> bool:
+        """Inicia a thread de replicação"""
+        try:
+            print("Iniciando serviço de replicação...")
+            self.start_worker()
+            print("Serviço de replicação iniciado com sucesso")
+            return True
+        except Exception as e:
+            print(f"Erro ao iniciar serviço de replicação: {e}")
+            print("Stacktrace:")
+            print(traceback.format_exc())
+            return False
+
+    async def stop(self) -> bool:
+        """Para a thread (a replicação em andamento termina o backup atual)"""
+        try:
+            print("Parando serviço de replicação...")
+            self._stop.set()
+            if self._thread:
+                self._thread.join(timeout=30)
+            self._thread = None
+            print("Serviço de replicação parado com sucesso")
+            return True
+        except Exception as e:
+            print(f"Erro ao parar serviço de replicação: {e}")
+            print("Stacktrace:")
+            print(traceback.format_exc())
+            return False
+
+    async def health_check(self) -> bool:
+        """Saudável se a thread está viva e a última replicação não falhou"""
+        alive = bool(self._thread and self._thread.is_alive())
+        return alive and (self._last_report is None or self._last_report.success)
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Retorna o progresso da replicação"""
+        report = self._last_report
+        return {
+            "peer": self.peer_url,
+            "runs": self._runs,
+            "replicated": self._replicated,
+            "bytes_fetched": self._bytes_fetched,
+            "last_run": self._last_run.isoformat() if self._last_run else None,
+            "last_errors": report.errors if report else [],
+            "last_seconds": report.seconds if report else None
+        }
@@ -1,4 +1,9 @@
-from core.services import ServiceManager, BackupService
+from core.services import (ServiceManager, BackupService, WatcherService, TieringService,
+                           ReplicationService)
+from core.backup.inotify import inotify_available
+from core.backup.tiering import TieringPolicy
+from core.backup.volumes import backup_base_dir
+import os
 import traceback
 
 # Inicializa o gerenciador de serviços
@@ -14,7 +19,7 @@ def initialize_services():
 
         # Inicializa o serviço de backup
         print("Criando instância do serviço de backup...")
-        backup_service = BackupService("/data/backups")
+        backup_service = BackupService(backup_base_dir())
         services["backup"] = backup_service
 
         # Registra o serviço
@@ -27,6 +32,52 @@ def initialize_services():
         if not service_manager.start_service("backup"):
             raise Exception("Falha ao iniciar serviço de backup")
 
+        # Inicia o watcher de alterações (opcional)
+        # BACKUP_WATCH_PROJECTS=projeto1=/caminho1,projeto2=/caminho2
+        watch_config = os.environ.get("BACKUP_WATCH_PROJECTS", "")
+        if watch_config and inotify_available():
+            print("Criando instância do serviço de watcher...")
+            projects = dict(
+                item.split("=", 1) for item in watch_config.split(",") if "=" in item
+            )
+            watcher_service = WatcherService(projects)
+            services["watcher"] = watcher_service
+            if not service_manager.register_service(watcher_service.info):
+                raise Exception("Falha ao registrar serviço de watcher")
+            for project_id, data_dir in projects.items():
+                watcher_service.watch(project_id, data_dir)
+            if not service_manager.start_service("watcher"):
+                raise Exception("Falha ao iniciar serviço de watcher")
+
+        # Inicia a migração para a camada fria (opcional)
+        # BACKUP_TIERING_DAYS=7 migra backups com mais de 7 dias
+        tiering_days = os.environ.get("BACKUP_TIERING_DAYS", "")
+        if tiering_days:
+            print("Criando instância do serviço de camadas...")
+            tiering_service = TieringService(
+                backup_base_dir(), TieringPolicy(min_age_days=float(tiering_days)))
+            services["tiering"] = tiering_service
+            if not service_manager.register_service(tiering_service.info):
+                raise Exception("Falha ao registrar serviço de camadas")
+            tiering_service.start_worker()
+            if not service_manager.start_service("tiering"):
+                raise Exception("Falha ao iniciar serviço de camadas")
+
+        # Inicia a replicação a partir de outra instância (opcional)
+        # BACKUP_REPLICATION_PEER=http://host-b:8000/api/v1
+        peer_url = os.environ.get("BACKUP_REPLICATION_PEER", "")
+        if peer_url:
+            print("Criando instância do serviço de replicação...")
+            replication_service = ReplicationService(
+                backup_base_dir(), peer_url,
+                float(os.environ.get("BACKUP_REPLICATION_INTERVAL", "300")))
+            services["replication"] = replication_service
+            if not service_manager.register_service(replication_service.info):
+                raise Exception("Falha ao registrar serviço de replicação")
+            replication_service.start_worker()
+            if not service_manager.start_service("replication"):
+                raise Exception("Falha ao iniciar serviço de replicação")
+
         # Inicia o monitoramento
         print("Iniciando monitoramento de serviços...")
         service_manager.start_monitor()
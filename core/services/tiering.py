@@ -0,0 +1,123 @@
+from typing import Dict, Any, Optional
+from datetime import datetime
+import threading
+import traceback
+from .base import BaseService
+from .manager import ServiceInfo as ManagerServiceInfo
+from core.backup.manager import BackupManager
+from core.backup.tiering import BackupTiering, TieringPolicy, lower_thread_priority
+
+DEFAULT_INTERVAL = 3600.0  # Segundos entre varreduras
+
+class TieringService(BaseService):
+    """Serviço que migra backups antigos para a camada fria em segundo plano"""
+
+    def __init__(self, base_dir: str,
+                 policy: Optional[TieringPolicy] = None,
+                 interval: float = DEFAULT_INTERVAL):
+        print(f"Inicializando TieringService com diretório base: {base_dir}")
+        super().__init__(
+            name="tiering",
+            description="Recompressão de backups antigos para a camada fria",
+            dependencies=["backup"],
+            required_ports=[]
+        )
+        self.base_dir = base_dir
+        self.policy = policy or TieringPolicy()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._tiering: Optional[BackupTiering] = None
+        self._migrated = 0
+        self._runs = 0
+        self._last_run: Optional[datetime] = None
+        self._last_error: Optional[str] = None
+        self._service_info = ManagerServiceInfo(
+            name="tiering",
+            description="Recompressão de backups antigos para a camada fria",
+            dependencies=["backup"],
+            required_ports=[]
+        )
+        print("TieringService inicializado")
+
+    @property
+    def info(self) -> ManagerServiceInfo:
+        """Retorna as informações do serviço"""
+        return self._service_info
+
+    def run_once(self) -> int:
+        """Executa uma varredura imediatamente; retorna quantos backups migraram"""
+        if not self._tiering:
+            return 0
+        try:
+            migrated = self._tiering.run_once()
+            self._migrated += len(migrated)
+            self._last_error = None
+            return len(migrated)
+        except Exception as e:
+            self._last_error = str(e)
+            print(f"Erro na varredura de camadas: {e}")
+            print(traceback.format_exc())
+            return 0
+        finally:
+            self._runs += 1
+            self._last_run = datetime.now()
+
+    def _loop(self) -> None:
+        lower_thread_priority(self.policy.nice)
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start_worker(self) -> None:
+        """Cria o gerenciador e a thread de migração (idempotente)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._tiering = BackupTiering(BackupManager(self.base_dir), self.policy, self._stop)
+        self._thread = threading.Thread(target=self._loop, name="backup-tiering", daemon=True)
+        self._thread.start()
+
+    async def start(self) -> bool:
+        """Inicia a thread de migração"""
+        try:
+            print("Iniciando serviço de camadas...")
+            self.start_worker()
+            print("Serviço de camadas iniciado com sucesso")
+            return True
+        except Exception as e:
+            print(f"Erro ao iniciar serviço de camadas: {e}")
+            print("Stacktrace:")
+            print(traceback.format_exc())
+            return False
+
+    async def stop(self) -> bool:
+        """Interrompe a migração em andamento e para a thread"""
+        try:
+            print("Parando serviço de camadas...")
+            self._stop.set()
+            if self._thread:
+                self._thread.join(timeout=30)
+            self._thread = None
+            print("Serviço de camadas parado com sucesso")
+            return True
+        except Exception as e:
+            print(f"Erro ao parar serviço de camadas: {e}")
+            print("Stacktrace:")
+            print(traceback.format_exc())
+            return False
+
+    async def health_check(self) -> bool:
+        """Saudável se a thread de migração está viva"""
+        return bool(self._thread and self._thread.is_alive())
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Retorna o progresso da migração"""
+        return {
+            "migrated": self._migrated,
+            "runs": self._runs,
+            "last_run": self._last_run.isoformat() if self._last_run else None,
+            "last_error": self._last_error,
+            "min_age_days": self.policy.min_age_days,
+            "compression": f"{self.policy.compression_type.value}:{self.policy.level}"
+        }
@@ -0,0 +1,111 @@
+from typing import Dict, Any, Optional
+import traceback
+from .base import BaseService
+from .manager import ServiceInfo as ManagerServiceInfo
+from core.backup.journal import ChangeJournal, JournalRegistry, CHANGE_JOURNALS
+from core.backup.inotify import InotifyWatcher, inotify_available
+
+class WatcherService(BaseService):
+    """Serviço que mantém journals de alterações dos projetos via inotify"""
+
+    def __init__(self, projects: Optional[Dict[str, str]] = None,
+                 journals: Optional[JournalRegistry] = None):
+        print("Inicializando WatcherService")
+        super().__init__(
+            name="watcher",
+            description="Journal de alterações para backups incrementais",
+            dependencies=["backup"],
+            required_ports=[]
+        )
+        self.projects = dict(projects or {})  # project_id -> data_dir
+        self.journals = journals or CHANGE_JOURNALS
+        self._watchers: Dict[str, InotifyWatcher] = {}
+        self._service_info = ManagerServiceInfo(
+            name="watcher",
+            description="Journal de alterações para backups incrementais",
+            dependencies=["backup"],
+            required_ports=[]
+        )
+        print("WatcherService inicializado")
+
+    @property
+    def info(self) -> ManagerServiceInfo:
+        """Retorna as informações do serviço"""
+        return self._service_info
+
+    def watch(self, project_id: str, data_dir: str) -> bool:
+        """Começa a observar o diretório de dados de um projeto"""
+        try:
+            self.unwatch(project_id)
+            journal = ChangeJournal(project_id, data_dir)
+            watcher = InotifyWatcher(journal)
+            watcher.start()
+            self._watchers[project_id] = watcher
+            self.projects[project_id] = data_dir
+            self.journals.register(journal)
+            print(f"Observando {data_dir} para o projeto {project_id} "
+                  f"({watcher.watch_count} diretórios)")
+            return True
+        except Exception as e:
+            print(f"Erro ao observar projeto {project_id}: {e}")
+            print(traceback.format_exc())
+            return False
+
+    def unwatch(self, project_id: str) -> None:
+        """Para de observar um projeto e descarta seu journal"""
+        watcher = self._watchers.pop(project_id, None)
+        if watcher:
+            watcher.stop()
+        self.journals.unregister(project_id)
+
+    async def start(self) -> bool:
+        """Inicia os watchers de todos os projetos configurados"""
+        try:
+            print("Iniciando serviço de watcher...")
+            if not inotify_available():
+                print("inotify indisponível: backups incrementais usarão scan completo")
+                return False
+            for project_id, data_dir in self.projects.items():
+                self.watch(project_id, data_dir)
+            print("Serviço de watcher iniciado com sucesso")
+            return True
+        except Exception as e:
+            print(f"Erro ao iniciar serviço de watcher: {e}")
+            print("Stacktrace:")
+            print(traceback.format_exc())
+            return False
+
+    async def stop(self) -> bool:
+        """Para todos os watchers"""
+        try:
+            print("Parando serviço de watcher...")
+            for project_id in list(self._watchers):
+                self.unwatch(project_id)
+            print("Serviço de watcher parado com sucesso")
+            return True
+        except Exception as e:
+            print(f"Erro ao parar serviço de watcher: {e}")
+            print("Stacktrace:")
+            print(traceback.format_exc())
+            return False
+
+    async def health_check(self) -> bool:
+        """Saudável se todos os journals ainda são confiáveis"""
+        for project_id in self._watchers:
+            journal = self.journals.get(project_id)
+            if not journal or journal.degraded:
+                print(f"Health check falhou: journal de {project_id} degradado")
+                return False
+        return True
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Retorna o estado dos journals observados"""
+        projects = {}
+        for project_id, watcher in self._watchers.items():
+            journal = self.journals.get(project_id)
+            if journal:
+                projects[project_id] = dict(journal.stats(), watches=watcher.watch_count)
+        return {
+            "projects": projects,
+            "watched_projects": len(projects)
+        }
@@ -1,10 +1,14 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 from core.services import ServiceManager, BackupService, ServiceStatus
 from core.services.service_registry import service_manager, services, initialize_services
 from routers import backup
+from api.v1 import backup as backup_v1
+from core.cache import RESPONSE_CACHE
+from api.conditional import cached_response
+import json
 import os
 import traceback
 import sys
@@ -24,7 +28,10 @@ app.add_middleware(
 )
 
 # Inclui os routers
-app.include_router(backup.router, prefix="/api/v1/backup", tags=["backup"])
+# O router de api/v1 responde em /api/v1/backup; o legado (BackupService) fica
+# em /api/v1/legacy/backup, já que os dois definem create, list, restore e delete
+app.include_router(backup_v1.router, prefix="/api/v1", tags=["backup"])
+app.include_router(backup.router, prefix="/api/v1/legacy/backup", tags=["backup-legacy"])
 
 # Modelos de resposta
 class ServiceStatusResponse(BaseModel):
@@ -91,32 +98,50 @@ async def health_check():
 
 # Endpoint para listar status dos serviços
 @app.get("/api/v1/services/status", response_model=List[ServiceStatusResponse])
-async def list_services_status():
-    """Lista o status de todos os serviços"""
-    print("=== LISTANDO STATUS DOS SERVIÇOS ===", file=sys.stderr)
-    response = []
-    for service_info in service_manager.list_services().values():
-        response.append({
-            "name": service_info.name,
-            "status": service_info.status,
-            "description": service_info.description,
-            "error_message": service_info.error_message
-        })
-    return response
+async def list_services_status(request: Request):
+    """Lista o status de todos os serviços
+
+    A resposta fica em cache até a próxima mudança de status e responde
+    304 a If-None-Match com a ETag atual.
+    """
+    def build() -> bytes:
+        print("=== LISTANDO STATUS DOS SERVIÇOS ===", file=sys.stderr)
+        response = []
+        for service_info in service_manager.list_services().values():
+            response.append({
+                "name": service_info.name,
+                "status": service_info.status.value,
+                "description": service_info.description,
+                "error_message": service_info.error_message
+            })
+        return json.dumps(response).encode()
+
+    cached = RESPONSE_CACHE.get_or_build("services_status", ["services"], build)
+    return cached_response(request, cached)
 
 # Endpoint para obter métricas dos serviços
 @app.get("/api/v1/services/metrics", response_model=List[ServiceMetricsResponse])
-async def get_services_metrics():
-    """Obtém métricas de todos os serviços"""
-    print("=== OBTENDO MÉTRICAS DOS SERVIÇOS ===", file=sys.stderr)
-    response = []
-    for name, service in services.items():
-        metrics = await service.get_metrics()
-        response.append({
-            "name": name,
-            "metrics": metrics
-        })
-    return response
+async def get_services_metrics(request: Request):
+    """Obtém métricas de todos os serviços
+
+    Invalidada por mudanças de status, backups criados/removidos e novas
+    medições de etapas; enquanto nada muda, a resposta vem do cache.
+    """
+    scopes = ["services", "backup", "stage_metrics"]
+    cached = RESPONSE_CACHE.lookup("services_metrics", scopes)
+    if cached is None:
+        print("=== OBTENDO MÉTRICAS DOS SERVIÇOS ===", file=sys.stderr)
+        versions = RESPONSE_CACHE.versions(scopes)
+        response = []
+        for name, service in services.items():
+            metrics = await service.get_metrics()
+            response.append({
+                "name": name,
+                "metrics": metrics
+            })
+        cached = RESPONSE_CACHE.store("services_metrics", versions,
+                                      json.dumps(response, default=str).encode())
+    return cached_response(request, cached)
 
 # Endpoint para obter logs de um serviço específico
 @app.get("/api/v1/services/{service_name}/logs")
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 from core.services.service_registry import services
+from core.cache import RESPONSE_CACHE
+from api.conditional import cached_response
 import traceback
 
 router = APIRouter()
@@ -54,28 +56,36 @@ async def create_backup(request: BackupRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/list/{project_id}", response_model=List[BackupResponse])
-async def list_backups(project_id: str):
-    """Lista todos os backups de um projeto"""
+async def list_backups(request: Request, project_id: str):
+    """Lista todos os backups de um projeto (com ETag; 304 se nada mudou)"""
     try:
         print(f"Recebida requisição para listar backups do projeto {project_id}")
         backup_service = services.get("backup")
         if not backup_service:
             raise HTTPException(status_code=503, detail="Serviço de backup não disponível")
 
-        backups = backup_service.manager.list_backups(project_id)
-        return [
-            BackupResponse(
-                id=backup.id,
-                project_id=backup.project_id,
-                timestamp=backup.timestamp,
-                description=backup.description,
-                size_bytes=backup.size_bytes,
-                status=backup.status,
-                error_message=backup.error_message
-            )
-            for backup in backups
-        ]
-
+        def build() -> bytes:
+            backups = backup_service.manager.list_backups(project_id)
+            responses = [
+                BackupResponse(
+                    id=backup.id,
+                    project_id=backup.project_id,
+                    timestamp=backup.timestamp,
+                    description=backup.description,
+                    size_bytes=backup.size_bytes,
+                    status=backup.status,
+                    error_message=backup.error_message
+                ).json()
+                for backup in backups
+            ]
+            return ("[" + ",".join(responses) + "]").encode()
+
+        cached = RESPONSE_CACHE.get_or_build(
+            f"legacy_backup_list:{project_id}", [f"backup:{project_id}"], build)
+        return cached_response(request, cached)
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro ao listar backups: {e}")
         print(traceback.format_exc())
@@ -86,6 +96,8 @@ class RestoreRequest(BaseModel):
     project_id: str
     backup_id: str
     target_dir: str
+    differential: bool = False  # Só copia/remove o que difere do destino
+    dry_run: bool = False       # Retorna o plano diferencial sem alterar o destino
 
 @router.post("/restore")
 async def restore_backup(request: RestoreRequest):
@@ -96,10 +108,21 @@ async def restore_backup(request: RestoreRequest):
         if not backup_service:
             raise HTTPException(status_code=503, detail="Serviço de backup não disponível")
 
+        if request.dry_run:
+            plan = backup_service.manager.plan_restore(
+                project_id=request.project_id,
+                backup_id=request.backup_id,
+                target_dir=request.target_dir
+            )
+            if plan is None:
+                raise HTTPException(status_code=404, detail="Backup não encontrado ou erro ao planejar")
+            return plan
+
         success = backup_service.manager.restore_backup(
             project_id=request.project_id,
             backup_id=request.backup_id,
-            target_dir=request.target_dir
+            target_dir=request.target_dir,
+            differential=request.differential
         )
 
         if not success:
@@ -107,6 +130,8 @@ async def restore_backup(request: RestoreRequest):
 
         return {"message": "Backup restaurado com sucesso"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro ao restaurar backup: {e}")
         print(traceback.format_exc())
@@ -0,0 +1,98 @@
+"""Chamadas ASGI em processo e um servidor HTTP mínimo, sem uvicorn nem requests
+
+Uso como script (uma instância da API num processo próprio):
+    BACKUP_DIR=/tmp/a python tests/asgi.py   # imprime port=<porta escolhida>
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+async def _call(app, method: str, url: str, body: bytes, headers: Dict[str, str]) -> Response:
+    parts = urlsplit(url)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": parts.path,
+        "raw_path": parts.path.encode(), "query_string": parts.query.encode(),
+        "root_path": "", "server": ("testserver", 80), "client": ("127.0.0.1", 0),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    received = False
+    status = 500
+    response_headers: Dict[str, str] = {}
+    chunks = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update((k.decode().lower(), v.decode()) for k, v in message["headers"])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, response_headers, b"".join(chunks)
+
+
+def request(app,
+            method: str,
+            url: str,
+            json_body: Any = None,
+            headers: Optional[Dict[str, str]] = None) -> Response:
+    """Executa uma requisição direto no app ASGI"""
+    headers = dict(headers or {})
+    body = b""
+    if json_body is not None:
+        body = json.dumps(json_body).encode()
+        headers["content-type"] = "application/json"
+    headers["content-length"] = str(len(body))
+    return asyncio.run(_call(app, method, url, body, headers))
+
+
+def serve(app, port: int = 0) -> ThreadingHTTPServer:
+    """Serve o app em 127.0.0.1 numa thread (HTTP/1.0, uma conexão por requisição)"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _handle(self):
+            length = int(self.headers.get("content-length") or 0)
+            body = self.rfile.read(length) if length else b""
+            status, headers, payload = asyncio.run(
+                _call(app, self.command, self.path, body, dict(self.headers.items())))
+            self.send_response(status)
+            for key, value in headers.items():
+                if key != "content-length":
+                    self.send_header(key, value)
+            self.send_header("content-length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import main
+
+    server = serve(main.app)
+    print(f"port={server.server_address[1]}", flush=True)
+    threading.Event().wait()
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.pop("BACKUP_S3_BUCKET", None)
+# A API (main.py, api/v1) monta o BackupManager na importação: nunca em /data/backups
+os.environ["BACKUP_DIR"] = tempfile.mkdtemp(prefix="backup-tests-")
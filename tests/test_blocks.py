@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+import zlib
+
+import pytest
+
+from core.backup import blocks
+from core.backup.blocks import BlockIndex, BlockWriter, iter_blocks
+
+
+@pytest.fixture
+def slots(monkeypatch):
+    """Poucas vagas globais, para forçar a disputa entre arquivos"""
+    semaphore = threading.BoundedSemaphore(2)
+    monkeypatch.setattr(blocks, "_SLOTS", semaphore)
+    yield semaphore
+    # Toda vaga reservada foi devolvida
+    assert all(semaphore.acquire(blocking=False) for _ in range(2))
+    assert not semaphore.acquire(blocking=False)
+
+
+def _write_file(path, data, block_size, compress=zlib.compress):
+    with open(path, "wb") as f:
+        writer = BlockWriter(f.write, 0, compress, block_size)
+        try:
+            for start in range(0, len(data), 1000):
+                writer.update(data[start:start + 1000])
+            return writer.finish()
+        finally:
+            writer.close()
+
+
+def test_in_flight_blocks_are_bounded_across_files(tmp_path, slots):
+    lock = threading.Lock()
+    counts = {"outstanding": 0, "peak": 0}
+
+    def compress(data):
+        with lock:
+            counts["outstanding"] += 1
+            counts["peak"] = max(counts["peak"], counts["outstanding"])
+        time.sleep(0.002)
+        return zlib.compress(data)
+
+    def run(n):
+        data = os.urandom(64 * 1024)
+        path = tmp_path / f"f{n}.blk"
+        with open(path, "wb") as f:
+            def write(stored):
+                with lock:
+                    counts["outstanding"] -= 1
+                f.write(stored)
+            writer = BlockWriter(write, 0, compress, 4096)
+            writer.update(data)
+            index = writer.finish()
+        assert b"".join(iter_blocks(str(path), BlockIndex.load(str(path)), zlib.decompress)) == data
+        assert len(index) == 16
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Vagas globais mais um bloco fora das vagas por arquivo
+    assert counts["peak"] <= 2 + 6
+
+
+def test_reader_and_writer_in_one_thread(tmp_path, slots):
+    data = os.urandom(200 * 1024)
+    src = tmp_path / "src.blk"
+    _write_file(src, data, 4096)
+    index = BlockIndex.load(str(src))
+    out = bytearray()
+    with open(tmp_path / "dst.blk", "wb") as f:
+        writer = BlockWriter(f.write, 0, zlib.compress, 8192)
+        for chunk in iter_blocks(str(src), index, zlib.decompress):
+            writer.update(chunk)
+        writer.finish()
+    for chunk in iter_blocks(str(tmp_path / "dst.blk"), BlockIndex.load(str(tmp_path / "dst.blk")),
+                             zlib.decompress):
+        out += chunk
+    assert bytes(out) == data
+
+
+def test_errors_and_abandoned_reads_release_slots(tmp_path, slots):
+    data = os.urandom(64 * 1024)
+    src = tmp_path / "src.blk"
+    _write_file(src, data, 4096)
+    chunks = iter_blocks(str(src), BlockIndex.load(str(src)), zlib.decompress)
+    assert next(chunks) == data[:4096]
+    chunks.close()
+
+    def failing(block):
+        raise RuntimeError("falha no codec")
+    with pytest.raises(RuntimeError):
+        _write_file(tmp_path / "bad.blk", data, 4096, failing)
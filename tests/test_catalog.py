@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+import main
+from core.backup.catalog import BackupFilter, decode_cursor
+from core.backup.manager import BackupManager
+from core.backup.models import BackupType
+from core.backup.volumes import VolumeSet
+from tests.asgi import request
+
+
+def _pages(manager, project_id, limit, **kwargs):
+    cursor, pages = None, []
+    while True:
+        page = manager.list_backups_page(project_id, limit, cursor, **kwargs)
+        pages.append([item["id"] for item in page.items])
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+
+@pytest.fixture
+def backups(tmp_path):
+    src = tmp_path / "src"
+    (src / "d").mkdir(parents=True)
+    (src / "a.txt").write_text("a")
+    base = str(tmp_path / "store")
+    manager = BackupManager(base, volumes=VolumeSet([base]))
+    created = [manager.create_backup("p", BackupType.FULL, str(src), tags={"env": "prod"})]
+    for i in range(4):
+        time.sleep(0.01)
+        (src / "d" / f"f{i}.txt").write_text(str(i))
+        created.append(manager.create_backup(
+            "p", BackupType.INCREMENTAL, str(src), tags={"env": "prod" if i % 2 else "dev"}))
+    return manager, src, created
+
+
+def test_pages_walk_newest_first_without_gaps(backups):
+    manager, src, created = backups
+    newest_first = [b.id for b in reversed(created)]
+    assert _pages(manager, "p", 2) == [newest_first[0:2], newest_first[2:4], newest_first[4:]]
+    assert _pages(manager, "p", 5) == [newest_first]
+    assert _pages(manager, "p", 1000) == [newest_first]
+
+    # Um backup criado entre as requisições não desloca as páginas seguintes
+    first = manager.list_backups_page("p", 2)
+    time.sleep(0.01)
+    (src / "late.txt").write_text("late")
+    late = manager.create_backup("p", BackupType.INCREMENTAL, str(src))
+    rest = manager.list_backups_page("p", 10, first.next_cursor)
+    assert [item["id"] for item in rest.items] == newest_first[2:]
+    assert manager.list_backups_page("p", 1).items[0]["id"] == late.id
+
+
+def test_filters_and_projection(backups):
+    manager, _, created = backups
+    newest_first = [b.id for b in reversed(created)]
+    incrementals = BackupFilter(types=[BackupType.INCREMENTAL.value])
+    assert _pages(manager, "p", 3, filters=incrementals) == [newest_first[:3], newest_first[3:4]]
+    prod = BackupFilter(tags={"env": "prod"})
+    assert _pages(manager, "p", 10, filters=prod) == [[newest_first[0], newest_first[2], newest_first[4]]]
+    both = BackupFilter(types=[BackupType.FULL.value], tags={"env": "prod"})
+    assert _pages(manager, "p", 10, filters=both) == [[created[0].id]]
+    since = BackupFilter(created_after=created[3].created_at)
+    assert _pages(manager, "p", 10, filters=since) == [newest_first[:2]]
+    before = BackupFilter(created_before=created[1].created_at)
+    assert _pages(manager, "p", 10, filters=before) == [[created[0].id]]
+
+    page = manager.list_backups_page("p", 10, fields=["id", "type"])
+    assert [set(item) for item in page.items] == [{"id", "type"}] * 5
+    assert all("files" not in item for item in manager.list_backups_page("p", 10).items)
+    page = manager.list_backups_page("p", 10, fields=["files"])
+    assert [sorted(f["path"] for f in item["files"]) for item in page.items][-1] == ["a.txt"]
+    assert [set(item) for item in page.items] == [{"files"}] * 5
+
+
+def test_catalog_reconciles_with_backup_dirs(backups):
+    manager, _, created = backups
+    project_dir = manager.project_dir("p")
+    newest_first = [b.id for b in reversed(created)]
+
+    # Catálogo perdido: é reconstruído a partir dos metadata.json
+    os.remove(os.path.join(project_dir, "catalog.json"))
+    assert [e["id"] for e in manager.catalog("p").entries()] == newest_first
+    assert all("files" not in e for e in manager.catalog("p").entries())
+
+    # Diretório removido por fora some; copiado por fora aparece
+    shutil.rmtree(os.path.join(project_dir, created[-1].id))
+    shutil.copytree(os.path.join(project_dir, created[0].id), os.path.join(project_dir, "copied"))
+    with open(os.path.join(project_dir, "copied", "metadata.json")) as f:
+        meta = json.load(f)
+    meta["id"] = "copied"
+    with open(os.path.join(project_dir, "copied", "metadata.json"), "w") as f:
+        json.dump(meta, f)
+    ids = {e["id"] for e in manager.catalog("p").entries()}
+    assert ids == set(newest_first[1:]) | {"copied"}
+
+
+def test_files_page_and_bad_cursor(backups):
+    manager, _, created = backups
+    last = created[-1]
+    full = created[0]
+    cursor, seen = None, []
+    while True:
+        page = manager.list_backup_files(full.id, "p", 1, cursor)
+        seen += [f["path"] for f in page.items]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == ["a.txt"]
+    assert [f["path"] for f in manager.list_backup_files(last.id, "p", prefix="d/").items] == ["d/f3.txt"]
+    assert manager.list_backup_files("missing", "p") is None
+
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor!")
+    with pytest.raises(ValueError):
+        manager.list_backups_page("p", 2, "bm90LWEtbGlzdA")  # base64 de "not-a-list"
+
+
+def test_list_endpoint_pages_and_rejects_bad_cursor(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    for i in range(3):
+        (src / "a.txt").write_text(str(i))
+        status, _, body = request(main.app, "POST", "/api/v1/backup/create", {
+            "project_id": "catalog-api", "backup_type": "full", "data_dir": str(src),
+            "tags": {"n": str(i)}})
+        assert status == 200, body
+        time.sleep(0.01)
+
+    status, _, body = request(main.app, "GET", "/api/v1/backup/list/catalog-api?limit=2&fields=id,tags")
+    assert status == 200
+    first = json.loads(body)
+    assert [item["tags"] for item in first["items"]] == [{"n": "2"}, {"n": "1"}]
+    status, _, body = request(
+        main.app, "GET", f"/api/v1/backup/list/catalog-api?limit=2&fields=id,tags&cursor={first['next_cursor']}")
+    second = json.loads(body)
+    assert [item["tags"] for item in second["items"]] == [{"n": "0"}]
+    assert second["next_cursor"] is None
+    status, _, body = request(main.app, "GET", "/api/v1/backup/list/catalog-api?tag=n:1&fields=tags")
+    assert json.loads(body)["items"] == [{"tags": {"n": "1"}}]
+    status, _, _ = request(main.app, "GET", "/api/v1/backup/list/catalog-api?cursor=@@@")
+    assert status == 400
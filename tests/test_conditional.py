@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from core.services import ServiceStatus
+from core.services.service_registry import initialize_services, service_manager, services
+from tests.asgi import request
+
+
+@pytest.fixture(scope="module")
+def backup_service():
+    # O evento de startup não roda nas chamadas diretas ao app
+    if "backup" not in services:
+        initialize_services()
+    service = services["backup"]
+    # O ServiceManager só marca o status; o gerenciador nasce em start()
+    if service.manager is None:
+        asyncio.run(service.start())
+    return service
+
+
+def _get(url, etag=None):
+    return request(main.app, "GET", url, headers={"If-None-Match": etag} if etag else None)
+
+
+def _assert_not_modified(url, etag):
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        status, headers, body = _get(url, header)
+        assert (status, body, headers["etag"]) == (304, b"", etag)
+
+
+def test_legacy_list_etag_follows_create_and_delete(tmp_path, backup_service):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("a")
+    url = "/api/v1/legacy/backup/list/etag-legacy"
+    status, headers, body = _get(url)
+    assert (status, json.loads(body)) == (200, [])
+    empty = headers["etag"]
+    _assert_not_modified(url, empty)
+
+    status, _, body = request(main.app, "POST", "/api/v1/legacy/backup/create",
+                              {"project_id": "etag-legacy", "source_dir": str(src)})
+    assert status == 200, body
+    backup_id = json.loads(body)["id"]
+    status, headers, body = _get(url, empty)
+    assert status == 200 and headers["etag"] != empty
+    assert [b["id"] for b in json.loads(body)] == [backup_id]
+    created = headers["etag"]
+    _assert_not_modified(url, created)
+
+    status, _, _ = request(main.app, "DELETE", f"/api/v1/legacy/backup/etag-legacy/{backup_id}")
+    assert status == 200
+    status, headers, body = _get(url, created)
+    assert (status, json.loads(body)) == (200, [])
+    assert headers["etag"] != created
+
+
+def test_v1_list_etag_follows_create(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("a")
+    url = "/api/v1/backup/list/etag-v1?limit=10"
+    status, headers, _ = _get(url)
+    assert status == 200
+    before = headers["etag"]
+    _assert_not_modified(url, before)
+
+    status, _, body = request(main.app, "POST", "/api/v1/backup/create",
+                              {"project_id": "etag-v1", "backup_type": "full", "data_dir": str(src)})
+    assert status == 200, body
+    status, headers, body = _get(url, before)
+    assert status == 200 and headers["etag"] != before
+    assert [item["type"] for item in json.loads(body)["items"]] == ["full"]
+
+
+def test_services_status_etag_follows_status_change(backup_service):
+    url = "/api/v1/services/status"
+    status, headers, body = _get(url)
+    assert status == 200
+    assert {s["name"]: s["status"] for s in json.loads(body)}["backup"] == ServiceStatus.RUNNING.value
+    before = headers["etag"]
+    _assert_not_modified(url, before)
+
+    info = service_manager.list_services()["backup"]
+    info.update_status(ServiceStatus.STOPPING)
+    try:
+        status, headers, body = _get(url, before)
+        assert status == 200 and headers["etag"] != before
+        assert {s["name"]: s["status"] for s in json.loads(body)}["backup"] == ServiceStatus.STOPPING.value
+    finally:
+        info.update_status(ServiceStatus.RUNNING)
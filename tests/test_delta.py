@@ -0,0 +1,137 @@
+import hashlib
+import os
+import random
+import time
+
+import pytest
+
+from core.backup.delta import (DeltaAborted, Signature, SignatureBuilder, apply_delta_file,
+                               build_signature, encode_delta)
+from core.backup.manager import BackupManager
+from core.backup.models import BackupType
+from core.backup.volumes import VolumeSet
+
+BLOCK = 1024
+
+
+def _random_bytes(seed: int, size: int) -> bytes:
+    return random.Random(seed).getrandbits(size * 8).to_bytes(size, "little")
+
+
+def _round_trip(tmp_path, old: bytes, new: bytes):
+    """Codifica new contra a assinatura de old, reaplica e confere os bytes"""
+    basis = tmp_path / "old.bin"
+    target = tmp_path / "new.bin"
+    basis.write_bytes(old)
+    target.write_bytes(new)
+    signature, digest = build_signature(str(basis), BLOCK)
+    assert digest == hashlib.md5(old).hexdigest()
+    delta = tmp_path / "new.delta"
+    result = encode_delta(str(target), signature, str(delta), hashlib.md5(new).hexdigest())
+    assert result.copied_bytes + result.literal_bytes == len(new)
+    assert result.delta_size == os.path.getsize(delta)
+
+    out = tmp_path / "out.bin"
+    data = delta.read_bytes()
+    # Em pedaços pequenos: o leitor precisa juntar cabeçalhos partidos entre chunks
+    chunks = (data[i:i + 7] for i in range(0, len(data), 7))
+    assert apply_delta_file(chunks, str(basis), str(out)) == hashlib.md5(new).hexdigest()
+    assert out.read_bytes() == new
+    return result
+
+
+@pytest.fixture
+def old():
+    return _random_bytes(7, 100 * BLOCK + 300)
+
+
+@pytest.mark.parametrize("edit", [
+    lambda d: d,                                         # sem alteração
+    lambda d: d[:50_000] + b"inserted" + d[50_000:],     # inserção desalinha o resto
+    lambda d: d[:30_000] + d[31_500:],                   # remoção
+    lambda d: b"xyz" + d,                                # deslocamento desde o início
+    lambda d: d[:40_000] + b"!" * 10 + d[40_010:],       # sobrescrita no lugar
+    lambda d: d + b"tail" * 100,                         # crescimento
+    lambda d: d[:-700],                                  # último bloco parcial
+])
+def test_round_trip_edits(tmp_path, old, edit):
+    new = edit(old)
+    result = _round_trip(tmp_path, old, new)
+    # Só a vizinhança da edição vira literal
+    assert result.literal_bytes <= 2 * BLOCK + 400
+
+
+def test_unrelated_content_aborts(tmp_path, old):
+    (tmp_path / "old.bin").write_bytes(old)
+    new = os.urandom(len(old))
+    (tmp_path / "new.bin").write_bytes(new)
+    signature, _ = build_signature(str(tmp_path / "old.bin"), BLOCK)
+    with pytest.raises(DeltaAborted):
+        encode_delta(str(tmp_path / "new.bin"), signature, str(tmp_path / "new.delta"),
+                     hashlib.md5(new).hexdigest())
+
+
+def test_wrong_basis_or_corruption_is_rejected(tmp_path, old):
+    new = old[:10_000] + b"edit" + old[10_000:]
+    _round_trip(tmp_path, old, new)
+    delta = (tmp_path / "new.delta").read_bytes()
+
+    (tmp_path / "other.bin").write_bytes(old[:-1])
+    with pytest.raises(ValueError):
+        apply_delta_file([delta], str(tmp_path / "other.bin"), str(tmp_path / "out2.bin"))
+    # Mesmo tamanho, conteúdo diferente: o md5 do resultado não confere
+    (tmp_path / "other.bin").write_bytes(b"\0" + old[1:])
+    with pytest.raises(ValueError):
+        apply_delta_file([delta], str(tmp_path / "other.bin"), str(tmp_path / "out2.bin"))
+    assert not (tmp_path / "out2.bin").exists()
+    assert not list(tmp_path.glob("*.delta-tmp"))
+
+
+def test_signature_is_independent_of_chunking(tmp_path, old):
+    whole = SignatureBuilder(BLOCK)
+    whole.update(old)
+    pieces = SignatureBuilder(BLOCK)
+    for start in range(0, len(old), 777):
+        pieces.update(old[start:start + 777])
+    a, b = whole.finish(), pieces.finish()
+    assert (a.file_size, list(a.weak), bytes(a.strong)) == (b.file_size, list(b.weak), bytes(b.strong))
+
+    a.save(str(tmp_path / "sig" / "old.sig"))
+    loaded = Signature.load(str(tmp_path / "sig" / "old.sig"))
+    assert (loaded.block_size, loaded.file_size, list(loaded.weak), bytes(loaded.strong)) == (
+        BLOCK, len(old), list(a.weak), bytes(a.strong))
+
+
+def test_chain_of_deltas_restores_every_version(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    big = src / "big.bin"
+    small = src / "small.txt"
+    versions = [_random_bytes(1, 600_000)]
+    big.write_bytes(versions[0])
+    small.write_bytes(b"a" * 1000)
+    base = str(tmp_path / "store")
+    manager = BackupManager(base, volumes=VolumeSet([base]), delta_threshold=256 * 1024)
+    backups = [manager.create_backup("p", BackupType.FULL, str(src))]
+
+    edits = [
+        lambda d: d[:100_000] + b"inserted" + d[100_000:],
+        lambda d: d[:200_000] + d[205_000:],
+        lambda d: b"shift" + d,
+    ]
+    for n, edit in enumerate(edits):
+        versions.append(edit(versions[-1]))
+        time.sleep(0.01)
+        big.write_bytes(versions[-1])
+        small.write_bytes(str(n).encode() * 1000)
+        inc = manager.create_backup("p", BackupType.INCREMENTAL, str(src))
+        delta = {f.path: f.delta for f in inc.files}
+        # Abaixo do limite o arquivo vai inteiro, mesmo alterado
+        assert delta == {"big.bin": True, "small.txt": False}
+        backups.append(inc)
+
+    for backup, content in zip(backups, versions):
+        out = tmp_path / f"out-{backup.id}"
+        report = manager.restore_backup_report(backup.id, "p", str(out))
+        assert report.success, report.error
+        assert (out / "big.bin").read_bytes() == content
@@ -0,0 +1,77 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from core.backup.manager import BackupManager
+from core.backup.models import BackupType, RestoreMode
+from core.backup.volumes import VolumeSet
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git não encontrado")
+
+
+def _git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout
+
+
+def _project(src):
+    """Projeto com um repositório git, um venv e um node_modules mínimos"""
+    (src / "app").mkdir(parents=True)
+    for i in range(5):
+        (src / "app" / f"m{i}.py").write_text(f"x = {i}\n")
+    site = src / "venv" / "lib" / "python3.11" / "site-packages"
+    (site / "pkg").mkdir(parents=True)
+    (src / "venv" / "pyvenv.cfg").write_text("home = /usr/bin\n")
+    (site / "pkg" / "__init__.py").write_text("VERSION = 1\n")
+    (site / "pkg-1.0.dist-info").mkdir()
+    (site / "pkg-1.0.dist-info" / "METADATA").write_text("Name: pkg\nVersion: 1.0\n\n")
+    (site / "pkg-1.0.dist-info" / "RECORD").write_text("pkg/__init__.py,,\n")
+    (src / "package.json").write_text('{"name": "app", "version": "1.0.0"}')
+    (src / "node_modules" / "left-pad").mkdir(parents=True)
+    (src / "node_modules" / "left-pad" / "package.json").write_text('{"version": "1.3.0"}')
+    (src / "node_modules" / "left-pad" / "index.js").write_text("module.exports = 1\n")
+    (src / ".gitignore").write_text("venv/\nnode_modules/\n")
+    _git(src, "init", "-q")
+    _git(src, "config", "user.email", "a@b")
+    _git(src, "config", "user.name", "a")
+    _git(src, "add", ".")
+    _git(src, "commit", "-qm", "c0")
+
+
+def test_differential_restore_keeps_environments_and_git_objects(tmp_path):
+    src = tmp_path / "src"
+    _project(src)
+    base = str(tmp_path / "store")
+    manager = BackupManager(base, volumes=VolumeSet([base]))
+    backup = manager.create_backup("p", BackupType.FULL, str(src), git_mode=True, env_mode=True)
+    assert backup.git and len(backup.environments) == 2
+
+    out = tmp_path / "out"
+    assert manager.restore_backup_report(backup.id, "p", str(out)).success
+
+    # Árvore idêntica: nada a fazer, nem nos ambientes nem em .git/objects
+    plan = manager.restore_backup_report(backup.id, "p", str(out), mode=RestoreMode.DIFFERENTIAL,
+                                         dry_run=True).plan
+    assert plan.changes == []
+    assert (plan.files_to_create, plan.files_to_update, plan.files_to_delete) == (0, 0, 0)
+
+    (out / "app" / "m1.py").write_text("changed\n")
+    venv_file = out / "venv" / "lib" / "python3.11" / "site-packages" / "pkg" / "__init__.py"
+    venv_inode = venv_file.stat().st_ino
+    report = manager.restore_backup_report(backup.id, "p", str(out), mode=RestoreMode.DIFFERENTIAL)
+    assert report.success, report.error
+    assert report.files_removed == 0
+    assert [v.path for v in report.files] == ["app/m1.py"]
+    assert (out / "app" / "m1.py").read_text() == "x = 1\n"
+    # Ambiente igual ao do backup não é recriado
+    assert venv_file.stat().st_ino == venv_inode
+    assert (out / "node_modules" / "left-pad" / "index.js").read_text() == "module.exports = 1\n"
+    _git(out, "fsck", "--strict")
+    assert _git(out, "log", "--format=%s") == "c0\n"
+
+    # Ambiente alterado no destino volta ao estado do backup
+    venv_file.write_text("VERSION = 2\n")
+    report = manager.restore_backup_report(backup.id, "p", str(out), mode=RestoreMode.DIFFERENTIAL)
+    assert report.success, report.error
+    assert venv_file.read_text() == "VERSION = 1\n"
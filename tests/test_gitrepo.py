@@ -0,0 +1,36 @@
+import shutil
+import subprocess
+
+import pytest
+
+from core.backup.gitrepo import pack_repository
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git não encontrado")
+
+
+def _git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+
+def test_unchanged_repository_packs_nothing(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    _git(repo, "config", "user.email", "a@b")
+    _git(repo, "config", "user.name", "a")
+    for i in range(20):
+        (repo / f"f{i}.txt").write_text(f"{i}\n" * 10)
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-qm", "c0")
+
+    first = pack_repository(str(repo), str(tmp_path / "0.pack"))
+    assert first.objects > 0
+    second = pack_repository(str(repo), str(tmp_path / "1.pack"), first)
+    assert second.objects == 0 and second.pack is None
+    assert not (tmp_path / "1.pack").exists()
+
+    # Alteração em stage entra no pack seguinte, só o blob novo
+    (repo / "f0.txt").write_text("staged\n")
+    _git(repo, "add", "f0.txt")
+    third = pack_repository(str(repo), str(tmp_path / "2.pack"), second)
+    assert third.objects == 1
@@ -0,0 +1,47 @@
+import json
+import time
+
+import main
+from tests.asgi import request
+
+
+def _create(project_id, backup_type, src):
+    status, _, body = request(main.app, "POST", "/api/v1/backup/create",
+                              {"project_id": project_id, "backup_type": backup_type, "data_dir": str(src)})
+    assert status == 200, body
+    return json.loads(body)
+
+
+def test_history_and_version_content(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("v1")
+    (src / "b.txt").write_text("x")
+    first = _create("hist", "full", src)
+    time.sleep(0.01)
+    (src / "a.txt").write_text("version 2")
+    second = _create("hist", "inc", src)
+    time.sleep(0.01)
+    (src / "b.txt").write_text("y")  # a.txt inalterado
+    _create("hist", "inc", src)
+
+    status, _, body = request(main.app, "GET", "/api/v1/backup/history/hist?path=a.txt")
+    assert status == 200, body
+    versions = json.loads(body)["versions"]
+    assert [v["backup_id"] for v in versions] == [second["id"], first["id"]]
+    assert [v["size"] for v in versions] == [9, 2]
+
+    status, headers, body = request(
+        main.app, "GET", f"/api/v1/backup/history/hist/content?path=a.txt&backup_id={first['id']}")
+    assert (status, body) == (200, b"v1")
+    assert headers["etag"] == f'"{versions[1]["checksum"]}"'
+
+    status, headers, body = request(
+        main.app, "GET", f"/api/v1/backup/history/hist/content?path=a.txt&backup_id={second['id']}",
+        headers={"Range": "bytes=2-4"})
+    assert (status, body) == (206, b"rsi")
+    assert headers["content-range"] == "bytes 2-4/9"
+
+    status, _, _ = request(
+        main.app, "GET", f"/api/v1/backup/history/hist/content?path=missing.txt&backup_id={first['id']}")
+    assert status == 404
@@ -0,0 +1,65 @@
+import os
+import time
+
+from core.backup.manager import BackupManager
+from core.backup.models import BackupType
+from core.backup.volumes import VolumeSet
+
+
+def _stage(metadata, name):
+    return next(t for t in metadata.stages if t.name == name)
+
+
+def test_incremental_stores_only_changed_files(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    (src / "d").mkdir(parents=True)
+    for i in range(50):
+        (src / "d" / f"f{i}.txt").write_bytes(os.urandom(98_000))
+    base = str(tmp_path / "store")
+    manager = BackupManager(base, volumes=VolumeSet([base]), delta_threshold=None)
+    manager.create_backup("p", BackupType.FULL, str(src))
+
+    time.sleep(0.01)
+    changed = src / "d" / "f7.txt"
+    changed.write_bytes(b"changed" * 100)
+
+    calls = []
+    store_file = manager.compressor.store_file
+    monkeypatch.setattr(manager.compressor, "store_file",
+                        lambda source, *args, **kwargs: calls.append(source) or store_file(source, *args, **kwargs))
+    inc = manager.create_backup("p", BackupType.INCREMENTAL, str(src))
+
+    assert calls == [str(changed)]
+    store = _stage(inc, "store")
+    assert (store.files, store.bytes) == (1, 700)
+    assert [f.path for f in inc.files] == ["d/f7.txt"]
+    assert sorted(os.listdir(os.path.join(base, "p", inc.id, "data", "d"))) == ["f7.txt.compressed"]
+
+
+def test_delta_signature_follows_latest_version(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    big = src / "big.bin"
+    content = bytearray(os.urandom(1_000_000))
+    big.write_bytes(content)
+    (src / "small.txt").write_text("x")
+    base = str(tmp_path / "store")
+    manager = BackupManager(base, volumes=VolumeSet([base]), delta_threshold=256 * 1024)
+    manager.create_backup("p", BackupType.FULL, str(src))
+
+    for round_ in range(3):
+        # Um incremental sem big.bin no meio: a assinatura vem de dois elos acima
+        time.sleep(0.01)
+        (src / "small.txt").write_text(str(round_))
+        manager.create_backup("p", BackupType.INCREMENTAL, str(src))
+        # Mesmo tamanho a cada rodada: só a assinatura da versão certa gera um delta válido
+        content[round_ * 100_000:round_ * 100_000 + 10] = os.urandom(10)
+        time.sleep(0.01)
+        big.write_bytes(content)
+        inc = manager.create_backup("p", BackupType.INCREMENTAL, str(src))
+        assert [f.delta for f in inc.files if f.path == "big.bin"] == [True]
+
+    out = tmp_path / "out"
+    report = manager.restore_backup_report(inc.id, "p", str(out))
+    assert report.success, report.error
+    assert (out / "big.bin").read_bytes() == bytes(content)
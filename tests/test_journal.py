@@ -0,0 +1,46 @@
+import time
+
+from core.backup.journal import ChangeJournal, JournalRegistry
+from core.backup.manager import BackupManager
+from core.backup.models import BackupType
+from core.backup.volumes import VolumeSet
+
+
+def _venv(src):
+    site = src / "venv" / "lib" / "python3.11" / "site-packages"
+    (site / "pkg").mkdir(parents=True)
+    (src / "venv" / "pyvenv.cfg").write_text("home = /usr/bin\n")
+    (site / "pkg" / "__init__.py").write_text("VERSION = 1\n")
+
+
+def test_journal_is_used_with_environments(tmp_path, capsys):
+    src = tmp_path / "src"
+    (src / "app").mkdir(parents=True)
+    for i in range(5):
+        (src / "app" / f"m{i}.py").write_text(f"x = {i}\n")
+    _venv(src)
+    journals = JournalRegistry()
+    journal = ChangeJournal("p", str(src))
+    journals.register(journal)
+    base = str(tmp_path / "store")
+    manager = BackupManager(base, volumes=VolumeSet([base]), journals=journals)
+    full = manager.create_backup("p", BackupType.FULL, str(src), env_mode=True)
+    assert [env.path for env in full.environments] == ["venv"]
+
+    time.sleep(0.01)
+    (src / "app" / "m1.py").write_text("changed\n")
+    journal.mark_file("app/m1.py")
+    capsys.readouterr()
+    inc = manager.create_backup("p", BackupType.INCREMENTAL, str(src), env_mode=True)
+    assert "Journal de p: 1 arquivos" in capsys.readouterr().out
+    assert [f.path for f in inc.files] == ["app/m1.py"]
+
+    # O venv deixa de ser ambiente: seus arquivos voltam ao walk, então o
+    # journal (que só viu pyvenv.cfg) não basta
+    time.sleep(0.01)
+    (src / "venv" / "pyvenv.cfg").unlink()
+    journal.mark_file("venv/pyvenv.cfg")
+    inc = manager.create_backup("p", BackupType.INCREMENTAL, str(src), env_mode=True)
+    assert "Journal de p" not in capsys.readouterr().out
+    assert inc.environments == []
+    assert [f.path for f in inc.files] == ["venv/lib/python3.11/site-packages/pkg/__init__.py"]
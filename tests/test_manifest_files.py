@@ -0,0 +1,115 @@
+import filecmp
+import json
+import os
+import time
+
+import pytest
+
+from core.backup.manager import BackupManager
+from core.backup.manifest import MANIFEST_FILENAME, Manifest
+from core.backup.models import BackupType, CompressionType
+from core.backup.volumes import VolumeSet
+
+
+def _same_tree(a, b):
+    cmp = filecmp.dircmp(a, b)
+    assert (cmp.left_only, cmp.right_only, cmp.diff_files) == ([], [], [])
+    for sub in cmp.common_dirs:
+        _same_tree(os.path.join(a, sub), os.path.join(b, sub))
+
+
+def _metadata(manager, backup_id):
+    with open(os.path.join(manager.project_dir("p"), backup_id, "metadata.json")) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def project(tmp_path):
+    src = tmp_path / "src"
+    (src / "d" / "e").mkdir(parents=True)
+    for i in range(12):
+        folder = [src, src / "d", src / "d" / "e"][i % 3]
+        (folder / f"f{i}.txt").write_text(f"arquivo {i} " * (i + 1))
+    base = str(tmp_path / "store")
+    return BackupManager(base, volumes=VolumeSet([base])), src
+
+
+def test_full_keeps_files_only_in_manifest(project, tmp_path):
+    manager, src = project
+    full = manager.create_backup("p", BackupType.FULL, str(src), CompressionType.ZLIB, 1)
+    meta = _metadata(manager, full.id)
+    assert (meta["files"], meta["files_manifest"], meta["files_count"]) == ([], True, 12)
+    manifest = Manifest.load(os.path.join(manager.project_dir("p"), full.id, MANIFEST_FILENAME))
+    assert len(manifest) == 12 and meta["size_bytes"] == manifest.total_size
+    assert manager.validator.validate_restore_point(full.id, "p") == (True, None)
+
+    time.sleep(0.01)
+    (src / "d" / "f1.txt").write_text("alterado")
+    (src / "f0.txt").unlink()
+    inc = manager.create_backup("p", BackupType.INCREMENTAL, str(src), CompressionType.ZLIB, 1)
+    out = tmp_path / "out"
+    report = manager.restore_backup_report(inc.id, "p", str(out))
+    assert report.success, report.error
+    _same_tree(str(src), str(out))
+
+    # Histórico e listagem de arquivos leem o manifesto
+    assert [v.backup_id for v in manager.path_history("p", "d/e/f2.txt")] == [full.id]
+    assert [v.backup_id for v in manager.path_history("p", "d/f1.txt")] == [inc.id, full.id]
+    cursor, seen = None, []
+    while True:
+        page = manager.list_backup_files(full.id, "p", 5, cursor)
+        seen += page.items
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert [f["path"] for f in seen] == [manifest.path(i) for i in range(12)]
+    assert all(f["compressed"] and not f["delta"] for f in seen)
+    assert [f["path"] for f in manager.list_backup_files(full.id, "p", prefix="d/e/").items] == \
+        ["d/e/f11.txt", "d/e/f2.txt", "d/e/f5.txt", "d/e/f8.txt"]
+
+    os.remove(os.path.join(manager.project_dir("p"), full.id, "data", "d", "e", "f2.txt.compressed"))
+    assert manager.validator.validate_restore_point(full.id, "p") == \
+        (False, "Arquivo comprimido ausente: d/e/f2.txt.compressed")
+
+
+def test_snapshot_links_from_manifest(project, tmp_path):
+    manager, src = project
+    first = manager.create_backup("p", BackupType.SNAPSHOT, str(src))
+    assert _metadata(manager, first.id)["files"] == []
+    time.sleep(0.01)
+    (src / "d" / "f4.txt").write_text("novo conteúdo")
+    second = manager.create_backup("p", BackupType.SNAPSHOT, str(src))
+    assert second.snapshot.base_snapshot_id == first.id
+    assert second.snapshot.linked + second.snapshot.reflinked == 11
+    assert second.snapshot.copied + second.snapshot.reflinked <= 12
+
+    out = tmp_path / "out"
+    report = manager.restore_backup_report(second.id, "p", str(out))
+    assert report.success, report.error
+    _same_tree(str(src), str(out))
+    versions = manager.path_history("p", "d/f4.txt")
+    assert [v.backup_id for v in versions] == [second.id, first.id]
+    assert versions[0].checksum != versions[1].checksum
+
+
+def test_backups_with_files_in_metadata_still_restore(project, tmp_path):
+    manager, src = project
+    full = manager.create_backup("p", BackupType.FULL, str(src))
+    backup_dir = os.path.join(manager.project_dir("p"), full.id)
+    manifest_path = os.path.join(backup_dir, MANIFEST_FILENAME)
+
+    # Formato anterior: lista completa no metadata.json e sem manifest.bin
+    meta = _metadata(manager, full.id)
+    meta["files"] = [dict(json.loads(f.json()), compressed=meta["compression"] is not None)
+                     for f in Manifest.load(manifest_path).file_infos()]
+    del meta["files_manifest"]
+    with open(os.path.join(backup_dir, "metadata.json"), "w") as f:
+        json.dump(meta, f)
+    os.remove(manifest_path)
+
+    assert manager.validator.validate_restore_point(full.id, "p") == (True, None)
+    assert len(manager.list_backup_files(full.id, "p").items) == 12
+    out = tmp_path / "out"
+    report = manager.restore_backup_report(full.id, "p", str(out))
+    assert report.success, report.error
+    _same_tree(str(src), str(out))
@@ -0,0 +1,79 @@
+import os
+import time
+
+from core.backup.estimator import BackupEstimator
+from core.backup.manager import BackupManager
+from core.backup.manifest import scan_manifest
+from core.backup.models import BackupType
+from core.backup.planner import ChainPolicy
+from core.backup.volumes import VolumeSet
+
+
+def _manager(tmp_path, **policy):
+    base = str(tmp_path / "store")
+    return BackupManager(base, volumes=VolumeSet([base]), delta_threshold=64 * 1024,
+                         chain_policy=ChainPolicy(**policy))
+
+
+def _project(tmp_path):
+    src = tmp_path / "src"
+    (src / "d").mkdir(parents=True)
+    for i in range(20):
+        (src / "d" / f"f{i}.txt").write_bytes(os.urandom(10_000))
+    (src / "big.bin").write_bytes(os.urandom(200_000))
+    return src
+
+
+def _touch(path, data):
+    time.sleep(0.01)
+    path.write_bytes(data)
+
+
+def test_auto_follows_depth_and_size_limits(tmp_path, monkeypatch):
+    src = _project(tmp_path)
+    manager = _manager(tmp_path, max_chain_depth=2)
+    first = manager.create_backup("p", BackupType.AUTO, str(src))
+    assert first.type == BackupType.FULL
+
+    _touch(src / "d" / "f1.txt", b"one")
+    second = manager.create_backup("p", BackupType.AUTO, str(src))
+    assert second.type in (BackupType.DIFFERENTIAL, BackupType.INCREMENTAL)
+    assert second.parent_backup_id == first.id
+
+    # A escolha usa só o catálogo e os manifestos, nunca metadata.json
+    def no_metadata(*args, **kwargs):
+        raise AssertionError("metadata.json lido pelo planejador")
+    monkeypatch.setattr(manager, "get_backup_info", no_metadata)
+    _touch(src / "d" / "f2.txt", b"two")
+    decision = manager.planner.choose("p", str(src))
+    monkeypatch.undo()
+
+    # Um incremental sobre o segundo passaria do limite de profundidade
+    by_type = {c.type: c for c in decision.candidates}
+    assert not by_type[BackupType.INCREMENTAL].feasible
+    assert decision.chosen == BackupType.DIFFERENTIAL
+    assert by_type[BackupType.DIFFERENTIAL].changed_files == 2
+
+    # Mudança grande desde o completo: o diferencial não compensa
+    for i in range(20):
+        _touch(src / "d" / f"f{i}.txt", os.urandom(10_000))
+    _touch(src / "big.bin", os.urandom(200_000))
+    decision = manager.planner.choose("p", str(src))
+    assert decision.chosen == BackupType.FULL
+    assert "completo" in {c.type: c for c in decision.candidates}[BackupType.DIFFERENTIAL].reason
+
+
+def test_changes_match_estimator(tmp_path):
+    src = _project(tmp_path)
+    manager = _manager(tmp_path)
+    full = manager.create_backup("p", BackupType.FULL, str(src))
+    _touch(src / "big.bin", os.urandom(200_000))
+    _touch(src / "d" / "new.txt", b"new")
+    os.remove(src / "d" / "f3.txt")
+
+    current = scan_manifest(str(src))
+    parent = manager._load_manifest(full)
+    changed, deleted = BackupEstimator.changed_entries(current, parent)
+    assert manager.planner._changes(current, parent) == (
+        len(changed), sum(current.sizes[i] for i in changed), deleted, 200_000)
+    assert (len(changed), deleted) == (2, 1)
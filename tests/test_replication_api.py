@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+ASGI_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "asgi.py")
+
+
+def _instance(backup_dir):
+    """Sobe main:app num processo próprio com BACKUP_DIR e retorna (processo, url do peer)"""
+    env = {**os.environ, "BACKUP_DIR": str(backup_dir)}
+    env.pop("BACKUP_REPLICATION_PEER", None)
+    process = subprocess.Popen([sys.executable, ASGI_SERVER], env=env, text=True,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    for line in process.stdout:
+        if line.startswith("port="):
+            # Continua lendo o stdout para os prints do servidor não bloquearem
+            threading.Thread(target=process.stdout.read, daemon=True).start()
+            return process, f"http://127.0.0.1:{line.strip().split('=', 1)[1]}/api/v1"
+    raise RuntimeError("Instância não subiu")
+
+
+def _call(method, url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+@pytest.fixture
+def instances(tmp_path):
+    started = []
+    try:
+        for name in ("a", "b"):
+            started.append(_instance(tmp_path / f"backups-{name}"))
+        yield [url for _, url in started]
+    finally:
+        for process, _ in started:
+            process.kill()
+            process.wait()
+
+
+def test_pull_between_two_instances(tmp_path, instances):
+    peer_a, peer_b = instances
+    src = tmp_path / "src"
+    (src / "d").mkdir(parents=True)
+    for i in range(5):
+        (src / "d" / f"f{i}.txt").write_bytes(os.urandom(20_000))
+
+    full = _call("POST", f"{peer_a}/backup/create",
+                 {"project_id": "p", "backup_type": "full", "data_dir": str(src)})
+    time.sleep(0.01)
+    (src / "d" / "f3.txt").write_bytes(b"changed")
+    inc = _call("POST", f"{peer_a}/backup/create",
+                {"project_id": "p", "backup_type": "inc", "data_dir": str(src)})
+
+    # A rota de replicação não pode cair no DELETE /backup/{project_id}/{backup_id}
+    assert "p" in _call("GET", f"{peer_a}/backup/replication/catalog")
+
+    report = _call("POST", f"{peer_b}/backup/replication/pull", {"peer_url": peer_a})
+    assert report["success"], report["errors"]
+    assert report["backups_replicated"] == [full["id"], inc["id"]]
+
+    listed = _call("GET", f"{peer_b}/backup/list/p")
+    assert {item["id"] for item in listed["items"]} == {full["id"], inc["id"]}
+    restored = tmp_path / "restored"
+    result = _call("POST", f"{peer_b}/backup/restore/report",
+                   {"project_id": "p", "backup_id": inc["id"], "restore_dir": str(restored)})
+    assert result["success"], result["error"]
+    for i in range(5):
+        path = os.path.join("d", f"f{i}.txt")
+        assert (restored / path).read_bytes() == (src / path).read_bytes()
+
+    # Segunda rodada: nada novo no peer
+    again = _call("POST", f"{peer_b}/backup/replication/pull", {"peer_url": peer_a})
+    assert again["backups_replicated"] == [] and again["backups_skipped"] == 2
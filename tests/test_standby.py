@@ -0,0 +1,105 @@
+import hashlib
+import os
+import subprocess
+import time
+
+import pytest
+
+from core.backup.manager import BackupManager
+from core.backup.models import BackupType
+from core.backup.standby import MerkleTree
+from core.backup.volumes import VolumeSet
+
+
+def _md5(data: bytes) -> bytes:
+    return hashlib.md5(data).digest()
+
+
+def test_merkle_diff():
+    base = {"a.txt": b"a", "d/b.txt": b"b", "d/e/c.txt": b"c", "x/y.txt": b"y"}
+    tree = MerkleTree((p, _md5(d)) for p, d in base.items())
+    assert MerkleTree((p, _md5(d)) for p, d in reversed(list(base.items()))).root == tree.root
+    assert tree.diff(tree) == ([], [], [])
+    assert sorted(tree.files("d")) == ["d/b.txt", "d/e/c.txt"]
+
+    other = dict(base)
+    other["d/e/c.txt"] = b"C"           # alterado
+    del other["a.txt"]                  # ausente
+    other["d/new.txt"] = b"n"           # sobrando
+    del other["x/y.txt"]
+    other["x"] = b"arquivo"             # diretório virou arquivo
+    actual = MerkleTree((p, _md5(d)) for p, d in other.items())
+    assert actual.root != tree.root
+    assert tree.diff(actual) == (["d/e/c.txt"], ["a.txt", "x/y.txt"], ["d/new.txt", "x"])
+    assert actual.diff(tree) == (["d/e/c.txt"], ["d/new.txt", "x"], ["a.txt", "x/y.txt"])
+
+
+@pytest.fixture
+def standby(tmp_path):
+    src = tmp_path / "src"
+    (src / "a" / "b").mkdir(parents=True)
+    for i in range(30):
+        folder = [src, src / "a", src / "a" / "b"][i % 3]
+        (folder / f"f{i}.txt").write_text(f"file {i} " * (i + 1))
+    base = str(tmp_path / "store")
+    manager = BackupManager(base, volumes=VolumeSet([base]))
+    manager.create_backup("p", BackupType.FULL, str(src))
+    replica = tmp_path / "replica"
+    info = manager.standby.enable("p", str(replica))
+    assert info.verified and info.error is None
+    return manager, src, replica
+
+
+def _same(a, b):
+    return subprocess.run(["diff", "-r", "--no-dereference", str(a), str(b)],
+                          capture_output=True).returncode == 0
+
+
+def test_incremental_is_applied_and_verified(standby):
+    manager, src, replica = standby
+    time.sleep(0.01)
+    (src / "a" / "f1.txt").write_text("changed")
+    (src / "a" / "b" / "new.txt").write_text("new")
+    (src / "f3.txt").unlink()
+    inc = manager.create_backup("p", BackupType.INCREMENTAL, str(src))
+    info = manager.standby.load("p")
+    assert (info.backup_id, info.rebuilt, info.verified) == (inc.id, False, True)
+    assert _same(src, replica)
+
+    verification = manager.standby.verify("p")
+    assert verification.ok and verification.merkle_root == info.merkle_root
+    assert (verification.files, verification.hashed) == (30, 0)
+
+
+def test_verify_finds_tampering_and_promote_repairs(standby, tmp_path):
+    manager, src, replica = standby
+    # Mesmo tamanho e mtime: só a verificação profunda vê a alteração
+    target = replica / "a" / "f1.txt"
+    stat = target.stat()
+    with open(target, "r+") as f:
+        f.write("X")
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    (replica / "extra.txt").write_text("junk")
+    (replica / "a" / "b" / "f2.txt").unlink()
+
+    fast = manager.standby.verify("p")
+    assert not fast.ok
+    assert (fast.changed, fast.missing, fast.extraneous) == ([], ["a/b/f2.txt"], ["extra.txt"])
+    assert fast.hashed == 1
+    deep = manager.standby.verify("p", deep=True)
+    assert (deep.changed, deep.missing, deep.extraneous) == (["a/f1.txt"], ["a/b/f2.txt"], ["extra.txt"])
+    assert deep.hashed == deep.files == 30
+    assert deep.merkle_root == fast.merkle_root and deep.actual_root != deep.merkle_root
+
+    promotion = manager.standby.promote("p", str(tmp_path / "out"), clone=True, deep=True)
+    assert promotion.repaired == 3 and promotion.verification.ok
+    assert _same(src, tmp_path / "out") and _same(src, replica)
+
+
+def test_verify_rejects_unexpected_merkle_root(standby):
+    manager, _, _ = standby
+    info = manager.standby.load("p")
+    info.merkle_root = "00" * 32
+    manager.standby._save(info)
+    with pytest.raises(ValueError):
+        manager.standby.verify("p")
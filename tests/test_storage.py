@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+
+import pytest
+
+from core.backup.storage import MemoryClientError, MemoryObjectClient, ObjectStore, RetryPolicy
+
+
+class _FailingPartClient(MemoryObjectClient):
+    """Falha de vez na parte 1 enquanto as demais ainda estão em andamento"""
+
+    def __init__(self):
+        super().__init__()
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self.lock:
+            self.running += 1
+        try:
+            if PartNumber == 1:
+                raise MemoryClientError("AccessDenied", 403)
+            time.sleep(0.05)
+            return super().upload_part(Bucket, Key, UploadId, PartNumber, Body)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def _store(client, **kwargs):
+    return ObjectStore(client, "bucket", part_size=1024, multipart_threshold=1024,
+                       retry=RetryPolicy(attempts=3, base_delay=0.001), **kwargs)
+
+
+def test_multipart_round_trip_with_transient_errors(tmp_path):
+    client = MemoryObjectClient()
+    store = _store(client)
+    data = os.urandom(10 * 1024 + 7)
+    (tmp_path / "a.bin").write_bytes(data)
+    client.fail_next(2)
+    assert store.upload_file(str(tmp_path / "a.bin"), "k/a.bin") == len(data)
+    # create repetido duas vezes, 11 partes e complete
+    assert sum(client.requests.values()) == 3 + 11 + 1
+    client.fail_next(2)
+    assert store.download_file("k/a.bin", str(tmp_path / "out" / "a.bin")) == len(data)
+    assert (tmp_path / "out" / "a.bin").read_bytes() == data
+
+
+def test_failed_upload_waits_for_parts_and_aborts(tmp_path):
+    client = _FailingPartClient()
+    store = _store(client, max_concurrency=4)
+    (tmp_path / "a.bin").write_bytes(os.urandom(8 * 1024))
+    with pytest.raises(MemoryClientError):
+        store.upload_file(str(tmp_path / "a.bin"), "k/a.bin")
+    # Nenhuma parte segue lendo o arquivo já fechado
+    assert client.running == 0
+    assert client.requests["abort_multipart_upload"] == 1
+    assert client._uploads == {}
+    assert not store.exists("k/a.bin")
+
+
+def test_map_files_and_trees(tmp_path):
+    store = _store(MemoryObjectClient())
+    src = tmp_path / "src"
+    (src / "d").mkdir(parents=True)
+    (src / "a.txt").write_bytes(b"a" * 3000)
+    (src / "d" / "b.txt").write_bytes(b"b")
+    (src / "skip.txt").write_bytes(b"s")
+    assert store.upload_tree(str(src), "p", skip=("skip.txt",)) == 3001
+    assert sorted(key for key, _ in store.list("p/")) == ["p/a.txt", "p/d/b.txt"]
+    assert store.download_tree("p", str(tmp_path / "dst")) == 3001
+    assert (tmp_path / "dst" / "d" / "b.txt").read_bytes() == b"b"
+
+    assert store.map_files(lambda a, b: a + b, [(1, 2), (3, 4)]) == [3, 7]
+    with pytest.raises(FileNotFoundError):
+        store.map_files(store.upload_file, [(str(tmp_path / "missing"), "p/x")])
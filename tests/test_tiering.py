@@ -0,0 +1,124 @@
+import filecmp
+import os
+import random
+import time
+
+import pytest
+
+from core.backup.manager import BackupManager
+from core.backup.models import BackupType, CompressionType
+from core.backup.restorer import ACTIVE_RESTORES
+from core.backup.tiering import OLD_DIRNAME, STAGING_DIRNAME, BackupTiering, TieringPolicy
+from core.backup.volumes import VolumeSet
+
+
+def _text(seed):
+    words = random.Random(seed).choices(["backup", "camada", "fria", "dados", "troca", "lote"], k=20_000)
+    return " ".join(words)
+
+
+def _same_tree(a, b):
+    cmp = filecmp.dircmp(a, b)
+    assert (cmp.left_only, cmp.right_only, cmp.diff_files) == ([], [], [])
+    for sub in cmp.common_dirs:
+        _same_tree(os.path.join(a, sub), os.path.join(b, sub))
+
+
+@pytest.fixture
+def setup(tmp_path):
+    src = tmp_path / "src"
+    (src / "d").mkdir(parents=True)
+    for i in range(5):
+        (src / "d" / f"f{i}.txt").write_text(_text(i))
+    base = str(tmp_path / "store")
+    manager = BackupManager(base, volumes=VolumeSet([base]))
+    full = manager.create_backup("p", BackupType.FULL, str(src), CompressionType.ZLIB, 1)
+    time.sleep(0.01)
+    (src / "d" / "f1.txt").write_text(_text(10))
+    inc = manager.create_backup("p", BackupType.INCREMENTAL, str(src), CompressionType.ZLIB, 1)
+    tiering = BackupTiering(manager, TieringPolicy(min_age_days=0, io_bytes_per_second=None,
+                                                   cpu_fraction=None))
+    return manager, tiering, src, full, inc
+
+
+def test_migrates_and_restores(setup, tmp_path):
+    manager, tiering, src, full, inc = setup
+    assert tiering.candidates("p") == [full.id, inc.id]
+    assert BackupTiering(manager, TieringPolicy(min_age_days=1)).candidates("p") == []
+
+    with ACTIVE_RESTORES.hold("p", [full.id]):
+        assert tiering.migrate("p", full.id) is None
+    assert tiering.run_once() == [full.id, inc.id]
+    assert tiering.candidates("p") == []
+
+    for backup in (full, inc):
+        metadata = manager.get_backup_info(backup.id, "p")
+        assert metadata.tier.tier == "cold"
+        assert metadata.compression.type == CompressionType.LZMA.value
+        assert metadata.compression.compressed_size < metadata.tier.previous.compressed_size
+        backup_dir = os.path.join(manager.project_dir("p"), backup.id)
+        assert not os.path.exists(os.path.join(backup_dir, OLD_DIRNAME))
+        assert not os.path.exists(os.path.join(backup_dir, STAGING_DIRNAME))
+        assert manager.validator.calculate_checksum(os.path.join(backup_dir, "data")) == metadata.checksum
+
+    out = tmp_path / "out"
+    report = manager.restore_backup_report(inc.id, "p", str(out))
+    assert report.success, report.error
+    _same_tree(str(src), str(out))
+
+
+def test_interrupted_swap_is_undone(setup, tmp_path):
+    manager, tiering, src, full, _ = setup
+    backup_dir = os.path.join(manager.project_dir("p"), full.id)
+    data_dir = os.path.join(backup_dir, "data")
+    original = {name: open(os.path.join(data_dir, "d", name), "rb").read()
+                for name in os.listdir(os.path.join(data_dir, "d"))}
+
+    # Queda entre os dois renames: data.old guarda os dados, data está pela metade
+    os.rename(data_dir, os.path.join(backup_dir, OLD_DIRNAME))
+    os.makedirs(os.path.join(data_dir, "d"))
+    open(os.path.join(data_dir, "d", "f0.txt.compressed"), "wb").write(b"lixo")
+    os.makedirs(os.path.join(backup_dir, STAGING_DIRNAME))
+    tiering._recover(backup_dir, manager.get_backup_info(full.id, "p"))
+    assert not os.path.exists(os.path.join(backup_dir, OLD_DIRNAME))
+    assert not os.path.exists(os.path.join(backup_dir, STAGING_DIRNAME))
+    assert {name: open(os.path.join(data_dir, "d", name), "rb").read()
+            for name in os.listdir(os.path.join(data_dir, "d"))} == original
+
+    # A migração seguinte parte de um estado consistente
+    os.rename(data_dir, os.path.join(backup_dir, OLD_DIRNAME))
+    assert tiering.migrate("p", full.id) is not None
+    out = tmp_path / "out"
+    report = manager.restore_backup_report(full.id, "p", str(out))
+    assert report.success, report.error
+    assert (out / "d" / "f1.txt").read_text() == _text(1)
+
+    # Queda depois dos metadados gravados: só resta apagar data.old
+    os.makedirs(os.path.join(backup_dir, OLD_DIRNAME))
+    tiering._recover(backup_dir, manager.get_backup_info(full.id, "p"))
+    assert not os.path.exists(os.path.join(backup_dir, OLD_DIRNAME))
+    assert os.listdir(os.path.join(data_dir, "d"))
+
+
+def test_swap_is_skipped_when_backup_changes_or_stops(setup, monkeypatch):
+    manager, tiering, _, full, _ = setup
+    backup_dir = os.path.join(manager.project_dir("p"), full.id)
+    meta_path = os.path.join(backup_dir, "metadata.json")
+    before = sorted(os.listdir(os.path.join(backup_dir, "data", "d")))
+    recompress = tiering._recompress
+
+    def touching(*args):
+        result = recompress(*args)
+        os.utime(meta_path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        return result
+    monkeypatch.setattr(tiering, "_recompress", touching)
+    assert tiering.migrate("p", full.id) is None
+    monkeypatch.undo()
+    assert manager.get_backup_info(full.id, "p").tier is None
+    assert sorted(os.listdir(os.path.join(backup_dir, "data", "d"))) == before
+    assert not os.path.exists(os.path.join(backup_dir, STAGING_DIRNAME))
+
+    tiering.stop_event.set()
+    assert tiering.migrate("p", full.id) is None
+    assert manager.get_backup_info(full.id, "p").tier is None
+    assert not os.path.exists(os.path.join(backup_dir, STAGING_DIRNAME))